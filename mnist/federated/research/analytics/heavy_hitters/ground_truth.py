@@ -0,0 +1,245 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Parallel computation of the ground truth for heavy hitters discovery.
+
+The ground truth is the histogram `{word: count}` counting, for every word, the
+number of clients holding it (optionally restricted to the top words of each
+client). It is computed as a map-reduce: the client ids are split into shards,
+worker processes tokenize the clients of a shard and count their words, and
+the per-shard counts are summed. The histogram is cached on disk, keyed by the
+dataset, the split, its client ids and the tokenization settings, and can be
+passed directly to `heavy_hitters_utils.{precision, recall, f1_score,
+distance_l1}`. The client ids of each split are cached as well, so that a
+cached histogram is read without loading the dataset.
+"""
+
+import collections
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Optional
+
+from absl import logging
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.analytics.heavy_hitters import heavy_hitters_utils as hh_utils
+
+# Bump this whenever `heavy_hitters_utils.tokenize` changes, so that histograms
+# cached with a previous tokenization are not reused.
+TOKENIZATION_VERSION = 'whitespace_casefold_no_punct_v1'
+
+# The element index of each split in the output of `load_data`.
+_SPLITS = {
+    'shakespeare': {
+        'train': 0,
+        'test': 1
+    },
+    'stackoverflow': {
+        'train': 0,
+        'held_out': 1,
+        'test': 2
+    },
+}
+
+# The `ClientData` loaded by each worker process, see `_init_worker`.
+_worker_data = {}
+
+
+def _check_split(dataset_name: str, split: str):
+  """Raises a `ValueError` if the split is not one of a supported dataset."""
+  if dataset_name not in _SPLITS:
+    raise ValueError('Unsupported dataset [{!s}], must be one of {!s}.'.format(
+        dataset_name, list(_SPLITS)))
+  if split not in _SPLITS[dataset_name]:
+    raise ValueError('Unsupported split [{!s}], must be one of {!s}.'.format(
+        split, list(_SPLITS[dataset_name])))
+
+
+def _load_client_data(dataset_name: str,
+                      split: str) -> tff.simulation.ClientData:
+  """Loads a split of one of the datasets supported by `tokenize`."""
+  _check_split(dataset_name, split)
+  if dataset_name == 'shakespeare':
+    splits = tff.simulation.datasets.shakespeare.load_data()
+  else:
+    splits = tff.simulation.datasets.stackoverflow.load_data()
+  return splits[_SPLITS[dataset_name][split]]
+
+
+def _get_client_words(data: tff.simulation.ClientData, client_id: str,
+                      dataset_name: str,
+                      num_words_per_client: Optional[int]) -> List[str]:
+  """Returns the set of (top) words held by a client."""
+  dataset = hh_utils.tokenize(
+      data.create_tf_dataset_for_client(client_id), dataset_name)
+  if num_words_per_client is None:
+    num_words_per_client = tf.int32.max
+  # Ties are broken by first occurrence, as in `collections.Counter`.
+  words = hh_utils.get_top_elements(dataset, num_words_per_client)
+  return [word.decode('utf-8') for word in words.numpy()]
+
+
+def _count_words(data: tff.simulation.ClientData, client_ids: List[str],
+                 dataset_name: str,
+                 num_words_per_client: Optional[int]) -> collections.Counter:
+  """Counts the number of clients in `client_ids` holding each word."""
+  counts = collections.Counter()
+  for client_id in client_ids:
+    counts.update(
+        _get_client_words(data, client_id, dataset_name, num_words_per_client))
+  return counts
+
+
+def _init_worker(dataset_name: str, split: str):
+  _worker_data['data'] = _load_client_data(dataset_name, split)
+
+
+def _count_words_in_worker(args) -> collections.Counter:
+  client_ids, dataset_name, num_words_per_client = args
+  return _count_words(_worker_data['data'], client_ids, dataset_name,
+                      num_words_per_client)
+
+
+def _get_cache_path(cache_dir: str, dataset_name: str, split: str,
+                    client_ids: List[str],
+                    num_words_per_client: Optional[int]) -> str:
+  """Returns the path of the cached histogram for the given settings."""
+  settings = collections.OrderedDict(
+      dataset_name=dataset_name,
+      split=split,
+      tokenization_version=TOKENIZATION_VERSION,
+      num_words_per_client=num_words_per_client,
+      client_ids=sorted(client_ids))
+  key = hashlib.sha1(json.dumps(settings).encode('utf-8')).hexdigest()
+  return os.path.join(cache_dir, '{}_{}_ground_truth_{}.json'.format(
+      dataset_name, split, key[:16]))
+
+
+def _get_client_ids_cache_path(cache_dir: str, dataset_name: str,
+                               split: str) -> str:
+  """Returns the path of the cached client ids of a split."""
+  # The datasets are pinned by the version of TFF which downloads them.
+  return os.path.join(
+      cache_dir, '{}_{}_client_ids_tff_{}.json'.format(dataset_name, split,
+                                                       tff.__version__))
+
+
+def _write_json(path: str, value):
+  # Write to a temporary file first, so that an interrupted write does not
+  # leave a truncated cache behind.
+  tf.io.gfile.makedirs(os.path.dirname(path))
+  tmp_path = path + '.tmp'
+  with tf.io.gfile.GFile(tmp_path, 'w') as f:
+    json.dump(value, f)
+  tf.io.gfile.rename(tmp_path, path, overwrite=True)
+
+
+def compute_ground_truth(dataset_name: str,
+                         split: str = 'train',
+                         data: Optional[tff.simulation.ClientData] = None,
+                         num_words_per_client: Optional[int] = None,
+                         num_workers: int = 1,
+                         clients_per_shard: int = 1000,
+                         cache_dir: Optional[str] = None) -> Dict[str, int]:
+  """Computes the number of clients holding each word of a dataset.
+
+  Args:
+    dataset_name: The name of the dataset, either 'shakespeare' or
+      'stackoverflow'.
+    split: The split of the dataset, as returned by
+      `tff.simulation.datasets.{dataset_name}.load_data`. One of 'train' or
+      'test', and also 'held_out' for StackOverflow.
+    data: An optional `tff.simulation.ClientData` to use instead of loading
+      `split`. Only supported if `num_workers` is 1.
+    num_words_per_client: If not `None`, only the top `num_words_per_client`
+      words of each client are counted.
+    num_workers: The number of worker processes. If 1, the clients are
+      processed in the current process.
+    clients_per_shard: The number of clients counted by a worker at a time.
+    cache_dir: An optional directory in which the histogram is cached.
+
+  Returns:
+    A dictionary mapping each word to the number of clients holding it.
+
+  Raises:
+    ValueError: If the dataset or split is not supported, or if `data` is
+      given and `num_workers` is greater than 1.
+  """
+  if num_workers < 1:
+    raise ValueError('num_workers must be positive, found {}.'.format(
+        num_workers))
+  if data is not None and num_workers > 1:
+    raise ValueError('Worker processes load the split themselves, so `data` '
+                     'is only supported with num_workers=1.')
+  _check_split(dataset_name, split)
+
+  # The client ids of a split are cached next to the histograms, so that a
+  # cached histogram is found without loading the split.
+  client_ids = None
+  if data is not None:
+    client_ids = list(data.client_ids)
+  elif cache_dir is not None:
+    client_ids_path = _get_client_ids_cache_path(cache_dir, dataset_name, split)
+    if tf.io.gfile.exists(client_ids_path):
+      with tf.io.gfile.GFile(client_ids_path, 'r') as f:
+        client_ids = json.load(f)
+  if client_ids is None:
+    data = _load_client_data(dataset_name, split)
+    client_ids = list(data.client_ids)
+    if cache_dir is not None:
+      _write_json(
+          _get_client_ids_cache_path(cache_dir, dataset_name, split),
+          client_ids)
+
+  cache_path = None
+  if cache_dir is not None:
+    cache_path = _get_cache_path(cache_dir, dataset_name, split, client_ids,
+                                 num_words_per_client)
+    if tf.io.gfile.exists(cache_path):
+      logging.info('Reading cached ground truth from %s', cache_path)
+      with tf.io.gfile.GFile(cache_path, 'r') as f:
+        return json.load(f)
+
+  start = time.time()
+  shards = [
+      client_ids[i:i + clients_per_shard]
+      for i in range(0, len(client_ids), clients_per_shard)
+  ]
+  counts = collections.Counter()
+  if num_workers == 1:
+    if data is None:
+      data = _load_client_data(dataset_name, split)
+    for shard in shards:
+      counts.update(
+          _count_words(data, shard, dataset_name, num_words_per_client))
+  else:
+    # TensorFlow is not fork-safe, so the workers are started from scratch.
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(
+        num_workers, initializer=_init_worker,
+        initargs=(dataset_name, split)) as pool:
+      tasks = [(shard, dataset_name, num_words_per_client) for shard in shards]
+      for i, shard_counts in enumerate(
+          pool.imap_unordered(_count_words_in_worker, tasks)):
+        counts.update(shard_counts)
+        logging.info('Counted %d of %d shards.', i + 1, len(shards))
+  ground_truth = dict(counts)
+  logging.info('Obtained ground truth in %.2f seconds', time.time() - start)
+
+  if cache_path is not None:
+    _write_json(cache_path, ground_truth)
+  return ground_truth
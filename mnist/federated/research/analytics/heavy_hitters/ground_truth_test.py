@@ -0,0 +1,107 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+from unittest import mock
+
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.analytics.heavy_hitters import ground_truth
+from tensorflow_federated.python.research.analytics.heavy_hitters import heavy_hitters_utils as hh_utils
+
+
+def _create_client_data():
+  return tff.simulation.FromTensorSlicesClientData({
+      'a': collections.OrderedDict(tokens=['hello world', 'Hello again !']),
+      'b': collections.OrderedDict(tokens=['world peace']),
+      'c': collections.OrderedDict(tokens=['hello hello world world world']),
+  })
+
+
+class GroundTruthTest(tf.test.TestCase):
+
+  def test_counts_clients_holding_each_word(self):
+    data = _create_client_data()
+    result = ground_truth.compute_ground_truth(
+        'stackoverflow', data=data, clients_per_shard=2)
+    self.assertEqual(result, {'hello': 2, 'world': 3, 'again': 1, 'peace': 1})
+    self.assertEqual(result, hh_utils.calculate_ground_truth(
+        data, 'stackoverflow'))
+
+  def test_counts_top_words_per_client(self):
+    result = ground_truth.compute_ground_truth(
+        'stackoverflow', data=_create_client_data(), num_words_per_client=1)
+    self.assertEqual(result, {'hello': 1, 'world': 2})
+
+  def test_reads_histogram_from_cache(self):
+    cache_dir = self.create_tempdir().full_path
+    data = _create_client_data()
+    result = ground_truth.compute_ground_truth(
+        'stackoverflow', data=data, cache_dir=cache_dir)
+    self.assertLen(tf.io.gfile.listdir(cache_dir), 1)
+
+    # A different setting is cached separately.
+    ground_truth.compute_ground_truth(
+        'stackoverflow',
+        data=data,
+        num_words_per_client=1,
+        cache_dir=cache_dir)
+    self.assertLen(tf.io.gfile.listdir(cache_dir), 2)
+
+    cached_result = ground_truth.compute_ground_truth(
+        'stackoverflow', data=data, cache_dir=cache_dir)
+    self.assertEqual(cached_result, result)
+
+  def test_reads_cached_histogram_without_loading_split(self):
+    cache_dir = self.create_tempdir().full_path
+    with mock.patch.object(
+        ground_truth, '_load_client_data',
+        return_value=_create_client_data()) as mock_load_client_data:
+      result = ground_truth.compute_ground_truth(
+          'stackoverflow', cache_dir=cache_dir)
+    mock_load_client_data.assert_called_once_with('stackoverflow', 'train')
+    # The histogram, and the client ids of the split.
+    self.assertLen(tf.io.gfile.listdir(cache_dir), 2)
+
+    with mock.patch.object(
+        ground_truth, '_load_client_data',
+        side_effect=AssertionError('The split was loaded.')):
+      cached_result = ground_truth.compute_ground_truth(
+          'stackoverflow', cache_dir=cache_dir)
+    self.assertEqual(cached_result, result)
+
+    # A histogram with other settings is computed from the loaded split.
+    with mock.patch.object(
+        ground_truth, '_load_client_data',
+        return_value=_create_client_data()) as mock_load_client_data:
+      result = ground_truth.compute_ground_truth(
+          'stackoverflow', num_words_per_client=1, cache_dir=cache_dir)
+    mock_load_client_data.assert_called_once_with('stackoverflow', 'train')
+    self.assertEqual(result, {'hello': 1, 'world': 2})
+
+  def test_raises_on_unsupported_split_before_loading(self):
+    with mock.patch.object(ground_truth, '_load_client_data') as mock_load:
+      with self.assertRaises(ValueError):
+        ground_truth.compute_ground_truth('stackoverflow', split='validation')
+    mock_load.assert_not_called()
+
+  def test_raises_on_data_with_workers(self):
+    with self.assertRaises(ValueError):
+      ground_truth.compute_ground_truth(
+          'stackoverflow', data=_create_client_data(), num_workers=2)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -55,11 +55,17 @@ def shakespeare_deterministic_sampler(data):
   ]
 
 
+# The number of elements counted at once when building a client histogram.
+HISTOGRAM_BATCH_SIZE = 4096
+
+
 @tf.function
 def get_top_elements(dataset, max_user_contribution):
   """Gets the top max_user_contribution words from the input list.
 
-  Note that the returned set of top words will not necessarily be sorted.
+  The histogram of the dataset is built batch by batch with `tf.unique`, so its
+  cost is linear in the number of elements. Ties between elements with the
+  same count are broken in favour of the element seen first in the dataset.
 
   Args:
     dataset: A `tf.data.Dataset` to extract top elements from.
@@ -68,38 +74,35 @@ def get_top_elements(dataset, max_user_contribution):
   Returns:
     A tensor of a list of strings.
     If the total number of unique words is less than or equal to
-    max_user_contribution, returns the set of unique words.
+    max_user_contribution, returns the set of unique words in order of first
+    occurrence. Otherwise returns the top words in order of decreasing count.
   """
-  # Create a tuple of parallel elements and counts. This will be appended to and
-  # updated as we iterate over the dataset.
+  # Create a tuple of parallel elements and counts, in order of first
+  # occurrence. This is merged with every batch of the dataset.
   element_type = dataset.element_spec.dtype
   initial_histogram = (tf.constant([], dtype=element_type),
                        tf.constant([], dtype=tf.int64))
 
-  def count_word(histogram, new_element):
+  def count_batch(histogram, batch):
     elements, counts = histogram
-    mask = tf.equal(elements, new_element)
-    # If the element doesn't match any we've already seen, expand the list of
-    # elements we are tracking and add one for the count.
-    if not tf.reduce_any(mask):
-      elements = tf.concat(
-          [elements, tf.expand_dims(new_element, axis=0)], axis=0)
-      counts = tf.concat([counts, tf.constant([1], dtype=tf.int64)], axis=0)
-    else:
-      # Otherwise add one to the index that was `True`.
-      counts += tf.cast(mask, tf.int64)
-    return elements, counts
-
-  words, counts = dataset.reduce(
-      initial_state=initial_histogram, reduce_func=count_word)
+    elements = tf.concat([elements, batch], axis=0)
+    counts = tf.concat(
+        [counts, tf.ones_like(batch, dtype=tf.int64)], axis=0)
+    unique_elements, index = tf.unique(elements)
+    unique_counts = tf.math.unsorted_segment_sum(counts, index,
+                                                 tf.size(unique_elements))
+    return unique_elements, unique_counts
+
+  words, counts = dataset.batch(HISTOGRAM_BATCH_SIZE).reduce(
+      initial_state=initial_histogram, reduce_func=count_batch)
   if tf.size(words) > max_user_contribution:
     # This logic is influenced by the focus on global heavy hitters and
     # thus implements clipping by chopping the tail of the distribution
     # of the words as present on a single client. Another option could
     # be to provide pick max_words_per_user random words out of the unique
-    # words present locally.
-    top_indices = tf.argsort(
-        counts, axis=-1, direction='DESCENDING')[:max_user_contribution]
+    # words present locally. `tf.math.top_k` returns the lower index first
+    # among equal counts, which makes the clipping deterministic.
+    _, top_indices = tf.math.top_k(counts, k=max_user_contribution)
     top_words = tf.gather(words, top_indices)
     return top_words
   return words
@@ -303,14 +306,25 @@ def compute_expected_results(datasets, limit):
 
 
 def calculate_ground_truth(data, dataset_name):
-  """Gets all the words in the entire dataset."""
+  """Counts the number of clients holding each word in the entire dataset.
+
+  For large datasets, use `ground_truth.compute_ground_truth`, which counts the
+  clients in parallel processes and caches the result.
+
+  Args:
+    data: A `tff.simulation.ClientData` object.
+    dataset_name: The name of the dataset, see `tokenize`.
+
+  Returns:
+    A {'string': frequency} dict.
+  """
   all_datasets = [
       tokenize(data.create_tf_dataset_for_client(client_id), dataset_name)
       for client_id in data.client_ids
   ]
 
   start = time.time()
-  ground_truth_results = get_top_words(all_datasets)
+  ground_truth_results = dict(collections.Counter(get_top_words(all_datasets)))
   logging.info('Obtained ground truth in %.2f seconds', time.time() - start)
   return ground_truth_results
 
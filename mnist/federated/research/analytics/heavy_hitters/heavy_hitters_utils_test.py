@@ -88,6 +88,18 @@ class GetTopElementsTest(tf.test.TestCase):
     top_elements = hh_utils.get_top_elements(ds, max_user_contribution=2)
     self.assertCountEqual(top_elements.numpy(), [b'a', b'c'])
 
+  def test_ties_are_broken_by_first_occurrence(self):
+    ds = tf.data.Dataset.from_tensor_slices(['d', 'b', 'a', 'b', 'c', 'a'])
+    top_elements = hh_utils.get_top_elements(ds, max_user_contribution=3)
+    self.assertAllEqual(top_elements.numpy(), [b'b', b'a', b'd'])
+
+  def test_counts_across_batches(self):
+    num_elements = hh_utils.HISTOGRAM_BATCH_SIZE + 10
+    words = ['rare'] + ['common'] * num_elements + ['other'] * 2
+    ds = tf.data.Dataset.from_tensor_slices(words)
+    top_elements = hh_utils.get_top_elements(ds, max_user_contribution=2)
+    self.assertAllEqual(top_elements.numpy(), [b'common', b'other'])
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -0,0 +1,283 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Federated frequency estimation with count-min and count sketches.
+
+Each client selects (up to) `max_user_contribution` of its words and encodes
+them into a `[depth, width]` sketch, using hash functions shared by all clients
+through a common seed. The server sums the client sketches with
+`tff.federated_sum`, optionally adds Gaussian noise, and accumulates them over
+rounds. Communication and server memory are therefore O(depth * width),
+independently of the size of the vocabulary.
+
+The frequency of any word can then be estimated from the sketch. Since the
+sketch does not store the words themselves, heavy hitters are decoded by
+estimating the frequencies of a set of candidate words (e.g. a public
+vocabulary), see `decode_heavy_hitters`.
+
+References:
+
+Graham Cormode and S. Muthukrishnan. An improved data stream summary: the
+count-min sketch and its applications. J. Algorithms, 2005.
+
+Moses Charikar, Kevin Chen and Martin Farach-Colton. Finding frequent items in
+data streams. ICALP 2002.
+"""
+
+import math
+from typing import Dict, List
+
+import attr
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.analytics.heavy_hitters import heavy_hitters_utils as hh_utils
+
+COUNT_MIN = 'count_min'
+COUNT_SKETCH = 'count_sketch'
+SUPPORTED_SKETCH_TYPES = [COUNT_MIN, COUNT_SKETCH]
+
+
+@attr.s(cmp=False, frozen=True)
+class ServerState(object):
+  """Structure for state on the server.
+
+  Fields:
+  `sketch`: A tf.float32 of shape (depth, width) holding the sum of the client
+  sketches (and noise) over all rounds.
+  `num_clients`: A tf.int32 containing the number of clients that contributed
+  to the sketch.
+  `round_num`: A tf.int32 dictating the algorithm's round number.
+  """
+  sketch = attr.ib()
+  num_clients = attr.ib()
+  round_num = attr.ib()
+
+
+def _check_sketch_type(sketch_type):
+  if sketch_type not in SUPPORTED_SKETCH_TYPES:
+    raise ValueError('Unsupported sketch type [{!s}], must be one of '
+                     '{!s}.'.format(sketch_type, SUPPORTED_SKETCH_TYPES))
+
+
+def _hash_words(words, sketch_type, depth, width, seed):
+  """Hashes `words` into the cells of a sketch.
+
+  Args:
+    words: A 1D tf.string containing the words to hash.
+    sketch_type: One of `SUPPORTED_SKETCH_TYPES`.
+    depth: The number of rows (i.e. hash functions) of the sketch.
+    width: The number of columns of the sketch.
+    seed: An integer seed shared by all clients and the server.
+
+  Returns:
+    A tuple `(indices, signs)`. `indices` is a tf.int64 of shape
+    (depth, len(words), 2) containing the (row, column) cell of each word in
+    each row, and `signs` a tf.float32 of shape (depth, len(words)) containing
+    the sign with which each word is added to each row.
+  """
+  indices = []
+  signs = []
+  for row in range(depth):
+    columns = tf.strings.to_hash_bucket_strong(words, width, key=[seed, row])
+    indices.append(
+        tf.stack([tf.fill(tf.shape(columns), tf.constant(row, tf.int64)),
+                  columns], axis=1))
+    if sketch_type == COUNT_SKETCH:
+      # An independent hash function with two buckets gives the signs.
+      bits = tf.strings.to_hash_bucket_strong(
+          words, 2, key=[seed, depth + row])
+      signs.append(2.0 * tf.cast(bits, tf.float32) - 1.0)
+    else:
+      signs.append(tf.ones(tf.shape(columns), dtype=tf.float32))
+  return tf.stack(indices), tf.stack(signs)
+
+
+@tf.function
+def encode_words(words, sketch_type, depth, width, seed):
+  """Returns the `[depth, width]` tf.float32 sketch of `words`."""
+  indices, signs = _hash_words(words, sketch_type, depth, width, seed)
+  return tf.scatter_nd(
+      tf.reshape(indices, [-1, 2]), tf.reshape(signs, [-1]), [depth, width])
+
+
+@tf.function
+def estimate_frequencies(sketch, words, sketch_type, seed):
+  """Estimates the frequencies of `words` from `sketch`.
+
+  For a count-min sketch the estimate is the minimum over rows of the cells of
+  a word, which never underestimates the true count in the absence of noise.
+  For a count sketch it is the median over rows of the signed cells, which is
+  unbiased.
+
+  Args:
+    sketch: A tf.float32 of shape (depth, width).
+    words: A 1D tf.string containing the words to estimate.
+    sketch_type: One of `SUPPORTED_SKETCH_TYPES`.
+    seed: The seed used to encode the sketch.
+
+  Returns:
+    A 1D tf.float32 containing the estimated frequency of each word.
+  """
+  depth, width = sketch.shape
+  indices, signs = _hash_words(words, sketch_type, depth, width, seed)
+  cells = tf.gather_nd(sketch, indices) * signs
+  if sketch_type == COUNT_MIN:
+    return tf.reduce_min(cells, axis=0)
+  sorted_cells = tf.sort(cells, axis=0)
+  # The median of the rows, averaging the two middle rows if depth is even.
+  return (sorted_cells[(depth - 1) // 2] + sorted_cells[depth // 2]) / 2.0
+
+
+def decode_heavy_hitters(server_state: ServerState, candidates: List[str],
+                         k: int, sketch_type: str,
+                         seed: int) -> Dict[str, float]:
+  """Returns the top `k` candidates by estimated frequency.
+
+  Args:
+    server_state: A `ServerState`, as returned by the process of
+      `build_sketch_process`.
+    candidates: A list of candidate words, for example a public vocabulary.
+    k: The number of heavy hitters to return.
+    sketch_type: The sketch type used by the process.
+    seed: The seed used by the process.
+
+  Returns:
+    A {'string': frequency} dict, which can be scored against the ground truth
+    with `heavy_hitters_utils.{precision, recall, f1_score}`.
+  """
+  _check_sketch_type(sketch_type)
+  if not candidates:
+    return {}
+  estimates = estimate_frequencies(
+      tf.constant(server_state.sketch, dtype=tf.float32),
+      tf.constant(candidates, dtype=tf.string), sketch_type, seed)
+  top_estimates, top_indices = tf.math.top_k(
+      estimates, k=min(k, len(candidates)))
+  return {
+      candidates[index]: estimate
+      for index, estimate in zip(top_indices.numpy(), top_estimates.numpy())
+  }
+
+
+def build_sketch_process(sketch_type: str,
+                         depth: int,
+                         width: int,
+                         max_user_contribution: int,
+                         seed: int = 0,
+                         noise_multiplier: float = 0.0):
+  """Builds the TFF computations for sketch-based frequency estimation.
+
+  In each round, the sampled clients select their top `max_user_contribution`
+  words and add each of them once to a sketch with `depth` rows and `width`
+  columns. The server sums the client sketches and adds them to the sketch
+  accumulated in previous rounds.
+
+  If `noise_multiplier` is positive, Gaussian noise with standard deviation
+  `noise_multiplier * sqrt(depth) * max_user_contribution` is added to the sum
+  of the client sketches in each round. This is the largest l2 norm of a
+  client sketch, since each row of a client sketch has an l1 norm of at most
+  `max_user_contribution`.
+
+  Args:
+    sketch_type: One of `SUPPORTED_SKETCH_TYPES`.
+    depth: The number of rows (i.e. hash functions) of the sketch. Must be
+      positive.
+    width: The number of columns of the sketch. Must be positive.
+    max_user_contribution: The maximum number of words a client can contribute.
+      Must be positive.
+    seed: The seed of the hash functions shared by all clients.
+    noise_multiplier: The ratio of the standard deviation of the noise to the
+      l2 sensitivity of the sum of the client sketches. Must be non-negative.
+
+  Returns:
+    A `tff.templates.IterativeProcess`.
+
+  Raises:
+    ValueError: If `sketch_type` is not supported, or an argument is out of
+      range.
+  """
+  _check_sketch_type(sketch_type)
+  for name, value in [('depth', depth), ('width', width),
+                      ('max_user_contribution', max_user_contribution)]:
+    if value <= 0:
+      raise ValueError('{} must be positive, found {}.'.format(name, value))
+  if noise_multiplier < 0:
+    raise ValueError('noise_multiplier must be non-negative, found {}.'.format(
+        noise_multiplier))
+  noise_stddev = noise_multiplier * math.sqrt(depth) * max_user_contribution
+
+  @tff.tf_computation
+  def server_init_tf():
+    return ServerState(
+        sketch=tf.zeros([depth, width], dtype=tf.float32),
+        num_clients=tf.constant(0, dtype=tf.int32),
+        round_num=tf.constant(0, dtype=tf.int32))
+
+  server_state_type = server_init_tf.type_signature.result
+  sketch_type_spec = tff.TensorType(dtype=tf.float32, shape=[depth, width])
+  num_clients_type = tff.TensorType(dtype=tf.int32, shape=[])
+
+  @tff.tf_computation(tff.SequenceType(tf.string))
+  def client_update_fn(tf_dataset):
+    words = hh_utils.get_top_elements(tf_dataset, max_user_contribution)
+    return encode_words(words, sketch_type, depth, width, seed)
+
+  @tff.tf_computation(server_state_type, sketch_type_spec, num_clients_type)
+  def server_update_fn(server_state, sub_round_sketch, sub_round_num_clients):
+    if noise_stddev > 0:
+      sub_round_sketch += tf.random.normal([depth, width], stddev=noise_stddev)
+    return tff.utils.update_state(
+        server_state,
+        sketch=server_state.sketch + sub_round_sketch,
+        num_clients=server_state.num_clients + sub_round_num_clients,
+        round_num=server_state.round_num + 1)
+
+  @tff.tf_computation(tff.SequenceType(tf.string))
+  def count_client_fn(tf_dataset):
+    del tf_dataset  # Unused.
+    return tf.constant(1, dtype=tf.int32)
+
+  federated_server_state_type = tff.FederatedType(server_state_type, tff.SERVER)
+  federated_dataset_type = tff.FederatedType(
+      tff.SequenceType(tf.string), tff.CLIENTS, all_equal=False)
+
+  @tff.federated_computation(federated_server_state_type,
+                             federated_dataset_type)
+  def run_one_round(server_state, federated_dataset):
+    """Orchestration logic for one round of sketch computation.
+
+    Args:
+      server_state: A `ServerState`.
+      federated_dataset: A federated `tf.Dataset` with placement `tff.CLIENTS`.
+
+    Returns:
+      An updated `ServerState`
+    """
+    client_sketches = tff.federated_map(client_update_fn, federated_dataset)
+    sub_round_sketch = tff.federated_sum(client_sketches)
+    sub_round_num_clients = tff.federated_sum(
+        tff.federated_map(count_client_fn, federated_dataset))
+
+    server_state = tff.federated_map(
+        server_update_fn,
+        (server_state, sub_round_sketch, sub_round_num_clients))
+
+    server_output = tff.federated_value([], tff.SERVER)
+
+    return server_state, server_output
+
+  return tff.templates.IterativeProcess(
+      initialize_fn=tff.federated_computation(
+          lambda: tff.federated_eval(server_init_tf, tff.SERVER)),
+      next_fn=run_one_round)
@@ -0,0 +1,118 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from absl.testing import parameterized
+import tensorflow as tf
+
+from tensorflow_federated.python.research.analytics.heavy_hitters import heavy_hitters_utils as hh_utils
+from tensorflow_federated.python.research.analytics.heavy_hitters import sketch_heavy_hitters as sketch_hh
+
+_CLIENT_WORDS = [
+    ['hello', 'world', 'hello', 'hi'],
+    ['hello', 'world'],
+    ['hello', 'hey'],
+]
+
+
+class SketchTest(tf.test.TestCase, parameterized.TestCase):
+
+  @parameterized.parameters(sketch_hh.COUNT_MIN, sketch_hh.COUNT_SKETCH)
+  def test_encode_and_estimate_frequencies(self, sketch_type):
+    words = tf.constant(['a', 'b', 'a', 'c', 'a', 'b'])
+    sketch = sketch_hh.encode_words(
+        words, sketch_type, depth=5, width=1000, seed=1)
+    self.assertAllEqual(sketch.shape, [5, 1000])
+    estimates = sketch_hh.estimate_frequencies(
+        sketch, tf.constant(['a', 'b', 'c', 'd']), sketch_type, seed=1)
+    # The sketch is wide enough for the words not to collide in most rows.
+    self.assertAllClose(estimates, [3.0, 2.0, 1.0, 0.0])
+
+  def test_encode_empty_words(self):
+    sketch = sketch_hh.encode_words(
+        tf.constant([], dtype=tf.string),
+        sketch_hh.COUNT_MIN,
+        depth=2,
+        width=3,
+        seed=0)
+    self.assertAllEqual(sketch, tf.zeros([2, 3]))
+
+  def test_count_min_never_underestimates(self):
+    words = tf.constant([str(i) for i in range(100)])
+    sketch = sketch_hh.encode_words(
+        words, sketch_hh.COUNT_MIN, depth=2, width=10, seed=0)
+    estimates = sketch_hh.estimate_frequencies(sketch, words,
+                                               sketch_hh.COUNT_MIN, seed=0)
+    self.assertAllGreaterEqual(estimates, 1.0)
+
+
+class SketchProcessTest(tf.test.TestCase, parameterized.TestCase):
+
+  @parameterized.parameters(sketch_hh.COUNT_MIN, sketch_hh.COUNT_SKETCH)
+  def test_process_finds_heavy_hitters(self, sketch_type):
+    process = sketch_hh.build_sketch_process(
+        sketch_type, depth=5, width=100, max_user_contribution=10, seed=3)
+    datasets = [
+        tf.data.Dataset.from_tensor_slices(words) for words in _CLIENT_WORDS
+    ]
+
+    state = process.initialize()
+    for _ in range(2):
+      state, _ = process.next(state, datasets)
+    self.assertEqual(state.round_num, 2)
+    self.assertEqual(state.num_clients, 6)
+
+    results = sketch_hh.decode_heavy_hitters(
+        state,
+        candidates=['hello', 'world', 'hi', 'hey', 'unseen'],
+        k=2,
+        sketch_type=sketch_type,
+        seed=3)
+    ground_truth = {'hello': 6, 'world': 4, 'hi': 2, 'hey': 2}
+    self.assertAllClose(results, {'hello': 6.0, 'world': 4.0})
+    self.assertAlmostEqual(hh_utils.f1_score(ground_truth, results, 2), 1.0)
+
+  def test_process_adds_noise(self):
+    datasets = [
+        tf.data.Dataset.from_tensor_slices(words) for words in _CLIENT_WORDS
+    ]
+    states = []
+    for noise_multiplier in [0.0, 1.0]:
+      process = sketch_hh.build_sketch_process(
+          sketch_hh.COUNT_SKETCH,
+          depth=3,
+          width=10,
+          max_user_contribution=10,
+          noise_multiplier=noise_multiplier)
+      state, _ = process.next(process.initialize(), datasets)
+      states.append(state)
+    self.assertNotAllClose(states[0].sketch, states[1].sketch)
+
+  def test_raises_on_invalid_arguments(self):
+    with self.assertRaises(ValueError):
+      sketch_hh.build_sketch_process(
+          'bloom_filter', depth=3, width=10, max_user_contribution=1)
+    with self.assertRaises(ValueError):
+      sketch_hh.build_sketch_process(
+          sketch_hh.COUNT_MIN, depth=0, width=10, max_user_contribution=1)
+    with self.assertRaises(ValueError):
+      sketch_hh.build_sketch_process(
+          sketch_hh.COUNT_MIN,
+          depth=3,
+          width=10,
+          max_user_contribution=1,
+          noise_multiplier=-1.0)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,187 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A persistent cache of the tokenized words of each client.
+
+Tokenizing the examples of a client with `heavy_hitters_utils.tokenize` is the
+bulk of the client work of heavy hitters experiments, and is otherwise repeated
+every time a client is sampled. The cache tokenizes every client once, and
+stores:
+
+*   `vocabulary.txt`: the distinct words, one per line, in order of first
+    occurrence. The id of a word is its line number.
+*   `client_ids.json`: the client ids, in the order of `ClientData.client_ids`.
+*   `offsets.npy`: an int64 array such that the word ids of the `i`-th client
+    are `word_ids[offsets[i]:offsets[i + 1]]`.
+*   `word_ids.bin`: the int32 word ids of all the clients, concatenated, which
+    is memory-mapped rather than read when the cache is loaded.
+
+A cache is keyed by the dataset, the client ids and the tokenization version of
+`ground_truth.TOKENIZATION_VERSION`, so that a stale cache is never reused.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List
+
+from absl import logging
+import numpy as np
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.analytics.heavy_hitters import ground_truth
+from tensorflow_federated.python.research.analytics.heavy_hitters import heavy_hitters_utils as hh_utils
+
+_VOCABULARY_FILENAME = 'vocabulary.txt'
+_CLIENT_IDS_FILENAME = 'client_ids.json'
+_OFFSETS_FILENAME = 'offsets.npy'
+_WORD_IDS_FILENAME = 'word_ids.bin'
+
+
+class TokenCache(object):
+  """The tokenized words of each client, read from a cache directory."""
+
+  def __init__(self, path: str):
+    """Loads the cache at `path`, as written by `build_token_cache`."""
+    with open(os.path.join(path, _VOCABULARY_FILENAME), 'rb') as f:
+      self._vocabulary = np.array(f.read().splitlines(), dtype=object)
+    with open(os.path.join(path, _CLIENT_IDS_FILENAME), 'r') as f:
+      self._client_ids = json.load(f)
+    self._client_indices = {
+        client_id: index for index, client_id in enumerate(self._client_ids)
+    }
+    self._offsets = np.load(os.path.join(path, _OFFSETS_FILENAME))
+    if self._offsets[-1]:
+      self._word_ids = np.memmap(
+          os.path.join(path, _WORD_IDS_FILENAME), dtype=np.int32, mode='r')
+    else:
+      # An empty file cannot be memory-mapped.
+      self._word_ids = np.zeros([0], dtype=np.int32)
+
+  @property
+  def client_ids(self) -> List[str]:
+    return self._client_ids
+
+  @property
+  def vocabulary(self) -> np.ndarray:
+    """The words of the cache, as a 1D array of `bytes` indexed by id."""
+    return self._vocabulary
+
+  def get_word_ids(self, client_id: str) -> np.ndarray:
+    """Returns the int32 word ids of a client, in order of occurrence."""
+    index = self._client_indices[client_id]
+    return self._word_ids[self._offsets[index]:self._offsets[index + 1]]
+
+  def get_words(self, client_id: str) -> np.ndarray:
+    """Returns the words of a client, as a 1D array of `bytes`."""
+    return self._vocabulary[self.get_word_ids(client_id)]
+
+  def create_tf_dataset_for_client(self, client_id: str) -> tf.data.Dataset:
+    """Returns the words of a client, like `heavy_hitters_utils.tokenize`."""
+    words = self.get_words(client_id)
+    if not words.size:
+      return tf.data.Dataset.from_tensor_slices(
+          tf.constant([], dtype=tf.string))
+    return tf.data.Dataset.from_tensor_slices(words)
+
+  def create_word_id_dataset_for_client(self,
+                                        client_id: str) -> tf.data.Dataset:
+    """Returns the word ids of a client as a `tf.data.Dataset` of tf.int32."""
+    return tf.data.Dataset.from_tensor_slices(
+        np.asarray(self.get_word_ids(client_id)))
+
+
+def _get_cache_path(cache_dir: str, dataset_name: str,
+                    client_ids: List[str]) -> str:
+  """Returns the directory of the cache for the given settings."""
+  settings = collections.OrderedDict(
+      dataset_name=dataset_name,
+      tokenization_version=ground_truth.TOKENIZATION_VERSION,
+      client_ids=list(client_ids))
+  key = hashlib.sha1(json.dumps(settings).encode('utf-8')).hexdigest()
+  return os.path.join(cache_dir, '{}_tokens_{}'.format(dataset_name, key[:16]))
+
+
+def build_token_cache(data: tff.simulation.ClientData, dataset_name: str,
+                      path: str) -> TokenCache:
+  """Tokenizes all the clients of `data`, and writes the cache to `path`.
+
+  Args:
+    data: A `tff.simulation.ClientData`.
+    dataset_name: The name of the dataset, either 'shakespeare' or
+      'stackoverflow'.
+    path: The directory of the cache. It is written to a temporary directory
+      first, which is renamed to `path` once complete.
+
+  Returns:
+    A `TokenCache` reading from `path`.
+  """
+  start = time.time()
+  tmp_path = path + '.tmp'
+  if os.path.exists(tmp_path):
+    tf.io.gfile.rmtree(tmp_path)
+  os.makedirs(tmp_path)
+
+  word_indices = {}  # type: Dict[bytes, int]
+  offsets = [0]
+  with open(os.path.join(tmp_path, _WORD_IDS_FILENAME), 'wb') as f:
+    for i, client_id in enumerate(data.client_ids):
+      dataset = hh_utils.tokenize(
+          data.create_tf_dataset_for_client(client_id), dataset_name)
+      word_ids = [
+          word_indices.setdefault(word, len(word_indices))
+          for word in dataset.as_numpy_iterator()
+      ]
+      f.write(np.array(word_ids, dtype=np.int32).tobytes())
+      offsets.append(offsets[-1] + len(word_ids))
+      if (i + 1) % 1000 == 0:
+        logging.info('Tokenized %d of %d clients.', i + 1,
+                     len(data.client_ids))
+
+  # Words are split on whitespace, so they do not contain line breaks.
+  with open(os.path.join(tmp_path, _VOCABULARY_FILENAME), 'wb') as f:
+    f.write(b''.join(word + b'\n' for word in word_indices))
+  with open(os.path.join(tmp_path, _CLIENT_IDS_FILENAME), 'w') as f:
+    json.dump(list(data.client_ids), f)
+  np.save(
+      os.path.join(tmp_path, _OFFSETS_FILENAME),
+      np.array(offsets, dtype=np.int64))
+  os.rename(tmp_path, path)
+  logging.info('Cached %d words of %d clients in %.2f seconds', offsets[-1],
+               len(data.client_ids),
+               time.time() - start)
+  return TokenCache(path)
+
+
+def get_token_cache(data: tff.simulation.ClientData, dataset_name: str,
+                    cache_dir: str) -> TokenCache:
+  """Returns the token cache of `data`, building it if it does not exist.
+
+  Args:
+    data: A `tff.simulation.ClientData`.
+    dataset_name: The name of the dataset, either 'shakespeare' or
+      'stackoverflow'.
+    cache_dir: A local directory in which the caches are stored.
+
+  Returns:
+    A `TokenCache`.
+  """
+  path = _get_cache_path(cache_dir, dataset_name, data.client_ids)
+  if os.path.exists(path):
+    logging.info('Reading cached tokens from %s', path)
+    return TokenCache(path)
+  os.makedirs(cache_dir, exist_ok=True)
+  return build_token_cache(data, dataset_name, path)
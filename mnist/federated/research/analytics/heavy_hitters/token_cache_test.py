@@ -0,0 +1,78 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import os
+
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.analytics.heavy_hitters import heavy_hitters_utils as hh_utils
+from tensorflow_federated.python.research.analytics.heavy_hitters import token_cache
+
+
+def _create_client_data():
+  return tff.simulation.FromTensorSlicesClientData({
+      'a': collections.OrderedDict(tokens=['hello world', 'Hello again !']),
+      'b': collections.OrderedDict(tokens=['!']),
+      'c': collections.OrderedDict(tokens=['world peace']),
+  })
+
+
+class TokenCacheTest(tf.test.TestCase):
+
+  def test_matches_tokenize(self):
+    data = _create_client_data()
+    cache = token_cache.get_token_cache(data, 'stackoverflow',
+                                        self.get_temp_dir())
+    self.assertEqual(cache.client_ids, ['a', 'b', 'c'])
+    self.assertAllEqual(cache.vocabulary,
+                        [b'hello', b'world', b'again', b'peace'])
+    self.assertAllEqual(cache.get_word_ids('a'), [0, 1, 0, 2])
+    self.assertAllEqual(cache.get_word_ids('b'), [])
+    self.assertAllEqual(cache.get_word_ids('c'), [1, 3])
+
+    for client_id in data.client_ids:
+      expected_words = list(
+          hh_utils.tokenize(
+              data.create_tf_dataset_for_client(client_id),
+              'stackoverflow').as_numpy_iterator())
+      self.assertEqual(
+          list(cache.create_tf_dataset_for_client(
+              client_id).as_numpy_iterator()), expected_words)
+
+  def test_word_id_dataset(self):
+    cache = token_cache.get_token_cache(_create_client_data(), 'stackoverflow',
+                                        self.get_temp_dir())
+    dataset = cache.create_word_id_dataset_for_client('c')
+    self.assertEqual(dataset.element_spec.dtype, tf.int32)
+    self.assertEqual(list(dataset.as_numpy_iterator()), [1, 3])
+
+  def test_reads_existing_cache(self):
+    cache_dir = self.get_temp_dir()
+    data = _create_client_data()
+    token_cache.get_token_cache(data, 'stackoverflow', cache_dir)
+    self.assertLen(tf.io.gfile.listdir(cache_dir), 1)
+    cache_path = os.path.join(cache_dir, tf.io.gfile.listdir(cache_dir)[0])
+    modification_time = os.path.getmtime(cache_path)
+
+    cache = token_cache.get_token_cache(data, 'stackoverflow', cache_dir)
+    self.assertLen(tf.io.gfile.listdir(cache_dir), 1)
+    self.assertEqual(os.path.getmtime(cache_path), modification_time)
+    self.assertAllEqual(cache.get_words('a'),
+                        [b'hello', b'world', b'hello', b'again'])
+
+
+if __name__ == '__main__':
+  tf.test.main()
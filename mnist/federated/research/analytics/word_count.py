@@ -0,0 +1,307 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Federated word and n-gram counting.
+
+Each client tokenizes its examples as `heavy_hitters_utils.tokenize` does,
+maps its words (or n-grams of words) to the indices of a fixed vocabulary or to
+hash buckets, and returns a count vector of fixed size. The server sums the
+count vectors with `tff.federated_sum`, so the words themselves never leave
+the clients, and the driver only holds one vector of counts.
+
+`count_client_data` runs the computation over all the clients of a
+`tff.simulation.ClientData`, a bounded number of clients at a time, and can
+save the counts after each batch of clients to resume an interrupted count.
+"""
+
+import hashlib
+import io
+import json
+import os
+from typing import Dict, List, Optional
+
+from absl import logging
+import numpy as np
+import tensorflow as tf
+import tensorflow_federated as tff
+import tensorflow_text as tf_text
+
+# The feature holding the text of an example of each supported dataset.
+_TEXT_FEATURES = {
+    'shakespeare': 'snippets',
+    'stackoverflow': 'tokens',
+}
+
+_COUNTS_FILENAME = 'counts.npz'
+
+
+def _check_arguments(dataset_name, vocabulary, num_buckets, ngram_width):
+  """Raises a `ValueError` if the counting arguments are not supported."""
+  if dataset_name not in _TEXT_FEATURES:
+    raise ValueError('Unsupported dataset [{!s}], must be one of {!s}.'.format(
+        dataset_name, list(_TEXT_FEATURES)))
+  if (vocabulary is None) == (num_buckets is None):
+    raise ValueError('Exactly one of vocabulary and num_buckets must be set.')
+  if num_buckets is not None and num_buckets <= 0:
+    raise ValueError(
+        'num_buckets must be positive, found {}.'.format(num_buckets))
+  if ngram_width <= 0:
+    raise ValueError(
+        'ngram_width must be positive, found {}.'.format(ngram_width))
+
+
+def get_ngrams(lines, ngram_width=1):
+  """Returns the n-grams of words of `lines`.
+
+  The words are obtained as in `heavy_hitters_utils.tokenize`: the lines are
+  split on whitespace, case folded, and the punctuation and symbols are
+  dropped. N-grams do not span several lines.
+
+  Args:
+    lines: A 1D tf.string containing lines of text.
+    ngram_width: The number of words of an n-gram. If 1, the words themselves
+      are returned.
+
+  Returns:
+    A 1D tf.string containing the n-grams, whose words are separated by a
+    space.
+  """
+  words = tf_text.WhitespaceTokenizer().tokenize(lines)
+  words = words.with_flat_values(tf_text.case_fold_utf8(words.flat_values))
+  words = tf.ragged.boolean_mask(
+      words,
+      words.with_flat_values(
+          tf.math.logical_not(
+              tf_text.wordshape(words.flat_values,
+                                tf_text.WordShape.IS_PUNCT_OR_SYMBOL))))
+  if ngram_width > 1:
+    words = tf_text.ngrams(
+        words,
+        ngram_width,
+        reduction_type=tf_text.Reduction.STRING_JOIN,
+        string_separator=' ')
+  return words.flat_values
+
+
+def build_word_count_computation(dataset_name: str,
+                                 element_type_structure,
+                                 vocabulary: Optional[List[str]] = None,
+                                 num_buckets: Optional[int] = None,
+                                 ngram_width: int = 1,
+                                 count_clients: bool = False):
+  """Builds a federated computation counting the words of the clients.
+
+  Exactly one of `vocabulary` and `num_buckets` must be set. With a
+  `vocabulary`, the counts are indexed like the vocabulary, and words out of
+  the vocabulary are not counted. With `num_buckets`, all the words are hashed
+  into `num_buckets` buckets, and the counts of the words of a bucket are
+  summed.
+
+  Args:
+    dataset_name: The name of the dataset, either 'shakespeare' or
+      'stackoverflow'.
+    element_type_structure: The type structure of the elements of the client
+      datasets, e.g. `client_data.element_type_structure`.
+    vocabulary: An optional list of the words (or n-grams) to count.
+    num_buckets: An optional number of hash buckets.
+    ngram_width: The number of words of the counted n-grams.
+    count_clients: If True, the number of clients holding each word is
+      counted, instead of the number of occurrences.
+
+  Returns:
+    A `tff.federated_computation` mapping federated client datasets to the
+    tf.int64 vector of the summed counts at `tff.SERVER`.
+
+  Raises:
+    ValueError: If the arguments are not supported.
+  """
+  _check_arguments(dataset_name, vocabulary, num_buckets, ngram_width)
+  text_feature = _TEXT_FEATURES[dataset_name]
+  num_counts = len(vocabulary) if vocabulary is not None else num_buckets
+  dataset_type = tff.SequenceType(element_type_structure)
+
+  @tff.tf_computation(dataset_type)
+  def client_count_fn(dataset):
+    """Returns the count vector of a client dataset."""
+    if vocabulary is not None:
+      table = tf.lookup.StaticHashTable(
+          tf.lookup.KeyValueTensorInitializer(
+              tf.constant(vocabulary, dtype=tf.string),
+              tf.range(num_counts, dtype=tf.int64)), -1)
+
+    def count_example(counts, example):
+      ngrams = get_ngrams(
+          tf.expand_dims(example[text_feature], 0), ngram_width)
+      if vocabulary is not None:
+        ids = table.lookup(ngrams)
+        ids = tf.boolean_mask(ids, tf.math.greater_equal(ids, 0))
+      else:
+        ids = tf.strings.to_hash_bucket_fast(ngrams, num_buckets)
+      return counts + tf.math.bincount(
+          tf.cast(ids, tf.int32),
+          minlength=num_counts,
+          maxlength=num_counts,
+          dtype=tf.int64)
+
+    counts = dataset.reduce(
+        tf.zeros([num_counts], dtype=tf.int64), count_example)
+    if count_clients:
+      counts = tf.math.minimum(counts, 1)
+    return counts
+
+  @tff.federated_computation(tff.FederatedType(dataset_type, tff.CLIENTS))
+  def count_fn(datasets):
+    return tff.federated_sum(tff.federated_map(client_count_fn, datasets))
+
+  return count_fn
+
+
+def _get_count_fingerprint(dataset_name, vocabulary, num_buckets, ngram_width,
+                           count_clients, client_ids):
+  """Returns a hash of the settings that the saved counts depend on."""
+  settings = json.dumps([
+      dataset_name, vocabulary, num_buckets, ngram_width, count_clients,
+      list(client_ids)
+  ])
+  return hashlib.sha256(settings.encode('utf-8')).hexdigest()
+
+
+def _save_counts(output_dir, counts, num_counted_clients, fingerprint):
+  """Saves `counts` and the number of counted clients atomically."""
+  counts_path = os.path.join(output_dir, _COUNTS_FILENAME)
+  # All are written to a single file, which replaces the previous one only
+  # once complete, so that they always match. `np.savez` seeks in its output,
+  # which a `GFile` opened for writing does not support, so the archive is
+  # built in memory first.
+  buffer = io.BytesIO()
+  np.savez(
+      buffer,
+      counts=counts,
+      num_counted_clients=num_counted_clients,
+      fingerprint=fingerprint)
+  with tf.io.gfile.GFile(counts_path + '.tmp', 'wb') as f:
+    f.write(buffer.getvalue())
+  tf.io.gfile.rename(counts_path + '.tmp', counts_path, overwrite=True)
+
+
+def _load_counts(output_dir, fingerprint):
+  """Returns the saved `(counts, num_counted_clients)`, or `(None, 0)`.
+
+  Args:
+    output_dir: The directory in which the counts are saved.
+    fingerprint: The `_get_count_fingerprint` of the current count.
+
+  Raises:
+    ValueError: If the saved counts were computed with different settings.
+  """
+  counts_path = os.path.join(output_dir, _COUNTS_FILENAME)
+  if not tf.io.gfile.exists(counts_path):
+    return None, 0
+  with tf.io.gfile.GFile(counts_path, 'rb') as f:
+    saved = np.load(f)
+    if 'fingerprint' not in saved or str(saved['fingerprint']) != fingerprint:
+      raise ValueError(
+          'The counts saved in [{!s}] were computed with a different dataset, '
+          'vocabulary, num_buckets, ngram_width, count_clients or set of '
+          'clients. Remove them or use another output_dir.'.format(counts_path))
+    return saved['counts'], int(saved['num_counted_clients'])
+
+
+def count_client_data(client_data: tff.simulation.ClientData,
+                      dataset_name: str,
+                      vocabulary: Optional[List[str]] = None,
+                      num_buckets: Optional[int] = None,
+                      ngram_width: int = 1,
+                      count_clients: bool = False,
+                      clients_per_round: int = 100,
+                      output_dir: Optional[str] = None) -> np.ndarray:
+  """Counts the words of all the clients of `client_data`.
+
+  The clients are counted `clients_per_round` at a time, so that only the
+  datasets of that many clients are processed at once. If `output_dir` is set,
+  the counts are saved there after each batch of clients, and a count
+  interrupted with the same `client_data` and `output_dir` resumes after the
+  last saved batch. Resuming from counts saved with different settings raises
+  an error.
+
+  Args:
+    client_data: A `tff.simulation.ClientData` of the dataset `dataset_name`.
+    dataset_name: The name of the dataset, either 'shakespeare' or
+      'stackoverflow'.
+    vocabulary: An optional list of the words (or n-grams) to count.
+    num_buckets: An optional number of hash buckets.
+    ngram_width: The number of words of the counted n-grams.
+    count_clients: If True, the number of clients holding each word is
+      counted, instead of the number of occurrences.
+    clients_per_round: The number of clients counted at once.
+    output_dir: An optional directory in which the counts are saved.
+
+  Returns:
+    A 1D np.int64 array of counts, see `build_word_count_computation`.
+
+  Raises:
+    ValueError: If the arguments are not supported, or the counts saved in
+      `output_dir` were computed with different settings.
+  """
+  if clients_per_round <= 0:
+    raise ValueError('clients_per_round must be positive, found {}.'.format(
+        clients_per_round))
+  count_fn = build_word_count_computation(dataset_name,
+                                          client_data.element_type_structure,
+                                          vocabulary, num_buckets, ngram_width,
+                                          count_clients)
+  num_counts = len(vocabulary) if vocabulary is not None else num_buckets
+  client_ids = client_data.client_ids
+
+  fingerprint = _get_count_fingerprint(dataset_name, vocabulary, num_buckets,
+                                       ngram_width, count_clients, client_ids)
+
+  counts, num_counted_clients = None, 0
+  if output_dir is not None:
+    tf.io.gfile.makedirs(output_dir)
+    counts, num_counted_clients = _load_counts(output_dir, fingerprint)
+    if num_counted_clients:
+      logging.info('Resuming the count after %d clients.', num_counted_clients)
+  if counts is None:
+    counts = np.zeros([num_counts], dtype=np.int64)
+
+  for start in range(num_counted_clients, len(client_ids), clients_per_round):
+    datasets = [
+        client_data.create_tf_dataset_for_client(client_id)
+        for client_id in client_ids[start:start + clients_per_round]
+    ]
+    counts += count_fn(datasets)
+    num_counted_clients = min(start + clients_per_round, len(client_ids))
+    logging.info('Counted %d of %d clients.', num_counted_clients,
+                 len(client_ids))
+    if output_dir is not None:
+      _save_counts(output_dir, counts, num_counted_clients, fingerprint)
+  return counts
+
+
+def get_top_counts(counts: np.ndarray, vocabulary: List[str],
+                   k: int) -> Dict[str, int]:
+  """Returns the `k` words of `vocabulary` with the highest `counts`.
+
+  Args:
+    counts: A 1D array of counts, indexed like `vocabulary`.
+    vocabulary: The vocabulary the counts were computed with.
+    k: The number of words to return.
+
+  Returns:
+    A {'string': count} dict, which can be compared to other histograms with
+    `heavy_hitters_utils.{precision, recall, f1_score}`.
+  """
+  # A stable sort keeps the vocabulary order between words with equal counts.
+  top_indices = np.argsort(-counts, kind='stable')[:k]
+  return {vocabulary[index]: int(counts[index]) for index in top_indices}
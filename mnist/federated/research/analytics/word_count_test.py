@@ -0,0 +1,144 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.analytics import word_count
+
+_VOCABULARY = ['hello', 'world', 'again', 'peace']
+
+
+def _create_client_data():
+  return tff.simulation.FromTensorSlicesClientData({
+      'a': collections.OrderedDict(snippets=['Hello world', 'hello again !']),
+      'b': collections.OrderedDict(snippets=['world peace']),
+      'c': collections.OrderedDict(snippets=['hello hello world world world']),
+  })
+
+
+class WordCountTest(tf.test.TestCase):
+
+  def test_get_ngrams(self):
+    lines = tf.constant(['Hello world !', 'a b c'])
+    self.assertAllEqual(
+        word_count.get_ngrams(lines), [b'hello', b'world', b'a', b'b', b'c'])
+    # Bigrams do not span several lines.
+    self.assertAllEqual(
+        word_count.get_ngrams(lines, ngram_width=2),
+        [b'hello world', b'a b', b'b c'])
+
+  def test_counts_vocabulary_words(self):
+    counts = word_count.count_client_data(
+        _create_client_data(),
+        'shakespeare',
+        vocabulary=_VOCABULARY,
+        clients_per_round=2)
+    self.assertAllEqual(counts, [4, 5, 1, 1])
+    self.assertEqual(
+        word_count.get_top_counts(counts, _VOCABULARY, 2), {
+            'world': 5,
+            'hello': 4
+        })
+
+  def test_counts_clients_holding_words(self):
+    counts = word_count.count_client_data(
+        _create_client_data(),
+        'shakespeare',
+        vocabulary=_VOCABULARY,
+        count_clients=True)
+    self.assertAllEqual(counts, [2, 3, 1, 1])
+
+  def test_counts_bigrams(self):
+    counts = word_count.count_client_data(
+        _create_client_data(),
+        'shakespeare',
+        vocabulary=['hello world', 'world world', 'world peace'],
+        ngram_width=2)
+    self.assertAllEqual(counts, [2, 2, 1])
+
+  def test_hashed_counts_sum_to_number_of_words(self):
+    counts = word_count.count_client_data(
+        _create_client_data(), 'shakespeare', num_buckets=7)
+    self.assertLen(counts, 7)
+    self.assertEqual(np.sum(counts), 11)
+
+  def test_resumes_from_saved_counts(self):
+    output_dir = self.create_tempdir().full_path
+    data = _create_client_data()
+    counts = word_count.count_client_data(
+        data,
+        'shakespeare',
+        vocabulary=_VOCABULARY,
+        clients_per_round=2,
+        output_dir=output_dir)
+    self.assertNotEmpty(tf.io.gfile.listdir(output_dir))
+
+    # All the clients are counted, so resuming does not count them again.
+    resumed_counts = word_count.count_client_data(
+        data,
+        'shakespeare',
+        vocabulary=_VOCABULARY,
+        clients_per_round=2,
+        output_dir=output_dir)
+    self.assertAllEqual(resumed_counts, counts)
+
+  def test_resuming_with_different_settings_raises(self):
+    output_dir = self.create_tempdir().full_path
+    data = _create_client_data()
+    word_count.count_client_data(
+        data, 'shakespeare', vocabulary=_VOCABULARY, output_dir=output_dir)
+
+    with self.assertRaises(ValueError):
+      word_count.count_client_data(
+          data,
+          'shakespeare',
+          vocabulary=_VOCABULARY[:2],
+          output_dir=output_dir)
+    with self.assertRaises(ValueError):
+      word_count.count_client_data(
+          data,
+          'shakespeare',
+          vocabulary=_VOCABULARY,
+          ngram_width=2,
+          output_dir=output_dir)
+    with self.assertRaises(ValueError):
+      word_count.count_client_data(
+          tff.simulation.FromTensorSlicesClientData({
+              'a': collections.OrderedDict(snippets=['Hello world']),
+          }),
+          'shakespeare',
+          vocabulary=_VOCABULARY,
+          output_dir=output_dir)
+
+  def test_raises_on_invalid_arguments(self):
+    element_type = _create_client_data().element_type_structure
+    with self.assertRaises(ValueError):
+      word_count.build_word_count_computation(
+          'emnist', element_type, vocabulary=_VOCABULARY)
+    with self.assertRaises(ValueError):
+      word_count.build_word_count_computation('shakespeare', element_type)
+    with self.assertRaises(ValueError):
+      word_count.build_word_count_computation(
+          'shakespeare', element_type, vocabulary=_VOCABULARY, num_buckets=3)
+    with self.assertRaises(ValueError):
+      word_count.build_word_count_computation(
+          'shakespeare', element_type, vocabulary=_VOCABULARY, ngram_width=0)
+
+
+if __name__ == '__main__':
+  tf.test.main()
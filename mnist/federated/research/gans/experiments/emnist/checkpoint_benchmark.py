@@ -0,0 +1,115 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Microbenchmark of checkpointing the EMNIST GAN server state.
+
+Compares the SavedModel checkpoints of `checkpoint_utils`, previously written
+by `training_loops.federated_training_loop`, with the raw tensor checkpoints of
+`checkpoint_manager.TensorFileCheckpointManager`. The save latency is the time
+the training loop is blocked, and the write latency the time until the
+checkpoint is on disk.
+"""
+
+import os.path
+import tempfile
+import time
+
+from absl import app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_federated.python.research.gans import gan_training_tf_fns
+from tensorflow_federated.python.research.gans import training_loops
+from tensorflow_federated.python.research.gans.experiments.emnist.models import convolutional_gan_networks as networks
+from tensorflow_federated.python.research.utils import checkpoint_utils
+
+flags.DEFINE_integer('noise_dim', 128,
+                     'Dimension of the generator input space.')
+flags.DEFINE_integer('num_checkpoints', 10, 'Number of checkpoints to time.')
+flags.DEFINE_string('root_dir', None, 'Directory to write the checkpoints to. '
+                    'Defaults to a temporary directory.')
+
+FLAGS = flags.FLAGS
+
+
+def _create_experiment_state(round_num):
+  generator = networks.get_gan_generator_model(FLAGS.noise_dim)
+  discriminator = networks.get_gan_discriminator_model()
+  generator(tf.zeros([1, FLAGS.noise_dim]))
+  discriminator(tf.zeros([1, 28, 28, 1]))
+  server_state = gan_training_tf_fns.server_initial_state(
+      generator, discriminator, dp_averaging_state=())
+  return training_loops.ExperimentState(
+      round_num=tf.constant(round_num), server_state=server_state)
+
+
+def _benchmark_checkpoint_utils(root_dir, state):
+  """Returns the save and load times of `checkpoint_utils`, in seconds."""
+  save_times = []
+  load_times = []
+  for round_num in range(FLAGS.num_checkpoints):
+    checkpoint_dir = os.path.join(
+        root_dir, '{}{:04d}'.format(training_loops.CHECKPOINT_PREFIX,
+                                    round_num))
+    start = time.time()
+    checkpoint_utils.save(state, checkpoint_dir)
+    save_times.append(time.time() - start)
+    start = time.time()
+    checkpoint_utils.load(checkpoint_dir, state)
+    load_times.append(time.time() - start)
+  return save_times, save_times, load_times
+
+
+def _benchmark_checkpoint_manager(root_dir, state):
+  """Returns the save, write and load times of the new manager, in seconds."""
+  checkpoint_mngr = training_loops.create_checkpoint_manager(root_dir)
+  save_times = []
+  write_times = []
+  load_times = []
+  for round_num in range(FLAGS.num_checkpoints):
+    start = time.time()
+    checkpoint_mngr.save_checkpoint(state, round_num)
+    save_times.append(time.time() - start)
+    checkpoint_mngr.wait_for_pending_write()
+    write_times.append(time.time() - start)
+    start = time.time()
+    checkpoint_mngr.load_checkpoint(state, round_num)
+    load_times.append(time.time() - start)
+  return save_times, write_times, load_times
+
+
+def main(argv):
+  if len(argv) > 1:
+    raise app.UsageError('Expected no command-line arguments, '
+                         'got: {}'.format(argv))
+
+  root_dir = FLAGS.root_dir or tempfile.mkdtemp()
+  state = _create_experiment_state(round_num=1)
+  num_parameters = sum(
+      np.size(value) for value in tf.nest.flatten(state.server_state))
+  print('Checkpointing {} values to {}'.format(num_parameters, root_dir))
+
+  for name, benchmark_fn in [('checkpoint_utils', _benchmark_checkpoint_utils),
+                             ('TensorFileCheckpointManager',
+                              _benchmark_checkpoint_manager)]:
+    save_times, write_times, load_times = benchmark_fn(
+        os.path.join(root_dir, name), state)
+    # The first checkpoint traces functions, and is not reported.
+    print('{}: save {:.4f} s, write {:.4f} s, load {:.4f} s'.format(
+        name, np.median(save_times[1:]), np.median(write_times[1:]),
+        np.median(load_times[1:])))
+
+
+if __name__ == '__main__':
+  app.run(main)
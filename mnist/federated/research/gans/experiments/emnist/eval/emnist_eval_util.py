@@ -14,8 +14,19 @@
 """GAN evaluation metrics for EMNIST.
 
 Built on top of TF-GAN library (https://github.com/tensorflow/gan).
+
+`emnist_score` and `emnist_frechet_distance` evaluate a single batch of images.
+For larger evaluations, `emnist_score_and_frechet_distance` streams batches of
+generated images through the classifier, and compares them to statistics of
+the real images that `get_cached_activation_statistics` computes once.
 """
 
+import hashlib
+import io
+import os.path
+
+from absl import logging
+import numpy as np
 import tensorflow as tf
 import tensorflow_gan as tfgan
 
@@ -100,3 +111,213 @@ def emnist_frechet_distance(real_images, generated_images, emnist_classifier):
       real_images_activations, generated_images_activations)
   frechet_distance.shape.assert_is_compatible_with([])
   return frechet_distance
+
+
+class ActivationStatistics(object):
+  """The mean and covariance of classifier activations, updated by batches.
+
+  The statistics are merged batch by batch with Welford's algorithm (as
+  generalized to batches by Chan et al.), so that they can be computed over
+  any number of images in constant memory.
+  """
+
+  def __init__(self, num_features, count=0, mean=None, m2=None):
+    """Returns the statistics of `count` activations, by default none.
+
+    Args:
+      num_features: The number of features of the activations.
+      count: The number of activations the statistics are computed over.
+      mean: The mean of the activations, of shape [num_features].
+      m2: The sum of the outer products of the deviations of the activations
+        from `mean`, of shape [num_features, num_features].
+    """
+    self._count = count
+    self._mean = (
+        np.zeros([num_features], dtype=np.float64) if mean is None else mean)
+    self._m2 = (
+        np.zeros([num_features, num_features], dtype=np.float64)
+        if m2 is None else m2)
+
+  @property
+  def count(self):
+    return self._count
+
+  @property
+  def mean(self):
+    return self._mean
+
+  @property
+  def covariance(self):
+    """The unbiased covariance, as used by TF-GAN's Frechet distance."""
+    return self._m2 / (self._count - 1)
+
+  def update(self, activations):
+    """Adds the activations of a batch, of shape [batch_size, num_features]."""
+    activations = np.asarray(activations, dtype=np.float64)
+    batch_count = activations.shape[0]
+    if not batch_count:
+      return
+    batch_mean = np.mean(activations, axis=0)
+    deviations = activations - batch_mean
+    delta = batch_mean - self._mean
+    count = self._count + batch_count
+    self._mean += delta * (batch_count / count)
+    self._m2 += np.matmul(deviations.T, deviations) + np.outer(
+        delta, delta) * (self._count * batch_count / count)
+    self._count = count
+
+  def save(self, path):
+    # `np.savez` seeks in its output, which a `GFile` opened for writing does
+    # not support, so the archive is built in memory first.
+    buffer = io.BytesIO()
+    np.savez(buffer, count=self._count, mean=self._mean, m2=self._m2)
+    with tf.io.gfile.GFile(path, 'wb') as f:
+      f.write(buffer.getvalue())
+
+  @classmethod
+  def load(cls, path):
+    with tf.io.gfile.GFile(path, 'rb') as f:
+      with np.load(f) as arrays:
+        return cls(
+            arrays['mean'].shape[0],
+            count=int(arrays['count']),
+            mean=arrays['mean'],
+            m2=arrays['m2'])
+
+
+def frechet_distance_from_statistics(statistics_1, statistics_2):
+  """Frechet distance between two Gaussians given by `ActivationStatistics`.
+
+  This computes the same quantity as
+  `tfgan.eval.frechet_classifier_distance_from_activations`, from the means and
+  covariances of the activations rather than from the activations.
+
+  Args:
+    statistics_1: An `ActivationStatistics`.
+    statistics_2: An `ActivationStatistics` with the same number of features.
+
+  Returns:
+    The Frechet distance, as a float.
+  """
+
+  def symmetric_matrix_square_root(matrix):
+    eigenvalues, eigenvectors = np.linalg.eigh(matrix)
+    return np.matmul(eigenvectors * np.sqrt(np.maximum(eigenvalues, 0.0)),
+                     eigenvectors.T)
+
+  sigma_1 = statistics_1.covariance
+  sigma_2 = statistics_2.covariance
+  # Tr(sqrt(sigma_1 sigma_2)) = Tr(sqrt(sqrt(sigma_1) sigma_2 sqrt(sigma_1))),
+  # where the latter is the square root of a symmetric matrix.
+  sqrt_sigma_1 = symmetric_matrix_square_root(sigma_1)
+  sqrt_product_eigenvalues = np.linalg.eigvalsh(
+      np.matmul(np.matmul(sqrt_sigma_1, sigma_2), sqrt_sigma_1))
+  trace_sqrt_product = np.sum(np.sqrt(np.maximum(sqrt_product_eigenvalues,
+                                                 0.0)))
+
+  mean_term = np.sum(np.square(statistics_1.mean - statistics_2.mean))
+  trace_term = np.trace(sigma_1) + np.trace(sigma_2) - 2.0 * trace_sqrt_product
+  return float(mean_term + trace_term)
+
+
+def compute_activation_statistics(images_ds, emnist_classifier):
+  """Returns the `ActivationStatistics` of the batches of `images_ds`."""
+  statistics = None
+  for images in images_ds:
+    activations = _emnist_classifier(images, emnist_classifier).numpy()
+    if statistics is None:
+      statistics = ActivationStatistics(activations.shape[-1])
+    statistics.update(activations)
+  return statistics
+
+
+def _get_classifier_key(emnist_classifier):
+  """Returns a hash of the weights of the classifier."""
+  key = hashlib.sha1()
+  for weight in emnist_classifier.weights:
+    key.update(weight.numpy().tobytes())
+  return key.hexdigest()
+
+
+def get_cached_activation_statistics(images_ds, emnist_classifier, cache_dir,
+                                     name):
+  """Returns the `ActivationStatistics` of a fixed dataset of images.
+
+  The statistics are computed once, and cached in `cache_dir` under a file
+  keyed by `name` and by the weights of the classifier, so that the cache is
+  never reused with another checkpoint of the classifier.
+
+  Args:
+    images_ds: A finite `tf.data.Dataset` of batches of images of shape [None,
+      28, 28, 1], which should always yield the same images.
+    emnist_classifier: A Keras model instance of a trained EMNIST classifier.
+    cache_dir: The directory of the cache. If None, the statistics are not
+      cached.
+    name: The name of the dataset of images.
+
+  Returns:
+    An `ActivationStatistics`.
+  """
+  if cache_dir is None:
+    return compute_activation_statistics(images_ds, emnist_classifier)
+
+  path = os.path.join(
+      cache_dir, '{}_activations_{}.npz'.format(
+          name,
+          _get_classifier_key(emnist_classifier)[:16]))
+  if tf.io.gfile.exists(path):
+    logging.info('Reading cached activation statistics from %s', path)
+    return ActivationStatistics.load(path)
+
+  statistics = compute_activation_statistics(images_ds, emnist_classifier)
+  tf.io.gfile.makedirs(cache_dir)
+  # Written to a temporary file first, so a partial cache is never read.
+  statistics.save(path + '.tmp')
+  tf.io.gfile.rename(path + '.tmp', path, overwrite=True)
+  logging.info('Cached the activation statistics of %d images to %s',
+               statistics.count, path)
+  return statistics
+
+
+def emnist_score_and_frechet_distance(generated_images_batches,
+                                      emnist_classifier,
+                                      real_activation_statistics):
+  """EMNIST classifier score and Frechet distance of batches of images.
+
+  The images are classified one batch at a time, so that the metrics can be
+  computed over any number of images. The metrics are the same as
+  `emnist_score` and `emnist_frechet_distance` on all the images at once, where
+  the real images are given by their statistics.
+
+  Args:
+    generated_images_batches: An iterable of generated images of shape [None,
+      28, 28, 1].
+    emnist_classifier: A Keras model instance of a trained EMNIST classifier.
+    real_activation_statistics: The `ActivationStatistics` of real images, e.g.
+      as returned by `get_cached_activation_statistics`.
+
+  Returns:
+    A tuple `(classifier_score, frechet_distance)` of floats.
+  """
+  generated_statistics = ActivationStatistics(
+      real_activation_statistics.mean.shape[0])
+  # The classifier score is exp(E[sum_y p(y|x) log p(y|x)] - sum_y p(y) log
+  # p(y)), where p(y) = E[p(y|x)].
+  sum_negative_entropies = 0.0
+  sum_probabilities = 0.0
+  for images in generated_images_batches:
+    images.shape.assert_is_compatible_with([None, 28, 28, 1])
+    logits = _emnist_classifier(images, emnist_classifier)
+    log_probabilities = tf.nn.log_softmax(tf.cast(logits, tf.float64)).numpy()
+    probabilities = np.exp(log_probabilities)
+    sum_negative_entropies += np.sum(probabilities * log_probabilities)
+    sum_probabilities += np.sum(probabilities, axis=0)
+    generated_statistics.update(logits.numpy())
+
+  count = generated_statistics.count
+  marginal_probabilities = sum_probabilities / count
+  classifier_score = np.exp(sum_negative_entropies / count - np.sum(
+      marginal_probabilities * np.log(marginal_probabilities)))
+  frechet_distance = frechet_distance_from_statistics(
+      real_activation_statistics, generated_statistics)
+  return float(classifier_score), frechet_distance
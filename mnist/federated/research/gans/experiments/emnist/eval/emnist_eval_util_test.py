@@ -13,6 +13,8 @@
 # limitations under the License.
 """Test the GAN evaluation metrics for EMNIST."""
 
+import os.path
+
 import numpy as np
 import tensorflow as tf
 
@@ -59,6 +61,51 @@ class EmnistEvalUtilTest(tf.test.TestCase):
         ecm.get_trained_emnist_classifier_model())
     self.assertAllClose(distance, 0.0)
 
+  def test_activation_statistics_match_numpy(self):
+    activations = np.random.random((50, 7))
+    statistics = eeu.ActivationStatistics(7)
+    for batch in np.split(activations, [10, 10, 35]):
+      statistics.update(batch)
+    self.assertEqual(statistics.count, 50)
+    self.assertAllClose(statistics.mean, np.mean(activations, axis=0))
+    self.assertAllClose(statistics.covariance,
+                        np.cov(activations, rowvar=False))
+
+  def test_activation_statistics_save_and_load(self):
+    statistics = eeu.ActivationStatistics(7)
+    statistics.update(np.random.random((50, 7)))
+    path = os.path.join(self.create_tempdir().full_path, 'statistics.npz')
+    statistics.save(path)
+    loaded_statistics = eeu.ActivationStatistics.load(path)
+    self.assertEqual(loaded_statistics.count, 50)
+    self.assertAllClose(loaded_statistics.mean, statistics.mean)
+    self.assertAllClose(loaded_statistics.covariance, statistics.covariance)
+
+  def test_emnist_score_and_frechet_distance(self):
+    classifier = ecm.get_trained_emnist_classifier_model()
+    real_activation_statistics = eeu.compute_activation_statistics(
+        [self.real_images], classifier)
+    fake_images_batches = tf.split(self.fake_images, [20, 12])
+    score, distance = eeu.emnist_score_and_frechet_distance(
+        fake_images_batches, classifier, real_activation_statistics)
+    self.assertAllClose(score, 1.1598, rtol=0.0001, atol=0.0001)
+    self.assertAllClose(distance, 568.6883, rtol=0.0001, atol=0.0001)
+
+  def test_get_cached_activation_statistics(self):
+    cache_dir = self.create_tempdir().full_path
+    classifier = ecm.get_trained_emnist_classifier_model()
+    statistics = eeu.get_cached_activation_statistics([self.real_images],
+                                                      classifier, cache_dir,
+                                                      'real')
+    self.assertLen(tf.io.gfile.listdir(cache_dir), 1)
+
+    # The cached statistics are read, rather than computed from the images.
+    cached_statistics = eeu.get_cached_activation_statistics([], classifier,
+                                                             cache_dir, 'real')
+    self.assertEqual(cached_statistics.count, statistics.count)
+    self.assertAllClose(cached_statistics.mean, statistics.mean)
+    self.assertAllClose(cached_statistics.covariance, statistics.covariance)
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -0,0 +1,88 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Microbenchmark of a discriminator step with the WGAN-GP loss.
+
+Times `gan_training_tf_fns.create_train_discriminator_fn` on the EMNIST GAN
+networks, with the discriminator run separately on the generated, real and
+interpolated images, and with the three passes fused into one batch.
+
+N.B. The EMNIST discriminator has a BatchNormalization layer, whose batch
+statistics differ between the fused and separate passes, so that the fused
+losses only match the separate ones up to those statistics. For this reason
+`gan_losses.WassersteinGanLossFns` only fuses the passes when asked to, see the
+`--fuse_discriminator_passes` flag of `train.py`.
+"""
+
+import time
+
+from absl import app
+from absl import flags
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_federated.python.research.gans import gan_losses
+from tensorflow_federated.python.research.gans import gan_training_tf_fns
+from tensorflow_federated.python.research.gans.experiments.emnist.models import convolutional_gan_networks as networks
+
+flags.DEFINE_integer('batch_size', 32, 'Size of the batches of images.')
+flags.DEFINE_integer('noise_dim', 64,
+                     'Dimension of the generator input space.')
+flags.DEFINE_float('wass_gp_lambda', 10.0,
+                   'Weight of the gradient penalty term.')
+flags.DEFINE_integer('num_steps', 100, 'Number of discriminator steps to time.')
+
+FLAGS = flags.FLAGS
+
+
+def _benchmark_discriminator_steps(fuse_discriminator_passes):
+  """Returns the first loss and the step times, in seconds."""
+  tf.random.set_seed(0)
+  generator = networks.get_gan_generator_model(FLAGS.noise_dim)
+  discriminator = networks.get_gan_discriminator_model()
+  gan_loss_fns = gan_losses.WassersteinGanLossFns(
+      grad_penalty_lambda=FLAGS.wass_gp_lambda,
+      fuse_discriminator_passes=fuse_discriminator_passes)
+  train_discriminator_fn = gan_training_tf_fns.create_train_discriminator_fn(
+      gan_loss_fns, tf.keras.optimizers.SGD(learning_rate=0.0))
+
+  gen_inputs = tf.random.normal([FLAGS.batch_size, FLAGS.noise_dim])
+  real_data = tf.random.uniform([FLAGS.batch_size, 28, 28, 1],
+                                minval=-1.0,
+                                maxval=1.0)
+  loss = gan_loss_fns.discriminator_loss(generator, discriminator, gen_inputs,
+                                         real_data)
+  step_times = []
+  for _ in range(FLAGS.num_steps + 1):
+    start = time.time()
+    train_discriminator_fn(generator, discriminator, gen_inputs,
+                           real_data).numpy()
+    step_times.append(time.time() - start)
+  # The first step traces the function, and is not reported.
+  return float(loss), step_times[1:]
+
+
+def main(argv):
+  if len(argv) > 1:
+    raise app.UsageError('Expected no command-line arguments, '
+                         'got: {}'.format(argv))
+
+  for name, fuse_discriminator_passes in [('separate passes', False),
+                                          ('fused passes', True)]:
+    loss, step_times = _benchmark_discriminator_steps(fuse_discriminator_passes)
+    print('{}: loss {:.6f}, step {:.4f} s (median of {})'.format(
+        name, loss, np.median(step_times), len(step_times)))
+
+
+if __name__ == '__main__':
+  app.run(main)
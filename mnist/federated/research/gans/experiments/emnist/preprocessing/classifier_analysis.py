@@ -0,0 +1,181 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Batched classification of the examples of Federated EMNIST clients.
+
+The examples of consecutive clients are gathered into batches of
+`batch_size` images, which are classified with a single call of the EMNIST
+classifier, and the predictions are split back per client. The clients can
+also be split into shards classified by several worker processes.
+"""
+
+import multiprocessing
+from typing import Dict, List
+
+from absl import logging
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_federated.python.research.gans.experiments.emnist import emnist_data_utils
+from tensorflow_federated.python.research.gans.experiments.emnist.classifier import emnist_classifier_model as ecm
+
+DEFAULT_BATCH_SIZE = 1024
+
+# The number of examples of a client read from its dataset at once.
+_CLIENT_BATCH_SIZE = 1024
+
+# The client data and classifier loaded by each worker process, see
+# `_init_worker`.
+_worker_state = {}
+
+
+def _get_client_examples(client_data, client_id, invert_imagery):
+  """Returns the preprocessed images and labels of a client as arrays."""
+  images_ds = emnist_data_utils.preprocess_img_dataset(
+      client_data.create_tf_dataset_for_client(client_id),
+      invert_imagery=invert_imagery,
+      include_label=True,
+      batch_size=_CLIENT_BATCH_SIZE,
+      shuffle=False,
+      repeat=False)
+  images = []
+  labels = []
+  for image_batch, label_batch in images_ds.as_numpy_iterator():
+    images.append(image_batch)
+    labels.append(label_batch)
+  if not images:
+    return (np.zeros([0, 28, 28, 1], dtype=np.float32),
+            np.zeros([0], dtype=np.int32))
+  return np.concatenate(images), np.concatenate(labels)
+
+
+def classify_clients(client_data, client_ids: List[str],
+                     invert_imagery: Dict[str, bool],
+                     classifier_model: tf.keras.Model,
+                     batch_size: int = DEFAULT_BATCH_SIZE
+                    ) -> Dict[str, np.ndarray]:
+  """Classifies the examples of `client_ids`, `batch_size` images at a time.
+
+  Args:
+    client_data: A `tff.simulation.ClientData` of raw EMNIST examples.
+    client_ids: The ids of the clients to classify.
+    invert_imagery: A dict mapping each client id to whether the pixel
+      intensities of its images are inverted.
+    classifier_model: The EMNIST classifier.
+    batch_size: The number of images classified at once.
+
+  Returns:
+    A dict mapping each client id to a 1D boolean array, which is True for the
+    examples of the client (in dataset order) whose label is predicted
+    correctly.
+  """
+
+  @tf.function(
+      input_signature=[tf.TensorSpec([None, 28, 28, 1], dtype=tf.float32)])
+  def predict(images):
+    return tf.math.argmax(
+        classifier_model(images), axis=-1, output_type=tf.int32)
+
+  correct_examples = {}
+  pending_client_ids = []
+  pending_images = []
+  pending_labels = []
+
+  def classify_pending_examples():
+    """Classifies the pending examples, and splits the results by client."""
+    images = np.concatenate(pending_images)
+    labels = np.concatenate(pending_labels)
+    predictions = [
+        predict(images[start:start + batch_size]).numpy()
+        for start in range(0, len(images), batch_size)
+    ]
+    correct = (
+        np.concatenate(predictions) if predictions else np.zeros(
+            [0], dtype=np.int32)) == labels
+    client_offsets = np.cumsum([len(l) for l in pending_labels])[:-1]
+    for client_id, client_correct in zip(pending_client_ids,
+                                         np.split(correct, client_offsets)):
+      correct_examples[client_id] = client_correct
+    del pending_client_ids[:], pending_images[:], pending_labels[:]
+
+  num_pending_examples = 0
+  for client_id in client_ids:
+    images, labels = _get_client_examples(client_data, client_id,
+                                          invert_imagery[client_id])
+    pending_client_ids.append(client_id)
+    pending_images.append(images)
+    pending_labels.append(labels)
+    num_pending_examples += len(labels)
+    if num_pending_examples >= batch_size:
+      classify_pending_examples()
+      num_pending_examples = 0
+  if pending_client_ids:
+    classify_pending_examples()
+  return correct_examples
+
+
+def _init_worker(split):
+  _worker_state['client_data'] = (
+      emnist_data_utils.create_real_images_tff_client_data(split))
+  _worker_state['classifier_model'] = ecm.get_trained_emnist_classifier_model()
+
+
+def _classify_clients_in_worker(args):
+  client_ids, invert_imagery, batch_size = args
+  return classify_clients(_worker_state['client_data'], client_ids,
+                          invert_imagery, _worker_state['classifier_model'],
+                          batch_size)
+
+
+def classify_clients_in_parallel(split: str,
+                                 client_ids: List[str],
+                                 invert_imagery: Dict[str, bool],
+                                 num_workers: int,
+                                 batch_size: int = DEFAULT_BATCH_SIZE,
+                                 clients_per_shard: int = 100
+                                ) -> Dict[str, np.ndarray]:
+  """Classifies the examples of `client_ids` with `num_workers` processes.
+
+  Each worker process loads the `split` of the EMNIST client data and the
+  trained classifier once, and classifies shards of `clients_per_shard`
+  clients with `classify_clients`.
+
+  Args:
+    split: The split of `emnist_data_utils.create_real_images_tff_client_data`
+      holding the clients.
+    client_ids: The ids of the clients to classify.
+    invert_imagery: A dict mapping each client id to whether the pixel
+      intensities of its images are inverted.
+    num_workers: The number of worker processes.
+    batch_size: The number of images classified at once.
+    clients_per_shard: The number of clients classified by a worker at a time.
+
+  Returns:
+    A dict as returned by `classify_clients`.
+  """
+  shards = [
+      client_ids[i:i + clients_per_shard]
+      for i in range(0, len(client_ids), clients_per_shard)
+  ]
+  tasks = [(shard, {client_id: invert_imagery[client_id] for client_id in shard
+                   }, batch_size) for shard in shards]
+  correct_examples = {}
+  # TensorFlow is not fork-safe, so the workers are started from scratch.
+  context = multiprocessing.get_context('spawn')
+  with context.Pool(
+      num_workers, initializer=_init_worker, initargs=(split,)) as pool:
+    for i, shard_correct_examples in enumerate(
+        pool.imap_unordered(_classify_clients_in_worker, tasks)):
+      correct_examples.update(shard_correct_examples)
+      logging.info('Classified %d of %d shards.', i + 1, len(shards))
+  return correct_examples
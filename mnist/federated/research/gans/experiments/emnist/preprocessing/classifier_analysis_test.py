@@ -0,0 +1,77 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for batched classification of Federated EMNIST clients."""
+
+from absl.testing import parameterized
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_federated.python.research.gans.experiments.emnist import emnist_data_utils
+from tensorflow_federated.python.research.gans.experiments.emnist.classifier import emnist_classifier_model as ecm
+from tensorflow_federated.python.research.gans.experiments.emnist.preprocessing import classifier_analysis
+
+
+def _classify_images_one_at_a_time(client_data, client_id, invert_imagery,
+                                   classifier_model):
+  images_ds = emnist_data_utils.preprocess_img_dataset(
+      client_data.create_tf_dataset_for_client(client_id),
+      invert_imagery=invert_imagery,
+      include_label=True,
+      batch_size=None,
+      shuffle=False,
+      repeat=False)
+  correct = []
+  for image, label in images_ds:
+    prediction = tf.math.argmax(
+        classifier_model(tf.expand_dims(image, 0)), axis=-1)[0]
+    correct.append(prediction.numpy() == label.numpy())
+  return np.array(correct, dtype=np.bool_)
+
+
+class ClassifierAnalysisTest(tf.test.TestCase, parameterized.TestCase):
+
+  # With a batch size of 3, batches span several clients and the examples of a
+  # client span several batches. The largest batch size pools the examples of
+  # all clients into a single batch.
+  @parameterized.named_parameters(('one_image_per_batch', 1),
+                                  ('batches_span_clients', 3),
+                                  ('all_clients_in_one_batch', 100000))
+  def test_classify_clients_matches_per_image_classification(self, batch_size):
+    tf.random.set_seed(0)
+    client_data = emnist_data_utils.create_real_images_tff_client_data(
+        'synthetic', num_pseudo_clients=3)
+    client_ids = client_data.client_ids
+    invert_imagery = {
+        client_id: i % 2 == 1 for i, client_id in enumerate(client_ids)
+    }
+    classifier_model = ecm.get_emnist_classifier_model()
+
+    correct_examples = classifier_analysis.classify_clients(
+        client_data,
+        client_ids,
+        invert_imagery,
+        classifier_model,
+        batch_size=batch_size)
+
+    self.assertCountEqual(correct_examples.keys(), client_ids)
+    for client_id in client_ids:
+      self.assertAllEqual(
+          correct_examples[client_id],
+          _classify_images_one_at_a_time(client_data, client_id,
+                                         invert_imagery[client_id],
+                                         classifier_model))
+
+
+if __name__ == '__main__':
+  tf.test.main()
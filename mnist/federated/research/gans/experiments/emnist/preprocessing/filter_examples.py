@@ -45,6 +45,7 @@ import tensorflow as tf
 
 from tensorflow_federated.python.research.gans.experiments.emnist import emnist_data_utils
 from tensorflow_federated.python.research.gans.experiments.emnist.classifier import emnist_classifier_model as ecm
+from tensorflow_federated.python.research.gans.experiments.emnist.preprocessing import classifier_analysis
 from tensorflow_federated.python.research.utils import utils_impl
 
 with utils_impl.record_new_flags() as hparam_flags:
@@ -93,54 +94,50 @@ with utils_impl.record_new_flags() as hparam_flags:
       'keys are client IDs from the Federated EMNIST dataset, and the values '
       'are a list of indices of examples that classified incorrectly on the '
       'client ID.')
-FLAGS = flags.FLAGS
-
-
-def _analyze_classifier(images_ds, classifier_model):
-  """Measure accuracy of the classifier model against the labeled dataset."""
-  correct_indices = []
-  incorrect_indices = []
-
-  index = 0
-  for image, label in images_ds:
-    logit = tf.squeeze(classifier_model(tf.expand_dims(image, axis=0)), axis=0)
-    predicted_label = tf.math.argmax(logit, output_type=tf.int32)
-    if tf.math.equal(label, predicted_label).numpy():
-      correct_indices.append(index)
-    else:
-      incorrect_indices.append(index)
-
-    index += 1
+  flags.DEFINE_integer(
+      'num_workers', 1,
+      'The number of processes running the classifier. Each of them loads the '
+      'EMNIST data and classifier.')
+  flags.DEFINE_integer('classification_batch_size',
+                       classifier_analysis.DEFAULT_BATCH_SIZE,
+                       'The number of images classified at once.')
 
-  return correct_indices, incorrect_indices
+FLAGS = flags.FLAGS
 
 
 def _get_client_ids_and_examples_based_on_classification(
     train_tff_data, min_num_examples, invert_imagery_likelihood,
-    classifier_model):
+    classifier_model, num_workers=1,
+    batch_size=classifier_analysis.DEFAULT_BATCH_SIZE):
   """Get maps storing whether imagery inverted and how examples classified."""
   client_ids_with_correct_examples_map = {}
   client_ids_with_incorrect_examples_map = {}
   client_ids_correct_example_indices_map = {}
   client_ids_incorrect_example_indices_map = {}
 
-  for client_id in train_tff_data.client_ids:
-    invert_imagery = (1 == np.random.binomial(n=1, p=invert_imagery_likelihood))
-
-    # TF Dataset for particular client.
-    raw_images_ds = train_tff_data.create_tf_dataset_for_client(client_id)
-    # Preprocess into format expected by classifier.
-    images_ds = emnist_data_utils.preprocess_img_dataset(
-        raw_images_ds,
-        invert_imagery=invert_imagery,
-        include_label=True,
-        batch_size=None,
-        shuffle=False,
-        repeat=False)
-    # Run classifier on all data on client, return lists of indices of examples
-    # classified correctly and incorrectly.
-    correct_indices, incorrect_indices = _analyze_classifier(
-        images_ds, classifier_model)
+  # The inversions are drawn in client order, as the clients are classified in
+  # batches and possibly out of order.
+  client_ids = train_tff_data.client_ids
+  invert_imagery_map = {}
+  for client_id in client_ids:
+    invert_imagery_map[client_id] = (
+        1 == np.random.binomial(n=1, p=invert_imagery_likelihood))
+
+  # Run classifier on all data on all clients, get whether each example of a
+  # client is classified correctly.
+  if num_workers > 1:
+    correct_examples = classifier_analysis.classify_clients_in_parallel(
+        'train', client_ids, invert_imagery_map, num_workers, batch_size)
+  else:
+    correct_examples = classifier_analysis.classify_clients(
+        train_tff_data, client_ids, invert_imagery_map, classifier_model,
+        batch_size)
+
+  for client_id in client_ids:
+    invert_imagery = invert_imagery_map[client_id]
+    correct_indices = np.flatnonzero(correct_examples[client_id]).tolist()
+    incorrect_indices = np.flatnonzero(
+        ~correct_examples[client_id]).tolist()
 
     if len(correct_indices) >= min_num_examples:
       client_ids_with_correct_examples_map[client_id] = invert_imagery
@@ -180,8 +177,12 @@ def main(argv):
   print('There are %d unique clients.' %
         len(client_real_images_train_tff_data.client_ids))
 
-  # Trained classifier model.
-  classifier_model = ecm.get_trained_emnist_classifier_model()
+  # Trained classifier model. With several workers, each worker loads its own
+  # copy of the classifier, so it is not loaded here.
+  if FLAGS.num_workers > 1:
+    classifier_model = None
+  else:
+    classifier_model = ecm.get_trained_emnist_classifier_model()
 
   # Filter down to those client IDs that fall within some accuracy cutoff.
   (client_ids_with_correct_examples_map, client_ids_with_incorrect_examples_map,
@@ -189,7 +190,8 @@ def main(argv):
    client_ids_incorrect_example_indices_map) = (
        _get_client_ids_and_examples_based_on_classification(
            client_real_images_train_tff_data, FLAGS.min_num_examples,
-           FLAGS.invert_imagery_likelihood, classifier_model))
+           FLAGS.invert_imagery_likelihood, classifier_model,
+           FLAGS.num_workers, FLAGS.classification_batch_size))
 
   print('There are %d unique clients with at least %d correct examples.' %
         (len(client_ids_with_correct_examples_map), FLAGS.min_num_examples))
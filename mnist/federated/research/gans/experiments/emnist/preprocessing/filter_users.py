@@ -43,6 +43,7 @@ import tensorflow as tf
 
 from tensorflow_federated.python.research.gans.experiments.emnist import emnist_data_utils
 from tensorflow_federated.python.research.gans.experiments.emnist.classifier import emnist_classifier_model as ecm
+from tensorflow_federated.python.research.gans.experiments.emnist.preprocessing import classifier_analysis
 from tensorflow_federated.python.research.utils import utils_impl
 
 with utils_impl.record_new_flags() as hparam_flags:
@@ -76,51 +77,51 @@ with utils_impl.record_new_flags() as hparam_flags:
       'are well-performing device client ids from the Federated EMNIST dataset, '
       'and the values are a boolean for whether the image intensity was inverted '
       'for that client id.')
-FLAGS = flags.FLAGS
-
-
-def _analyze_classifier(images_ds, classifier_model):
-  """Measure accuracy of the classifier model against the labeled dataset."""
-
-  def reduce_fn(total_count_and_correct_count, image_and_label):
-    """Reduces total and correctly classified example counts across a client."""
-    total_count, correct_count = total_count_and_correct_count
-    image, label = image_and_label
-
-    logit = tf.squeeze(classifier_model(tf.expand_dims(image, axis=0)), axis=0)
-    predicted_label = tf.math.argmax(logit, output_type=tf.int32)
+  flags.DEFINE_integer(
+      'num_workers', 1,
+      'The number of processes running the classifier. Each of them loads the '
+      'EMNIST data and classifier.')
+  flags.DEFINE_integer('classification_batch_size',
+                       classifier_analysis.DEFAULT_BATCH_SIZE,
+                       'The number of images classified at once.')
 
-    return (total_count + 1, correct_count +
-            tf.cast(tf.math.equal(label, predicted_label), tf.int32))
-
-  total_count, correct_count = images_ds.reduce((0, 0), reduce_fn)
-
-  return total_count, correct_count
+FLAGS = flags.FLAGS
 
 
-def _get_client_ids_meeting_condition(train_tff_data, bad_accuracy_cutoff,
-                                      good_accuracy_cutoff,
-                                      invert_imagery_likelihood,
-                                      classifier_model):
+def _get_client_ids_meeting_condition(
+    train_tff_data,
+    bad_accuracy_cutoff,
+    good_accuracy_cutoff,
+    invert_imagery_likelihood,
+    classifier_model,
+    num_workers=1,
+    batch_size=classifier_analysis.DEFAULT_BATCH_SIZE):
   """Get clients that classify <bad_accuracy_cutoff or >good_accuracy_cutoff."""
   bad_client_ids_inversion_map = {}
   good_client_ids_inversion_map = {}
-  for client_id in train_tff_data.client_ids:
-    invert_imagery = (1 == np.random.binomial(n=1, p=invert_imagery_likelihood))
-
-    # TF Dataset for particular client.
-    raw_images_ds = train_tff_data.create_tf_dataset_for_client(client_id)
-    # Preprocess into format expected by classifier.
-    images_ds = emnist_data_utils.preprocess_img_dataset(
-        raw_images_ds,
-        invert_imagery=invert_imagery,
-        include_label=True,
-        batch_size=None,
-        shuffle=False,
-        repeat=False)
-    # Run classifier on all data on client, compute % classified correctly.
-    total_count, correct_count = _analyze_classifier(images_ds,
-                                                     classifier_model)
+
+  # The inversions are drawn in client order, as the clients are classified in
+  # batches and possibly out of order.
+  client_ids = train_tff_data.client_ids
+  invert_imagery_map = {}
+  for client_id in client_ids:
+    invert_imagery_map[client_id] = (
+        1 == np.random.binomial(n=1, p=invert_imagery_likelihood))
+
+  # Run classifier on all data on all clients.
+  if num_workers > 1:
+    correct_examples = classifier_analysis.classify_clients_in_parallel(
+        'train', client_ids, invert_imagery_map, num_workers, batch_size)
+  else:
+    correct_examples = classifier_analysis.classify_clients(
+        train_tff_data, client_ids, invert_imagery_map, classifier_model,
+        batch_size)
+
+  for client_id in client_ids:
+    invert_imagery = invert_imagery_map[client_id]
+    # Compute % classified correctly.
+    total_count = correct_examples[client_id].size
+    correct_count = np.sum(correct_examples[client_id])
     accuracy = float(correct_count) / float(total_count)
 
     if accuracy < bad_accuracy_cutoff:
@@ -159,8 +160,12 @@ def main(argv):
   print('There are %d unique clients.' %
         len(client_real_images_train_tff_data.client_ids))
 
-  # Trained classifier model.
-  classifier_model = ecm.get_trained_emnist_classifier_model()
+  # Trained classifier model. With several workers, each worker loads its own
+  # copy of the classifier, so it is not loaded here.
+  if FLAGS.num_workers > 1:
+    classifier_model = None
+  else:
+    classifier_model = ecm.get_trained_emnist_classifier_model()
 
   # Filter down to those client IDs that fall within some accuracy cutoff.
   bad_client_ids_inversion_map, good_client_ids_inversion_map = (
@@ -168,7 +173,8 @@ def main(argv):
                                         FLAGS.bad_accuracy_cutoff,
                                         FLAGS.good_accuracy_cutoff,
                                         FLAGS.invert_imagery_likelihood,
-                                        classifier_model))
+                                        classifier_model, FLAGS.num_workers,
+                                        FLAGS.classification_batch_size))
 
   print('There are %d unique clients meeting bad accuracy cutoff condition.' %
         len(bad_client_ids_inversion_map))
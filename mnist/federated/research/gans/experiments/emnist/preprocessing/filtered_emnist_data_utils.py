@@ -15,8 +15,11 @@
 
 import csv
 import functools
+import io
 import os.path
 
+from absl import logging
+import numpy as np
 import tensorflow as tf
 import tensorflow_federated as tff
 
@@ -25,6 +28,10 @@ from tensorflow_federated.python.research.gans.experiments.emnist import emnist_
 BASE_URL = 'https://storage.googleapis.com/tff-experiments-public/'
 CSVS_BASE_PATH = 'gans/csvs/'
 
+# The suffix of the binary index written next to an example indices csv file,
+# see `_load_example_indices_map`.
+EXAMPLE_INDICES_INDEX_SUFFIX = '.npz'
+
 
 @functools.lru_cache(maxsize=1)
 def get_unfiltered_client_data_for_training(batch_size):
@@ -221,28 +228,88 @@ def get_filtered_client_data_for_training(path_to_read_inversions_csv,
 def _filter_by_example(raw_ds, client_ids_example_indices_map, client_id):
   """Form a tf.data.Dataset from the examples in the map for the client_id."""
   example_indices = client_ids_example_indices_map[client_id]
+  # A mask over the examples up to the last selected one, so the filtering
+  # stays in the graph of the dataset.
+  num_examples = int(example_indices[-1]) + 1 if example_indices.size else 0
+  mask = np.zeros([num_examples], dtype=bool)
+  mask[example_indices] = True
+  mask = tf.constant(mask)
+
+  return raw_ds.take(num_examples).enumerate().filter(
+      lambda index, element: tf.gather(mask, index)).map(
+          lambda index, element: element)
+
+
+def _parse_example_indices(example_indices):
+  """Returns the example indices of a csv value as a sorted int32 array."""
   # B/c the csv stores the list as a string, we need to do some slightly
   # klugey conversion from a string to list. (We strip off the first and
   # last characters in the string, which are [ and ], and then split on
   # commas as delimiters, to recover the original list of ints.
-  example_indices = [int(s) for s in example_indices[1:-1].split(',')]
+  example_indices = example_indices[1:-1].strip()
+  if not example_indices:
+    return np.zeros([0], dtype=np.int32)
+  return np.sort(
+      np.array([int(s) for s in example_indices.split(',')], dtype=np.int32))
+
+
+def _load_example_indices_map(path_to_read_example_indices_csv):
+  """Returns a map from client ids to sorted int32 arrays of example indices.
 
-  # Get the elements (OrderedDicts) in the raw data which are at the indices
-  # indicated by the list above.
-  elements = []
-  index = 0
-  for element in raw_ds:
-    if index in example_indices:
-      elements.append(element)
-    index += 1
+  The csv file is parsed once, and the arrays are saved to a binary index next
+  to it, which is read instead of the csv file if it is more recent.
 
-  # Bind the elements (via a generator fn) into a new tf.data.Dataset.
-  def _generator():
-    for element in elements:
-      yield element
+  Args:
+    path_to_read_example_indices_csv: The path to a csv file written by the
+      ./filter_examples.py script.
 
-  return tf.data.Dataset.from_generator(_generator, raw_ds.output_types,
-                                        raw_ds.output_shapes)
+  Returns:
+    A dict mapping client ids to 1D int32 arrays.
+  """
+  index_path = (
+      path_to_read_example_indices_csv + EXAMPLE_INDICES_INDEX_SUFFIX)
+  if (tf.io.gfile.exists(index_path) and
+      tf.io.gfile.stat(index_path).mtime_nsec >=
+      tf.io.gfile.stat(path_to_read_example_indices_csv).mtime_nsec):
+    with tf.io.gfile.GFile(index_path, 'rb') as f:
+      with np.load(f) as index:
+        return dict(
+            zip(index['client_ids'].tolist(),
+                np.split(index['example_indices'], index['offsets'][1:-1])))
+
+  client_ids_example_indices_map = {}
+  with tf.io.gfile.GFile(path_to_read_example_indices_csv, 'r') as csvfile:
+    csvreader = csv.reader(csvfile)
+    for [key, val] in csvreader:
+      client_ids_example_indices_map[key] = _parse_example_indices(val)
+
+  # The example indices of the `i`-th client are
+  # `example_indices[offsets[i]:offsets[i + 1]]`.
+  example_indices = list(client_ids_example_indices_map.values())
+  offsets = np.cumsum([0] + [len(indices) for indices in example_indices])
+  # `np.savez` seeks in its output, which a `GFile` opened for writing does not
+  # support, so the index is built in memory first.
+  buffer = io.BytesIO()
+  np.savez(
+      buffer,
+      client_ids=np.array(list(client_ids_example_indices_map)),
+      offsets=offsets,
+      example_indices=np.concatenate([np.zeros([0], dtype=np.int32)] +
+                                     example_indices))
+  # Written to a temporary file first, so a partial index is never read.
+  tmp_index_path = index_path + '.tmp'
+  try:
+    with tf.io.gfile.GFile(tmp_index_path, 'wb') as f:
+      f.write(buffer.getvalue())
+    tf.io.gfile.rename(tmp_index_path, index_path, overwrite=True)
+  except tf.errors.OpError as e:
+    logging.warning('Could not write the example indices index %s: %s',
+                    index_path, e)
+    try:
+      tf.io.gfile.remove(tmp_index_path)
+    except tf.errors.NotFoundError:
+      pass
+  return client_ids_example_indices_map
 
 
 def _get_client_ids_inversion_and_example_indices_maps(
@@ -265,11 +332,8 @@ def _get_client_ids_inversion_and_example_indices_maps(
   # the GAN will be trained on.
   client_ids_example_indices_map = None
   if path_to_read_example_indices_csv:
-    client_ids_example_indices_map = {}
-    with tf.io.gfile.GFile(path_to_read_example_indices_csv, 'r') as csvfile:
-      csvreader = csv.reader(csvfile)
-      for [key, val] in csvreader:
-        client_ids_example_indices_map[key] = val
+    client_ids_example_indices_map = _load_example_indices_map(
+        path_to_read_example_indices_csv)
 
     set_1 = set(client_ids_example_indices_map.keys())
     set_2 = set(selected_client_ids_inversion_map.keys())
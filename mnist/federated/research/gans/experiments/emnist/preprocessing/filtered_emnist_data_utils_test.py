@@ -0,0 +1,94 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the loading of the filtered Federated EMNIST example indices."""
+
+import csv
+import os
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_federated.python.research.gans.experiments.emnist.preprocessing import filtered_emnist_data_utils as fedu
+
+
+class FilteredEmnistDataUtilsTest(tf.test.TestCase):
+
+  def _write_example_indices_csv(self, client_ids_example_indices):
+    path = os.path.join(self.create_tempdir().full_path, 'indices.csv')
+    with open(path, 'w') as csvfile:
+      csvwriter = csv.writer(csvfile)
+      for client_id, example_indices in client_ids_example_indices.items():
+        csvwriter.writerow([client_id, str(example_indices)])
+    return path
+
+  def test_parse_example_indices(self):
+    self.assertAllEqual(fedu._parse_example_indices('[7, 1, 4]'), [1, 4, 7])
+    self.assertEqual(fedu._parse_example_indices('[7, 1, 4]').dtype, np.int32)
+    self.assertAllEqual(fedu._parse_example_indices('[5]'), [5])
+    self.assertEmpty(fedu._parse_example_indices('[]'))
+
+  def test_load_example_indices_map_writes_and_reads_index(self):
+    csv_path = self._write_example_indices_csv({
+        'a': [7, 1, 4],
+        'b': [],
+        'c': [2],
+    })
+    expected_map = {'a': [1, 4, 7], 'b': [], 'c': [2]}
+
+    example_indices_map = fedu._load_example_indices_map(csv_path)
+    self.assertCountEqual(example_indices_map, expected_map)
+    for client_id, example_indices in expected_map.items():
+      self.assertAllEqual(example_indices_map[client_id], example_indices)
+    self.assertCountEqual(
+        tf.io.gfile.listdir(os.path.dirname(csv_path)),
+        ['indices.csv', 'indices.csv' + fedu.EXAMPLE_INDICES_INDEX_SUFFIX])
+
+    # The second load reads the index, rather than parsing the csv file.
+    with mock.patch.object(
+        fedu, '_parse_example_indices',
+        side_effect=AssertionError('The csv file was parsed.')):
+      reloaded_map = fedu._load_example_indices_map(csv_path)
+    self.assertCountEqual(reloaded_map, expected_map)
+    for client_id, example_indices in expected_map.items():
+      self.assertAllEqual(reloaded_map[client_id], example_indices)
+
+  def test_load_example_indices_map_parses_csv_newer_than_index(self):
+    csv_path = self._write_example_indices_csv({'a': [1]})
+    fedu._load_example_indices_map(csv_path)
+    index_path = csv_path + fedu.EXAMPLE_INDICES_INDEX_SUFFIX
+    os.utime(index_path, (0, 0))
+
+    with open(csv_path, 'w') as csvfile:
+      csv.writer(csvfile).writerow(['a', '[2, 3]'])
+    self.assertAllEqual(fedu._load_example_indices_map(csv_path)['a'], [2, 3])
+
+  def test_filter_by_example(self):
+    raw_ds = tf.data.Dataset.range(10)
+    example_indices_map = {
+        'a': fedu._parse_example_indices('[7, 1, 4]'),
+        'b': fedu._parse_example_indices('[]'),
+    }
+    self.assertEqual(
+        list(
+            fedu._filter_by_example(raw_ds, example_indices_map,
+                                    'a').as_numpy_iterator()), [1, 4, 7])
+    self.assertEmpty(
+        list(
+            fedu._filter_by_example(raw_ds, example_indices_map,
+                                    'b').as_numpy_iterator()))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -15,6 +15,7 @@
 
 import collections
 import functools
+import itertools
 import os.path
 import time
 
@@ -127,8 +128,23 @@ with utils_impl.record_new_flags() as hparam_flags:
       'wass_gp_lambda', 10.0,
       'Value to use as the multiplier on the gradient penalty, in Improved '
       'Wasserstein GAN Loss')
+  flags.DEFINE_boolean(
+      'fuse_discriminator_passes', False,
+      'If True, and wass_gp_lambda is positive, the discriminator is run once '
+      'on the generated, real and interpolated images concatenated in a '
+      'single batch, rather than once on each. The statistics of the '
+      'BatchNormalization layer of the discriminator then cover all three '
+      'sets of images, which changes the discriminator loss.')
   flags.DEFINE_integer('noise_dim', 128,
                        'Dimension of the generator input space.')
+  flags.DEFINE_integer(
+      'seed',
+      0,
+      'Seed of the generator inputs and of the sampling of clients during '
+      'training. Together with the round number, it determines the data of a '
+      'round, so that training restarted from a checkpoint is reproducible.',
+      lower_bound=0,
+      upper_bound=2**32 - 1)
 
   # Controls output data frequency.
   flags.DEFINE_integer(
@@ -143,6 +159,18 @@ with utils_impl.record_new_flags() as hparam_flags:
       'The number of federated rounds to go between saving examples of '
       'generated images.')
 
+# Execution.
+flags.DEFINE_integer(
+    'num_client_workers', None,
+    'The number of threads training the discriminator on the clients of a '
+    'round in parallel. If None, each client of a round gets its own thread.')
+
+# Evaluation.
+flags.DEFINE_integer(
+    'num_eval_batches', 1,
+    'The number of batches of generated images on which the classifier score '
+    'and Frechet distance are computed at each evaluation.')
+
 FLAGS = flags.FLAGS
 
 CLIENT_TRAIN_BATCH_SIZE = 32
@@ -155,6 +183,56 @@ def _create_gen_inputs_dataset(batch_size, noise_dim, seed=None):
       lambda _: tf.random.normal([batch_size, noise_dim], seed=seed))
 
 
+def _create_real_images_dataset_for_frechet_distance():
+  """Returns a `tf.data.Dataset` of all the real test images, in order."""
+  eval_tff_data = emnist_data_utils.create_real_images_tff_client_data(
+      split='test')
+  raw_data = eval_tff_data.create_tf_dataset_from_all_clients()
+
+  return emnist_data_utils.preprocess_img_dataset(
+      raw_data,
+      include_label=False,
+      batch_size=EVAL_BATCH_SIZE,
+      shuffle=False,
+      repeat=False)
+
+
+def _create_stateless_gen_inputs_dataset(batch_size, noise_dim, num_batches,
+                                         seed, round_num, stream):
+  """Returns a `tf.data.Dataset` of generator inputs of a round.
+
+  The inputs are drawn by a stateless RNG, keyed by `[seed, round_num]` with
+  the `stream` and the batch number folded in. So the inputs of a round do not
+  depend on the inputs drawn before it, and there is no RNG state to
+  checkpoint. The batches are prefetched, to draw them while the previous ones
+  are trained on.
+
+  Args:
+    batch_size: The number of generator inputs in a batch.
+    noise_dim: The dimension of the generator input space.
+    num_batches: The number of batches of the dataset.
+    seed: The seed of the experiment.
+    round_num: The number of the round.
+    stream: The index of the inputs in the round, 0 for the server and `i + 1`
+      for the `i`-th client.
+
+  Returns:
+    A `tf.data.Dataset` of `num_batches` tensors of shape
+    [batch_size, noise_dim].
+  """
+  # The seed and round number are separate elements of the key, so that
+  # distinct pairs never collide or overflow.
+  round_key = tf.constant([seed, round_num], dtype=tf.int64)
+  stream_key = tf.random.experimental.stateless_fold_in(round_key, stream)
+
+  def gen_inputs_fn(batch_num):
+    key = tf.random.experimental.stateless_fold_in(stream_key, batch_num)
+    return tf.random.stateless_normal([batch_size, noise_dim], seed=key)
+
+  return tf.data.Dataset.range(num_batches).map(gen_inputs_fn).prefetch(
+      num_batches)
+
+
 @functools.lru_cache(maxsize=16)
 def _create_real_images_dataset_for_eval():
   """Returns a `tf.data.Dataset` of real images."""
@@ -179,9 +257,8 @@ def _get_gan_network_models(noise_dim):
   return disc_model_fn, gen_model_fn
 
 
-def _save_images(generator, gen_inputs, outdir, file_prefix):
-  """Saves images from `generator`."""
-  gen_images = generator(gen_inputs, training=False)
+def _save_images(gen_images, outdir, file_prefix):
+  """Saves images from a generator."""
   generated_results = np.array([
       np.reshape(gen_image.numpy(), (28, 28, 1))
       for gen_image in tf.unstack(gen_images, axis=0)[:36]
@@ -201,10 +278,12 @@ def _save_images(generator, gen_inputs, outdir, file_prefix):
   pil_image.convert('L').save(f, 'PNG')
 
 
-def _compute_eval_metrics(generator, discriminator, gen_inputs, real_images,
-                          gan_loss_fns, emnist_classifier):
+def _compute_eval_metrics(generator, discriminator, gen_inputs_batches,
+                          gen_images, real_images, gan_loss_fns,
+                          emnist_classifier, real_activation_statistics):
   """Computes eval metrics for the GAN."""
-  gen_images = generator(gen_inputs, training=False)
+  # The losses are computed on the first batch, whose images are given.
+  gen_inputs = gen_inputs_batches[0]
   disc_on_real_images = discriminator(real_images, training=False)
   disc_on_gen_outputs = discriminator(gen_images, training=False)
   real_data_logits = tf.reduce_mean(disc_on_real_images)
@@ -213,9 +292,14 @@ def _compute_eval_metrics(generator, discriminator, gen_inputs, real_images,
   gen_loss = gan_loss_fns.generator_loss(generator, discriminator, gen_inputs)
   disc_loss = gan_loss_fns.discriminator_loss(generator, discriminator,
                                               gen_inputs, real_images)
-  classifier_score = eeu.emnist_score(gen_images, emnist_classifier)
-  frechet_classifier_distance = eeu.emnist_frechet_distance(
-      real_images, gen_images, emnist_classifier)
+  # The images of the other batches are generated as they are classified.
+  gen_images_batches = itertools.chain([gen_images], (
+      generator(gen_inputs, training=False)
+      for gen_inputs in gen_inputs_batches[1:]))
+  classifier_score, frechet_classifier_distance = (
+      eeu.emnist_score_and_frechet_distance(gen_images_batches,
+                                            emnist_classifier,
+                                            real_activation_statistics))
 
   metrics = collections.OrderedDict([
       ('real_data_logits', real_data_logits),
@@ -239,7 +323,8 @@ def _compute_eval_metrics(generator, discriminator, gen_inputs, real_images,
 def _get_emnist_eval_hook_fn(exp_name, output_dir, hparams_dict, gan_loss_fns,
                              gen_input_eval_dataset, real_images_eval_dataset,
                              rounds_per_save_images, path_to_output_images,
-                             emnist_classifier_for_metrics):
+                             emnist_classifier_for_metrics,
+                             real_activation_statistics, num_eval_batches):
   """Returns an eval_hook function to pass to training loops."""
   tf.io.gfile.makedirs(path_to_output_images)
   logging.info(
@@ -262,20 +347,24 @@ def _get_emnist_eval_hook_fn(exp_name, output_dir, hparams_dict, gan_loss_fns,
     start_time = time.time()
     metrics = {}
 
-    gen_inputs = next(gen_inputs_iter)
+    gen_inputs_batches = [
+        next(gen_inputs_iter) for _ in range(num_eval_batches)
+    ]
     real_images = next(real_images_iter)
+    gen_images = generator(gen_inputs_batches[0], training=False)
 
     if round_num % rounds_per_save_images == 0:
       _save_images(
-          generator,
-          gen_inputs,
+          gen_images,
           outdir=path_to_output_images,
           file_prefix='emnist_tff_gen_images_step_{:05d}'.format(round_num))
 
     # Compute eval metrics.
-    eval_metrics = _compute_eval_metrics(generator, discriminator, gen_inputs,
+    eval_metrics = _compute_eval_metrics(generator, discriminator,
+                                         gen_inputs_batches, gen_images,
                                          real_images, gan_loss_fns,
-                                         emnist_classifier_for_metrics)
+                                         emnist_classifier_for_metrics,
+                                         real_activation_statistics)
     metrics['eval'] = eval_metrics
 
     # Get counters from the server_state.
@@ -334,31 +423,41 @@ def _get_gan(gen_model_fn, disc_model_fn, gan_loss_fns, gen_optimizer,
       train_discriminator_dp_average_query=dp_average_query)
 
 
-def _train(gan, server_gen_inputs_dataset, client_gen_inputs_dataset,
+def _train(gan, server_train_batch_size, noise_dim, seed,
            client_real_images_tff_data, client_disc_train_steps,
            server_gen_train_steps, clients_per_round, total_rounds,
            rounds_per_eval, eval_hook_fn, rounds_per_checkpoint, output_dir,
            exp_name):
   """Trains the federated GAN."""
-  server_gen_inputs_iterator = iter(
-      server_gen_inputs_dataset.window(server_gen_train_steps))
-  client_gen_inputs_iterator = iter(
-      client_gen_inputs_dataset.window(client_disc_train_steps))
 
   def server_gen_inputs_fn(round_num):
-    del round_num
-    return next(server_gen_inputs_iterator)
+    return _create_stateless_gen_inputs_dataset(
+        server_train_batch_size,
+        noise_dim,
+        server_gen_train_steps,
+        seed,
+        round_num,
+        stream=0)
 
   def client_datasets_fn(round_num):
     """Forms clients_per_round number of datasets for a round of computation."""
-    del round_num
-    client_ids = np.random.choice(
+    # Seeded by the round, so that the clients of a round are the same when
+    # training restarts from a checkpoint.
+    random_state = np.random.RandomState([seed, round_num])
+    client_ids = random_state.choice(
         client_real_images_tff_data.client_ids,
         size=clients_per_round,
         replace=False)
     datasets = []
-    for client_id in client_ids:
-      datasets.append((next(client_gen_inputs_iterator),
+    for i, client_id in enumerate(client_ids):
+      gen_inputs = _create_stateless_gen_inputs_dataset(
+          CLIENT_TRAIN_BATCH_SIZE,
+          noise_dim,
+          client_disc_train_steps,
+          seed,
+          round_num,
+          stream=i + 1)
+      datasets.append((gen_inputs,
                        client_real_images_tff_data.create_tf_dataset_for_client(
                            client_id).take(client_disc_train_steps)))
     return datasets
@@ -397,8 +496,20 @@ def main(argv):
   for k, v in hparam_dict.items():
     print('{} : {} '.format(k, v))
 
+  if FLAGS.num_eval_batches < 1:
+    raise ValueError('num_eval_batches must be at least 1, got {}.'.format(
+        FLAGS.num_eval_batches))
+  if FLAGS.num_client_workers is None:
+    clients_per_thread = 1
+  elif FLAGS.num_client_workers < 1:
+    raise ValueError('num_client_workers must be at least 1, got {}.'.format(
+        FLAGS.num_client_workers))
+  else:
+    clients_per_thread = int(
+        np.ceil(FLAGS.num_clients_per_round / FLAGS.num_client_workers))
   tff.backends.native.set_local_execution_context(
-      num_clients=FLAGS.num_clients_per_round)
+      num_clients=FLAGS.num_clients_per_round,
+      clients_per_thread=clients_per_thread)
 
   # Trained classifier model.
   classifier_model = ecm.get_trained_emnist_classifier_model()
@@ -406,11 +517,15 @@ def main(argv):
   # GAN Models.
   disc_model_fn, gen_model_fn = _get_gan_network_models(FLAGS.noise_dim)
 
-  # Training datasets.
-  server_gen_inputs_dataset = _create_gen_inputs_dataset(
-      batch_size=FLAGS.server_train_batch_size, noise_dim=FLAGS.noise_dim)
-  client_gen_inputs_dataset = _create_gen_inputs_dataset(
-      batch_size=CLIENT_TRAIN_BATCH_SIZE, noise_dim=FLAGS.noise_dim)
+  # Training datasets. The generator inputs of each round are created by
+  # `_train`, this dataset only gives their format to the GAN.
+  server_gen_inputs_dataset = _create_stateless_gen_inputs_dataset(
+      batch_size=FLAGS.server_train_batch_size,
+      noise_dim=FLAGS.noise_dim,
+      num_batches=1,
+      seed=FLAGS.seed,
+      round_num=0,
+      stream=0)
 
   if FLAGS.filtering == 'by_user':
     client_real_images_train_tff_data = (
@@ -435,7 +550,8 @@ def main(argv):
 
   # Training: GAN Losses and Optimizers.
   gan_loss_fns = gan_losses.WassersteinGanLossFns(
-      grad_penalty_lambda=FLAGS.wass_gp_lambda)
+      grad_penalty_lambda=FLAGS.wass_gp_lambda,
+      fuse_discriminator_passes=FLAGS.fuse_discriminator_passes)
   disc_optimizer = tf.keras.optimizers.SGD(lr=0.0005)
   gen_optimizer = tf.keras.optimizers.SGD(lr=0.005)
 
@@ -443,6 +559,13 @@ def main(argv):
   gen_inputs_eval_dataset = _create_gen_inputs_dataset(
       batch_size=EVAL_BATCH_SIZE, noise_dim=FLAGS.noise_dim)
   real_images_eval_dataset = _create_real_images_dataset_for_eval()
+  # The statistics of the real images for the Frechet distance are the same at
+  # every evaluation, so they are computed once.
+  real_activation_statistics = eeu.get_cached_activation_statistics(
+      _create_real_images_dataset_for_frechet_distance(),
+      classifier_model,
+      cache_dir=os.path.join(FLAGS.root_output_dir, 'cache'),
+      name='emnist_test')
 
   # Eval hook.
   path_to_output_images = _get_path_to_output_image(FLAGS.root_output_dir,
@@ -451,7 +574,8 @@ def main(argv):
   eval_hook_fn = _get_emnist_eval_hook_fn(
       FLAGS.exp_name, FLAGS.root_output_dir, hparam_dict, gan_loss_fns,
       gen_inputs_eval_dataset, real_images_eval_dataset,
-      FLAGS.num_rounds_per_save_images, path_to_output_images, classifier_model)
+      FLAGS.num_rounds_per_save_images, path_to_output_images, classifier_model,
+      real_activation_statistics, FLAGS.num_eval_batches)
 
   # Form the GAN.
   gan = _get_gan(
@@ -470,8 +594,9 @@ def main(argv):
   # Training.
   _, tff_time = _train(
       gan,
-      server_gen_inputs_dataset,
-      client_gen_inputs_dataset,
+      FLAGS.server_train_batch_size,
+      FLAGS.noise_dim,
+      FLAGS.seed,
       client_real_images_train_tff_data,
       FLAGS.num_client_disc_train_steps,
       FLAGS.num_server_gen_train_steps,
@@ -65,10 +65,18 @@ class WassersteinGanLossFns(AbstractGanLossFns):
 
   To enable the gradient penalty term, set the `grad_penalty_lambda` argument in
   the constructor to a value greater than 0.0.
+
+  With the gradient penalty, the discriminator is run on the generated, real
+  and interpolated images in a single batch when `fuse_discriminator_passes`
+  is True. This only preserves the loss if the discriminator treats each
+  example of a batch independently. The BatchNormalization statistics of a
+  discriminator such as the EMNIST and one-dimensional ones instead cover all
+  three sets of images, which changes the loss.
   """
 
-  def __init__(self, grad_penalty_lambda=0.0):
+  def __init__(self, grad_penalty_lambda=0.0, fuse_discriminator_passes=False):
     self._grad_penalty_lambda = grad_penalty_lambda
+    self._fuse_discriminator_passes = fuse_discriminator_passes
 
   def generator_loss(self, generator: tf.keras.Model,
                      discriminator: tf.keras.Model, gen_inputs):
@@ -84,7 +92,8 @@ class WassersteinGanLossFns(AbstractGanLossFns):
         real_data,
         gen_images,
         discriminator,
-        grad_penalty_lambda=self._grad_penalty_lambda)
+        grad_penalty_lambda=self._grad_penalty_lambda,
+        fuse_discriminator_passes=self._fuse_discriminator_passes)
 
 
 class _ImprovedWassersteinGanLossFns(WassersteinGanLossFns):
@@ -110,24 +119,34 @@ def get_gan_loss_fns(gan_loss_fns_name):
       (gan_loss_fns_name, str([name for name in GAN_LOSS_FNS_DICT.keys()])))
 
 
+def _get_interpolates(real_images, gen_images):
+  # Forms batch of interpolated images, for use in grad penalty calculation.
+  # This is step 6 of Algorithm 1 in WGAN-GP paper. See discussion in
+  # ' Sampling distribution' part of Section 4 of the paper.
+  differences = gen_images - real_images
+  batch_size = tf.shape(differences)[0]
+  alpha_shape = [batch_size] + [1] * (differences.shape.ndims - 1)
+  alpha = tf.random.uniform(shape=alpha_shape)
+  interpolates = real_images + (alpha * differences)
+  return interpolates
+
+
+def _calculate_penalty(gradients, epsilon=1e-10):
+  # See Section 4 of the WGAN-GP paper (https://arxiv.org/abs/1704.00028),
+  # describing the additional gradient penalty term.
+  gradient_squares = tf.reduce_sum(
+      tf.square(gradients), axis=list(range(1, gradients.shape.ndims)))
+  gradient_norm = tf.sqrt(gradient_squares + epsilon)
+  penalties_squared = tf.square(gradient_norm - 1.0)
+  return tf.reduce_mean(penalties_squared)
+
+
 def _wass_grad_penalty_term(real_images,
                             gen_images,
                             discriminator: tf.keras.Model,
                             grad_penalty_lambda,
                             epsilon=1e-10):
   """Calculate the gradient penalty term used in improved Wasserstein."""
-
-  def _get_interpolates(real_images, gen_images):
-    # Forms batch of interpolated images, for use in grad penalty calculation.
-    # This is step 6 of Algorithm 1 in WGAN-GP paper. See discussion in
-    # ' Sampling distribution' part of Section 4 of the paper.
-    differences = gen_images - real_images
-    batch_size = tf.shape(differences)[0]
-    alpha_shape = [batch_size] + [1] * (differences.shape.ndims - 1)
-    alpha = tf.random.uniform(shape=alpha_shape)
-    interpolates = real_images + (alpha * differences)
-    return interpolates
-
   interpolates = _get_interpolates(real_images, gen_images)
 
   # The gradient of the discriminator ('critic') w.r.t. the interpolated images.
@@ -136,24 +155,55 @@ def _wass_grad_penalty_term(real_images,
     disc_interpolates = discriminator(interpolates, training=True)
   gradients = wass_grad_tape.gradient(disc_interpolates, interpolates)
 
-  def _calculate_penalty(gradients, epsilon=1e-10):
-    # See Section 4 of the WGAN-GP paper (https://arxiv.org/abs/1704.00028),
-    # describing the additional gradient penalty term.
-    gradient_squares = tf.reduce_sum(
-        tf.square(gradients), axis=list(range(1, gradients.shape.ndims)))
-    gradient_norm = tf.sqrt(gradient_squares + epsilon)
-    penalties_squared = tf.square(gradient_norm - 1.0)
-    return tf.reduce_mean(penalties_squared)
-
   penalty = _calculate_penalty(gradients, epsilon)
 
   return penalty * grad_penalty_lambda
 
 
+def _fused_wass_disc_scores_and_grad_penalty(real_images,
+                                             gen_images,
+                                             discriminator: tf.keras.Model,
+                                             grad_penalty_lambda,
+                                             epsilon=1e-10):
+  """Calculate the Wasserstein scores and gradient penalty in a single pass.
+
+  The discriminator is run once on the generated, real and interpolated images,
+  concatenated in a single batch. As the examples of the batch are independent,
+  the gradient of the sum of the outputs on the interpolated images w.r.t. the
+  interpolated images holds the gradient of each output w.r.t. its input.
+
+  Args:
+    real_images: A batch of real images.
+    gen_images: A batch of generated images, of the same size.
+    discriminator: A discriminator without layers mixing examples of a batch.
+    grad_penalty_lambda: The multiplier of the gradient penalty.
+    epsilon: A small value added to the squared gradient norms.
+
+  Returns:
+    A tuple `(score_on_generated, score_on_real, grad_penalty)`.
+  """
+  batch_size = tf.shape(real_images)[0]
+  interpolates = _get_interpolates(real_images, gen_images)
+
+  with tf.GradientTape() as wass_grad_tape:
+    wass_grad_tape.watch(interpolates)
+    disc_output = discriminator(
+        tf.concat([gen_images, real_images, interpolates], axis=0),
+        training=True)
+    disc_interpolates = disc_output[2 * batch_size:]
+  gradients = wass_grad_tape.gradient(disc_interpolates, interpolates)
+
+  score_on_generated = tf.reduce_mean(disc_output[:batch_size])
+  score_on_real = tf.reduce_mean(disc_output[batch_size:2 * batch_size])
+  penalty = _calculate_penalty(gradients, epsilon)
+  return score_on_generated, score_on_real, penalty * grad_penalty_lambda
+
+
 def _wass_disc_loss_fn(real_images,
                        gen_images,
                        discriminator: tf.keras.Model,
-                       grad_penalty_lambda=0.0):
+                       grad_penalty_lambda=0.0,
+                       fuse_discriminator_passes=False):
   """Calculate the Wasserstein (discriminator) loss."""
   if grad_penalty_lambda < 0.0:
     raise ValueError('grad_penalty_lambda must be greater than or equal to 0.0')
@@ -166,17 +216,24 @@ def _wass_disc_loss_fn(real_images,
       [tf.assert_equal(tf.shape(real_images)[0],
                        tf.shape(gen_images)[0])]):
 
-    disc_gen_output = discriminator(gen_images, training=True)
-    score_on_generated = tf.reduce_mean(disc_gen_output)
-
-    disc_real_output = discriminator(real_images, training=True)
-    score_on_real = tf.reduce_mean(disc_real_output)
-
-    disc_loss = score_on_generated - score_on_real
-    # Add gradient penalty, if indicated.
-    if grad_penalty_lambda > 0.0:
-      disc_loss += _wass_grad_penalty_term(real_images, gen_images,
-                                           discriminator, grad_penalty_lambda)
+    if grad_penalty_lambda > 0.0 and fuse_discriminator_passes:
+      score_on_generated, score_on_real, grad_penalty = (
+          _fused_wass_disc_scores_and_grad_penalty(real_images, gen_images,
+                                                   discriminator,
+                                                   grad_penalty_lambda))
+      disc_loss = score_on_generated - score_on_real + grad_penalty
+    else:
+      disc_gen_output = discriminator(gen_images, training=True)
+      score_on_generated = tf.reduce_mean(disc_gen_output)
+
+      disc_real_output = discriminator(real_images, training=True)
+      score_on_real = tf.reduce_mean(disc_real_output)
+
+      disc_loss = score_on_generated - score_on_real
+      # Add gradient penalty, if indicated.
+      if grad_penalty_lambda > 0.0:
+        disc_loss += _wass_grad_penalty_term(real_images, gen_images,
+                                             discriminator, grad_penalty_lambda)
 
     # Now add discriminator model regularization losses in.
     if discriminator.losses:
@@ -0,0 +1,67 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tensorflow as tf
+
+from tensorflow_federated.python.research.gans import gan_losses
+from tensorflow_federated.python.research.gans import one_dim_gan
+
+
+def _create_discriminator_without_batch_norm():
+  return tf.keras.Sequential([
+      tf.keras.layers.Input(shape=[1]),
+      tf.keras.layers.Dense(16, activation='relu'),
+      tf.keras.layers.Dense(1, activation='linear')
+  ])
+
+
+class GanLossesTest(tf.test.TestCase):
+
+  def test_fused_wasserstein_disc_loss_matches_separate_passes(self):
+    tf.random.set_seed(0)
+    generator = one_dim_gan.create_generator()
+    discriminator = _create_discriminator_without_batch_norm()
+    gen_inputs = tf.random.normal([8, one_dim_gan.NOISE_DIM])
+    real_data = tf.random.normal([8, 1], mean=2.0)
+
+    def disc_loss(fuse_discriminator_passes):
+      gan_loss_fns = gan_losses.WassersteinGanLossFns(
+          grad_penalty_lambda=10.0,
+          fuse_discriminator_passes=fuse_discriminator_passes)
+      # Both passes draw the same interpolation weights under the same seed.
+      tf.random.set_seed(1)
+      return gan_loss_fns.discriminator_loss(generator, discriminator,
+                                             gen_inputs, real_data)
+
+    fused_loss = disc_loss(True)
+    separate_loss = disc_loss(False)
+    self.assertAllClose(fused_loss, separate_loss)
+    # The gradient penalty is not trivial, so that the interpolation weights
+    # matter.
+    gan_loss_fns = gan_losses.WassersteinGanLossFns()
+    self.assertNotAllClose(
+        separate_loss,
+        gan_loss_fns.discriminator_loss(generator, discriminator, gen_inputs,
+                                        real_data))
+
+  def test_negative_grad_penalty_lambda_raises(self):
+    gan_loss_fns = gan_losses.WassersteinGanLossFns(grad_penalty_lambda=-1.0)
+    with self.assertRaises(ValueError):
+      gan_loss_fns.discriminator_loss(
+          one_dim_gan.create_generator(), one_dim_gan.create_discriminator(),
+          tf.zeros([4, one_dim_gan.NOISE_DIM]), tf.zeros([4, 1]))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -237,14 +237,24 @@ def build_server_computation(gan: GanFnsAndTypes, server_state_type: tff.Type,
   return server_computation
 
 
-def build_gan_training_process(gan: GanFnsAndTypes):
-  """Constructs a `tff.Computation` for GAN training.
+def build_gan_training_round_comps(gan: GanFnsAndTypes):
+  """Constructs the computations of the client and server phases of a round.
+
+  The client phase broadcasts the server weights, trains the discriminator on
+  each client and aggregates the client outputs. The server phase updates the
+  discriminator with the aggregated outputs and trains the generator. Running
+  the two phases one after the other is equivalent to a round of the process
+  returned by `build_gan_training_process`, and allows timing each phase.
 
   Args:
     gan: A `GanFnsAndTypes` object.
 
   Returns:
-    A `tff.templates.IterativeProcess` for GAN training.
+    A tuple `(initialize, run_clients, run_server)` of `tff.Computation`s, where
+    `initialize` returns the initial `ServerState@SERVER`, `run_clients`
+    returns a tuple `(aggregated_client_output@SERVER,
+    new_dp_averaging_state@SERVER)` and `run_server` returns the new
+    `ServerState@SERVER`.
   """
 
   # Generally, it is easiest to get the types correct by building
@@ -262,12 +272,10 @@ def build_gan_training_process(gan: GanFnsAndTypes):
     return tff.federated_value(server_initial_state(), tff.SERVER)
 
   @tff.federated_computation(
-      tff.FederatedType(server_state_type,
-                        tff.SERVER), gan.server_gen_input_type,
+      tff.FederatedType(server_state_type, tff.SERVER),
       gan.client_gen_input_type, gan.client_real_data_type)
-  def run_one_round(server_state, server_gen_inputs, client_gen_inputs,
-                    client_real_data):
-    """The `tff.Computation` to be returned."""
+  def run_clients(server_state, client_gen_inputs, client_real_data):
+    """Trains the discriminator on the clients and aggregates the outputs."""
 
     from_server = gan_training_tf_fns.FromServer(
         generator_weights=server_state.generator_weights,
@@ -304,9 +312,46 @@ def build_gan_training_process(gan: GanFnsAndTypes):
         update_weight=tff.federated_sum(client_outputs.update_weight),
         counters=tff.federated_sum(client_outputs.counters))
 
-    server_state = tff.federated_map(
+    return (tff.federated_zip(aggregated_client_output),
+            new_dp_averaging_state)
+
+  @tff.federated_computation(
+      tff.FederatedType(server_state_type, tff.SERVER),
+      gan.server_gen_input_type,
+      tff.FederatedType(client_output_type, tff.SERVER),
+      tff.FederatedType(gan.dp_averaging_state_type, tff.SERVER))
+  def run_server(server_state, server_gen_inputs, aggregated_client_output,
+                 new_dp_averaging_state):
+    """Updates the discriminator and trains the generator on the server."""
+    return tff.federated_map(
         server_computation, (server_state, server_gen_inputs,
                              aggregated_client_output, new_dp_averaging_state))
-    return server_state
+
+  return fed_server_initial_state, run_clients, run_server
+
+
+def build_gan_training_process(gan: GanFnsAndTypes):
+  """Constructs a `tff.Computation` for GAN training.
+
+  Args:
+    gan: A `GanFnsAndTypes` object.
+
+  Returns:
+    A `tff.templates.IterativeProcess` for GAN training.
+  """
+  fed_server_initial_state, run_clients, run_server = (
+      build_gan_training_round_comps(gan))
+  server_state_type = fed_server_initial_state.type_signature.result
+
+  @tff.federated_computation(server_state_type, gan.server_gen_input_type,
+                             gan.client_gen_input_type,
+                             gan.client_real_data_type)
+  def run_one_round(server_state, server_gen_inputs, client_gen_inputs,
+                    client_real_data):
+    """The `tff.Computation` to be returned."""
+    aggregated_client_output, new_dp_averaging_state = run_clients(
+        server_state, client_gen_inputs, client_real_data)
+    return run_server(server_state, server_gen_inputs, aggregated_client_output,
+                      new_dp_averaging_state)
 
   return tff.templates.IterativeProcess(fed_server_initial_state, run_one_round)
@@ -247,6 +247,43 @@ class TffGansTest(tf.test.TestCase, parameterized.TestCase):
           AFTER_2_RDS_DP_STD_DEV,
           places=5)
 
+  @parameterized.named_parameters(('no_dp', False), ('dp', True))
+  def test_build_gan_training_round_comps(self, with_dp):
+    gan = _get_gan(with_dp)
+    initialize, run_clients, run_server = (
+        tff_gans.build_gan_training_round_comps(gan))
+    server_state = initialize()
+
+    client_dataset_sizes = [1, 3]
+    client_gen_inputs = [
+        one_dim_gan.create_generator_inputs().take(i)
+        for i in client_dataset_sizes
+    ]
+    client_real_inputs = [
+        one_dim_gan.create_real_data().take(i) for i in client_dataset_sizes
+    ]
+
+    aggregated_client_output, new_dp_averaging_state = run_clients(
+        server_state, client_gen_inputs, client_real_inputs)
+    self.assertDictEqual(
+        aggregated_client_output.counters, {
+            'num_discriminator_train_examples':
+                one_dim_gan.BATCH_SIZE * sum(client_dataset_sizes)
+        })
+
+    server_state = run_server(server_state,
+                              one_dim_gan.create_generator_inputs().take(1),
+                              aggregated_client_output, new_dp_averaging_state)
+    self.assertDictEqual(
+        server_state.counters, {
+            'num_rounds':
+                1,
+            'num_generator_train_examples':
+                one_dim_gan.BATCH_SIZE,
+            'num_discriminator_train_examples':
+                one_dim_gan.BATCH_SIZE * sum(client_dataset_sizes),
+        })
+
 
 if __name__ == '__main__':
   tf.test.main()
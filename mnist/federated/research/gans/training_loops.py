@@ -13,7 +13,6 @@
 # limitations under the License.
 """TF and TFF training loops."""
 
-import os.path
 import time
 
 from absl import logging
@@ -22,7 +21,7 @@ import tensorflow as tf
 
 from tensorflow_federated.python.research.gans import gan_training_tf_fns
 from tensorflow_federated.python.research.gans import tff_gans
-from tensorflow_federated.python.research.utils import checkpoint_utils
+from tensorflow_federated.python.research.utils import checkpoint_manager
 
 CHECKPOINT_PREFIX = 'ckpt_'
 
@@ -128,11 +127,9 @@ def simple_training_loop(generator_model_fn,
 @attr.s()
 class ExperimentState(object):
   """Container from the state of a federated_training_loop."""
-  # Note: This is used only inside read_checkpoint and write_checkpoint, where
-  # any marshalling/unmarshalling logic currently lives. An alternative design
-  # makes these methods essentially generic (likely moving to checkpoint_utils),
-  # with an object of this type (where all fields are already marshalled) passed
-  # in.
+  # Note: This is the structure checkpointed by federated_training_loop. It
+  # keeps the layout of the checkpoints previously written with
+  # `checkpoint_utils.save`, so that they can still be restored.
 
   round_num = attr.ib()
   # Server state contains the generator and discriminator weights, the counters,
@@ -145,55 +142,32 @@ class ExperimentState(object):
   # get_state and from_state methods.
 
 
-def write_checkpoint(root_checkpoint_dir, server_state, round_num):
-  """Write the current experiment state to disk."""
+def create_checkpoint_manager(root_checkpoint_dir):
+  """Returns the `CheckpointManager` of a federated_training_loop, or None."""
   if root_checkpoint_dir is None:
-    return
-
-  if tf.io.gfile.exists(root_checkpoint_dir):
-    # Clean-up old checkpoints if more than 5 exist, not including the
-    # original (which captures random model initialization).
-    checkpoints = sorted(
-        tf.io.gfile.glob(
-            os.path.join(root_checkpoint_dir, CHECKPOINT_PREFIX + '*')))
-    to_remove = checkpoints[1:-1]
-    logging.info('Cleaning up %s', to_remove)
-    for checkpoint in to_remove:
-      tf.io.gfile.rmtree(checkpoint)
-
-  state = ExperimentState(round_num, server_state)
-  checkpoint_dir = os.path.join(root_checkpoint_dir,
-                                '{}{:04d}'.format(CHECKPOINT_PREFIX, round_num))
-  checkpoint_utils.save(state, checkpoint_dir)
-
-
-def read_checkpoint(checkpoint_dir, server_state):
-  """Read a previously saved experiment state to memory."""
-  obj_template = ExperimentState(round_num=0, server_state=server_state)
-  state = checkpoint_utils.load(checkpoint_dir, obj_template)
-
-  return state.server_state, state.round_num
-
-
-def maybe_read_latest_checkpoint(root_checkpoint_dir, server_state):
+    return None
+  # Writes are done in the background, and old checkpoints are cleaned up
+  # after each write, keeping only the original (which captures random model
+  # initialization) and the latest one.
+  return checkpoint_manager.TensorFileCheckpointManager(
+      root_checkpoint_dir,
+      prefix=CHECKPOINT_PREFIX,
+      keep_total=2,
+      keep_first=True)
+
+
+def maybe_read_latest_checkpoint(checkpoint_mngr, server_state):
   """Returns server_state, round_num, possibly from a recent checkpoint."""
-  if root_checkpoint_dir is None:
-    latest_checkpoint_dir = None
-  else:
-    latest_checkpoint_dir = checkpoint_utils.latest_checkpoint(
-        root_checkpoint_dir, CHECKPOINT_PREFIX)
-    logging.info('Looking for checkpoints in [%s/%s].', root_checkpoint_dir,
-                 CHECKPOINT_PREFIX)
-  if latest_checkpoint_dir is None:
-    write_checkpoint(root_checkpoint_dir, server_state, 0)
-    logging.info('No previous checkpoints, initializing experiment.')
+  if checkpoint_mngr is None:
+    logging.info('No checkpoint directory, initializing experiment.')
     return server_state, 0
+  state, round_num = checkpoint_mngr.load_latest_checkpoint_or_default(
+      ExperimentState(round_num=0, server_state=server_state))
+  if round_num == 0:
+    logging.info('No previous checkpoints, initializing experiment.')
   else:
-    server_state, round_num = read_checkpoint(latest_checkpoint_dir,
-                                              server_state)
-    round_num = int(round_num.numpy())
     logging.info('Restarting from checkpoint round %d.', round_num)
-    return server_state, round_num
+  return state.server_state, round_num
 
 
 def federated_training_loop(gan: tff_gans.GanFnsAndTypes,
@@ -206,6 +180,10 @@ def federated_training_loop(gan: tff_gans.GanFnsAndTypes,
                             root_checkpoint_dir=None):
   """A simple federated training loop.
 
+  Each round runs the client and server phases of
+  `tff_gans.build_gan_training_round_comps` one after the other, and logs the
+  time taken by each phase.
+
   Args:
     gan: A `GanFnsAndTypes` object.
     server_gen_inputs_fn: A function that takes the round number, and returns a
@@ -227,14 +205,16 @@ def federated_training_loop(gan: tff_gans.GanFnsAndTypes,
   """
   logging.info('Starting federated_training_loop.')
   start_time = time.time()
-  process = tff_gans.build_gan_training_process(gan)
-  server_state = process.initialize()
+  fed_server_initial_state, run_clients, run_server = (
+      tff_gans.build_gan_training_round_comps(gan))
+  server_state = fed_server_initial_state()
   logging.info(
       'Built processes and computed initial state in {:.2f} seconds'.format(
           time.time() - start_time))
 
+  checkpoint_mngr = create_checkpoint_manager(root_checkpoint_dir)
   server_state, round_num = maybe_read_latest_checkpoint(
-      root_checkpoint_dir, server_state)
+      checkpoint_mngr, server_state)
 
   start_time = time.time()
   start_round_num = round_num
@@ -264,13 +244,24 @@ def federated_training_loop(gan: tff_gans.GanFnsAndTypes,
       do_eval(round_num, server_state)
 
     client_gen_inputs, client_real_inputs = zip(*client_datasets_fn(round_num))
-    server_state = process.next(server_state, server_gen_inputs_fn(round_num),
-                                client_gen_inputs, client_real_inputs)
+    round_start_time = time.time()
+    aggregated_client_output, new_dp_averaging_state = run_clients(
+        server_state, client_gen_inputs, client_real_inputs)
+    client_time = time.time() - round_start_time
+    server_state = run_server(server_state, server_gen_inputs_fn(round_num),
+                              aggregated_client_output, new_dp_averaging_state)
+    server_time = time.time() - round_start_time - client_time
+    logging.info(
+        'Round #%d: %.2f seconds of client computation, %.2f seconds of '
+        'server computation.', round_num, client_time, server_time)
 
     round_num += 1
-    if round_num % rounds_per_checkpoint == 0:
-      write_checkpoint(root_checkpoint_dir, server_state, round_num)
+    if checkpoint_mngr is not None and round_num % rounds_per_checkpoint == 0:
+      checkpoint_mngr.save_checkpoint(
+          ExperimentState(round_num, server_state), round_num)
 
+  if checkpoint_mngr is not None:
+    checkpoint_mngr.wait_for_pending_write()
   train_time = time.time() - start_time
   do_eval(total_rounds, server_state)
   return server_state, train_time
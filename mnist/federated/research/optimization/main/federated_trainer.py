@@ -17,31 +17,53 @@ Specifically, we create (according to flags) an iterative processes that allows
 for client and server learning rate schedules, as well as various client and
 server optimization methods. For more details on the learning rate scheduling
 and optimization methods, see `shared/optimizer_utils.py`. For details on the
-iterative process, see `shared/fed_avg_schedule.py`.
+iterative process, see `shared/fed_avg_schedule.py`, or
+`shared/hierarchical_fed_avg.py` when client updates are aggregated through
+edges with `--num_edges`.
+
+With `--sweep`, several trials of a hyperparameter grid are run in this process,
+one after the other. The trials share the loaded datasets, as well as the
+iterative processes of trials whose computations are the same.
+
+Only the module of `--task` is imported, and the time spent in each phase of
+the startup of a trial is logged, see `_log_startup_secs`.
 """
 
 import collections
-from typing import Any, Callable, Optional
+import contextlib
+import importlib
+import pprint
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional
 
 from absl import app
 from absl import flags
+from absl import logging
 import tensorflow as tf
 import tensorflow_federated as tff
 
-from tensorflow_federated.python.research.optimization.cifar100 import federated_cifar100
-from tensorflow_federated.python.research.optimization.emnist import federated_emnist
-from tensorflow_federated.python.research.optimization.emnist_ae import federated_emnist_ae
-from tensorflow_federated.python.research.optimization.shakespeare import federated_shakespeare
 from tensorflow_federated.python.research.optimization.shared import fed_avg_schedule
+from tensorflow_federated.python.research.optimization.shared import hierarchical_fed_avg
 from tensorflow_federated.python.research.optimization.shared import optimizer_utils
-from tensorflow_federated.python.research.optimization.stackoverflow import federated_stackoverflow
-from tensorflow_federated.python.research.optimization.stackoverflow_lr import federated_stackoverflow_lr
+from tensorflow_federated.python.research.optimization.shared import precision_utils
+# Imported for the flags of the training loop, which the task modules use.
+from tensorflow_federated.python.research.utils import training_loop  # pylint: disable=unused-import
 from tensorflow_federated.python.research.utils import utils_impl
+from tensorflow_federated.python.research.utils.datasets import dataset_cache
+
+_OPTIMIZATION_PACKAGE = 'tensorflow_federated.python.research.optimization'
+
+# The module running each task, imported when the task is run.
+_TASK_MODULES = collections.OrderedDict([
+    ('cifar100', 'cifar100.federated_cifar100'),
+    ('emnist_cr', 'emnist.federated_emnist'),
+    ('emnist_ae', 'emnist_ae.federated_emnist_ae'),
+    ('shakespeare', 'shakespeare.federated_shakespeare'),
+    ('stackoverflow_nwp', 'stackoverflow.federated_stackoverflow'),
+    ('stackoverflow_lr', 'stackoverflow_lr.federated_stackoverflow_lr'),
+])
 
-_SUPPORTED_TASKS = [
-    'cifar100', 'emnist_cr', 'emnist_ae', 'shakespeare', 'stackoverflow_nwp',
-    'stackoverflow_lr'
-]
+_SUPPORTED_TASKS = list(_TASK_MODULES.keys())
 
 # Defining optimizer flags
 with utils_impl.record_hparam_flags():
@@ -62,6 +84,21 @@ with utils_impl.record_hparam_flags():
                        'How many clients to sample per round.')
   flags.DEFINE_integer('client_datasets_random_seed', 1,
                        'Random seed for client sampling.')
+  flags.DEFINE_enum(
+      'client_precision', 'float32', precision_utils.SUPPORTED_PRECISIONS,
+      'The Keras precision policy used to build the client models. Under the '
+      'mixed policies layers compute in 16 bits, while variables (and hence '
+      'the model deltas sent to the server) are kept in float32. The server '
+      'and evaluation models are always built in float32.')
+  flags.DEFINE_boolean(
+      'use_flat_server_update', False,
+      'Whether to apply the server optimizer as one fused update on a flat '
+      'parameter vector, rather than variable by variable.')
+  flags.DEFINE_integer(
+      'num_edges', 0, 'If positive, client updates are aggregated through '
+      'this many edge aggregators, training the clients of one edge at a time '
+      'so that only one edge of client updates is held in memory. See '
+      '`shared/hierarchical_fed_avg.py`.')
 
   # CIFAR-100 flags
   flags.DEFINE_integer('cifar100_crop_size', 24, 'The height and width of '
@@ -110,19 +147,89 @@ with utils_impl.record_hparam_flags():
                        'Max number of training '
                        'sentences to use per user.')
 
-FLAGS = flags.FLAGS
-
-
-def main(argv):
-  if len(argv) > 1:
-    raise app.UsageError('Expected no command-line arguments, '
-                         'got: {}'.format(argv))
+flags.DEFINE_string(
+    'artifact_cache_dir', None, 'Local directory caching artifacts derived '
+    'from the datasets, such as vocabularies, across runs. If not set, they '
+    'are derived in every run.')
+flags.DEFINE_multi_string(
+    'sweep', None, 'Hyperparameter values of an in-process sweep, as '
+    '`name=value1,value2,...`. Each combination of values is run as a trial, '
+    'named after --experiment_name and its hyperparameters.')
 
-  client_optimizer_fn = optimizer_utils.create_optimizer_fn_from_flags('client')
-  server_optimizer_fn = optimizer_utils.create_optimizer_fn_from_flags('server')
+FLAGS = flags.FLAGS
 
-  client_lr_schedule = optimizer_utils.create_lr_schedule_from_flags('client')
-  server_lr_schedule = optimizer_utils.create_lr_schedule_from_flags('server')
+# The flags which do not change the computations of the iterative process.
+# Trials differing only in these flags share the same iterative process.
+_FLAGS_NOT_IN_ITERATIVE_PROCESS = frozenset([
+    'experiment_name', 'root_output_dir', 'total_rounds',
+    'write_metrics_with_bz2', 'rounds_per_eval', 'rounds_per_train_eval',
+    'rounds_per_checkpoint', 'rounds_per_profile', 'clients_per_round',
+    'client_datasets_random_seed'
+])
+
+# The iterative processes built in this process, keyed by the values of the
+# flags they depend on.
+_iterative_processes = {}
+
+
+def _get_iterative_process_key():
+  return tuple((name, FLAGS[name].value)
+               for name in utils_impl.get_hparam_flags()
+               if name not in _FLAGS_NOT_IN_ITERATIVE_PROCESS)
+
+
+@contextlib.contextmanager
+def _record_secs(startup_secs, phase):
+  start_time = time.time()
+  yield
+  startup_secs[phase] = time.time() - start_time
+
+
+def _log_startup_secs(startup_secs, start_time):
+  """Logs the time spent in each phase of the startup of a trial.
+
+  Args:
+    startup_secs: A dict mapping the phases of the startup to their duration,
+      in seconds. The time spent loading datasets and deriving artifacts since
+      the last report is added to it.
+    start_time: The start time of the trial.
+  """
+  for name, secs in dataset_cache.pop_load_secs().items():
+    startup_secs['load_' + name] = secs
+  startup_secs['total'] = time.time() - start_time
+  logging.info('Startup of the trial, until the first round (secs):\n%s',
+               pprint.pformat(dict(startup_secs)))
+
+
+def _run_trial():
+  """Runs federated training on `--task`, configured by the current flags."""
+  start_time = time.time()
+  startup_secs = collections.OrderedDict()
+  # Clears the load times of previous trials.
+  dataset_cache.pop_load_secs()
+
+  if FLAGS.task not in _TASK_MODULES:
+    raise ValueError(
+        '--task flag {} is not supported, must be one of {}.'.format(
+            FLAGS.task, _SUPPORTED_TASKS))
+  if FLAGS.num_edges > 0 and FLAGS.use_flat_server_update:
+    raise ValueError('--use_flat_server_update is not supported with '
+                     '--num_edges.')
+  with _record_secs(startup_secs, 'import_task_module'):
+    task_module = importlib.import_module('{}.{}'.format(
+        _OPTIMIZATION_PACKAGE, _TASK_MODULES[FLAGS.task]))
+
+  with _record_secs(startup_secs, 'create_optimizers'):
+    client_optimizer_fn = precision_utils.wrap_optimizer_fn(
+        optimizer_utils.create_optimizer_fn_from_flags('client'),
+        FLAGS.client_precision)
+    server_optimizer_fn = optimizer_utils.create_optimizer_fn_from_flags(
+        'server')
+
+    client_lr_schedule = optimizer_utils.create_lr_schedule_from_flags(
+        'client')
+    server_lr_schedule = optimizer_utils.create_lr_schedule_from_flags(
+        'server')
 
   def iterative_process_builder(
       model_fn: Callable[[], tff.learning.Model],
@@ -145,15 +252,44 @@ def main(argv):
     Returns:
       A `tff.templates.IterativeProcess`.
     """
-
-    return fed_avg_schedule.build_fed_avg_process(
-        model_fn=model_fn,
-        client_optimizer_fn=client_optimizer_fn,
-        client_lr=client_lr_schedule,
-        server_optimizer_fn=server_optimizer_fn,
-        server_lr=server_lr_schedule,
-        client_weight_fn=client_weight_fn,
-        dataset_preprocess_comp=dataset_preprocess_comp)
+    # Only the client models are built with `--client_precision`, the server
+    # and evaluation models are built in float32.
+    client_model_fn = precision_utils.wrap_model_fn(model_fn,
+                                                    FLAGS.client_precision)
+    key = _get_iterative_process_key()
+    if key in _iterative_processes:
+      logging.info('Reusing the iterative process of a previous trial.')
+      iterative_process = _iterative_processes[key]
+    else:
+      with _record_secs(startup_secs, 'build_iterative_process'):
+        if FLAGS.num_edges > 0:
+          iterative_process = (
+              hierarchical_fed_avg.build_hierarchical_fed_avg_process(
+                  model_fn=model_fn,
+                  client_optimizer_fn=client_optimizer_fn,
+                  num_edges=FLAGS.num_edges,
+                  client_lr=client_lr_schedule,
+                  server_optimizer_fn=server_optimizer_fn,
+                  server_lr=server_lr_schedule,
+                  client_weight_fn=client_weight_fn,
+                  dataset_preprocess_comp=dataset_preprocess_comp,
+                  client_model_fn=client_model_fn))
+        else:
+          iterative_process = fed_avg_schedule.build_fed_avg_process(
+              model_fn=model_fn,
+              client_optimizer_fn=client_optimizer_fn,
+              client_lr=client_lr_schedule,
+              server_optimizer_fn=server_optimizer_fn,
+              server_lr=server_lr_schedule,
+              client_weight_fn=client_weight_fn,
+              dataset_preprocess_comp=dataset_preprocess_comp,
+              use_flat_server_update=FLAGS.use_flat_server_update,
+              client_model_fn=client_model_fn)
+      _iterative_processes[key] = iterative_process
+    # The tasks build the iterative process once their data is loaded, right
+    # before starting the training loop.
+    _log_startup_secs(startup_secs, start_time)
+    return iterative_process
 
   assign_weights_fn = fed_avg_schedule.ServerState.assign_weights_to_keras_model
 
@@ -167,18 +303,18 @@ def main(argv):
   ])
 
   if FLAGS.task == 'cifar100':
-    federated_cifar100.run_federated(
+    task_module.run_federated(
         **common_args, crop_size=FLAGS.cifar100_crop_size)
 
   elif FLAGS.task == 'emnist_cr':
-    federated_emnist.run_federated(
+    task_module.run_federated(
         **common_args, emnist_model=FLAGS.emnist_cr_model)
 
   elif FLAGS.task == 'emnist_ae':
-    federated_emnist_ae.run_federated(**common_args)
+    task_module.run_federated(**common_args)
 
   elif FLAGS.task == 'shakespeare':
-    federated_shakespeare.run_federated(
+    task_module.run_federated(
         **common_args, sequence_length=FLAGS.shakespeare_sequence_length)
 
   elif FLAGS.task == 'stackoverflow_nwp':
@@ -186,19 +322,97 @@ def main(argv):
     for flag_name in FLAGS:
       if flag_name.startswith('so_nwp_'):
         so_nwp_flags[flag_name[7:]] = FLAGS[flag_name].value
-    federated_stackoverflow.run_federated(**common_args, **so_nwp_flags)
+    task_module.run_federated(**common_args, **so_nwp_flags)
 
   elif FLAGS.task == 'stackoverflow_lr':
     so_lr_flags = collections.OrderedDict()
     for flag_name in FLAGS:
       if flag_name.startswith('so_lr_'):
         so_lr_flags[flag_name[6:]] = FLAGS[flag_name].value
-    federated_stackoverflow_lr.run_federated(**common_args, **so_lr_flags)
+    task_module.run_federated(**common_args, **so_lr_flags)
+
+
+def _parse_sweep(sweep: List[str]) -> Dict[str, List[str]]:
+  """Returns the values of each hyperparameter of the `--sweep` entries."""
+  hparam_flags = utils_impl.get_hparam_flags()
+  grid = collections.OrderedDict()
+  for entry in sweep:
+    name, separator, values = entry.partition('=')
+    if not separator or not values:
+      raise ValueError('--sweep entries must be of the form '
+                       'name=value1,value2,..., found {}'.format(entry))
+    if (name not in hparam_flags or
+        name in ('task', 'experiment_name', 'root_output_dir')):
+      raise ValueError('--sweep can only set the hyperparameters of a task, '
+                       'found {}'.format(name))
+    grid[name] = values.split(',')
+  return grid
+
+
+@contextlib.contextmanager
+def _override_flags(flag_values: Mapping[str, str]):
+  """Parses `flag_values` into the flags, which are restored on exit."""
+  saved_flags = [(FLAGS[name], FLAGS[name].value, FLAGS[name].present)
+                 for name in flag_values]
+  try:
+    for name, value in flag_values.items():
+      FLAGS[name].parse(value)
+    yield
+  finally:
+    for flag, value, present in saved_flags:
+      flag.value = value
+      flag.present = present
+
+
+def _run_sweep(grid: Mapping[str, List[str]]):
+  """Runs the trials of `grid` one after the other, in this process.
+
+  Each trial writes its outputs under its own experiment name. The datasets
+  are loaded once for all trials, see `dataset_cache.cache_loaded_datasets`.
+
+  Args:
+    grid: A dict mapping hyperparameter flags to the values to try.
+
+  Raises:
+    ValueError: If `--experiment_name` is not set.
+    RuntimeError: If any trial failed. The other trials still run.
+  """
+  if not FLAGS.experiment_name:
+    raise ValueError('--experiment_name must be set to run a sweep.')
+  trials = list(utils_impl.iter_grid(grid))
+  failed_trials = []
+  with dataset_cache.cache_loaded_datasets():
+    for idx, trial in enumerate(trials):
+      experiment_name = '{}-{}'.format(FLAGS.experiment_name,
+                                       utils_impl.hparams_to_str(idx, trial))
+      logging.info('Running trial %d of %d: %s', idx + 1, len(trials),
+                   experiment_name)
+      start_time = time.time()
+      with _override_flags(dict(trial, experiment_name=experiment_name)):
+        try:
+          _run_trial()
+        except Exception:  # pylint: disable=broad-except
+          logging.exception('Trial %s failed.', experiment_name)
+          failed_trials.append(experiment_name)
+      logging.info('Trial %s ran in %.1f s.', experiment_name,
+                   time.time() - start_time)
+      # Frees the Keras models of the trial.
+      tf.keras.backend.clear_session()
+  if failed_trials:
+    raise RuntimeError('{} of {} trials failed: {}'.format(
+        len(failed_trials), len(trials), failed_trials))
+
+
+def main(argv):
+  if len(argv) > 1:
+    raise app.UsageError('Expected no command-line arguments, '
+                         'got: {}'.format(argv))
 
+  dataset_cache.set_artifact_cache_dir(FLAGS.artifact_cache_dir)
+  if FLAGS.sweep:
+    _run_sweep(_parse_sweep(FLAGS.sweep))
   else:
-    raise ValueError(
-        '--task flag {} is not supported, must be one of {}.'.format(
-            FLAGS.task, _SUPPORTED_TASKS))
+    _run_trial()
 
 
 if __name__ == '__main__':
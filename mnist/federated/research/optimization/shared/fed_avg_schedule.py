@@ -37,6 +37,8 @@ import attr
 import tensorflow as tf
 import tensorflow_federated as tff
 
+from tensorflow_federated.python.research.optimization.shared import flat_optimizers
+from tensorflow_federated.python.research.optimization.shared import precision_utils
 from tensorflow_federated.python.research.utils import adapters
 from tensorflow_federated.python.tensorflow_libs import tensor_utils
 
@@ -143,6 +145,56 @@ def server_update(model, server_optimizer, server_state, weights_delta):
       round_num=server_state.round_num + 1.0)
 
 
+def _flat_optimizer_state(iterations, slots):
+  """Returns the optimizer state used by `flat_server_update`."""
+  optimizer_state = collections.OrderedDict(iterations=iterations)
+  optimizer_state.update(slots)
+  return optimizer_state
+
+
+@tf.function
+def flat_server_update(layout, flat_optimizer, server_state, weights_delta):
+  """Updates `server_state` with one fused step on a flat parameter vector.
+
+  Unlike `server_update`, this does not assign the server state to the
+  variables of a model and optimizer. Instead the trainable weights, the update
+  and the optimizer slots are each kept as one contiguous vector, the optimizer
+  step is applied as a few vectorized ops, and the result is split back into
+  tensors.
+
+  Args:
+    layout: A `flat_optimizers.ParameterLayout` of the trainable weights.
+    flat_optimizer: A `flat_optimizers.FlatOptimizer`.
+    server_state: A `ServerState` whose `optimizer_state` is a
+      `collections.OrderedDict` of the optimizer iterations and flat slots.
+    weights_delta: An update to the trainable variables of the model.
+
+  Returns:
+    An updated `ServerState`.
+  """
+  flat_delta = layout.flatten(weights_delta)
+  if not tf.reduce_all(tf.math.is_finite(flat_delta)):
+    return server_state
+
+  optimizer_state = server_state.optimizer_state
+  iterations = optimizer_state['iterations']
+  slots = collections.OrderedDict(
+      (name, slot) for name, slot in optimizer_state.items()
+      if name != 'iterations')
+  # As in `server_update`, weights_delta is viewed as a negative gradient.
+  flat_var, slots = flat_optimizer.apply(
+      layout, layout.flatten(server_state.model.trainable), -1.0 * flat_delta,
+      slots, iterations)
+
+  return tff.utils.update_state(
+      server_state,
+      model=ModelWeights(
+          trainable=tuple(layout.unflatten(flat_var)),
+          non_trainable=server_state.model.non_trainable),
+      optimizer_state=_flat_optimizer_state(iterations + 1, slots),
+      round_num=server_state.round_num + 1.0)
+
+
 @attr.s(eq=False, order=False, frozen=True)
 class ClientOutput(object):
   """Structure for outputs returned from clients during federated optimization.
@@ -197,11 +249,20 @@ def create_client_update_fn():
     model_weights = _get_weights(model)
     tff.utils.assign(model_weights, initial_weights)
 
+    # Under a mixed float16 policy the loss is scaled before differentiation
+    # to avoid gradient underflow, see `precision_utils.wrap_optimizer_fn`.
+    scale_loss = precision_utils.is_loss_scale_optimizer(client_optimizer)
+
     num_examples = tf.constant(0, dtype=tf.int32)
     for batch in dataset:
       with tf.GradientTape() as tape:
         output = model.forward_pass(batch)
-      grads = tape.gradient(output.loss, model_weights.trainable)
+        loss = output.loss
+        if scale_loss:
+          loss = client_optimizer.get_scaled_loss(loss)
+      grads = tape.gradient(loss, model_weights.trainable)
+      if scale_loss:
+        grads = client_optimizer.get_unscaled_gradients(grads)
       grads_and_vars = zip(grads, model_weights.trainable)
       client_optimizer.apply_gradients(grads_and_vars)
       num_examples += tf.shape(output.predictions)[0]
@@ -258,6 +319,39 @@ def build_server_init_fn(
   return server_init_tf
 
 
+def build_flat_server_init_fn(
+    model_fn: ModelBuilder,
+    server_optimizer_fn: Callable[[], tf.keras.optimizers.Optimizer],
+    layout: flat_optimizers.ParameterLayout):
+  """Builds a `tff.tf_computation` returning the initial state of a flat update.
+
+  This is the counterpart of `build_server_init_fn` for `flat_server_update`.
+  The attribute `ServerState.optimizer_state` is a `collections.OrderedDict`
+  holding the number of optimizer iterations and the flat optimizer slots.
+
+  Args:
+    model_fn: A no-arg function that returns a `tff.learning.Model`.
+    server_optimizer_fn: A no-arg function that returns a
+      `tf.keras.optimizers.Optimizer` supported by
+      `flat_optimizers.from_keras_optimizer`.
+    layout: A `flat_optimizers.ParameterLayout` of the trainable weights.
+
+  Returns:
+    A `tff.tf_computation` that returns initial `ServerState`.
+  """
+
+  @tff.tf_computation
+  def server_init_tf():
+    flat_optimizer = flat_optimizers.from_keras_optimizer(server_optimizer_fn())
+    return ServerState(
+        model=_get_weights(model_fn()),
+        optimizer_state=_flat_optimizer_state(
+            tf.constant(0, tf.int64), flat_optimizer.initialize(layout)),
+        round_num=0.0)
+
+  return server_init_tf
+
+
 class FederatedAveragingProcessAdapter(adapters.IterativeProcessPythonAdapter):
   """Converts iterative process results from anonymous tuples.
 
@@ -289,6 +383,8 @@ def build_fed_avg_process(
     server_lr: Union[float, LRScheduleFn] = 1.0,
     client_weight_fn: Optional[ClientWeightFn] = None,
     dataset_preprocess_comp: Optional[tff.Computation] = None,
+    use_flat_server_update: bool = False,
+    client_model_fn: Optional[ModelBuilder] = None,
 ) -> FederatedAveragingProcessAdapter:
   """Builds the TFF computations for optimization using federated averaging.
 
@@ -310,10 +406,20 @@ def build_fed_avg_process(
       pipeline on the clients. The computation must take a squence of values
       and return a sequence of values, or in TFF type shorthand `(U* -> V*)`. If
       `None`, no dataset preprocessing is applied.
+    use_flat_server_update: Whether to apply the server optimizer as one fused
+      step on a flat parameter vector, see `flat_server_update`. The server
+      optimizer must be supported by `flat_optimizers.from_keras_optimizer`.
+    client_model_fn: An optional no-arg function returning the
+      `tff.learning.Model` trained on the clients, with the same weights as the
+      model of `model_fn`, e.g. built under a mixed precision policy by
+      `precision_utils.wrap_model_fn`. Defaults to `model_fn`, which builds the
+      server model.
 
   Returns:
     A `FederatedAveragingProcessAdapter`.
   """
+  if client_model_fn is None:
+    client_model_fn = model_fn
 
   client_lr_schedule = client_lr
   if not callable(client_lr_schedule):
@@ -325,10 +431,19 @@ def build_fed_avg_process(
 
   dummy_model = model_fn()
 
-  server_init_tf = build_server_init_fn(
-      model_fn,
-      # Initialize with the learning rate for round zero.
-      lambda: server_optimizer_fn(server_lr_schedule(0)))
+  if use_flat_server_update:
+    layout = flat_optimizers.ParameterLayout.from_variables(
+        dummy_model.trainable_variables)
+    server_init_tf = build_flat_server_init_fn(
+        model_fn,
+        # Initialize with the learning rate for round zero.
+        lambda: server_optimizer_fn(server_lr_schedule(0)),
+        layout)
+  else:
+    server_init_tf = build_server_init_fn(
+        model_fn,
+        # Initialize with the learning rate for round zero.
+        lambda: server_optimizer_fn(server_lr_schedule(0)))
   server_state_type = server_init_tf.type_signature.result
   model_weights_type = server_state_type.model
   round_num_type = server_state_type.round_num
@@ -352,14 +467,18 @@ def build_fed_avg_process(
     client_lr = client_lr_schedule(round_num)
     client_optimizer = client_optimizer_fn(client_lr)
     client_update = create_client_update_fn()
-    return client_update(model_fn(), tf_dataset, initial_model_weights,
+    return client_update(client_model_fn(), tf_dataset, initial_model_weights,
                          client_optimizer, client_weight_fn)
 
   @tff.tf_computation(server_state_type, model_weights_type.trainable)
   def server_update_fn(server_state, model_delta):
-    model = model_fn()
     server_lr = server_lr_schedule(server_state.round_num)
     server_optimizer = server_optimizer_fn(server_lr)
+    if use_flat_server_update:
+      flat_optimizer = flat_optimizers.from_keras_optimizer(server_optimizer)
+      return flat_server_update(layout, flat_optimizer, server_state,
+                                model_delta)
+    model = model_fn()
     # We initialize the server optimizer variables to avoid creating them
     # within the scope of the tf.function server_update.
     _initialize_optimizer_vars(model, server_optimizer)
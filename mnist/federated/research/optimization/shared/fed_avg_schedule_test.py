@@ -21,6 +21,7 @@ import tensorflow as tf
 import tensorflow_federated as tff
 
 from tensorflow_federated.python.research.optimization.shared import fed_avg_schedule
+from tensorflow_federated.python.research.optimization.shared import precision_utils
 
 _Batch = collections.namedtuple('Batch', ['x', 'y'])
 
@@ -72,6 +73,28 @@ class ModelDeltaProcessTest(tf.test.TestCase):
     _, train_outputs, _ = self._run_rounds(iterproc_adapter, federated_data, 5)
     self.assertLess(train_outputs[-1]['loss'], train_outputs[0]['loss'])
 
+  def test_fed_avg_with_flat_server_update_matches_keras_update(self):
+    federated_data = [[_batch_fn()]]
+    server_optimizer_fn = lambda lr: tf.keras.optimizers.Adam(lr * 0.1)
+
+    keras_state, keras_outputs, _ = self._run_rounds(
+        fed_avg_schedule.build_fed_avg_process(
+            _uncompiled_model_builder,
+            client_optimizer_fn=tf.keras.optimizers.SGD,
+            server_optimizer_fn=server_optimizer_fn), federated_data, 3)
+    flat_state, flat_outputs, _ = self._run_rounds(
+        fed_avg_schedule.build_fed_avg_process(
+            _uncompiled_model_builder,
+            client_optimizer_fn=tf.keras.optimizers.SGD,
+            server_optimizer_fn=server_optimizer_fn,
+            use_flat_server_update=True), federated_data, 3)
+
+    self.assertAllClose(flat_state.model.trainable,
+                        keras_state.model.trainable)
+    self.assertAllClose([o['loss'] for o in flat_outputs],
+                        [o['loss'] for o in keras_outputs])
+    self.assertEqual(flat_state.optimizer_state['iterations'], 3)
+
   def test_fed_avg_with_custom_client_weight_fn(self):
     federated_data = [[_batch_fn()]]
 
@@ -109,6 +132,20 @@ class ModelDeltaProcessTest(tf.test.TestCase):
                             client_optimizer)
     self.assertAllEqual(self.evaluate(outputs.client_weight), 0)
 
+  def test_client_update_with_loss_scale_optimizer(self):
+    federated_data = [_batch_fn()]
+    model = _uncompiled_model_builder()
+    client_optimizer = precision_utils.wrap_optimizer_fn(
+        tf.keras.optimizers.SGD, 'mixed_float16')(0.1)
+    client_update = fed_avg_schedule.create_client_update_fn()
+    outputs = client_update(model, federated_data,
+                            fed_avg_schedule._get_weights(model),
+                            client_optimizer)
+    self.assertAllEqual(self.evaluate(outputs.client_weight), 1)
+    self.assertTrue(
+        all(np.isfinite(x).all()
+            for x in self.evaluate(tf.nest.flatten(outputs.weights_delta))))
+
   def test_server_update_with_nan_data_is_noop(self):
     federated_data = [[_batch_fn(has_nan=True)]]
 
@@ -0,0 +1,367 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""An implementation of asynchronous, buffered federated averaging.
+
+Unlike `fed_avg_schedule.build_fed_avg_process`, where every round waits for
+all sampled clients, clients here train concurrently against the model version
+that was current when they started. The server accumulates incoming client
+updates into a buffer, and applies a server optimizer step whenever `K` updates
+have arrived. Updates computed against older model versions are down-weighted
+according to their staleness.
+
+This is based on the paper:
+
+Federated Learning with Buffered Asynchronous Aggregation
+    John Nguyen, Kshitiz Malik, Hongyuan Zhan, Ashkan Yousefpour,
+    Michael Rabbat, Mani Malek, Dzmitry Huba. 2021.
+    https://arxiv.org/abs/2106.06639
+
+Since TFF does not model asynchrony, `AsyncSimulator` drives the process from
+Python using a virtual clock and per-client duration distributions.
+"""
+
+import collections
+import heapq
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.optimization.shared import fed_avg_schedule
+
+# Convenience type aliases.
+ModelBuilder = Callable[[], tff.learning.Model]
+OptimizerBuilder = Callable[[float], tf.keras.optimizers.Optimizer]
+ClientWeightFn = Callable[..., float]
+LRScheduleFn = Callable[[int], float]
+StalenessWeightFn = Callable[[int], float]
+DurationFn = Callable[[Hashable, np.random.RandomState], float]
+
+
+def polynomial_staleness_weight(staleness: int, exponent: float = 0.5) -> float:
+  """Returns the weight `(1 + staleness)^-exponent` of a stale update."""
+  return (1.0 + staleness)**(-exponent)
+
+
+def build_lognormal_duration_fn(
+    mean_compute_secs: float,
+    mean_latency_secs: float,
+    sigma: float = 1.0,
+    client_slowdown: Optional[Mapping[Hashable, float]] = None) -> DurationFn:
+  """Returns a function sampling the virtual duration of a client update.
+
+  The compute time of a client is log-normally distributed with mean
+  `mean_compute_secs`, multiplied by an optional per-client slowdown factor. The
+  network latency is exponentially distributed with mean `mean_latency_secs`.
+
+  Args:
+    mean_compute_secs: The mean time spent training on a client.
+    mean_latency_secs: The mean time spent downloading the model and uploading
+      the update.
+    sigma: The standard deviation of the log of the compute time. Larger values
+      produce heavier tailed stragglers.
+    client_slowdown: An optional mapping from client id to a multiplicative
+      factor applied to its compute time. Clients not in the mapping use 1.0.
+
+  Returns:
+    A function accepting a client id and a `np.random.RandomState`, and
+    returning a non-negative float duration.
+  """
+  client_slowdown = client_slowdown or {}
+  mu = np.log(mean_compute_secs) - 0.5 * sigma**2
+
+  def duration_fn(client_id, random_state):
+    compute_secs = random_state.lognormal(mean=mu, sigma=sigma)
+    latency_secs = random_state.exponential(scale=mean_latency_secs)
+    return client_slowdown.get(client_id, 1.0) * compute_secs + latency_secs
+
+  return duration_fn
+
+
+class BufferedFedAvgProcess(object):
+  """The TFF computations making up buffered federated averaging.
+
+  The process does not prescribe when clients start or finish. Instead a driver
+  (e.g. `AsyncSimulator`) calls `client_update` with the model a client started
+  from, adds the result to a buffer with `accumulate`, and calls
+  `server_update` once the buffer holds `buffer_size` updates.
+  """
+
+  def __init__(self, server_init_tf: tff.Computation,
+               client_update_tf: tff.Computation,
+               zeros_tf: tff.Computation, accumulate_tf: tff.Computation,
+               server_update_tf: tff.Computation, buffer_size: int,
+               staleness_weight_fn: StalenessWeightFn):
+    self._server_init_tf = server_init_tf
+    self._client_update_tf = client_update_tf
+    self._zeros_tf = zeros_tf
+    self._accumulate_tf = accumulate_tf
+    self._server_update_tf = server_update_tf
+    self._buffer_size = buffer_size
+    self._staleness_weight_fn = staleness_weight_fn
+
+  @property
+  def buffer_size(self) -> int:
+    return self._buffer_size
+
+  def initialize(self) -> fed_avg_schedule.ServerState:
+    return self._server_init_tf()
+
+  def client_update(self, dataset: tf.data.Dataset,
+                    model: fed_avg_schedule.ModelWeights,
+                    round_num: float) -> fed_avg_schedule.ClientOutput:
+    """Trains a client starting from `model`, the model at `round_num`."""
+    return self._client_update_tf(dataset, model, round_num)
+
+  def empty_buffer(self) -> Tuple[Any, float]:
+    """Returns an empty buffer as a `(weighted_sum, total_weight)` tuple."""
+    return self._zeros_tf(), 0.0
+
+  def accumulate(self, buffer: Tuple[Any, float],
+                 client_output: fed_avg_schedule.ClientOutput,
+                 staleness: int) -> Tuple[Any, float]:
+    """Adds a client update to `buffer`, down-weighted by its staleness."""
+    weighted_sum, total_weight = buffer
+    weight = (
+        float(client_output.client_weight) *
+        self._staleness_weight_fn(staleness))
+    weighted_sum = self._accumulate_tf(weighted_sum,
+                                       client_output.weights_delta, weight)
+    return weighted_sum, total_weight + weight
+
+  def server_update(self, server_state: fed_avg_schedule.ServerState,
+                    buffer: Tuple[Any, float]) -> fed_avg_schedule.ServerState:
+    """Applies the weighted mean of the buffered updates to `server_state`."""
+    weighted_sum, total_weight = buffer
+    return self._server_update_tf(server_state, weighted_sum, total_weight)
+
+
+def build_fed_buff_process(
+    model_fn: ModelBuilder,
+    client_optimizer_fn: OptimizerBuilder,
+    client_lr: Union[float, LRScheduleFn] = 0.1,
+    server_optimizer_fn: OptimizerBuilder = tf.keras.optimizers.SGD,
+    server_lr: Union[float, LRScheduleFn] = 1.0,
+    client_weight_fn: Optional[ClientWeightFn] = None,
+    buffer_size: int = 10,
+    staleness_weight_fn: StalenessWeightFn = polynomial_staleness_weight,
+) -> BufferedFedAvgProcess:
+  """Builds the TFF computations for buffered asynchronous federated averaging.
+
+  Args:
+    model_fn: A no-arg function that returns a `tff.learning.Model`.
+    client_optimizer_fn: A function that accepts a `learning_rate` keyword
+      argument and returns a `tf.keras.optimizers.Optimizer` instance.
+    client_lr: A scalar learning rate or a function that accepts a float
+      `round_num` argument and returns a learning rate. Here `round_num` is the
+      number of server steps taken before the client started training.
+    server_optimizer_fn: A function that accepts a `learning_rate` argument and
+      returns a `tf.keras.optimizers.Optimizer` instance.
+    server_lr: A scalar learning rate or a function that accepts a float
+      `round_num` argument and returns a learning rate.
+    client_weight_fn: Optional function that takes the output of
+      `model.report_local_outputs` and returns a tensor that provides the weight
+      in the federated average of model deltas. If not provided, the default is
+      the total number of examples processed on device.
+    buffer_size: The number of client updates `K` aggregated per server step.
+    staleness_weight_fn: A function accepting the integer number of server
+      steps taken since a client started training, and returning a
+      multiplicative factor for its client weight.
+
+  Returns:
+    A `BufferedFedAvgProcess`.
+
+  Raises:
+    ValueError: If `buffer_size` is not positive.
+  """
+  if buffer_size < 1:
+    raise ValueError('buffer_size must be positive, found {}.'.format(
+        buffer_size))
+
+  client_lr_schedule = client_lr
+  if not callable(client_lr_schedule):
+    client_lr_schedule = lambda round_num: client_lr
+
+  server_lr_schedule = server_lr
+  if not callable(server_lr_schedule):
+    server_lr_schedule = lambda round_num: server_lr
+
+  dummy_model = model_fn()
+
+  server_init_tf = fed_avg_schedule.build_server_init_fn(
+      model_fn,
+      # Initialize with the learning rate for round zero.
+      lambda: server_optimizer_fn(server_lr_schedule(0)))
+  server_state_type = server_init_tf.type_signature.result
+  model_weights_type = server_state_type.model
+  round_num_type = server_state_type.round_num
+  model_input_type = tff.SequenceType(dummy_model.input_spec)
+
+  @tff.tf_computation(model_input_type, model_weights_type, round_num_type)
+  def client_update_tf(tf_dataset, initial_model_weights, round_num):
+    client_lr = client_lr_schedule(round_num)
+    client_optimizer = client_optimizer_fn(client_lr)
+    client_update = fed_avg_schedule.create_client_update_fn()
+    return client_update(model_fn(), tf_dataset, initial_model_weights,
+                         client_optimizer, client_weight_fn)
+
+  @tff.tf_computation
+  def zeros_tf():
+    return tf.nest.map_structure(tf.zeros_like,
+                                 fed_avg_schedule._get_weights(  # pylint: disable=protected-access
+                                     model_fn()).trainable)
+
+  @tff.tf_computation(model_weights_type.trainable, model_weights_type.trainable,
+                      tf.float32)
+  def accumulate_tf(weighted_sum, weights_delta, weight):
+    return tf.nest.map_structure(lambda a, b: a + weight * b, weighted_sum,
+                                 weights_delta)
+
+  @tff.tf_computation(server_state_type, model_weights_type.trainable,
+                      tf.float32)
+  def server_update_tf(server_state, weighted_sum, total_weight):
+    model_delta = tf.nest.map_structure(
+        lambda x: tf.math.divide_no_nan(x, total_weight), weighted_sum)
+    model = model_fn()
+    server_lr = server_lr_schedule(server_state.round_num)
+    server_optimizer = server_optimizer_fn(server_lr)
+    # We initialize the server optimizer variables to avoid creating them
+    # within the scope of the tf.function server_update.
+    fed_avg_schedule._initialize_optimizer_vars(model, server_optimizer)  # pylint: disable=protected-access
+    return fed_avg_schedule.server_update(model, server_optimizer,
+                                          server_state, model_delta)
+
+  return BufferedFedAvgProcess(
+      server_init_tf=server_init_tf,
+      client_update_tf=client_update_tf,
+      zeros_tf=zeros_tf,
+      accumulate_tf=accumulate_tf,
+      server_update_tf=server_update_tf,
+      buffer_size=buffer_size,
+      staleness_weight_fn=staleness_weight_fn)
+
+
+class AsyncSimulator(object):
+  """Drives a `BufferedFedAvgProcess` with a virtual clock.
+
+  The simulator keeps `concurrency` clients in flight at all times. Each client
+  is assigned a virtual duration by `duration_fn` when it starts, and trains
+  against the model version current at that moment. Client updates are
+  delivered to the server buffer in order of their virtual finish time, and a
+  new client is started whenever one finishes.
+
+  Client training is run lazily when a client finishes, so at most one copy of
+  each distinct in-flight model version is kept in memory.
+  """
+
+  def __init__(self,
+               process: BufferedFedAvgProcess,
+               client_ids: Sequence[Hashable],
+               client_data_fn: Callable[[Hashable], tf.data.Dataset],
+               duration_fn: DurationFn,
+               concurrency: int,
+               seed: Optional[int] = None):
+    """Returns an initialized `AsyncSimulator`.
+
+    Args:
+      process: The `BufferedFedAvgProcess` to drive.
+      client_ids: The ids of the clients available for sampling.
+      client_data_fn: A function accepting a client id and returning the
+        `tf.data.Dataset` of that client.
+      duration_fn: A function accepting a client id and a
+        `np.random.RandomState`, and returning the virtual time the client
+        takes to download the model, train and upload its update. See
+        `build_lognormal_duration_fn`.
+      concurrency: The number of clients training at any point in time.
+      seed: An optional random seed for client sampling and durations.
+
+    Raises:
+      ValueError: If `concurrency` is not positive or `client_ids` is empty.
+    """
+    if concurrency < 1:
+      raise ValueError('concurrency must be positive, found {}.'.format(
+          concurrency))
+    if not client_ids:
+      raise ValueError('client_ids must not be empty.')
+    self._process = process
+    self._client_ids = list(client_ids)
+    self._client_data_fn = client_data_fn
+    self._duration_fn = duration_fn
+    self._concurrency = concurrency
+    self._random_state = np.random.RandomState(seed)
+
+  def _start_client(self, events, now, sequence_num, state, version):
+    client_id = self._client_ids[self._random_state.randint(
+        len(self._client_ids))]
+    duration = self._duration_fn(client_id, self._random_state)
+    heapq.heappush(events, (now + duration, sequence_num, client_id, version,
+                            state.model, state.round_num))
+
+  def run(
+      self, server_state: fed_avg_schedule.ServerState, num_server_steps: int
+  ) -> Tuple[fed_avg_schedule.ServerState, List[Dict[str, float]]]:
+    """Runs the simulation until `num_server_steps` server steps are taken.
+
+    Args:
+      server_state: The `fed_avg_schedule.ServerState` to start from.
+      num_server_steps: The number of server optimizer steps to simulate.
+
+    Returns:
+      A tuple of the final `ServerState`, and a list with a dictionary of
+      metrics for each server step.
+    """
+    events = []
+    version = 0
+    sequence_num = 0
+    now = 0.0
+    for _ in range(self._concurrency):
+      self._start_client(events, now, sequence_num, server_state, version)
+      sequence_num += 1
+
+    all_metrics = []
+    buffer = self._process.empty_buffer()
+    stalenesses = []
+    num_examples = 0
+    last_step_time = 0.0
+    while len(all_metrics) < num_server_steps:
+      now, _, client_id, client_version, model, round_num = heapq.heappop(
+          events)
+      client_output = self._process.client_update(
+          self._client_data_fn(client_id), model, round_num)
+      staleness = version - client_version
+      buffer = self._process.accumulate(buffer, client_output, staleness)
+      stalenesses.append(staleness)
+      num_examples += int(client_output.optimizer_output['num_examples'])
+
+      if len(stalenesses) == self._process.buffer_size:
+        server_state = self._process.server_update(server_state, buffer)
+        version += 1
+        all_metrics.append(
+            collections.OrderedDict(
+                virtual_time=now,
+                virtual_secs_per_step=now - last_step_time,
+                mean_staleness=float(np.mean(stalenesses)),
+                max_staleness=int(np.max(stalenesses)),
+                buffer_weight=float(buffer[1]),
+                num_examples=num_examples))
+        buffer = self._process.empty_buffer()
+        stalenesses = []
+        num_examples = 0
+        last_step_time = now
+
+      self._start_client(events, now, sequence_num, server_state, version)
+      sequence_num += 1
+
+    return server_state, all_metrics
@@ -0,0 +1,133 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""End-to-end tests of buffered asynchronous FedAvg on the MNIST model."""
+
+import collections
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.optimization.shared import fed_buff
+
+_Batch = collections.namedtuple('Batch', ['x', 'y'])
+
+
+def _batch_fn():
+  return _Batch(
+      x=np.ones([1, 784], dtype=np.float32), y=np.ones([1, 1], dtype=np.int64))
+
+
+def _create_input_spec():
+  return _Batch(
+      x=tf.TensorSpec(shape=[None, 784], dtype=tf.float32),
+      y=tf.TensorSpec(dtype=tf.int64, shape=[None, 1]))
+
+
+def _uncompiled_model_builder():
+  keras_model = tff.simulation.models.mnist.create_keras_model(
+      compile_model=False)
+  return tff.learning.from_keras_model(
+      keras_model=keras_model,
+      input_spec=_create_input_spec(),
+      loss=tf.keras.losses.SparseCategoricalCrossentropy())
+
+
+def _loss(client_output):
+  loss_sum, num_examples = client_output.model_output['loss']
+  return loss_sum / num_examples
+
+
+def _client_data_fn(client_id):
+  del client_id  # Unused.
+  return tf.data.Dataset.from_tensors(_batch_fn())
+
+
+class StalenessWeightTest(tf.test.TestCase):
+
+  def test_polynomial_staleness_weight(self):
+    self.assertAllClose(fed_buff.polynomial_staleness_weight(0), 1.0)
+    self.assertAllClose(fed_buff.polynomial_staleness_weight(3), 0.5)
+    self.assertAllClose(
+        fed_buff.polynomial_staleness_weight(3, exponent=1.0), 0.25)
+
+  def test_lognormal_duration_fn_applies_slowdown(self):
+    duration_fn = fed_buff.build_lognormal_duration_fn(
+        mean_compute_secs=1.0,
+        mean_latency_secs=0.0,
+        sigma=0.0,
+        client_slowdown={'slow': 10.0})
+    random_state = np.random.RandomState(0)
+    self.assertAllClose(duration_fn('fast', random_state), 1.0)
+    self.assertAllClose(duration_fn('slow', random_state), 10.0)
+
+
+class BufferedFedAvgProcessTest(tf.test.TestCase):
+
+  def test_buffer_size_must_be_positive(self):
+    with self.assertRaises(ValueError):
+      fed_buff.build_fed_buff_process(
+          _uncompiled_model_builder,
+          client_optimizer_fn=tf.keras.optimizers.SGD,
+          buffer_size=0)
+
+  def test_stale_update_is_down_weighted(self):
+    process = fed_buff.build_fed_buff_process(
+        _uncompiled_model_builder,
+        client_optimizer_fn=tf.keras.optimizers.SGD,
+        buffer_size=1)
+    state = process.initialize()
+    client_output = process.client_update(
+        _client_data_fn(0), state.model, state.round_num)
+
+    _, fresh_weight = process.accumulate(process.empty_buffer(), client_output,
+                                         staleness=0)
+    _, stale_weight = process.accumulate(process.empty_buffer(), client_output,
+                                         staleness=3)
+    self.assertAllClose(fresh_weight, 1.0)
+    self.assertAllClose(stale_weight, 0.5)
+
+  def test_simulation_decreases_loss(self):
+    process = fed_buff.build_fed_buff_process(
+        _uncompiled_model_builder,
+        client_optimizer_fn=tf.keras.optimizers.SGD,
+        buffer_size=2)
+    simulator = fed_buff.AsyncSimulator(
+        process,
+        client_ids=['a', 'b', 'c', 'd'],
+        client_data_fn=_client_data_fn,
+        duration_fn=fed_buff.build_lognormal_duration_fn(1.0, 0.1),
+        concurrency=3,
+        seed=0)
+
+    initial_state = process.initialize()
+    initial_loss = _loss(
+        process.client_update(
+            _client_data_fn(0), initial_state.model, initial_state.round_num))
+    state, metrics = simulator.run(initial_state, num_server_steps=5)
+    final_loss = _loss(
+        process.client_update(_client_data_fn(0), state.model, state.round_num))
+
+    self.assertLen(metrics, 5)
+    self.assertEqual(state.round_num, 5.0)
+    self.assertLess(final_loss, initial_loss)
+    virtual_times = [m['virtual_time'] for m in metrics]
+    self.assertAllEqual(virtual_times, sorted(virtual_times))
+    # With three clients in flight and two updates per step, some updates must
+    # have been computed against a stale model.
+    self.assertGreater(max(m['max_staleness'] for m in metrics), 0)
+
+
+if __name__ == '__main__':
+  tf.test.main()
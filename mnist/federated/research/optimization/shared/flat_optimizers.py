@@ -0,0 +1,413 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Optimizers operating on a single flat parameter vector.
+
+A Keras optimizer applies its update one variable at a time, so a server update
+for a model with hundreds of weight tensors runs hundreds of small ops. The
+optimizers here instead concatenate all weights into one contiguous vector,
+apply the update as a handful of vectorized ops, and split the result back into
+views with the original shapes. Per-tensor quantities (such as the layer-wise
+norms of LARS) are computed with segment reductions over the flat vector.
+
+The update rules replicate those of the corresponding Keras optimizers (see
+`from_keras_optimizer`), including `keras_optimizers/yogi.py` and
+`keras_optimizers/lars.py`.
+"""
+
+import abc
+import collections
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_federated.python.research.optimization.shared.keras_optimizers import lars
+from tensorflow_federated.python.research.optimization.shared.keras_optimizers import yogi
+
+Slots = collections.OrderedDict
+
+
+class ParameterLayout(object):
+  """Describes how a sequence of tensors is laid out in one flat vector."""
+
+  def __init__(self,
+               shapes: Sequence[tf.TensorShape],
+               names: Optional[Sequence[str]] = None):
+    """Returns an initialized `ParameterLayout`.
+
+    Args:
+      shapes: The fully defined shapes of the tensors, in order.
+      names: Optional names of the tensors, used by optimizers that treat
+        tensors differently based on their name (e.g. LARS). Defaults to the
+        position of each tensor.
+
+    Raises:
+      ValueError: If a shape is not fully defined, or `names` does not match
+        `shapes` in length.
+    """
+    self._shapes = [tf.TensorShape(s) for s in shapes]
+    for shape in self._shapes:
+      if not shape.is_fully_defined():
+        raise ValueError('Shapes must be fully defined, found {}.'.format(
+            shape))
+    self._sizes = [shape.num_elements() for shape in self._shapes]
+    if names is None:
+      names = [str(i) for i in range(len(self._shapes))]
+    elif len(names) != len(self._shapes):
+      raise ValueError('Found {} names for {} shapes.'.format(
+          len(names), len(self._shapes)))
+    self._names = list(names)
+
+  @classmethod
+  def from_variables(cls, variables: Sequence[tf.Variable]):
+    """Returns the layout of a sequence of variables, using their names."""
+    return cls([v.shape for v in variables], [v.name for v in variables])
+
+  @property
+  def names(self) -> List[str]:
+    return self._names
+
+  @property
+  def num_tensors(self) -> int:
+    return len(self._shapes)
+
+  @property
+  def num_params(self) -> int:
+    return sum(self._sizes)
+
+  def flatten(self, tensors: Sequence[tf.Tensor]) -> tf.Tensor:
+    """Concatenates `tensors` into one flat vector."""
+    return tf.concat([tf.reshape(t, [-1]) for t in tensors], axis=0)
+
+  def unflatten(self, flat: tf.Tensor) -> List[tf.Tensor]:
+    """Splits a flat vector into tensors with the shapes of the layout."""
+    return [
+        tf.reshape(t, shape)
+        for t, shape in zip(tf.split(flat, self._sizes), self._shapes)
+    ]
+
+  def segment_ids(self) -> tf.Tensor:
+    """Returns the index of the tensor each flat coordinate belongs to."""
+    return tf.repeat(tf.range(self.num_tensors), self._sizes)
+
+  def broadcast(self, per_tensor: tf.Tensor) -> tf.Tensor:
+    """Expands a vector with one value per tensor to one value per parameter."""
+    return tf.repeat(per_tensor, self._sizes)
+
+  def tensor_norms(self, flat: tf.Tensor) -> tf.Tensor:
+    """Returns the l2 norm of each tensor in a flat vector."""
+    return tf.sqrt(
+        tf.math.unsorted_segment_sum(
+            tf.square(flat), self.segment_ids(), self.num_tensors))
+
+
+class FlatOptimizer(metaclass=abc.ABCMeta):
+  """An optimizer applying its update to a flat parameter vector."""
+
+  def __init__(self, learning_rate):
+    self._learning_rate = learning_rate
+
+  @abc.abstractmethod
+  def initialize(self, layout: ParameterLayout) -> Slots:
+    """Returns the initial optimizer slots, as flat vectors."""
+    raise NotImplementedError
+
+  @abc.abstractmethod
+  def apply(self, layout: ParameterLayout, var: tf.Tensor, grad: tf.Tensor,
+            slots: Slots, iterations: tf.Tensor) -> Tuple[tf.Tensor, Slots]:
+    """Returns the updated parameters and slots.
+
+    Args:
+      layout: The `ParameterLayout` of `var`.
+      var: The flat parameter vector.
+      grad: The flat gradient vector.
+      slots: The optimizer slots, as returned by `initialize` or a previous
+        call to `apply`.
+      iterations: An int64 scalar, the number of updates applied so far.
+    """
+    raise NotImplementedError
+
+
+class FlatSGD(FlatOptimizer):
+  """Flat version of `tf.keras.optimizers.SGD`."""
+
+  def __init__(self, learning_rate, momentum=0.0, nesterov=False):
+    super().__init__(learning_rate)
+    self._momentum = momentum
+    self._use_momentum = (
+        tf.is_tensor(momentum) or callable(momentum) or momentum > 0)
+    self._nesterov = nesterov
+
+  def initialize(self, layout):
+    if not self._use_momentum:
+      return Slots()
+    return Slots(momentum=tf.zeros([layout.num_params]))
+
+  def apply(self, layout, var, grad, slots, iterations):
+    del layout, iterations  # Unused.
+    if not self._use_momentum:
+      return var - self._learning_rate * grad, slots
+    accum = self._momentum * slots['momentum'] - self._learning_rate * grad
+    if self._nesterov:
+      var = var + self._momentum * accum - self._learning_rate * grad
+    else:
+      var = var + accum
+    return var, Slots(momentum=accum)
+
+
+class FlatAdam(FlatOptimizer):
+  """Flat version of `tf.keras.optimizers.Adam` (without AMSGrad)."""
+
+  def __init__(self, learning_rate, beta_1=0.9, beta_2=0.999, epsilon=1e-7):
+    super().__init__(learning_rate)
+    self._beta_1 = beta_1
+    self._beta_2 = beta_2
+    self._epsilon = epsilon
+
+  def initialize(self, layout):
+    return Slots(
+        m=tf.zeros([layout.num_params]), v=tf.zeros([layout.num_params]))
+
+  def apply(self, layout, var, grad, slots, iterations):
+    del layout  # Unused.
+    local_step = tf.cast(iterations + 1, tf.float32)
+    lr = (
+        self._learning_rate * tf.sqrt(1 - tf.pow(self._beta_2, local_step)) /
+        (1 - tf.pow(self._beta_1, local_step)))
+    m = slots['m'] + (grad - slots['m']) * (1 - self._beta_1)
+    v = slots['v'] + (tf.square(grad) - slots['v']) * (1 - self._beta_2)
+    var = var - lr * m / (tf.sqrt(v) + self._epsilon)
+    return var, Slots(m=m, v=v)
+
+
+class FlatAdagrad(FlatOptimizer):
+  """Flat version of `tf.keras.optimizers.Adagrad`."""
+
+  def __init__(self,
+               learning_rate,
+               initial_accumulator_value=0.1,
+               epsilon=1e-7):
+    super().__init__(learning_rate)
+    self._initial_accumulator_value = initial_accumulator_value
+    self._epsilon = epsilon
+
+  def initialize(self, layout):
+    return Slots(
+        accumulator=tf.fill([layout.num_params],
+                            float(self._initial_accumulator_value)))
+
+  def apply(self, layout, var, grad, slots, iterations):
+    del layout, iterations  # Unused.
+    accumulator = slots['accumulator'] + tf.square(grad)
+    var = var - self._learning_rate * grad / (
+        tf.sqrt(accumulator) + self._epsilon)
+    return var, Slots(accumulator=accumulator)
+
+
+class FlatYogi(FlatOptimizer):
+  """Flat version of `keras_optimizers.yogi.Yogi`."""
+
+  def __init__(self,
+               learning_rate,
+               beta1=0.9,
+               beta2=0.999,
+               epsilon=1e-3,
+               l1_regularization_strength=0.0,
+               l2_regularization_strength=0.0,
+               initial_accumulator_value=1.0,
+               activation='sign'):
+    super().__init__(learning_rate)
+    if activation not in ['sign', 'tanh']:
+      raise NotImplementedError('Activation function can be sign or tanh')
+    self._beta1 = beta1
+    self._beta2 = beta2
+    self._epsilon = epsilon
+    self._l1 = l1_regularization_strength
+    self._l2 = l2_regularization_strength
+    self._initial_accumulator_value = initial_accumulator_value
+    self._activation = activation
+
+  def initialize(self, layout):
+    slots = Slots(
+        v=tf.fill([layout.num_params], float(self._initial_accumulator_value)))
+    if self._beta1 > 0.0:
+      slots['m'] = tf.zeros([layout.num_params])
+    return slots
+
+  def apply(self, layout, var, grad, slots, iterations):
+    del layout  # Unused.
+    local_step = tf.cast(iterations + 1, tf.float32)
+    beta1_power = tf.pow(self._beta1, local_step)
+    beta2_power = tf.pow(self._beta2, local_step)
+    lr = (self._learning_rate * tf.sqrt(1 - beta2_power) / (1 - beta1_power))
+
+    new_slots = Slots()
+    # v_t = v + sign(g_t^2-v)(g_t^2)
+    v = slots['v']
+    grad2 = grad * grad
+    if self._activation == 'sign':
+      sign = tf.sign(grad2 - v)
+    else:
+      sign = tf.tanh(10 * (grad2 - v))
+    v_t = v + (1 - self._beta2) * sign * grad2
+    new_slots['v'] = v_t
+
+    if self._beta1 > 0.0:
+      # m_t = beta1 * m + (1 - beta1) * g_t
+      m_t = slots['m'] * self._beta1 + grad * (1 - self._beta1)
+      new_slots['m'] = m_t
+      direction = m_t
+    else:
+      direction = grad
+
+    # Yogi effective LR
+    per_coord_lr = lr / (tf.sqrt(v_t) + self._epsilon)
+    # Step 1: Gradient descent
+    new_var = var - per_coord_lr * direction
+    # Step 2: Prox operator
+    if self._l1 > 0:
+      new_var = yogi._solve(1 + self._l2 * per_coord_lr, -new_var,  # pylint: disable=protected-access
+                            self._l1 * per_coord_lr)
+    elif self._l2 > 0:
+      new_var = new_var / (1 + self._l2 * per_coord_lr)
+    return new_var, new_slots
+
+
+class FlatLARS(FlatOptimizer):
+  """Flat version of `keras_optimizers.lars.LARS`.
+
+  Weight decay and layer adaptation are applied per tensor of the layout, using
+  the same name-based exclusion rules as `lars.LARS`.
+  """
+
+  def __init__(self,
+               learning_rate,
+               momentum=0.9,
+               weight_decay_rate=0.0,
+               epsilon=0.001,
+               exclude_from_weight_decay=None,
+               exclude_from_layer_adaptation=None):
+    super().__init__(learning_rate)
+    self._momentum = momentum
+    self._weight_decay_rate = weight_decay_rate
+    self._epsilon = epsilon
+    self._exclude_from_weight_decay = exclude_from_weight_decay
+    if exclude_from_layer_adaptation:
+      self._exclude_from_layer_adaptation = exclude_from_layer_adaptation
+    else:
+      self._exclude_from_layer_adaptation = exclude_from_weight_decay
+
+  def _tensor_mask(self, layout, exclude_patterns):
+    """Returns a float vector with 0 for excluded tensors and 1 otherwise."""
+    mask = np.ones([layout.num_tensors], dtype=np.float32)
+    for i, name in enumerate(layout.names):
+      name = re.sub(r':\d+$', '', name)
+      for pattern in exclude_patterns or []:
+        if re.search(pattern, name) is not None:
+          mask[i] = 0.0
+          break
+    return tf.constant(mask)
+
+  def initialize(self, layout):
+    return Slots(m=tf.zeros([layout.num_params]))
+
+  def apply(self, layout, var, grad, slots, iterations):
+    del iterations  # Unused.
+    # m_t = beta * m_{t-1} + (1 - beta) * (g_t + lambda * x_t)
+    decay_mask = layout.broadcast(
+        self._tensor_mask(layout, self._exclude_from_weight_decay))
+    grad_with_decay = grad + decay_mask * self._weight_decay_rate * var
+    m_t = (
+        slots['m'] * self._momentum + grad_with_decay * (1 - self._momentum))
+
+    w_norm = layout.tensor_norms(var)
+    m_norm = layout.tensor_norms(m_t)
+    ratio = tf.where(
+        tf.greater(w_norm, 0),
+        tf.where(tf.greater(m_norm, 0), (w_norm / (m_norm + self._epsilon)),
+                 1.0),
+        1.0,
+    )
+    adaptation_mask = self._tensor_mask(layout,
+                                        self._exclude_from_layer_adaptation)
+    ratio = adaptation_mask * ratio + (1.0 - adaptation_mask)
+    var = var - layout.broadcast(ratio) * self._learning_rate * m_t
+    return var, Slots(m=m_t)
+
+
+def _hyper(optimizer, name):
+  """Returns the value of a hyperparameter of a Keras optimizer."""
+  return optimizer._get_hyper(name)  # pylint: disable=protected-access
+
+
+def from_keras_optimizer(
+    optimizer: tf.keras.optimizers.Optimizer) -> FlatOptimizer:
+  """Returns the `FlatOptimizer` equivalent to a Keras optimizer.
+
+  Supported optimizers are `tf.keras.optimizers.{SGD, Adam, Adagrad}` and the
+  `Yogi` and `LARS` optimizers in `keras_optimizers`.
+
+  Args:
+    optimizer: A `tf.keras.optimizers.Optimizer`.
+
+  Raises:
+    ValueError: If the optimizer, or one of its settings (such as learning
+      rate decay or AMSGrad), is not supported.
+  """
+  # pylint: disable=protected-access
+  if optimizer._initial_decay:
+    raise ValueError('Learning rate decay is not supported, use a learning '
+                     'rate schedule instead.')
+  learning_rate = _hyper(optimizer, 'learning_rate')
+  optimizer_cls = type(optimizer)
+  if optimizer_cls is tf.keras.optimizers.SGD:
+    return FlatSGD(
+        learning_rate,
+        momentum=_hyper(optimizer, 'momentum'),
+        nesterov=optimizer.nesterov)
+  elif optimizer_cls is tf.keras.optimizers.Adam:
+    if optimizer.amsgrad:
+      raise ValueError('AMSGrad is not supported.')
+    return FlatAdam(
+        learning_rate,
+        beta_1=_hyper(optimizer, 'beta_1'),
+        beta_2=_hyper(optimizer, 'beta_2'),
+        epsilon=optimizer.epsilon)
+  elif optimizer_cls is tf.keras.optimizers.Adagrad:
+    return FlatAdagrad(
+        learning_rate,
+        initial_accumulator_value=optimizer._initial_accumulator_value,
+        epsilon=optimizer.epsilon)
+  elif optimizer_cls is yogi.Yogi:
+    return FlatYogi(
+        learning_rate,
+        beta1=optimizer._beta1,
+        beta2=_hyper(optimizer, 'beta_2'),
+        epsilon=_hyper(optimizer, 'epsilon'),
+        l1_regularization_strength=optimizer._l1_regularization_strength,
+        l2_regularization_strength=optimizer._l2_regularization_strength,
+        initial_accumulator_value=optimizer._initial_accumulator_value,
+        activation=optimizer._activation)
+  elif optimizer_cls is lars.LARS:
+    return FlatLARS(
+        learning_rate,
+        momentum=_hyper(optimizer, 'momentum'),
+        weight_decay_rate=_hyper(optimizer, 'weight_decay_rate'),
+        epsilon=_hyper(optimizer, 'epsilon'),
+        exclude_from_weight_decay=optimizer.exclude_from_weight_decay,
+        exclude_from_layer_adaptation=optimizer.exclude_from_layer_adaptation)
+  # pylint: enable=protected-access
+  raise ValueError('Optimizer {!s} has no flat implementation.'.format(
+      optimizer_cls.__name__))
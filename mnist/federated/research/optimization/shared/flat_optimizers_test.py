@@ -0,0 +1,110 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from absl.testing import parameterized
+import tensorflow as tf
+
+from tensorflow_federated.python.research.optimization.shared import flat_optimizers
+from tensorflow_federated.python.research.optimization.shared.keras_optimizers import lars
+from tensorflow_federated.python.research.optimization.shared.keras_optimizers import yogi
+
+
+def _create_variables():
+  return [
+      tf.Variable([[1.0, -2.0], [3.0, 0.5]], name='kernel'),
+      tf.Variable([0.1, -0.2], name='bias'),
+      tf.Variable(4.0, name='scale'),
+  ]
+
+
+def _gradients(step):
+  scale = float(step + 1)
+  return [
+      tf.constant([[0.5, -1.0], [0.0, 2.0]]) * scale,
+      tf.constant([-0.3, 0.7]) / scale,
+      tf.constant(1.5),
+  ]
+
+
+class ParameterLayoutTest(tf.test.TestCase):
+
+  def test_flatten_unflatten_round_trip(self):
+    variables = _create_variables()
+    layout = flat_optimizers.ParameterLayout.from_variables(variables)
+    self.assertEqual(layout.num_tensors, 3)
+    self.assertEqual(layout.num_params, 7)
+
+    flat = layout.flatten(variables)
+    self.assertAllEqual(flat.shape, [7])
+    for tensor, variable in zip(layout.unflatten(flat), variables):
+      self.assertAllEqual(tensor, variable)
+
+  def test_tensor_norms(self):
+    layout = flat_optimizers.ParameterLayout([[2], [1], [3]])
+    norms = layout.tensor_norms(
+        tf.constant([3.0, 4.0, -2.0, 1.0, 2.0, 2.0]))
+    self.assertAllClose(norms, [5.0, 2.0, 3.0])
+
+  def test_raises_on_undefined_shape(self):
+    with self.assertRaises(ValueError):
+      flat_optimizers.ParameterLayout([[None, 2]])
+
+
+class FlatOptimizerTest(tf.test.TestCase, parameterized.TestCase):
+
+  @parameterized.named_parameters(
+      ('sgd', lambda: tf.keras.optimizers.SGD(0.1)),
+      ('sgd_momentum', lambda: tf.keras.optimizers.SGD(0.1, momentum=0.9)),
+      ('sgd_nesterov',
+       lambda: tf.keras.optimizers.SGD(0.1, momentum=0.9, nesterov=True)),
+      ('adam', lambda: tf.keras.optimizers.Adam(0.1)),
+      ('adagrad', lambda: tf.keras.optimizers.Adagrad(0.1)),
+      ('yogi', lambda: yogi.Yogi(0.1)),
+      ('yogi_regularized', lambda: yogi.Yogi(
+          0.1, l1_regularization_strength=0.01,
+          l2_regularization_strength=0.01)),
+      ('lars', lambda: lars.LARS(
+          0.1, weight_decay_rate=0.01, exclude_from_weight_decay=['bias'])),
+  )
+  def test_matches_keras_optimizer(self, optimizer_fn):
+    keras_variables = _create_variables()
+    keras_optimizer = optimizer_fn()
+
+    layout = flat_optimizers.ParameterLayout.from_variables(keras_variables)
+    flat_optimizer = flat_optimizers.from_keras_optimizer(optimizer_fn())
+    flat_var = layout.flatten(keras_variables)
+    slots = flat_optimizer.initialize(layout)
+
+    for step in range(3):
+      grads = _gradients(step)
+      keras_optimizer.apply_gradients(zip(grads, keras_variables))
+      flat_var, slots = flat_optimizer.apply(layout, flat_var,
+                                             layout.flatten(grads), slots,
+                                             tf.constant(step, tf.int64))
+
+    for tensor, variable in zip(layout.unflatten(flat_var), keras_variables):
+      self.assertAllClose(tensor, variable, rtol=1e-5, atol=1e-6)
+
+  def test_from_keras_optimizer_raises_on_unsupported_optimizer(self):
+    with self.assertRaises(ValueError):
+      flat_optimizers.from_keras_optimizer(tf.keras.optimizers.RMSprop(0.1))
+
+  def test_from_keras_optimizer_raises_on_amsgrad(self):
+    with self.assertRaises(ValueError):
+      flat_optimizers.from_keras_optimizer(
+          tf.keras.optimizers.Adam(0.1, amsgrad=True))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,231 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Federated averaging with two-tier (clients -> edges -> server) aggregation.
+
+Each round reuses the client and server updates of `fed_avg_schedule`, but
+instead of mapping `client_update` over the whole cohort and taking a single
+`tff.federated_mean`, the clients are trained one edge at a time and their
+updates are aggregated with a `hierarchical_aggregation.HierarchicalAggregator`.
+Only the model updates of the clients of one edge are held in memory at once,
+so large simulated cohorts fit in the memory of a single machine.
+
+Since the edges are driven from Python, the process is not a
+`tff.templates.IterativeProcess`, but it implements the same
+`adapters.IterativeProcessPythonAdapter` interface as
+`fed_avg_schedule.FederatedAveragingProcessAdapter`, and can be passed to
+`training_loop.run`.
+"""
+
+from typing import Callable, Hashable, List, Optional, Sequence, Union
+
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.optimization.shared import fed_avg_schedule
+from tensorflow_federated.python.research.utils import adapters
+from tensorflow_federated.python.research.utils import hierarchical_aggregation
+
+# Convenience type aliases.
+ModelBuilder = Callable[[], tff.learning.Model]
+OptimizerBuilder = Callable[[float], tf.keras.optimizers.Optimizer]
+ClientWeightFn = Callable[..., float]
+LRScheduleFn = Callable[[int], float]
+
+
+class HierarchicalFedAvgProcessAdapter(adapters.IterativeProcessPythonAdapter):
+  """Runs rounds of federated averaging through a tier of edge aggregators.
+
+  The `output` of each `IterationResult` holds the per-tier measurements
+  returned by `hierarchical_aggregation.HierarchicalAggregator`.
+  """
+
+  def __init__(self, server_init_tf: tff.Computation,
+               client_update_tf: tff.Computation,
+               server_update_tf: tff.Computation,
+               federated_output_computation: tff.Computation,
+               aggregator: hierarchical_aggregation.HierarchicalAggregator,
+               dataset_preprocess_comp: Optional[tff.Computation] = None):
+    self._server_init_tf = server_init_tf
+    self._client_update_tf = client_update_tf
+    self._server_update_tf = server_update_tf
+    self._federated_output_computation = federated_output_computation
+    self._aggregator = aggregator
+    self._dataset_preprocess_comp = dataset_preprocess_comp
+
+  def initialize(self) -> fed_avg_schedule.ServerState:
+    return self._server_init_tf()
+
+  def next(
+      self,
+      state: fed_avg_schedule.ServerState,
+      data: Sequence[tf.data.Dataset],
+      client_keys: Optional[Sequence[Hashable]] = None
+  ) -> adapters.IterationResult:
+    """Runs one round of training.
+
+    Args:
+      state: A `fed_avg_schedule.ServerState`.
+      data: A sequence of client `tf.data.Dataset`s. A client dataset is only
+        iterated when the edge of the client is trained.
+      client_keys: An optional sequence of hashable keys, one per client in
+        `data`, passed to the `partition_fn` of the aggregator. If `None`, the
+        position of each client is used.
+
+    Returns:
+      An `adapters.IterationResult` with the updated `ServerState`, the
+      aggregated model metrics, and the per-tier aggregation measurements.
+
+    Raises:
+      ValueError: If `client_keys` and `data` have different lengths.
+    """
+    if client_keys is None:
+      client_keys = range(len(data))
+    elif len(client_keys) != len(data):
+      raise ValueError('Found {} client datasets but {} client keys.'.format(
+          len(data), len(client_keys)))
+
+    model_outputs = []
+
+    def edge_values_fn(positions: List[int]):
+      weights_deltas = []
+      client_weights = []
+      for i in positions:
+        dataset = data[i]
+        if self._dataset_preprocess_comp is not None:
+          dataset = self._dataset_preprocess_comp(dataset)
+        client_output = self._client_update_tf(dataset, state.model,
+                                               state.round_num)
+        weights_deltas.append(client_output.weights_delta)
+        client_weights.append(float(client_output.client_weight))
+        model_outputs.append(client_output.model_output)
+      return weights_deltas, client_weights
+
+    model_delta, measurements = self._aggregator.aggregate_edges(
+        edge_values_fn, client_keys)
+    state = self._server_update_tf(state, model_delta)
+    metrics = self._federated_output_computation(model_outputs)
+    return adapters.IterationResult(state, metrics, measurements)
+
+
+def build_hierarchical_fed_avg_process(
+    model_fn: ModelBuilder,
+    client_optimizer_fn: OptimizerBuilder,
+    num_edges: int,
+    client_lr: Union[float, LRScheduleFn] = 0.1,
+    server_optimizer_fn: OptimizerBuilder = tf.keras.optimizers.SGD,
+    server_lr: Union[float, LRScheduleFn] = 1.0,
+    client_weight_fn: Optional[ClientWeightFn] = None,
+    dataset_preprocess_comp: Optional[tff.Computation] = None,
+    partition_fn: hierarchical_aggregation.PartitionFn = (
+        hierarchical_aggregation.default_partition_fn),
+    clip_norm: Optional[float] = None,
+    edge_aggregate_fn: Optional[tff.utils.StatefulAggregateFn] = None,
+    server_aggregate_fn: Optional[tff.utils.StatefulAggregateFn] = None,
+    client_model_fn: Optional[ModelBuilder] = None,
+) -> HierarchicalFedAvgProcessAdapter:
+  """Builds federated averaging with updates aggregated through edges.
+
+  With the default aggregators and no `clip_norm`, a round computes the same
+  weighted mean of client updates as `fed_avg_schedule.build_fed_avg_process`.
+
+  Args:
+    model_fn: A no-arg function that returns a `tff.learning.Model`.
+    client_optimizer_fn: A function that accepts a `learning_rate` keyword
+      argument and returns a `tf.keras.optimizers.Optimizer` instance.
+    num_edges: A positive integer, the number of edge aggregators.
+    client_lr: A scalar learning rate or a function that accepts a float
+      `round_num` argument and returns a learning rate.
+    server_optimizer_fn: A function that accepts a `learning_rate` argument and
+      returns a `tf.keras.optimizers.Optimizer` instance.
+    server_lr: A scalar learning rate or a function that accepts a float
+      `round_num` argument and returns a learning rate.
+    client_weight_fn: Optional function that takes the output of
+      `model.report_local_outputs` and returns a tensor that provides the weight
+      in the federated average of model deltas. If not provided, the default is
+      the total number of examples processed on device.
+    dataset_preprocess_comp: Optional `tff.Computation` applied to each client
+      dataset before training, with TFF type shorthand `(U* -> V*)`.
+    partition_fn: A function accepting a client key and `num_edges`, and
+      returning the index of the edge the client is assigned to.
+    clip_norm: An optional float. If set, each client update is clipped to this
+      global l2 norm at its edge.
+    edge_aggregate_fn: An optional `tff.utils.StatefulAggregateFn` used to
+      aggregate client updates at each edge.
+    server_aggregate_fn: An optional `tff.utils.StatefulAggregateFn` used to
+      aggregate edge updates at the server.
+    client_model_fn: An optional no-arg function returning the
+      `tff.learning.Model` trained on the clients, with the same weights as the
+      model of `model_fn`, e.g. built under a mixed precision policy by
+      `precision_utils.wrap_model_fn`. Defaults to `model_fn`, which builds the
+      server model.
+
+  Returns:
+    A `HierarchicalFedAvgProcessAdapter`.
+  """
+  if client_model_fn is None:
+    client_model_fn = model_fn
+
+  client_lr_schedule = client_lr
+  if not callable(client_lr_schedule):
+    client_lr_schedule = lambda round_num: client_lr
+
+  server_lr_schedule = server_lr
+  if not callable(server_lr_schedule):
+    server_lr_schedule = lambda round_num: server_lr
+
+  dummy_model = model_fn()
+
+  server_init_tf = fed_avg_schedule.build_server_init_fn(
+      model_fn,
+      # Initialize with the learning rate for round zero.
+      lambda: server_optimizer_fn(server_lr_schedule(0)))
+  server_state_type = server_init_tf.type_signature.result
+  model_weights_type = server_state_type.model
+  round_num_type = server_state_type.round_num
+  model_input_type = tff.SequenceType(dummy_model.input_spec)
+
+  @tff.tf_computation(model_input_type, model_weights_type, round_num_type)
+  def client_update_tf(tf_dataset, initial_model_weights, round_num):
+    client_lr = client_lr_schedule(round_num)
+    client_optimizer = client_optimizer_fn(client_lr)
+    client_update = fed_avg_schedule.create_client_update_fn()
+    return client_update(client_model_fn(), tf_dataset, initial_model_weights,
+                         client_optimizer, client_weight_fn)
+
+  @tff.tf_computation(server_state_type, model_weights_type.trainable)
+  def server_update_tf(server_state, model_delta):
+    model = model_fn()
+    server_lr = server_lr_schedule(server_state.round_num)
+    server_optimizer = server_optimizer_fn(server_lr)
+    # We initialize the server optimizer variables to avoid creating them
+    # within the scope of the tf.function server_update.
+    fed_avg_schedule._initialize_optimizer_vars(model, server_optimizer)  # pylint: disable=protected-access
+    return fed_avg_schedule.server_update(model, server_optimizer,
+                                          server_state, model_delta)
+
+  aggregator = hierarchical_aggregation.HierarchicalAggregator(
+      model_weights_type.trainable,
+      num_edges=num_edges,
+      partition_fn=partition_fn,
+      clip_norm=clip_norm,
+      edge_aggregate_fn=edge_aggregate_fn,
+      server_aggregate_fn=server_aggregate_fn)
+
+  return HierarchicalFedAvgProcessAdapter(
+      server_init_tf=server_init_tf,
+      client_update_tf=client_update_tf,
+      server_update_tf=server_update_tf,
+      federated_output_computation=dummy_model.federated_output_computation,
+      aggregator=aggregator,
+      dataset_preprocess_comp=dataset_preprocess_comp)
@@ -0,0 +1,90 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""End-to-end tests of hierarchical FedAvg on the MNIST model."""
+
+import collections
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.optimization.shared import fed_avg_schedule
+from tensorflow_federated.python.research.optimization.shared import hierarchical_fed_avg
+
+_Batch = collections.namedtuple('Batch', ['x', 'y'])
+
+
+def _batch_fn(value=1.0, label=1):
+  return _Batch(
+      x=np.full([1, 784], value, dtype=np.float32),
+      y=np.full([1, 1], label, dtype=np.int64))
+
+
+def _create_input_spec():
+  return _Batch(
+      x=tf.TensorSpec(shape=[None, 784], dtype=tf.float32),
+      y=tf.TensorSpec(dtype=tf.int64, shape=[None, 1]))
+
+
+def _uncompiled_model_builder():
+  keras_model = tff.simulation.models.mnist.create_keras_model(
+      compile_model=False)
+  return tff.learning.from_keras_model(
+      keras_model=keras_model,
+      input_spec=_create_input_spec(),
+      loss=tf.keras.losses.SparseCategoricalCrossentropy())
+
+
+def _federated_data():
+  return [
+      tf.data.Dataset.from_tensors(_batch_fn(value=0.1 * i, label=i))
+      for i in range(5)
+  ]
+
+
+class HierarchicalFedAvgTest(tf.test.TestCase):
+
+  def test_round_matches_flat_fed_avg(self):
+    flat_process = fed_avg_schedule.build_fed_avg_process(
+        _uncompiled_model_builder,
+        client_optimizer_fn=tf.keras.optimizers.SGD)
+    hierarchical_process = hierarchical_fed_avg.build_hierarchical_fed_avg_process(
+        _uncompiled_model_builder,
+        client_optimizer_fn=tf.keras.optimizers.SGD,
+        num_edges=2)
+
+    state = flat_process.initialize()
+    flat_result = flat_process.next(state, _federated_data())
+    hierarchical_result = hierarchical_process.next(state, _federated_data())
+
+    self.assertAllClose(flat_result.state.model.trainable,
+                        hierarchical_result.state.model.trainable)
+    self.assertEqual(hierarchical_result.state.round_num, 1.0)
+    self.assertAllClose(flat_result.metrics['loss'],
+                        hierarchical_result.metrics['loss'])
+    measurements = hierarchical_result.output
+    self.assertEqual(measurements['edge']['num_edges'], 2)
+    self.assertEqual(measurements['edge']['max_clients_per_edge'], 3)
+
+  def test_mismatched_client_keys_raises(self):
+    process = hierarchical_fed_avg.build_hierarchical_fed_avg_process(
+        _uncompiled_model_builder,
+        client_optimizer_fn=tf.keras.optimizers.SGD,
+        num_edges=2)
+    with self.assertRaises(ValueError):
+      process.next(process.initialize(), _federated_data(), client_keys=['a'])
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,125 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Utilities for training Keras models with mixed precision on clients.
+
+Under a mixed precision policy, Keras layers compute in a 16-bit floating point
+type while their variables are kept in float32. The model weights exchanged in
+federated averaging (and hence the `weights_delta` returned by clients) are
+therefore unaffected by the policy.
+
+The Keras policy is global, and a layer uses the policy in effect when it is
+constructed. `wrap_model_fn` therefore only sets the policy while the client
+model is built, so that the server and evaluation models are still built in
+float32, and a policy never leaks into models built later in the process.
+"""
+
+import contextlib
+from typing import Any, Callable
+
+import tensorflow as tf
+
+SUPPORTED_PRECISIONS = ['float32', 'mixed_bfloat16', 'mixed_float16']
+
+OptimizerBuilder = Callable[..., tf.keras.optimizers.Optimizer]
+# A no-arg function returning a `tff.learning.Model`.
+ModelBuilder = Callable[[], Any]
+
+
+def _check_precision(precision: str) -> None:
+  if precision not in SUPPORTED_PRECISIONS:
+    raise ValueError('Unsupported precision [{!s}], must be one of {!s}.'.format(
+        precision, SUPPORTED_PRECISIONS))
+
+
+@contextlib.contextmanager
+def policy_scope(precision: str):
+  """A context manager within which Keras models are built with `precision`.
+
+  The previous global policy is restored on exit.
+
+  Args:
+    precision: One of `SUPPORTED_PRECISIONS`.
+
+  Raises:
+    ValueError: If `precision` is not supported.
+  """
+  _check_precision(precision)
+  previous_policy = tf.keras.mixed_precision.experimental.global_policy()
+  tf.keras.mixed_precision.experimental.set_policy(precision)
+  try:
+    yield
+  finally:
+    tf.keras.mixed_precision.experimental.set_policy(previous_policy)
+
+
+def wrap_model_fn(model_fn: ModelBuilder, precision: str) -> ModelBuilder:
+  """Wraps `model_fn` to build its Keras model with `precision`.
+
+  Args:
+    model_fn: A no-arg function returning a `tff.learning.Model`, which builds
+      its Keras model when called.
+    precision: One of `SUPPORTED_PRECISIONS`.
+
+  Returns:
+    A no-arg function returning the model of `model_fn`, built within
+    `policy_scope(precision)`.
+
+  Raises:
+    ValueError: If `precision` is not supported.
+  """
+  _check_precision(precision)
+  if precision == 'float32':
+    return model_fn
+
+  def mixed_precision_model_fn():
+    with policy_scope(precision):
+      return model_fn()
+
+  return mixed_precision_model_fn
+
+
+def wrap_optimizer_fn(optimizer_fn: OptimizerBuilder,
+                      precision: str) -> OptimizerBuilder:
+  """Wraps `optimizer_fn` to use dynamic loss scaling if required.
+
+  Gradients computed in float16 may underflow, so for `mixed_float16` the
+  optimizer is wrapped in a `LossScaleOptimizer` with a dynamic loss scale.
+  `bfloat16` has the same exponent range as float32, so no loss scaling is
+  needed for `mixed_bfloat16`.
+
+  Args:
+    optimizer_fn: A function returning a `tf.keras.optimizers.Optimizer`.
+    precision: One of `SUPPORTED_PRECISIONS`.
+
+  Returns:
+    A function with the same arguments as `optimizer_fn`.
+
+  Raises:
+    ValueError: If `precision` is not supported.
+  """
+  _check_precision(precision)
+  if precision != 'mixed_float16':
+    return optimizer_fn
+
+  def loss_scale_optimizer_fn(*args, **kwargs):
+    return tf.keras.mixed_precision.experimental.LossScaleOptimizer(
+        optimizer_fn(*args, **kwargs), loss_scale='dynamic')
+
+  return loss_scale_optimizer_fn
+
+
+def is_loss_scale_optimizer(optimizer: tf.keras.optimizers.Optimizer) -> bool:
+  """Returns whether `optimizer` expects scaled losses and gradients."""
+  return isinstance(optimizer,
+                    tf.keras.mixed_precision.experimental.LossScaleOptimizer)
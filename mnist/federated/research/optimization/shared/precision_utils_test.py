@@ -0,0 +1,116 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from absl.testing import parameterized
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_federated.python.research.optimization.shared import precision_utils
+
+
+def _build_keras_model():
+  return tf.keras.Sequential([
+      tf.keras.layers.Dense(8, activation='relu', input_shape=(4,)),
+      tf.keras.layers.Dense(1),
+  ])
+
+
+def _train(model, initial_weights, num_steps=20):
+  """Trains `model` with SGD on a fixed regression, and returns its losses."""
+  model.set_weights(initial_weights)
+  x = tf.constant(np.linspace(-1.0, 1.0, 64).reshape([16, 4]), tf.float32)
+  y = tf.reduce_sum(x, axis=1, keepdims=True)
+  optimizer = tf.keras.optimizers.SGD(learning_rate=0.1)
+  losses = []
+  for _ in range(num_steps):
+    with tf.GradientTape() as tape:
+      predictions = tf.cast(model(x), tf.float32)
+      loss = tf.reduce_mean(tf.square(predictions - y))
+    gradients = tape.gradient(loss, model.trainable_variables)
+    optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+    losses.append(loss.numpy())
+  return losses
+
+
+class PrecisionUtilsTest(tf.test.TestCase, parameterized.TestCase):
+
+  def tearDown(self):
+    tf.keras.mixed_precision.experimental.set_policy('float32')
+    super().tearDown()
+
+  def test_wrap_model_fn_keeps_float32_variables(self):
+    model_fn = precision_utils.wrap_model_fn(_build_keras_model,
+                                             'mixed_bfloat16')
+    model = model_fn()
+    outputs = model(tf.ones([1, 4]))
+    self.assertEqual(outputs.dtype, tf.bfloat16)
+    for variable in model.variables:
+      self.assertEqual(variable.dtype, tf.float32)
+
+  def test_wrap_model_fn_restores_policy(self):
+    precision_utils.wrap_model_fn(_build_keras_model, 'mixed_bfloat16')()
+    # Models built later, e.g. on the server, are not affected.
+    self.assertEqual(_build_keras_model()(tf.ones([1, 4])).dtype, tf.float32)
+    self.assertEqual(
+        tf.keras.mixed_precision.experimental.global_policy().name, 'float32')
+
+  def test_wrap_model_fn_is_noop_for_float32(self):
+    self.assertIs(
+        precision_utils.wrap_model_fn(_build_keras_model, 'float32'),
+        _build_keras_model)
+
+  def test_policy_scope_restores_policy_on_error(self):
+    with self.assertRaises(RuntimeError):
+      with precision_utils.policy_scope('mixed_float16'):
+        raise RuntimeError()
+    self.assertEqual(
+        tf.keras.mixed_precision.experimental.global_policy().name, 'float32')
+
+  def test_raises_on_unknown_precision(self):
+    with self.assertRaises(ValueError):
+      precision_utils.wrap_model_fn(_build_keras_model, 'float8')
+    with self.assertRaises(ValueError):
+      with precision_utils.policy_scope('float8'):
+        pass
+
+  @parameterized.named_parameters(('bfloat16', 'mixed_bfloat16'),
+                                  ('float16', 'mixed_float16'))
+  def test_mixed_precision_training_matches_float32(self, precision):
+    tf.random.set_seed(0)
+    float32_model = _build_keras_model()
+    initial_weights = float32_model.get_weights()
+    float32_losses = _train(float32_model, initial_weights)
+    mixed_losses = _train(
+        precision_utils.wrap_model_fn(_build_keras_model, precision)(),
+        initial_weights)
+    self.assertLess(float32_losses[-1], 0.5 * float32_losses[0])
+    # bfloat16 keeps 8 bits of mantissa, hence a ~0.4% relative error.
+    self.assertAllClose(mixed_losses, float32_losses, rtol=0.05, atol=1e-3)
+
+  def test_wrap_optimizer_fn_uses_loss_scaling_for_float16(self):
+    optimizer_fn = precision_utils.wrap_optimizer_fn(tf.keras.optimizers.SGD,
+                                                     'mixed_float16')
+    optimizer = optimizer_fn(learning_rate=0.1)
+    self.assertTrue(precision_utils.is_loss_scale_optimizer(optimizer))
+
+  def test_wrap_optimizer_fn_is_noop_for_bfloat16(self):
+    optimizer_fn = precision_utils.wrap_optimizer_fn(tf.keras.optimizers.SGD,
+                                                     'mixed_bfloat16')
+    self.assertIs(optimizer_fn, tf.keras.optimizers.SGD)
+    self.assertFalse(
+        precision_utils.is_loss_scale_optimizer(optimizer_fn(0.1)))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -13,10 +13,7 @@
 # limitations under the License.
 """Script for training + evaluating models for Semi-Cyclic SGD paper."""
 
-import csv
-import datetime
 import os
-import random
 import sys
 import time
 
@@ -40,6 +37,10 @@ flags.DEFINE_string(
     'dictionary', os.path.join(RAWDATA, 'dict.txt'),
     'Dictionary file (one word per line, descending by '
     'frequency).')
+flags.DEFINE_string(
+    'cache_dir', os.path.join(RAWDATA, 'cache'),
+    'Directory caching the tokenized training and test data, so that the CSV '
+    'files are only parsed once. If empty, no cache is used.')
 flags.DEFINE_float('lr', 0.215, 'Learning rate.')
 flags.DEFINE_integer('batch_size', 128, 'Minibatch size.')
 flags.DEFINE_integer('num_days', 10, 'Number of days to train')
@@ -74,12 +75,11 @@ flags.DEFINE_integer(
 class Model(object):
   """Class representing a logistic regression model using bag-of-words."""
 
-  def __init__(self, lr, vocab, bow_limit):
+  def __init__(self, lr, vocab):
     self.vocab = vocab
     self.input_dim = len(self.vocab)
     self.lr = lr
     self.num_classes = 2
-    self.bow_limit = bow_limit
     self._optimizer = None
 
   @property
@@ -92,53 +92,105 @@ class Model(object):
 
   def create_model(self):
     """Creates a TF model and returns ops necessary to run training/eval."""
-    features = tf.compat.v1.placeholder(tf.float32, [None, self.input_dim])
-    labels = tf.compat.v1.placeholder(tf.float32, [None, self.num_classes])
+    # Bag-of-words features are fed as a sparse matrix, labels as class ids.
+    features = tf.compat.v1.sparse_placeholder(tf.float32,
+                                               [None, self.input_dim])
+    labels = tf.compat.v1.placeholder(tf.int64, [None])
 
     w = tf.Variable(tf.random.normal(shape=[self.input_dim, self.num_classes]))
     b = tf.Variable(tf.random.normal(shape=[self.num_classes]))
 
-    pred = tf.nn.softmax(tf.matmul(features, w) + b)
+    logits = tf.sparse.sparse_dense_matmul(features, w) + b
 
-    loss = tf.reduce_mean(-tf.reduce_sum(labels * tf.math.log(pred), axis=1))
+    loss = tf.reduce_mean(
+        tf.nn.sparse_softmax_cross_entropy_with_logits(
+            labels=labels, logits=logits))
     train_op = self.optimizer.minimize(
         loss=loss, global_step=tf.train.get_or_create_global_step())
 
-    correct_pred = tf.equal(tf.argmax(pred, 1), tf.argmax(labels, 1))
+    correct_pred = tf.equal(tf.argmax(logits, 1), labels)
     eval_metric_op = tf.count_nonzero(correct_pred)
 
     return features, labels, train_op, loss, eval_metric_op
 
-  def process_x(self, raw_batch):
-    x_batch = [e[0][4] for e in raw_batch]  # list of lines/phrases
-    bags = np.zeros((len(raw_batch), len(self.vocab)))
-    su.bag_of_words(x_batch, bags, self.bow_limit)
-    return bags
+  def process_x(self, batch):
+    # The bag-of-words of the batch, see CyclicDataGenerator.make_batch.
+    return tf.compat.v1.SparseTensorValue(*batch[0])
 
-  def process_y(self, raw_batch):
-    y_batch = [int(e[1]) for e in raw_batch]
-    y_batch = [su.val_to_vec(self.num_classes, e) for e in y_batch]
-    y_batch = np.array(y_batch)
-    return y_batch
+  def process_y(self, batch):
+    return batch[1]
 
 
 class CyclicDataGenerator(object):
   """Generates minibatches from data grouped by day & group.
 
+  The data is held in columnar form: the bag-of-words of all examples is a
+  single matrix in CSR format, next to an int64 array of labels. The examples
+  of each group are stored contiguously, in (shuffled) processing order, so
+  that a block of a group is a range of rows, and a minibatch shares the word
+  IDs and counts of these arrays rather than copying them. Minibatches are pairs
+  (features, labels), where features is the bag-of-words matrix of the batch in
+  sparse COO format.
+
   The class does not handle loading or preprocessing (such as shuffling) of
-  data, and subclasses should implement that in their constructor.
+  data, and subclasses should implement that in their constructor, and then
+  call set_groups().
   """
 
   def __init__(self, logger, num_groups, num_examples_per_day_per_group,
                batch_size):
-    # self.data has num_groups list. Each contains the entire data of that
-    # group, which is processed in a round-robin manner, see comments on get().
+    # Each group contains the entire data of that group, which is processed in
+    # a round-robin manner, see comments on get().
     assert batch_size != 0
     self.logger = logger
     self.num_groups = num_groups
-    self.data = [[] for _ in range(0, num_groups)]  # can't use [[]]*num_groups
     self.num_examples_per_day_per_group = num_examples_per_day_per_group
     self.batch_size = batch_size
+    # Set by set_groups().
+    self.vocab_size = None
+    self.features = None
+    self.labels = None
+    self.group_offsets = None
+
+  def set_groups(self, data, group_row_ids, vocab_size, bow_limit):
+    """Featurizes the examples of each group, in processing order.
+
+    Args:
+      data: A sentiment_util.Sentiment140 tuple.
+      group_row_ids: A list with, for each group, the int array of the rows of
+        data in that group, in the order in which they are processed.
+      vocab_size: The size of the vocabulary used to tokenize data.
+      bow_limit: Max num of words in bow presentation (0: unlimited).
+    """
+    row_ids = np.concatenate(group_row_ids).astype(np.int64)
+    self.vocab_size = vocab_size
+    self.features = su.tokens_to_bag_of_words(data.token_indptr, data.token_ids,
+                                              row_ids, vocab_size, bow_limit)
+    self.labels = data.labels[row_ids]
+    self.group_offsets = np.zeros(len(group_row_ids) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in group_row_ids], out=self.group_offsets[1:])
+
+  def group_size(self, group):
+    return int(self.group_offsets[group + 1] - self.group_offsets[group])
+
+  def make_batch(self, group, start, end):
+    """Returns the minibatch holding examples start..end-1 of a group.
+
+    Args:
+      group: The group of the examples.
+      start: The index of the first example, in [0, group_size(group)).
+      end: The index after the last example. If end > group_size(group), the
+        batch wraps around to the start of the group.
+    """
+    offset = self.group_offsets[group]
+    indptr, indices, values = self.features
+    if end <= self.group_size(group):
+      return (su.csr_slice_to_coo(indptr, indices, values, offset + start,
+                                  offset + end, self.vocab_size),
+              self.labels[offset + start:offset + end])
+    row_ids = offset + np.arange(start, end) % self.group_size(group)
+    return (su.csr_rows_to_coo(indptr, indices, values, row_ids,
+                               self.vocab_size), self.labels[row_ids])
 
   def get(self, day, group):
     """Gets data for training - a generator representing one block."""
@@ -152,49 +204,20 @@ class CyclicDataGenerator(object):
     end_index = (day + 1) * self.num_examples_per_day_per_group
 
     for i in range(start_index, end_index, self.batch_size):
-      group_size = len(self.data[group])
+      group_size = self.group_size(group)
       assert group_size >= self.batch_size
       i_mod = i % group_size
-      if i_mod + self.batch_size <= group_size:
-        result = self.data[group][i_mod:i_mod + self.batch_size]
-        if not result:
-          print(day, group, self.num_groups, start_index, end_index, i,
-                group_size, i_mod, self.batch_size)
-      else:
-        result = self.data[group][i_mod:]
-        remainder = self.batch_size - len(result)
-        result.extend(self.data[group][:remainder])
-        if not result:
-          print(day, group, self.num_groups, start_index, end_index, i,
-                group_size, i_mod, self.batch_size)
-      yield result
+      yield self.make_batch(group, i_mod, i_mod + self.batch_size)
 
   def get_test_data(self, group):
     # Gets all data for a group, ignoring num_examples_per_day. Used for test
-    # data where splitting into days may be undesired.
+    # data where splitting into days may be undesired. The data is returned as
+    # a single batch, holding the examples of all full minibatches of the group.
     assert group < self.num_groups
-    for i in range(0,
-                   len(self.data[group]) - self.batch_size + 1,
-                   self.batch_size):
-      yield self.data[group][i:i + self.batch_size]
-
-  def process_row(self, row, vocab):
-    """Utility function that preprocesses a Sentiment140 training example.
-
-    Args:
-      row: a row, split into items, from the Sentiment140 CSV file.
-      vocab: a vocabulary for tokenization.  The example is processed by
-        converting the label to an integer, and tokenizing the text of the post.
-        The argument row is modified in place.
-    """
-    if row[0] == '1':
-      row[0] = 1
-    elif row[0] == '0':
-      row[0] = 0
-    else:
-      raise ValueError('label neither 0 nor 1, but: type {}, value {}'.format(
-          type(row[0]), row[0]))
-    row[5] = su.line_to_word_ids(row[5], vocab)
+    num_examples = (
+        self.group_size(group) // self.batch_size) * self.batch_size
+    if num_examples > 0:
+      yield self.make_batch(group, 0, num_examples)
 
 
 class IidDataGenerator(CyclicDataGenerator):
@@ -208,23 +231,23 @@ class IidDataGenerator(CyclicDataGenerator):
 
   def __init__(self,
                logger,
-               path,
-               vocab,
+               data,
+               vocab_size,
                num_groups,
                num_examples_per_day_per_group,
-               batch_size=0):
+               batch_size=0,
+               bow_limit=0,
+               seed=None):
     CyclicDataGenerator.__init__(self, logger, num_groups,
                                  num_examples_per_day_per_group, batch_size)
-    with open(path, 'r') as f:
-      csv_reader = csv.reader(f, delimiter=',')
-      i = 0
-      for row in csv_reader:
-        self.process_row(row, vocab)
-        label = row[0]
-        self.data[i % self.num_groups].append([row[1:], label])
-        i += 1
+    random_state = np.random.RandomState(seed)
+    rows = np.arange(len(data.labels))
+    group_row_ids = []
     for g in range(0, self.num_groups):
-      random.shuffle(self.data[g])
+      group_rows = rows[g::self.num_groups].copy()
+      random_state.shuffle(group_rows)
+      group_row_ids.append(group_rows)
+    self.set_groups(data, group_row_ids, vocab_size, bow_limit)
 
 
 class NonIidDataGenerator(CyclicDataGenerator):
@@ -232,12 +255,14 @@ class NonIidDataGenerator(CyclicDataGenerator):
 
   def __init__(self,
                logger,
-               path,
-               vocab,
+               data,
+               vocab_size,
                num_groups,
                num_examples_per_day_per_group,
                bias,
-               batch_size=0):
+               batch_size=0,
+               bow_limit=0,
+               seed=None):
     CyclicDataGenerator.__init__(self, logger, num_groups,
                                  num_examples_per_day_per_group, batch_size)
     # Bias parameter b=0..1 specifies how much to bias. In group 0, we drop
@@ -252,32 +277,27 @@ class NonIidDataGenerator(CyclicDataGenerator):
         range(num_groups // 2 + 1), [0, num_groups / 2],
         [-bias, bias]).tolist()
     biases.extend(biases[-2:0:-1])
-    with open(path, 'r') as f:
-      csv_reader = csv.reader(f, delimiter=',')
-      for row in csv_reader:
-        self.process_row(row, vocab)
-        label = row[0]
-        t = datetime.datetime.strptime(row[2], '%a %b %d %H:%M:%S %Z %Y')
-        # 1. Split by time of day into num_groups.
-        assert 24 % num_groups == 0
-        group = int(t.hour / (24 / num_groups))
-        # 2. Introduce further bias by dropping examples.
-        if bias > 0.0:
-          r = random.random()
-          b = biases[group]
-          # Drop neg?
-          if b < 0:
-            if label == 1 or r >= abs(b):
-              self.data[group].append([row[1:], label])
-          else:
-            if label == 0 or r >= b:
-              self.data[group].append([row[1:], label])
-        else:
-          # No biasing, add unconditionally.
-          self.data[group].append([row[1:], label])
+    random_state = np.random.RandomState(seed)
+    # 1. Split by time of day into num_groups.
+    assert 24 % num_groups == 0
+    groups = data.hours.astype(np.int64) // (24 // num_groups)
+    # 2. Introduce further bias by dropping examples.
+    if bias > 0.0:
+      r = random_state.random_sample(len(data.labels))
+      b = np.array(biases)[groups]
+      # Drop neg where b < 0, and pos where b >= 0.
+      keep = np.where(b < 0, (data.labels == 1) | (r >= np.abs(b)),
+                      (data.labels == 0) | (r >= b))
+    else:
+      # No biasing, keep unconditionally.
+      keep = np.ones(len(data.labels), dtype=bool)
+    group_row_ids = []
     for g in range(0, self.num_groups):
-      logger.log('group {}: {} examples'.format(g, len(self.data[g])))
-      random.shuffle(self.data[g])
+      group_rows = np.nonzero(keep & (groups == g))[0]
+      logger.log('group {}: {} examples'.format(g, len(group_rows)))
+      random_state.shuffle(group_rows)
+      group_row_ids.append(group_rows)
+    self.set_groups(data, group_row_ids, vocab_size, bow_limit)
 
 
 class Logger(object):
@@ -338,14 +358,14 @@ def test(test_data,
   t_process_y = 0
   t_process_tf = 0
   for b in test_data.get_test_data(g):
-    t1 = time.clock()
+    t1 = time.perf_counter()
     x = model.process_x(b)
-    t2 = time.clock()
+    t2 = time.perf_counter()
     y = model.process_y(b)
-    t3 = time.clock()
-    num_test_examples = num_test_examples + len(x)
+    t3 = time.perf_counter()
+    num_test_examples = num_test_examples + len(y)
     num_correct_ = sess.run([eval_metric_op], {features: x, labels: y})
-    t4 = time.clock()
+    t4 = time.perf_counter()
     num_correct = num_correct + num_correct_[0]
     t_process_x = t_process_x + (t2 - t1)
     t_process_y = t_process_y + (t3 - t2)
@@ -370,25 +390,32 @@ def init(logger):
         break
   logger.log('Read vocabulary with %d words' % len(vocab))
   logger.log('Loading training & testing data')
+  training_columns = su.load_sentiment140(FLAGS.training_data, vocab,
+                                          FLAGS.cache_dir)
+  test_columns = su.load_sentiment140(FLAGS.test_data, vocab, FLAGS.cache_dir)
   if FLAGS.mode == 'iid':
     training_data = IidDataGenerator(
-        logger, FLAGS.training_data, vocab, FLAGS.num_groups,
+        logger, training_columns, len(vocab), FLAGS.num_groups,
         int(FLAGS.num_train_examples_per_day / FLAGS.num_groups),
-        FLAGS.batch_size)
-    test_data = IidDataGenerator(logger, FLAGS.test_data, vocab,
-                                 FLAGS.num_groups, 0, FLAGS.batch_size)
+        FLAGS.batch_size, FLAGS.bow_limit, seed=FLAGS.replica)
+    test_data = IidDataGenerator(logger, test_columns, len(vocab),
+                                 FLAGS.num_groups, 0, FLAGS.batch_size,
+                                 FLAGS.bow_limit, seed=FLAGS.replica)
   else:
     training_data = NonIidDataGenerator(
-        logger, FLAGS.training_data, vocab, FLAGS.num_groups,
+        logger, training_columns, len(vocab), FLAGS.num_groups,
         int(FLAGS.num_train_examples_per_day / FLAGS.num_groups), FLAGS.bias,
-        FLAGS.batch_size)
-    test_data = NonIidDataGenerator(logger, FLAGS.test_data, vocab,
+        FLAGS.batch_size, FLAGS.bow_limit, seed=FLAGS.replica)
+    test_data = NonIidDataGenerator(logger, test_columns, len(vocab),
                                     FLAGS.num_groups, 0, FLAGS.bias,
-                                    FLAGS.batch_size)
+                                    FLAGS.batch_size, FLAGS.bow_limit,
+                                    seed=FLAGS.replica)
   return vocab, training_data, test_data
 
 
 def main(unused_args):
+  if FLAGS.mode not in ('iid', 'sep', 'sc'):
+    raise ValueError('unsupported mode %s' % FLAGS.mode)
   logger = Logger(10)
   log_config(logger)
   vocab, training_data, test_data = init(logger)
@@ -400,7 +427,7 @@ def main(unused_args):
   else:
     num_models = 1
   for _ in range(num_models):
-    model = Model(FLAGS.lr, vocab, FLAGS.bow_limit)
+    model = Model(FLAGS.lr, vocab)
     features, labels, train_op, loss_op, eval_metric_op = model.create_model()
     models.append({
         'model': model,
@@ -424,7 +451,7 @@ def main(unused_args):
         for batch in training_data.get(d, g):
           x = m['model'].process_x(batch)
           y = m['model'].process_y(batch)
-          num_train_examples = num_train_examples + len(x)
+          num_train_examples = num_train_examples + len(y)
           loss, _ = sess.run([m['loss_op'], m['train_op']], {
               m['features']: x,
               m['labels']: y
@@ -448,50 +475,20 @@ def main(unused_args):
                   gt,
                   num_train_examples,
                   prefix='debug ')
-        if FLAGS.mode == 'iid':
-          for gt in range(0, FLAGS.num_groups):
-            test(
-                test_data,
-                m['model'],
-                sess,
-                m['eval_metric_op'],
-                m['features'],
-                m['labels'],
-                logger,
-                d,
-                gt,
-                num_train_examples,
-                prefix='iid %d on %d: ' % (g, gt))
-        elif FLAGS.mode == 'sep':
-          for gt in range(0, FLAGS.num_groups):
-            test(
-                test_data,
-                m['model'],
-                sess,
-                m['eval_metric_op'],
-                m['features'],
-                m['labels'],
-                logger,
-                d,
-                gt,
-                num_train_examples,
-                prefix='sep %d on %d: ' % (g, gt))
-        elif FLAGS.mode == 'sc':
-          for gt in range(0, FLAGS.num_groups):
-            test(
-                test_data,
-                m['model'],
-                sess,
-                m['eval_metric_op'],
-                m['features'],
-                m['labels'],
-                logger,
-                d,
-                gt,
-                num_train_examples,
-                prefix='sc %d on %d: ' % (g, gt))
-        else:
-          raise ValueError('unsupported mode %s' % FLAGS.mode)
+        # Evaluate on each group of the test data, each as one batched pass.
+        for gt in range(0, FLAGS.num_groups):
+          test(
+              test_data,
+              m['model'],
+              sess,
+              m['eval_metric_op'],
+              m['features'],
+              m['labels'],
+              logger,
+              d,
+              gt,
+              num_train_examples,
+              prefix='%s %d on %d: ' % (FLAGS.mode, g, gt))
   logger.log('END_MARKER')
 
 
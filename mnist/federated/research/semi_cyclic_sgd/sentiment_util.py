@@ -13,8 +13,25 @@
 # limitations under the License.
 """Tools to process Sentiment140 data (building a dict, tokenizing etc.)"""
 
+import calendar
+import collections
+import csv
+import datetime
+import hashlib
+import json
+import os
 import re
 
+import numpy as np
+
+# A Sentiment140 CSV file in columnar form. Example i has label labels[i] (0 or
+# 1), was posted at timestamps[i] (seconds since the epoch, UTC) and hour of day
+# hours[i], and its text is tokenized to the word IDs
+# token_ids[token_indptr[i]:token_indptr[i + 1]].
+Sentiment140 = collections.namedtuple(
+    'Sentiment140',
+    ['labels', 'timestamps', 'hours', 'token_indptr', 'token_ids'])
+
 
 def line_to_word_ids(line, vocab):
   # Splits a line into words and maps them to word IDs from vocab.
@@ -24,19 +41,127 @@ def line_to_word_ids(line, vocab):
   return [vocab[w] for w in words if w in vocab]
 
 
-def bag_of_words(x_batch, bags, limit=0):
-  # Converts a python list-of-list (batch x num_word_ids) to a numpy
-  # matrix (batch_size x vocab_size), each element indicating
-  # the number of occurrences of a word in a sentence (capped by "limit").
-  for i, word_ids in enumerate(x_batch):
-    for word_id in word_ids:
-      if limit == 0 or bags[i, word_id] < limit:
-        bags[i, word_id] += 1
+def load_sentiment140(path, vocab, cache_dir=None):
+  # Parses a (preprocessed) Sentiment140 CSV file into a Sentiment140 tuple of
+  # numpy arrays. If cache_dir is set, the arrays are cached there in binary
+  # form, keyed by the file (path, size and modification time) and vocab, so
+  # that the CSV is only parsed and tokenized once.
+  cache_path = None
+  if cache_dir:
+    stat = os.stat(path)
+    vocab_words = sorted(vocab, key=vocab.get)
+    key = json.dumps([
+        os.path.abspath(path), stat.st_size, stat.st_mtime_ns,
+        hashlib.sha1('\n'.join(vocab_words).encode('utf-8')).hexdigest()
+    ])
+    cache_path = os.path.join(
+        cache_dir, '{}_{}.npz'.format(
+            os.path.basename(path),
+            hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]))
+    if os.path.exists(cache_path):
+      with np.load(cache_path) as arrays:
+        return Sentiment140(**{name: arrays[name] for name in arrays.files})
+
+  labels = []
+  timestamps = []
+  hours = []
+  lengths = []
+  token_ids = []
+  with open(path, 'r') as f:
+    for row in csv.reader(f, delimiter=','):
+      if row[0] not in ('0', '1'):
+        raise ValueError('label neither 0 nor 1, but: type {}, value {}'.format(
+            type(row[0]), row[0]))
+      labels.append(int(row[0]))
+      t = datetime.datetime.strptime(row[2], '%a %b %d %H:%M:%S %Z %Y')
+      timestamps.append(calendar.timegm(t.timetuple()))
+      hours.append(t.hour)
+      word_ids = line_to_word_ids(row[5], vocab)
+      lengths.append(len(word_ids))
+      token_ids.extend(word_ids)
+  token_indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+  np.cumsum(lengths, out=token_indptr[1:])
+  data = Sentiment140(
+      labels=np.array(labels, dtype=np.int64),
+      timestamps=np.array(timestamps, dtype=np.int64),
+      hours=np.array(hours, dtype=np.int8),
+      token_indptr=token_indptr,
+      token_ids=np.array(token_ids, dtype=np.int32))
+
+  if cache_path is not None:
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first, so that concurrent runs never read a
+    # partially written cache.
+    tmp_path = '{}.{}.tmp.npz'.format(cache_path, os.getpid())
+    np.savez(tmp_path, **data._asdict())
+    os.replace(tmp_path, cache_path)
+  return data
+
+
+def tokens_to_bag_of_words(token_indptr, token_ids, row_ids, vocab_size,
+                           limit=0):
+  # Converts the rows row_ids (in that order) of the tokens of a Sentiment140
+  # tuple to a (len(row_ids) x vocab_size) bag-of-words matrix, each element
+  # indicating the number of occurrences of a word in a sentence (capped by
+  # "limit"), in compressed sparse row (CSR) format: returns
+  # (indptr, indices, values), where the word IDs of row i and their capped
+  # counts are indices[indptr[i]:indptr[i + 1]] and values[...], respectively.
+  row_ids = np.asarray(row_ids, dtype=np.int64)
+  rows, word_ids = _gather_rows(token_indptr, token_ids, row_ids)
+  return _to_csr(
+      *_count_word_ids(rows, word_ids, vocab_size, limit),
+      num_rows=len(row_ids))
+
+
+def csr_rows_to_coo(indptr, indices, values, row_ids, vocab_size):
+  # Gathers the rows row_ids (an int array) of a CSR matrix, and returns them
+  # as a (len(row_ids) x vocab_size) matrix in COO format (indices, values,
+  # dense_shape), as expected by tf.compat.v1.SparseTensorValue.
+  rows, positions = _gather_positions(indptr, row_ids)
+  return (np.stack([rows, indices[positions]], axis=1), values[positions],
+          np.array([len(row_ids), vocab_size], dtype=np.int64))
+
+
+def csr_slice_to_coo(indptr, indices, values, start, end, vocab_size):
+  # Like csr_rows_to_coo, for the contiguous rows start..end-1. The word IDs and
+  # values of the result are views of indices and values, rather than copies.
+  begin = indptr[start]
+  lengths = np.diff(indptr[start:end + 1])
+  rows = np.repeat(np.arange(end - start, dtype=np.int64), lengths)
+  cols = indices[begin:indptr[end]]
+  return (np.stack([rows, cols], axis=1), values[begin:indptr[end]],
+          np.array([end - start, vocab_size], dtype=np.int64))
+
+
+def _gather_positions(indptr, row_ids):
+  # Returns the (output row, position) of every entry of the rows row_ids of a
+  # CSR matrix, in order.
+  starts = indptr[row_ids]
+  lengths = indptr[row_ids + 1] - starts
+  # Position of each gathered entry within its row, plus the row start.
+  offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+  positions = np.arange(lengths.sum()) - offsets + np.repeat(starts, lengths)
+  rows = np.repeat(np.arange(len(row_ids), dtype=np.int64), lengths)
+  return rows, positions
+
+
+def _gather_rows(indptr, indices, row_ids):
+  rows, positions = _gather_positions(indptr, row_ids)
+  return rows, indices[positions]
+
+
+def _to_csr(rows, cols, counts, num_rows):
+  indptr = np.zeros(num_rows + 1, dtype=np.int64)
+  np.cumsum(np.bincount(rows, minlength=num_rows), out=indptr[1:])
+  return indptr, cols, counts.astype(np.float32)
 
 
-def val_to_vec(size, val):
-  # Creates a one-hot vector, length size, 1 at index val.
-  assert 0 <= val < size
-  vec = [0] * size
-  vec[int(val)] = 1
-  return vec
+def _count_word_ids(row_ids, word_ids, vocab_size, limit):
+  # Returns (rows, cols, counts) int64 arrays holding the number of occurrences
+  # (capped by "limit") of each distinct word ID in each row, sorted by row,
+  # then word ID. All rows are counted at once with np.unique.
+  keys, counts = np.unique(
+      row_ids * vocab_size + word_ids.astype(np.int64), return_counts=True)
+  if limit > 0:
+    counts = np.minimum(counts, limit)
+  return keys // vocab_size, keys % vocab_size, counts
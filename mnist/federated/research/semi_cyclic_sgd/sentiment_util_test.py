@@ -0,0 +1,127 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the Sentiment140 parsing and bag-of-words tools."""
+
+import csv
+import os
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_federated.python.research.semi_cyclic_sgd import sentiment_util as su
+
+_VOCAB = {'good': 0, 'bad': 1, 'day': 2, '!': 3, "isn't": 4}
+
+_ROWS = [
+    ['1', '10', 'Mon Apr 06 22:19:45 UTC 2009', 'NO_QUERY', 'a',
+     'good good good day !'],
+    ['0', '11', 'Tue Apr 07 03:00:00 UTC 2009', 'NO_QUERY', 'b',
+     "bad day, isn't it"],
+    ['1', '12', 'Tue Apr 07 09:30:00 UTC 2009', 'NO_QUERY', 'c', 'unknown'],
+    ['0', '13', 'Wed Apr 08 23:59:59 UTC 2009', 'NO_QUERY', 'd',
+     'bad bad ! bad ! day'],
+]
+
+
+def _bag_of_words_per_row(x_batch, vocab_size, limit=0):
+  # The per-row loop that the CSR helpers replace.
+  bags = np.zeros((len(x_batch), vocab_size))
+  for i, word_ids in enumerate(x_batch):
+    for word_id in word_ids:
+      if limit == 0 or bags[i, word_id] < limit:
+        bags[i, word_id] += 1
+  return bags
+
+
+def _csr_to_dense(indptr, indices, values, vocab_size):
+  dense = np.zeros((len(indptr) - 1, vocab_size))
+  for i in range(len(indptr) - 1):
+    row = slice(indptr[i], indptr[i + 1])
+    dense[i, indices[row]] = values[row]
+  return dense
+
+
+def _coo_to_dense(indices, values, dense_shape):
+  dense = np.zeros(dense_shape)
+  dense[indices[:, 0], indices[:, 1]] = values
+  return dense
+
+
+class SentimentUtilTest(tf.test.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.path = os.path.join(self.create_tempdir().full_path, 'train.csv')
+    with open(self.path, 'w') as f:
+      csv.writer(f).writerows(_ROWS)
+    self.word_ids = [su.line_to_word_ids(row[5], _VOCAB) for row in _ROWS]
+
+  def test_load_sentiment140(self):
+    data = su.load_sentiment140(self.path, _VOCAB)
+    self.assertAllEqual(data.labels, [1, 0, 1, 0])
+    self.assertAllEqual(data.hours, [22, 3, 9, 23])
+    # 2009-04-06 22:19:45 UTC, then 4h40m15s later.
+    self.assertEqual(data.timestamps[0], 1239056385)
+    self.assertEqual(data.timestamps[1] - data.timestamps[0],
+                     4 * 3600 + 40 * 60 + 15)
+    for i, word_ids in enumerate(self.word_ids):
+      self.assertAllEqual(
+          data.token_ids[data.token_indptr[i]:data.token_indptr[i + 1]],
+          word_ids)
+
+  def test_load_sentiment140_reads_cache(self):
+    cache_dir = self.create_tempdir().full_path
+    data = su.load_sentiment140(self.path, _VOCAB, cache_dir=cache_dir)
+    self.assertLen(os.listdir(cache_dir), 1)
+
+    with mock.patch.object(
+        su, 'line_to_word_ids',
+        side_effect=AssertionError('The csv file was parsed.')):
+      cached_data = su.load_sentiment140(self.path, _VOCAB, cache_dir=cache_dir)
+    for array, cached_array in zip(data, cached_data):
+      self.assertAllEqual(array, cached_array)
+
+    # Another vocabulary is cached separately.
+    su.load_sentiment140(self.path, {'good': 0}, cache_dir=cache_dir)
+    self.assertLen(os.listdir(cache_dir), 2)
+
+  def test_tokens_to_bag_of_words_matches_per_row_loop(self):
+    data = su.load_sentiment140(self.path, _VOCAB)
+    row_ids = [3, 0, 2, 1, 3]
+    for limit in [0, 1, 2]:
+      indptr, indices, values = su.tokens_to_bag_of_words(
+          data.token_indptr, data.token_ids, row_ids, len(_VOCAB), limit)
+      self.assertAllEqual(
+          _csr_to_dense(indptr, indices, values, len(_VOCAB)),
+          _bag_of_words_per_row([self.word_ids[i] for i in row_ids],
+                                len(_VOCAB), limit))
+
+  def test_csr_to_coo_matches_dense_rows(self):
+    data = su.load_sentiment140(self.path, _VOCAB)
+    indptr, indices, values = su.tokens_to_bag_of_words(
+        data.token_indptr, data.token_ids, np.arange(len(_ROWS)), len(_VOCAB))
+    dense = _bag_of_words_per_row(self.word_ids, len(_VOCAB))
+
+    row_ids = np.array([2, 3, 0, 3])
+    self.assertAllEqual(
+        _coo_to_dense(*su.csr_rows_to_coo(indptr, indices, values, row_ids,
+                                          len(_VOCAB))), dense[row_ids])
+    self.assertAllEqual(
+        _coo_to_dense(*su.csr_slice_to_coo(indptr, indices, values, 1, 4,
+                                           len(_VOCAB))), dense[1:4])
+
+
+if __name__ == '__main__':
+  tf.test.main()
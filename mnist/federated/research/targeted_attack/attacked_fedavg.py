@@ -87,6 +87,29 @@ def _get_weights(model):
   return tff.learning.framework.ModelWeights.from_model(model)
 
 
+def empty_dataset_like(dataset):
+  """Returns an empty `tf.data.Dataset` with the element spec of `dataset`.
+
+  Unlike `dataset.take(0)`, the returned dataset does not hold the tensors of
+  `dataset`, so it is cheap to serialize. It is intended as the malicious
+  dataset of benign clients, which never read it.
+
+  Args:
+    dataset: A `tf.data.Dataset` whose element shapes are fully defined, except
+      possibly for their first dimension.
+
+  Returns:
+    An empty `tf.data.Dataset`.
+  """
+
+  def zeros(spec):
+    shape = [0 if dim is None else dim for dim in spec.shape.as_list()]
+    return tf.zeros(shape, dtype=spec.dtype)
+
+  return tf.data.Dataset.range(0).map(
+      lambda _: tf.nest.map_structure(zeros, dataset.element_spec))
+
+
 def _get_norm(weights):
   """Compute the norm of a weight matrix.
 
@@ -373,7 +396,9 @@ def build_run_one_round_fn_attacked(server_update_fn, client_update_fn,
       server_state: A `ServerState`.
       federated_dataset: A federated `tf.Dataset` with placement `tff.CLIENTS`.
       malicious_dataset: A federated `tf.Dataset` with placement `tff.CLIENTS`.
-        consisting of malicious datasets.
+        consisting of malicious datasets. Only the malicious clients read
+        their malicious dataset, so benign clients should be given one from
+        `empty_dataset_like`.
       malicious_clients: A federated `tf.bool` with placement `tff.CLIENTS`.
 
     Returns:
@@ -201,6 +201,32 @@ class ClientAttackTest(tf.test.TestCase):
       losses.append(outputs['loss'])
     self.assertLess(losses[1], losses[0])
 
+  def test_self_contained_example_with_empty_malicious_dataset(self):
+    client_data = create_client_data()
+    batch = client_data()
+    train_data = [batch, batch]
+    malicious_data = [attacked_fedavg.empty_dataset_like(batch), batch]
+    client_type_list = [tf.constant(False), tf.constant(True)]
+    trainer = build_federated_averaging_process_attacked(_model_fn)
+    state = trainer.initialize()
+    losses = []
+    for _ in range(2):
+      state, outputs = trainer.next(state, train_data, malicious_data,
+                                    client_type_list)
+      losses.append(outputs['loss'])
+    self.assertLess(losses[1], losses[0])
+
+  def test_empty_dataset_like(self):
+    batch = create_client_data()()
+    empty_dataset = attacked_fedavg.empty_dataset_like(batch)
+    self.assertEqual(empty_dataset.reduce(0, lambda count, _: count + 1), 0)
+    self.assertTrue(
+        all(
+            tf.nest.flatten(
+                tf.nest.map_structure(lambda s, t: s.is_compatible_with(t),
+                                      empty_dataset.element_spec,
+                                      batch.element_spec))))
+
   def test_attack(self):
     """Test whether an attacker is doing the right attack."""
     self.skipTest('b/150215351 This test became flaky after TF change which '
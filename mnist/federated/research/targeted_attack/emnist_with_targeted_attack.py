@@ -123,12 +123,18 @@ def make_federated_data_with_malicious(client_data,
       preprocess(client_data.create_tf_dataset_for_client(x))
       for x in client_ids
   ]
-  malicious_dataset = [dataset_malicious for x in client_ids]
+  # Benign clients never read their malicious dataset, so they are given an
+  # empty one rather than a copy of the target samples.
+  empty_dataset = attacked_fedavg.empty_dataset_like(dataset_malicious)
   if with_attack:
     client_type_list = \
         [tf.cast(0, tf.bool)] * (len(client_ids)-1) + [tf.cast(1, tf.bool)]
+    malicious_dataset = [empty_dataset] * (len(client_ids) - 1) + [
+        dataset_malicious
+    ]
   else:
     client_type_list = [tf.cast(0, tf.bool)] * len(client_ids)
+    malicious_dataset = [empty_dataset] * len(client_ids)
   return benign_dataset, malicious_dataset, client_type_list
 
 
@@ -0,0 +1,223 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs TrieHH on StackOverflow until no prefixes are left to extend.
+
+After each level of the trie is decoded, the discovered heavy hitters are
+scored against the ground truth of the sampled split, see `run_triehh`.
+"""
+
+import collections
+import string
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from absl import app
+from absl import flags
+from absl import logging
+import numpy as np
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.analytics.heavy_hitters import ground_truth as ground_truth_lib
+from tensorflow_federated.python.research.analytics.heavy_hitters import heavy_hitters_utils as hh_utils
+from tensorflow_federated.python.research.analytics.heavy_hitters import token_cache
+from tensorflow_federated.python.research.triehh import triehh_tff
+
+flags.DEFINE_integer('clients_per_round', 1000,
+                     'Number of clients sampled in each round.')
+flags.DEFINE_integer('num_sub_rounds', 1,
+                     'Number of rounds whose votes are decoded together.')
+flags.DEFINE_integer('max_rounds', 100,
+                     'Maximum number of rounds, if prefixes are left.')
+flags.DEFINE_integer('max_num_prefixes', 10,
+                     'Maximum number of prefixes kept in the trie.')
+flags.DEFINE_integer('threshold', 5, 'Minimum number of votes to keep a '
+                     'prefix or heavy hitter.')
+flags.DEFINE_integer('max_user_contribution', 10,
+                     'Maximum number of words a client votes with.')
+flags.DEFINE_boolean('use_trie', True, 'Whether to broadcast the discovered '
+                     'prefixes as a trie.')
+flags.DEFINE_integer('levels_per_round', 1, 'Number of levels of the trie '
+                     'voted on in a round. Requires --use_trie.')
+flags.DEFINE_integer('k', 10, 'Number of top words scored against the ground '
+                     'truth.')
+flags.DEFINE_integer('ground_truth_workers', 1, 'Number of processes computing '
+                     'the ground truth.')
+flags.DEFINE_string('cache_dir', None, 'Directory caching the ground truth.')
+flags.DEFINE_string('token_cache_dir', None, 'Local directory caching the '
+                    'tokenized words of the clients. If not set, the sampled '
+                    'clients are tokenized in every round.')
+flags.DEFINE_integer('seed', 0, 'Seed of the client sampling.')
+
+FLAGS = flags.FLAGS
+
+# The characters of the words discovered by TrieHH.
+POSSIBLE_PREFIX_EXTENSIONS = (
+    string.ascii_lowercase + string.digits + "'@#-;*:./")
+
+
+def _get_prefix_recall(ground_truth: Dict[str, int], heavy_hitters: List[str],
+                       prefixes: List[bytes], level: int, k: int) -> float:
+  """Returns the fraction of the top `k` words which can still be discovered.
+
+  A word can still be discovered if it is a heavy hitter already, or if its
+  prefix of length `level` is one of the `prefixes` left to extend.
+
+  Args:
+    ground_truth: A {'string': count} dict.
+    heavy_hitters: The discovered heavy hitters.
+    prefixes: The discovered prefixes, of length `level`.
+    level: The length of the prefixes.
+    k: The number of top words of `ground_truth` to consider.
+
+  Returns:
+    A float in [0, 1].
+  """
+  top_words = list(hh_utils.top_k(ground_truth, k))
+  if not top_words:
+    return 0.0
+  heavy_hitters = set(heavy_hitters)
+  prefixes = set(prefixes)
+  # TrieHH extends prefixes byte by byte.
+  reachable = []
+  for word in top_words:
+    word_bytes = word.encode('utf-8')
+    if word in heavy_hitters or (len(word_bytes) >= level and
+                                 word_bytes[:level] in prefixes):
+      reachable.append(word)
+  return float(len(reachable)) / len(top_words)
+
+
+def run_triehh(
+    iterative_process: tff.templates.IterativeProcess,
+    client_datasets_fn: Callable[[int], List[tf.data.Dataset]],
+    max_rounds: int,
+    num_sub_rounds: int,
+    levels_per_round: int = 1,
+    ground_truth: Optional[Dict[str, int]] = None,
+    k: int = 10) -> Tuple[Any, List[Dict[str, Any]]]:
+  """Runs a TrieHH process until no prefixes are left to extend.
+
+  Votes are decoded every `num_sub_rounds` rounds, adding `levels_per_round`
+  levels to the trie. The process stops as soon as a decoding leaves no prefix
+  to extend, since the clients of later rounds would not vote, or after
+  `max_rounds` rounds.
+
+  Args:
+    iterative_process: A process returned by
+      `triehh_tff.build_triehh_process`.
+    client_datasets_fn: Function accepting an integer argument (the round
+      number) and returning a list of client datasets to use as federated data
+      for that round.
+    max_rounds: The maximum number of rounds to run.
+    num_sub_rounds: The `num_sub_rounds` of `iterative_process`.
+    levels_per_round: The `levels_per_round` of `iterative_process`.
+    ground_truth: An optional {'string': count} dict, against which the heavy
+      hitters are scored after each decoding.
+    k: The number of top words to score.
+
+  Returns:
+    A tuple `(server_state, level_metrics)`, where `level_metrics` holds an
+    `OrderedDict` of metrics for each decoding.
+  """
+  server_state = iterative_process.initialize()
+  level_metrics = []
+  for round_num in range(max_rounds):
+    server_state, _ = iterative_process.next(server_state,
+                                             client_datasets_fn(round_num))
+    if (round_num + 1) % num_sub_rounds != 0:
+      continue
+
+    level = (round_num + 1) // num_sub_rounds * levels_per_round
+    heavy_hitters = {
+        word.decode('utf-8'): frequency
+        for word, frequency in zip(server_state.discovered_heavy_hitters,
+                                   server_state.heavy_hitters_frequencies)
+    }
+    prefixes = list(server_state.discovered_prefixes)
+    metrics = collections.OrderedDict(
+        round_num=round_num + 1,
+        level=level,
+        num_prefixes=len(prefixes),
+        num_heavy_hitters=len(heavy_hitters))
+    if ground_truth is not None:
+      metrics['precision'] = hh_utils.precision(ground_truth, heavy_hitters, k)
+      metrics['recall'] = hh_utils.recall(ground_truth, heavy_hitters, k)
+      metrics['f1_score'] = hh_utils.f1_score(ground_truth, heavy_hitters, k)
+      metrics['prefix_recall'] = _get_prefix_recall(ground_truth,
+                                                    list(heavy_hitters),
+                                                    prefixes, level, k)
+    logging.info('Level %d: %s', level, dict(metrics))
+    level_metrics.append(metrics)
+
+    if not prefixes:
+      logging.info('No prefixes left to extend after %d rounds.',
+                   round_num + 1)
+      break
+  return server_state, level_metrics
+
+
+def main(argv):
+  if len(argv) > 1:
+    raise app.UsageError('Expected no command-line arguments, '
+                         'got: {}'.format(argv))
+
+  train_data, _, _ = tff.simulation.datasets.stackoverflow.load_data()
+  ground_truth = ground_truth_lib.compute_ground_truth(
+      'stackoverflow',
+      num_words_per_client=FLAGS.max_user_contribution,
+      num_workers=FLAGS.ground_truth_workers,
+      cache_dir=FLAGS.cache_dir)
+
+  iterative_process = triehh_tff.build_triehh_process(
+      list(POSSIBLE_PREFIX_EXTENSIONS),
+      num_sub_rounds=FLAGS.num_sub_rounds,
+      max_num_prefixes=FLAGS.max_num_prefixes,
+      threshold=FLAGS.threshold,
+      max_user_contribution=FLAGS.max_user_contribution,
+      use_trie=FLAGS.use_trie,
+      levels_per_round=FLAGS.levels_per_round)
+
+  if FLAGS.token_cache_dir is not None:
+    tokens = token_cache.get_token_cache(train_data, 'stackoverflow',
+                                         FLAGS.token_cache_dir)
+    create_tokenized_dataset = tokens.create_tf_dataset_for_client
+  else:
+
+    def create_tokenized_dataset(client_id):
+      return hh_utils.tokenize(
+          train_data.create_tf_dataset_for_client(client_id), 'stackoverflow')
+
+  random_state = np.random.RandomState(FLAGS.seed)
+
+  def client_datasets_fn(round_num):
+    del round_num  # Unused.
+    client_ids = random_state.choice(
+        train_data.client_ids, size=FLAGS.clients_per_round, replace=False)
+    return [create_tokenized_dataset(client_id) for client_id in client_ids]
+
+  _, level_metrics = run_triehh(
+      iterative_process,
+      client_datasets_fn,
+      max_rounds=FLAGS.max_rounds,
+      num_sub_rounds=FLAGS.num_sub_rounds,
+      levels_per_round=FLAGS.levels_per_round,
+      ground_truth=ground_truth,
+      k=FLAGS.k)
+  for metrics in level_metrics:
+    print(', '.join('{}={}'.format(name, value)
+                    for name, value in metrics.items()))
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,110 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import string
+
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.analytics.heavy_hitters import heavy_hitters_testcase as hh_test
+from tensorflow_federated.python.research.triehh import run_triehh
+from tensorflow_federated.python.research.triehh import triehh_tff
+
+# With two levels per round, the first word of each client votes on the first
+# level and the second word on the second level.
+_CLIENT_WORDS = [
+    ['hello', 'hey'],
+    ['hey', 'hello'],
+    ['hello', 'hi'],
+    ['hi', 'hello'],
+]
+_GROUND_TRUTH = {'hello': 4, 'hey': 2, 'hi': 2}
+
+
+def _client_datasets_fn(round_num):
+  del round_num  # Unused.
+  return [tf.data.Dataset.from_tensor_slices(words) for words in _CLIENT_WORDS]
+
+
+def _build_process(num_sub_rounds, use_trie=False, levels_per_round=1):
+  return triehh_tff.build_triehh_process(
+      list(string.ascii_lowercase),
+      num_sub_rounds=num_sub_rounds,
+      max_num_prefixes=4,
+      threshold=1,
+      max_user_contribution=10,
+      use_trie=use_trie,
+      levels_per_round=levels_per_round)
+
+
+class RunTriehhTest(hh_test.HeavyHittersTest):
+
+  def setUp(self):
+    super().setUp()
+    # TODO(b/152051528): Remove this once lookup table state is cleared in
+    # eager executer.
+    tff.backends.native.set_local_execution_context()
+
+  def test_stops_when_no_prefixes_are_left(self):
+    server_state, level_metrics = run_triehh.run_triehh(
+        _build_process(num_sub_rounds=2),
+        _client_datasets_fn,
+        max_rounds=100,
+        num_sub_rounds=2,
+        ground_truth=_GROUND_TRUTH,
+        k=3)
+
+    # 'hello$' is decoded at the sixth level, after which no prefix is left.
+    self.assertEqual(server_state.round_num, 12)
+    self.assertLen(level_metrics, 6)
+    self.assertEqual([metrics['level'] for metrics in level_metrics],
+                     [1, 2, 3, 4, 5, 6])
+    self.assertEqual(level_metrics[-1]['num_prefixes'], 0)
+    self.assertSetAllEqual(server_state.discovered_heavy_hitters,
+                           ['hello', 'hey', 'hi'])
+    self.assertAlmostEqual(level_metrics[-1]['precision'], 1.0)
+    self.assertAlmostEqual(level_metrics[-1]['recall'], 1.0)
+    # Before any heavy hitter is discovered, all the top words are reachable.
+    self.assertAlmostEqual(level_metrics[0]['recall'], 0.0)
+    self.assertAlmostEqual(level_metrics[0]['prefix_recall'], 1.0)
+
+  def test_multi_level_rounds_find_same_heavy_hitters(self):
+    single_level_state, _ = run_triehh.run_triehh(
+        _build_process(num_sub_rounds=1),
+        _client_datasets_fn,
+        max_rounds=100,
+        num_sub_rounds=1)
+    multi_level_state, level_metrics = run_triehh.run_triehh(
+        _build_process(num_sub_rounds=1, use_trie=True, levels_per_round=2),
+        _client_datasets_fn,
+        max_rounds=100,
+        num_sub_rounds=1,
+        levels_per_round=2)
+
+    # Two levels are voted on in each round, so that the words of length 5
+    # are decoded in 3 rounds instead of 6.
+    self.assertEqual(single_level_state.round_num, 6)
+    self.assertEqual(multi_level_state.round_num, 3)
+    self.assertEqual([metrics['level'] for metrics in level_metrics],
+                     [2, 4, 6])
+    self.assertSetAllEqual(multi_level_state.discovered_heavy_hitters,
+                           single_level_state.discovered_heavy_hitters)
+
+  def test_build_process_raises_on_multi_level_without_trie(self):
+    with self.assertRaises(ValueError):
+      _build_process(num_sub_rounds=1, levels_per_round=2)
+
+
+if __name__ == '__main__':
+  tf.test.main()
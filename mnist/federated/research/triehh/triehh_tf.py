@@ -75,15 +75,59 @@ class ServerState(object):
   accumulated_weights = attr.ib()
 
 
+@attr.s(cmp=False, frozen=True)
+class TrieServerState(object):
+  """Structure for state on the server, holding the prefixes in a trie.
+
+  The root of the trie (the empty prefix) has node id 0, and the other nodes
+  are numbered from 1 in breadth-first order. The node with id `i + 1` is the
+  child of node `node_keys[i] // num_extensions` by the extension
+  `node_keys[i] % num_extensions`, where `num_extensions` is the length of
+  `possible_prefix_extensions`. Since the children of a node are added in
+  order of their extension, and the nodes of a level after all the nodes of
+  the previous level, `node_keys` is sorted and a child is found by binary
+  search.
+
+  Fields:
+  `discovered_heavy_hitters`: A tf.string containing discovered heavy
+  hitters.
+  `heavy_hitters_frequencies`: A tf.float64 containing the frequency of the
+  heavy hitter in the round it is discovered.
+  `discovered_prefixes`: A tf.string containing the prefixes of the nodes with
+  ids starting at `frontier_start`, i.e. the deepest level of the trie. These
+  are only used by the server to decode heavy hitters, and are not broadcast.
+  `node_keys`: A 1D tf.int32 containing the (sorted) keys of the non-root nodes
+  of the trie.
+  `frontier_start`: A tf.int32 containing the id of the first node of the
+  deepest level of the trie. The prefixes of this level are the ones extended
+  by client votes, and the level is empty once training is done.
+  `round_num`: A tf.constant dictating the algorithm's round number.
+  `accumulated_votes`: A tf.constant that holds the votes accumulated over
+  sub-rounds.
+  `accumulated_weights`: A tf.constant that holds the total number of
+    capped contributions from all clients over sub-rounds.
+  """
+  discovered_heavy_hitters = attr.ib()
+  heavy_hitters_frequencies = attr.ib()
+  discovered_prefixes = attr.ib()
+  node_keys = attr.ib()
+  frontier_start = attr.ib()
+  round_num = attr.ib()
+  accumulated_votes = attr.ib()
+  accumulated_weights = attr.ib()
+
+
 def make_accumulate_client_votes_fn(round_num, num_sub_rounds,
                                     discovered_prefixes_table,
                                     possible_prefix_extensions_table):
-  """Returns a reduce function that is used to accumulate client votes.
+  """Returns a function that is used to accumulate client votes.
 
-  This function creates an accumulate_client_votes reduce function that can be
-  consumed by a tf.data.Dataset.reduce method. The reduce function maps
-  (old_state, example) to a new_state. It must take two arguments and return a
-  new element with a structure that matches that of the initial_state.
+  This function creates an accumulate_client_votes function mapping
+  (old_state, examples) to a new_state. `examples` may be a single word or a
+  tensor of words, whose votes are all cast at once: the prefixes and
+  extensions of all words are looked up with one call to each table, and the
+  votes are added with a single `tf.tensor_scatter_nd_add`. The function can
+  also be consumed by a tf.data.Dataset.reduce method.
 
   Args:
     round_num: A tf.constant containing the round number.
@@ -95,44 +139,46 @@ def make_accumulate_client_votes_fn(round_num, num_sub_rounds,
       possible prefix extensions that a client can vote on.
 
   Returns:
-    An accumulate_client_votes reduce function for a specific round, set of
+    An accumulate_client_votes function for a specific round, set of
       discovered prefixes, and a set of possbile prefix extensions.
   """
 
   @tf.function
-  def accumulate_client_votes(vote_accumulator, example):
+  def accumulate_client_votes(vote_accumulator, examples):
     """Accumulates client votes on prefix extensions."""
 
-    example = tf.strings.lower(example)
-    # Append the default terminator to the example.
+    examples = tf.reshape(tf.strings.lower(examples), [-1])
+    # Append the default terminator to the examples.
     default_terminator = tf.constant(DEFAULT_TERMINATOR, dtype=tf.string)
-    example = tf.strings.join([example, default_terminator])
+    examples = tf.strings.join([examples, default_terminator])
 
     # Compute effective round number.
     effective_round_num = tf.math.floordiv(round_num, num_sub_rounds)
 
-    if tf.strings.length(example) < effective_round_num:
-      return vote_accumulator
-    else:
-      discovered_prefixes_index = discovered_prefixes_table.lookup(
-          tf.strings.substr(example, 0, effective_round_num))
-      possible_prefix_extensions_index = possible_prefix_extensions_table.lookup(
-          tf.strings.substr(example, effective_round_num, 1))
-
-      # If the character extension is not in the alphabet, or the prefix is not
-      # already in the discovered prefixes, do not add client's vote.
-      if tf.math.logical_or(
-          tf.math.equal(possible_prefix_extensions_index,
-                        tf.constant(DEFAULT_VALUE)),
-          tf.math.equal(discovered_prefixes_index, tf.constant(DEFAULT_VALUE))):
-        return vote_accumulator
-
-      else:
-        indices = [[
-            discovered_prefixes_index, possible_prefix_extensions_index
-        ]]
-        updates = tf.constant([1])
-        return tf.tensor_scatter_nd_add(vote_accumulator, indices, updates)
+    # Examples shorter than the prefix length do not vote. They must be removed
+    # before taking substrings, which fail if the position is out of range.
+    examples = tf.boolean_mask(
+        examples,
+        tf.math.greater_equal(tf.strings.length(examples), effective_round_num))
+    discovered_prefixes_index = discovered_prefixes_table.lookup(
+        tf.strings.substr(examples, 0, effective_round_num))
+    possible_prefix_extensions_index = possible_prefix_extensions_table.lookup(
+        tf.strings.substr(examples, effective_round_num, 1))
+
+    # If the character extension is not in the alphabet, or the prefix is not
+    # already in the discovered prefixes, do not add client's vote.
+    valid_votes = tf.math.logical_and(
+        tf.math.not_equal(possible_prefix_extensions_index,
+                          tf.constant(DEFAULT_VALUE)),
+        tf.math.not_equal(discovered_prefixes_index,
+                          tf.constant(DEFAULT_VALUE)))
+    indices = tf.stack([
+        tf.boolean_mask(discovered_prefixes_index, valid_votes),
+        tf.boolean_mask(possible_prefix_extensions_index, valid_votes)
+    ],
+                       axis=1)
+    updates = tf.ones_like(indices[:, 0])
+    return tf.tensor_scatter_nd_add(vote_accumulator, indices, updates)
 
   return accumulate_client_votes
 
@@ -194,18 +240,20 @@ def client_update(dataset, discovered_prefixes, possible_prefix_extensions,
 
     sampled_data_list = hh_utils.get_top_elements(dataset,
                                                   max_user_contribution)
-    sampled_data = tf.data.Dataset.from_tensor_slices(sampled_data_list)
     client_weight = tf.size(sampled_data_list)
 
     return ClientOutput(
-        sampled_data.reduce(client_votes, accumulate_client_votes_fn),
+        accumulate_client_votes_fn(client_votes, sampled_data_list),
         client_weight)
 
 
 @tf.function()
 def accumulate_server_votes(server_state, sub_round_votes, sub_round_weight):
   """Accumulates votes and returns an updated server state."""
-  accumulated_votes = server_state.accumulated_votes + sub_round_votes
+  # The votes are a list of tensors when voting on several levels per round.
+  accumulated_votes = tf.nest.map_structure(tf.add,
+                                            server_state.accumulated_votes,
+                                            sub_round_votes)
   accumulated_weights = server_state.accumulated_weights + sub_round_weight
   round_num = server_state.round_num + 1
   return tff.utils.update_state(
@@ -230,20 +278,13 @@ def get_extended_prefix_candidates(discovered_prefixes,
     `discovered_prefixes` extended by each item in `extensions_wo_terminator`.
     Shape: (len(`discovered_prefixes`) * len(`extensions_wo_terminator`), ).
   """
-  extended_prefixes = tf.TensorArray(
-      dtype=tf.string,
-      size=tf.shape(discovered_prefixes)[0] *
-      tf.shape(extensions_wo_terminator)[0])
-  position = tf.constant(0, dtype=tf.int32)
-  for prefix in discovered_prefixes:
-    for possible_extension in extensions_wo_terminator:
-      # [-1] is passed to tf.reshape to flatten the extended prefix. This is
-      # important to ensure consistency of shapes.
-      extended_prefix = tf.reshape(
-          tf.strings.reduce_join([prefix, possible_extension]), [-1])
-      extended_prefixes = extended_prefixes.write(position, extended_prefix)
-      position += 1
-  return extended_prefixes.concat()
+  # Pair every prefix with every extension, with the prefix as the outer index.
+  # This matches the row-major layout of the flattened prefix votes.
+  prefixes = tf.repeat(discovered_prefixes,
+                       tf.shape(extensions_wo_terminator)[0])
+  extensions = tf.tile(extensions_wo_terminator,
+                       [tf.shape(discovered_prefixes)[0]])
+  return tf.strings.join([prefixes, extensions])
 
 
 @tf.function()
@@ -272,7 +313,30 @@ def extend_prefixes(prefixes_votes, discovered_prefixes,
   """
   extended_prefix_candiates = get_extended_prefix_candidates(
       discovered_prefixes, extensions_wo_terminator)
-  extended_prefix_candiates_num = tf.shape(extended_prefix_candiates)[0]
+  prefixes_mask = get_extended_prefixes_mask(prefixes_votes, max_num_prefixes,
+                                             threshold)
+  extended_prefixes = tf.boolean_mask(extended_prefix_candiates, prefixes_mask)
+  return extended_prefixes
+
+
+@tf.function()
+def get_extended_prefixes_mask(prefixes_votes, max_num_prefixes, threshold):
+  """Returns the mask of the extended prefixes to keep.
+
+  Args:
+    prefixes_votes: A 1D tf.int32 containing flattern votes of all candidates
+      for extended prefixes.
+    max_num_prefixes: A tf.constant dictating the maximum number of prefixes we
+      can keep in the trie.
+    threshold: The threshold for heavy hitters and discovered prefixes. Only
+      those get at least `threshold` votes are discovered.
+
+  Returns:
+    A 1D tf.bool of the same shape as `prefixes_votes`, which is True for the
+    candidates with at least `threshold` votes among the highest
+    `max_num_prefixes` votes.
+  """
+  extended_prefix_candiates_num = tf.shape(prefixes_votes)[0]
 
   prefixes_mask = tf.math.greater_equal(prefixes_votes, threshold)
 
@@ -298,8 +362,7 @@ def extend_prefixes(prefixes_votes, discovered_prefixes,
     top_indices_mask = tf.sparse.to_dense(top_indices_mask)
     prefixes_mask = tf.math.logical_and(prefixes_mask, top_indices_mask)
 
-  extended_prefixes = tf.boolean_mask(extended_prefix_candiates, prefixes_mask)
-  return extended_prefixes
+  return prefixes_mask
 
 
 @tf.function()
@@ -436,3 +499,543 @@ def server_update(server_state, possible_prefix_extensions, sub_round_votes,
   else:
     return accumulate_server_votes(server_state, sub_round_votes,
                                    sub_round_weight)
+
+
+def get_char_to_index(possible_prefix_extensions):
+  """Returns the index of each byte value in `possible_prefix_extensions`.
+
+  Args:
+    possible_prefix_extensions: A list containing all possible prefix
+      extensions, including the terminator.
+
+  Returns:
+    A list of length 256 containing, for each byte value, its index in
+    `possible_prefix_extensions`, or `DEFAULT_VALUE` if it is not a possible
+    extension. Extensions which are not a single byte long cannot match a
+    single character of a word, and are mapped to no byte value.
+  """
+  char_to_index = [DEFAULT_VALUE] * 256
+  for index, extension in enumerate(possible_prefix_extensions):
+    extension_bytes = extension.encode('utf-8')
+    if len(extension_bytes) == 1:
+      char_to_index[ord(extension_bytes)] = index
+  return char_to_index
+
+
+@tf.function
+def accumulate_trie_votes(vote_accumulator,
+                          examples,
+                          node_keys,
+                          frontier_start,
+                          char_to_index,
+                          prefix_length,
+                          num_extensions,
+                          path_length=0):
+  """Accumulates client votes on extensions of the nodes of a trie.
+
+  Each example is converted to a sequence of extension indices, and walks the
+  trie from the root by looking up the child of its current node by the next
+  index. Examples whose first `prefix_length` characters lead to a node of the
+  deepest level of the trie vote for the extension at `prefix_length`.
+
+  If `path_length` is positive, the examples instead vote for the extension at
+  `prefix_length + path_length`, of the path formed by the `path_length`
+  characters following the node. These characters cannot be the terminator,
+  and the path is encoded in base `num_extensions - 1`, so that the vote for
+  the extension `e` of the path `p` is in column `p * num_extensions + e`.
+  This lets clients vote on levels of the trie that the server has not built
+  yet.
+
+  Args:
+    vote_accumulator: A tf.int32 of shape (max_num_prefixes,
+      (num_extensions - 1)**path_length * num_extensions).
+    examples: A tf.string containing the words to vote with.
+    node_keys: A 1D tf.int32 containing the keys of the trie nodes, see
+      `TrieServerState`.
+    frontier_start: A tf.int32 containing the id of the first node of the
+      deepest level of the trie.
+    char_to_index: A 1D tf.int32 of length 256, as returned by
+      `get_char_to_index`.
+    prefix_length: A tf.int32 containing the depth of the deepest level of the
+      trie.
+    num_extensions: The number of possible prefix extensions.
+    path_length: The number of characters between the deepest level of the
+      trie and the extension voted for.
+
+  Returns:
+    The updated `vote_accumulator`.
+  """
+  examples = tf.reshape(tf.strings.lower(examples), [-1])
+  default_terminator = tf.constant(DEFAULT_TERMINATOR, dtype=tf.string)
+  examples = tf.strings.join([examples, default_terminator])
+
+  # Decoding as ISO-8859-1 maps every byte to its own code point, so the
+  # characters are the same bytes compared by `make_accumulate_client_votes_fn`.
+  codes = tf.strings.unicode_decode(examples, 'ISO-8859-1')
+
+  # Examples must have a character at `vote_position` to vote on.
+  vote_position = prefix_length + path_length
+  codes = tf.ragged.boolean_mask(
+      codes,
+      tf.math.greater(codes.row_lengths(), tf.cast(vote_position, tf.int64)))
+  char_indices = tf.gather(
+      char_to_index, codes.to_tensor(shape=[-1, vote_position + 1]))
+
+  nodes = tf.zeros_like(char_indices[:, 0])
+  valid_votes = tf.math.not_equal(char_indices[:, vote_position],
+                                  tf.constant(DEFAULT_VALUE))
+  for position in tf.range(prefix_length):
+    chars = char_indices[:, position]
+    keys = nodes * num_extensions + chars
+    children = tf.math.minimum(
+        tf.searchsorted(node_keys, keys), tf.size(node_keys) - 1)
+    # If the character is not in the alphabet, or the prefix is not in the
+    # trie, do not add the vote.
+    valid_votes = tf.math.logical_and(
+        valid_votes,
+        tf.math.logical_and(
+            tf.math.not_equal(chars, tf.constant(DEFAULT_VALUE)),
+            tf.math.equal(tf.gather(node_keys, children), keys)))
+    nodes = children + 1
+
+  slots = nodes - frontier_start
+  valid_votes = tf.math.logical_and(valid_votes,
+                                    tf.math.greater_equal(slots, 0))
+
+  columns = char_indices[:, vote_position]
+  for position in range(path_length):
+    chars = char_indices[:, prefix_length + position]
+    valid_votes = tf.math.logical_and(
+        valid_votes,
+        tf.math.logical_and(
+            tf.math.not_equal(chars, tf.constant(DEFAULT_VALUE)),
+            tf.math.not_equal(chars, num_extensions - 1)))
+    columns += chars * (num_extensions - 1)**(path_length - 1 -
+                                              position) * num_extensions
+
+  indices = tf.stack([
+      tf.boolean_mask(slots, valid_votes),
+      tf.boolean_mask(columns, valid_votes)
+  ],
+                     axis=1)
+  updates = tf.ones_like(indices[:, 0])
+  return tf.tensor_scatter_nd_add(vote_accumulator, indices, updates)
+
+
+@tf.function
+def trie_client_update(dataset, node_keys, frontier_start, char_to_index,
+                       round_num, num_sub_rounds, max_num_prefixes,
+                       max_user_contribution, num_extensions):
+  """Creates a ClientOutput object that holds the client's votes on a trie.
+
+  This is the counterpart of `client_update` for a `TrieServerState`: instead
+  of the discovered prefixes, the client receives the trie as int tensors, and
+  votes on the extensions of its deepest level without any string lookups.
+
+  Args:
+    dataset: A 'tf.data.Dataset' containing the client's on-device words.
+    node_keys: A 1D tf.int32 containing the keys of the trie nodes, see
+      `TrieServerState`.
+    frontier_start: A tf.int32 containing the id of the first node of the
+      deepest level of the trie.
+    char_to_index: A 1D tf.int32 of length 256, as returned by
+      `get_char_to_index`.
+    round_num: A tf.constant dictating the algorithm's round number.
+    num_sub_rounds: A tf.constant containing the number of sub rounds in a
+      round.
+    max_num_prefixes: A tf.constant dictating the maximum number of prefixes we
+      can keep in the trie.
+    max_user_contribution: A tf.constant dictating the maximum number of
+      examples a client can contribute.
+    num_extensions: The number of possible prefix extensions.
+
+  Returns:
+    A ClientOutput object holding the client's votes.
+  """
+  client_votes = tf.zeros(
+      dtype=tf.int32, shape=[max_num_prefixes, num_extensions])
+  client_weight = tf.constant(0)
+
+  # If the deepest level of the trie is emtpy (training is done), skip the
+  # voting.
+  if tf.math.greater(frontier_start, tf.size(node_keys)):
+    return ClientOutput(client_votes, client_weight)
+  else:
+    sampled_data_list = hh_utils.get_top_elements(dataset,
+                                                  max_user_contribution)
+    client_weight = tf.size(sampled_data_list)
+    prefix_length = tf.math.floordiv(round_num, num_sub_rounds)
+
+    return ClientOutput(
+        accumulate_trie_votes(client_votes, sampled_data_list, node_keys,
+                              frontier_start, char_to_index, prefix_length,
+                              num_extensions), client_weight)
+
+
+def _decode_trie_level(discovered_prefixes, frontier_start, votes, weight,
+                       extensions_wo_terminator, max_num_prefixes, threshold):
+  """Decodes the votes on the extensions of the deepest level of a trie.
+
+  Args:
+    discovered_prefixes: A 1D tf.string containing the prefixes of the deepest
+      level of the trie.
+    frontier_start: A tf.int32 containing the id of the first node of the
+      deepest level.
+    votes: A tf.int32 of shape (len(discovered_prefixes), num_extensions)
+      containing the votes on the extensions of each prefix, with the votes for
+      the terminator in the last column.
+    weight: A tf.int32 containing the capped number of words that voted.
+    extensions_wo_terminator: A 1D tf.string containing all possible prefix
+      extensions except `default_terminator`.
+    max_num_prefixes: A tf.constant dictating the maximum number of prefixes we
+      can keep in the trie.
+    threshold: The threshold for heavy hitters and discovered prefixes.
+
+  Returns:
+    A tuple `(heavy_hitters, heavy_hitters_frequencies, parent_slots,
+    extensions, extended_prefixes, new_node_keys)`. `parent_slots` and
+    `extensions` hold, for each new node, the index of its parent in
+    `discovered_prefixes` and the index of its extension.
+  """
+  extensions_wo_terminator_num = tf.shape(extensions_wo_terminator)[0]
+
+  # The last column of `votes` are those ending with 'default_terminator`,
+  # which are full length heavy hitters.
+  heavy_hitters_votes = votes[:, extensions_wo_terminator_num]
+  heavy_hitters_mask = tf.math.greater_equal(heavy_hitters_votes, threshold)
+  heavy_hitters = tf.boolean_mask(discovered_prefixes, heavy_hitters_mask)
+
+  if weight == 0:
+    logging.warning('All participating clients have empty data.')
+    heavy_hitters_frequencies = tf.cast(heavy_hitters_votes, tf.float64)
+  else:
+    heavy_hitters_frequencies = heavy_hitters_votes / weight
+  heavy_hitters_frequencies = tf.boolean_mask(heavy_hitters_frequencies,
+                                              heavy_hitters_mask)
+
+  prefixes_votes = tf.reshape(votes[:, :extensions_wo_terminator_num], [-1])
+  prefixes_mask = get_extended_prefixes_mask(prefixes_votes, max_num_prefixes,
+                                             threshold)
+
+  # The selected candidates are in increasing order of (parent, extension), so
+  # their keys are sorted, and larger than the keys of all existing nodes.
+  selected = tf.cast(tf.reshape(tf.where(prefixes_mask), [-1]), tf.int32)
+  parent_slots = tf.math.floordiv(selected, extensions_wo_terminator_num)
+  extensions = tf.math.floormod(selected, extensions_wo_terminator_num)
+  new_node_keys = ((frontier_start + parent_slots) *
+                   (extensions_wo_terminator_num + 1) + extensions)
+  extended_prefixes = tf.strings.join([
+      tf.gather(discovered_prefixes, parent_slots),
+      tf.gather(extensions_wo_terminator, extensions)
+  ])
+  return (heavy_hitters, heavy_hitters_frequencies, parent_slots, extensions,
+          extended_prefixes, new_node_keys)
+
+
+@tf.function()
+def accumulate_server_votes_and_expand_trie(server_state,
+                                            possible_prefix_extensions,
+                                            sub_round_votes, sub_round_weight,
+                                            max_num_prefixes, threshold):
+  """Accumulates server votes and adds a level to the trie.
+
+  This is the counterpart of `accumulate_server_votes_and_decode` for a
+  `TrieServerState`. Only the selected extensions are turned into nodes and
+  prefixes, rather than all the candidates of `get_extended_prefix_candidates`.
+
+  Args:
+    server_state: A `TrieServerState`, the state to be updated.
+    possible_prefix_extensions: A 1D tf.string containing all possible prefix
+      extensions.
+    sub_round_votes: A tensor of shape = (max_num_prefixes,
+      len(possible_prefix_extensions)) containing aggregated client votes.
+    sub_round_weight: A scalar tensor of containing aggregated client weights.
+    max_num_prefixes: A tf.constant dictating the maximum number of prefixes we
+      can keep in the trie.
+    threshold: The threshold for heavy hitters and discovered prefixes. Only
+      those get at least `threshold` votes are discovered.
+
+  Returns:
+    An updated `TrieServerState`.
+  """
+  possible_extensions_num = tf.shape(possible_prefix_extensions)[0]
+  extensions_wo_terminator = possible_prefix_extensions[:-1]
+  frontier_num = tf.shape(server_state.discovered_prefixes)[0]
+
+  accumulated_votes = server_state.accumulated_votes + sub_round_votes
+  accumulated_weights = server_state.accumulated_weights + sub_round_weight
+
+  (new_heavy_hitters, new_heavy_hitters_frequencies, _, _, extended_prefixes,
+   new_node_keys) = _decode_trie_level(server_state.discovered_prefixes,
+                                       server_state.frontier_start,
+                                       accumulated_votes[:frontier_num],
+                                       accumulated_weights,
+                                       extensions_wo_terminator,
+                                       max_num_prefixes, threshold)
+
+  return tff.utils.update_state(
+      server_state,
+      discovered_heavy_hitters=tf.concat(
+          [server_state.discovered_heavy_hitters, new_heavy_hitters], 0),
+      heavy_hitters_frequencies=tf.concat([
+          server_state.heavy_hitters_frequencies, new_heavy_hitters_frequencies
+      ], 0),
+      discovered_prefixes=extended_prefixes,
+      node_keys=tf.concat([server_state.node_keys, new_node_keys], 0),
+      frontier_start=tf.size(server_state.node_keys) + 1,
+      round_num=server_state.round_num + 1,
+      accumulated_votes=tf.zeros(
+          dtype=tf.int32, shape=[max_num_prefixes, possible_extensions_num]),
+      accumulated_weights=tf.constant(0))
+
+
+@tf.function
+def trie_server_update(server_state, possible_prefix_extensions,
+                       sub_round_votes, sub_round_weight, num_sub_rounds,
+                       max_num_prefixes, threshold):
+  """Updates a `TrieServerState` based on `client_votes`.
+
+  Args:
+    server_state: A `TrieServerState`, the state to be updated.
+    possible_prefix_extensions: A 1D tf.string containing all possible prefix
+      extensions.
+    sub_round_votes: A tensor of shape = (max_num_prefixes,
+      len(possible_prefix_extensions)) containing aggregated client votes.
+    sub_round_weight: A scalar tensor of containing aggregated client weights.
+    num_sub_rounds: The total number of sub rounds to be executed before
+      decoding aggregated votes.
+    max_num_prefixes: A tf.constant dictating the maximum number of prefixes we
+      can keep in the trie.
+    threshold: The threshold for heavy hitters and discovered prefixes. Only
+      those get at least `threshold` votes are discovered.
+
+  Returns:
+    An updated `TrieServerState`.
+  """
+  if tf.math.equal(tf.size(server_state.discovered_prefixes), 0):
+    return server_state
+
+  if tf.math.equal((server_state.round_num + 1) % num_sub_rounds, 0):
+    return accumulate_server_votes_and_expand_trie(server_state,
+                                                   possible_prefix_extensions,
+                                                   sub_round_votes,
+                                                   sub_round_weight,
+                                                   max_num_prefixes, threshold)
+  else:
+    return accumulate_server_votes(server_state, sub_round_votes,
+                                   sub_round_weight)
+
+
+def get_level_votes_shapes(levels_per_round, max_num_prefixes, num_extensions):
+  """Returns the shapes of the votes on each level of a multi-level round.
+
+  The votes on the `level`-th level below the deepest level of the trie are
+  indexed by the node of the deepest level and the path of `level` characters
+  leading to the extension, see `accumulate_trie_votes`.
+
+  Args:
+    levels_per_round: The number of levels voted on in a round.
+    max_num_prefixes: The maximum number of prefixes we can keep in the trie.
+    num_extensions: The number of possible prefix extensions.
+
+  Returns:
+    A list of `levels_per_round` shapes.
+  """
+  return [[max_num_prefixes, (num_extensions - 1)**level * num_extensions]
+          for level in range(levels_per_round)]
+
+
+@tf.function
+def multi_level_trie_client_update(dataset, node_keys, frontier_start,
+                                   char_to_index, round_num, num_sub_rounds,
+                                   max_num_prefixes, max_user_contribution,
+                                   num_extensions, levels_per_round):
+  """Creates a ClientOutput object with the client's votes on several levels.
+
+  The (up to) `max_user_contribution` words of the client are dealt round-robin
+  into `levels_per_round` disjoint samples, in decreasing order of their
+  counts. The words of the `level`-th sample vote on the extensions
+  `level + 1` characters below the deepest level of the trie, so that each
+  word still votes at most once, and the server can add `levels_per_round`
+  levels to the trie after each round.
+
+  Args:
+    dataset: A 'tf.data.Dataset' containing the client's on-device words.
+    node_keys: A 1D tf.int32 containing the keys of the trie nodes, see
+      `TrieServerState`.
+    frontier_start: A tf.int32 containing the id of the first node of the
+      deepest level of the trie.
+    char_to_index: A 1D tf.int32 of length 256, as returned by
+      `get_char_to_index`.
+    round_num: A tf.constant dictating the algorithm's round number.
+    num_sub_rounds: A tf.constant containing the number of sub rounds in a
+      round.
+    max_num_prefixes: A tf.constant dictating the maximum number of prefixes we
+      can keep in the trie.
+    max_user_contribution: A tf.constant dictating the maximum number of
+      examples a client can contribute.
+    num_extensions: The number of possible prefix extensions.
+    levels_per_round: The number of levels voted on in a round.
+
+  Returns:
+    A ClientOutput object. `client_votes` is a list holding the votes on each
+    level, with shapes given by `get_level_votes_shapes`, and `client_weight`
+    a tf.int32 of shape (levels_per_round,) holding the number of words voting
+    on each level.
+  """
+  client_votes = [
+      tf.zeros(dtype=tf.int32, shape=shape) for shape in get_level_votes_shapes(
+          levels_per_round, max_num_prefixes, num_extensions)
+  ]
+  client_weight = tf.zeros(dtype=tf.int32, shape=[levels_per_round])
+
+  if tf.math.greater(frontier_start, tf.size(node_keys)):
+    return ClientOutput(client_votes, client_weight)
+  else:
+    sampled_data_list = hh_utils.get_top_elements(dataset,
+                                                  max_user_contribution)
+    word_levels = tf.math.floormod(
+        tf.range(tf.size(sampled_data_list)), levels_per_round)
+    prefix_length = levels_per_round * tf.math.floordiv(round_num,
+                                                        num_sub_rounds)
+
+    level_votes = []
+    level_weights = []
+    for level in range(levels_per_round):
+      level_data_list = tf.boolean_mask(sampled_data_list,
+                                        tf.math.equal(word_levels, level))
+      level_votes.append(
+          accumulate_trie_votes(
+              client_votes[level],
+              level_data_list,
+              node_keys,
+              frontier_start,
+              char_to_index,
+              prefix_length,
+              num_extensions,
+              path_length=level))
+      level_weights.append(tf.size(level_data_list))
+    return ClientOutput(level_votes, tf.stack(level_weights))
+
+
+@tf.function()
+def accumulate_server_votes_and_expand_trie_levels(server_state,
+                                                   possible_prefix_extensions,
+                                                   sub_round_votes,
+                                                   sub_round_weight,
+                                                   max_num_prefixes,
+                                                   threshold):
+  """Accumulates server votes and adds several levels to the trie.
+
+  The levels are decoded one after the other, as in
+  `accumulate_server_votes_and_expand_trie`: the votes on the extensions of a
+  new node are read from the votes on the next level, at the row of its
+  ancestor in the deepest level of `server_state` and at the column of its path
+  from that ancestor.
+
+  Args:
+    server_state: A `TrieServerState`, the state to be updated, whose votes
+      and weights are those of `multi_level_trie_client_update`.
+    possible_prefix_extensions: A 1D tf.string containing all possible prefix
+      extensions.
+    sub_round_votes: A list of tensors containing the aggregated client votes
+      on each level.
+    sub_round_weight: A tf.int32 of shape (levels_per_round,) containing the
+      aggregated client weights of each level.
+    max_num_prefixes: A tf.constant dictating the maximum number of prefixes we
+      can keep in the trie.
+    threshold: The threshold for heavy hitters and discovered prefixes. Only
+      those get at least `threshold` votes are discovered.
+
+  Returns:
+    An updated `TrieServerState`.
+  """
+  possible_extensions_num = tf.shape(possible_prefix_extensions)[0]
+  extensions_wo_terminator = possible_prefix_extensions[:-1]
+
+  accumulated_votes = tf.nest.map_structure(tf.add,
+                                            server_state.accumulated_votes,
+                                            sub_round_votes)
+  accumulated_weights = server_state.accumulated_weights + sub_round_weight
+
+  discovered_heavy_hitters = server_state.discovered_heavy_hitters
+  heavy_hitters_frequencies = server_state.heavy_hitters_frequencies
+  discovered_prefixes = server_state.discovered_prefixes
+  node_keys = server_state.node_keys
+  frontier_start = server_state.frontier_start
+  # The row of the ancestor of each node of the deepest level in the votes, and
+  # the index of the path from the ancestor to the node.
+  ancestor_slots = tf.range(tf.size(discovered_prefixes))
+  paths = tf.zeros_like(ancestor_slots)
+
+  for level, level_votes in enumerate(accumulated_votes):
+    columns = (
+        tf.expand_dims(paths * possible_extensions_num, 1) +
+        tf.expand_dims(tf.range(possible_extensions_num), 0))
+    votes = tf.gather(
+        tf.gather(level_votes, ancestor_slots), columns, batch_dims=1)
+
+    (new_heavy_hitters, new_heavy_hitters_frequencies, parent_slots,
+     extensions, discovered_prefixes, new_node_keys) = _decode_trie_level(
+         discovered_prefixes, frontier_start, votes, accumulated_weights[level],
+         extensions_wo_terminator, max_num_prefixes, threshold)
+
+    discovered_heavy_hitters = tf.concat(
+        [discovered_heavy_hitters, new_heavy_hitters], 0)
+    heavy_hitters_frequencies = tf.concat(
+        [heavy_hitters_frequencies, new_heavy_hitters_frequencies], 0)
+    ancestor_slots = tf.gather(ancestor_slots, parent_slots)
+    paths = (
+        tf.gather(paths, parent_slots) * (possible_extensions_num - 1) +
+        extensions)
+    frontier_start = tf.size(node_keys) + 1
+    node_keys = tf.concat([node_keys, new_node_keys], 0)
+
+  return tff.utils.update_state(
+      server_state,
+      discovered_heavy_hitters=discovered_heavy_hitters,
+      heavy_hitters_frequencies=heavy_hitters_frequencies,
+      discovered_prefixes=discovered_prefixes,
+      node_keys=node_keys,
+      frontier_start=frontier_start,
+      round_num=server_state.round_num + 1,
+      accumulated_votes=tf.nest.map_structure(tf.zeros_like,
+                                              accumulated_votes),
+      accumulated_weights=tf.zeros_like(accumulated_weights))
+
+
+@tf.function
+def multi_level_trie_server_update(server_state, possible_prefix_extensions,
+                                   sub_round_votes, sub_round_weight,
+                                   num_sub_rounds, max_num_prefixes,
+                                   threshold):
+  """Updates a `TrieServerState` based on votes on several levels.
+
+  Args:
+    server_state: A `TrieServerState`, the state to be updated.
+    possible_prefix_extensions: A 1D tf.string containing all possible prefix
+      extensions.
+    sub_round_votes: A list of tensors containing the aggregated client votes
+      on each level.
+    sub_round_weight: A tf.int32 of shape (levels_per_round,) containing the
+      aggregated client weights of each level.
+    num_sub_rounds: The total number of sub rounds to be executed before
+      decoding aggregated votes.
+    max_num_prefixes: A tf.constant dictating the maximum number of prefixes we
+      can keep in the trie.
+    threshold: The threshold for heavy hitters and discovered prefixes. Only
+      those get at least `threshold` votes are discovered.
+
+  Returns:
+    An updated `TrieServerState`.
+  """
+  if tf.math.equal(tf.size(server_state.discovered_prefixes), 0):
+    return server_state
+
+  if tf.math.equal((server_state.round_num + 1) % num_sub_rounds, 0):
+    return accumulate_server_votes_and_expand_trie_levels(
+        server_state, possible_prefix_extensions, sub_round_votes,
+        sub_round_weight, max_num_prefixes, threshold)
+  else:
+    return accumulate_server_votes(server_state, sub_round_votes,
+                                   sub_round_weight)
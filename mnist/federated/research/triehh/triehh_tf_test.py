@@ -69,6 +69,17 @@ class TriehhTfTest(hh_test.HeavyHittersTest):
     accumulated_votes = accumulate_client_votes(initial_votes, example2)
     self.assertAllEqual(accumulated_votes, initial_votes)
 
+    # A batch of examples is voted on at once. Prefixes that are not
+    # discovered and extensions outside of the alphabet are not counted.
+    examples = tf.constant(['ab', 'ea', 'Ab', 'ba', 'af'], dtype=tf.string)
+    accumulated_votes = accumulate_client_votes(initial_votes, examples)
+    expected_accumulated_votes = tf.constant(
+        [[1, 4, 1, 0, 0], [2, 0, 0, 0, 0], [0, 0, 0, 0, 0], [0, 0, 0, 0, 0],
+         [0, 0, 0, 0, 0], [0, 0, 0, 0, 0], [0, 0, 0, 0, 0], [0, 0, 0, 0, 0],
+         [0, 0, 0, 0, 0], [0, 0, 0, 0, 0]],
+        dtype=tf.int32)
+    self.assertAllEqual(accumulated_votes, expected_accumulated_votes)
+
   def test_client_update_works_as_expected(self):
     max_num_prefixes = tf.constant(10)
     max_user_contribution = tf.constant(10)
@@ -883,6 +894,129 @@ class TriehhTfTest(hh_test.HeavyHittersTest):
     self.assertSetAllEqual(server_state.discovered_prefixes,
                            expected_discovered_prefixes)
 
+  def _create_trie(self):
+    # The trie of the prefixes 'a', 'b', 'ab' and 'ba' over the extensions
+    # ['a', 'b', 'c', '$']: the nodes 'a' and 'b' have ids 1 and 2, and their
+    # children 'ab' and 'ba' ids 3 and 4.
+    node_keys = tf.constant([0, 1, 1 * 4 + 1, 2 * 4 + 0], dtype=tf.int32)
+    frontier_start = tf.constant(3)
+    return node_keys, frontier_start
+
+  def test_trie_client_update_works_as_expected(self):
+    max_num_prefixes = tf.constant(3)
+    max_user_contribution = tf.constant(10)
+    possible_prefix_extensions = ['a', 'b', 'c', triehh_tf.DEFAULT_TERMINATOR]
+    char_to_index = tf.constant(
+        triehh_tf.get_char_to_index(possible_prefix_extensions))
+    node_keys, frontier_start = self._create_trie()
+    round_num = tf.constant(2)
+    num_sub_rounds = tf.constant(1)
+    sample_data = tf.data.Dataset.from_tensor_slices(
+        ['abc', 'ab', 'Bab', 'aac', 'abd', 'a', 'bb'])
+    client_output = triehh_tf.trie_client_update(
+        sample_data, node_keys, frontier_start, char_to_index, round_num,
+        num_sub_rounds, max_num_prefixes, max_user_contribution,
+        len(possible_prefix_extensions))
+
+    expected_client_votes = tf.constant(
+        [[0, 0, 1, 1], [0, 1, 0, 0], [0, 0, 0, 0]], dtype=tf.int32)
+    self.assertAllEqual(client_output.client_votes, expected_client_votes)
+    self.assertEqual(client_output.client_weight, 7)
+
+    # Walking the trie gives the same votes as looking up the prefixes.
+    string_client_output = triehh_tf.client_update(
+        sample_data, tf.constant(['ab', 'ba']),
+        tf.constant(possible_prefix_extensions), round_num, num_sub_rounds,
+        max_num_prefixes, max_user_contribution)
+    self.assertAllEqual(client_output.client_votes,
+                        string_client_output.client_votes)
+
+  def test_trie_client_update_works_on_empty_trie_level(self):
+    possible_prefix_extensions = ['a', 'b', 'c', triehh_tf.DEFAULT_TERMINATOR]
+    node_keys, _ = self._create_trie()
+    client_output = triehh_tf.trie_client_update(
+        tf.data.Dataset.from_tensor_slices(['ab', 'ba']), node_keys,
+        tf.constant(5),
+        tf.constant(triehh_tf.get_char_to_index(possible_prefix_extensions)),
+        tf.constant(3), tf.constant(1), tf.constant(3), tf.constant(10),
+        len(possible_prefix_extensions))
+    self.assertAllEqual(client_output.client_votes, tf.zeros([3, 4], tf.int32))
+    self.assertEqual(client_output.client_weight, 0)
+
+  def test_multi_level_trie_client_update_works_as_expected(self):
+    possible_prefix_extensions = ['a', 'b', 'c', triehh_tf.DEFAULT_TERMINATOR]
+    num_extensions = len(possible_prefix_extensions)
+    node_keys, frontier_start = self._create_trie()
+    # The words are dealt alternately to the two levels, in order of first
+    # occurrence: 'abc' and 'ba' vote on the extensions of 'ab' and 'ba', and
+    # 'bab' and 'abca' on the extensions of their paths 'b' and 'c' below them.
+    sample_data = tf.data.Dataset.from_tensor_slices(
+        ['abc', 'Bab', 'ba', 'abca', 'abc'])
+    client_output = triehh_tf.multi_level_trie_client_update(
+        sample_data, node_keys, frontier_start,
+        tf.constant(triehh_tf.get_char_to_index(possible_prefix_extensions)),
+        tf.constant(1), tf.constant(1), tf.constant(3), tf.constant(10),
+        num_extensions, 2)
+
+    level_0_votes, level_1_votes = client_output.client_votes
+    self.assertAllEqual(level_0_votes,
+                        [[0, 0, 1, 0], [0, 0, 0, 1], [0, 0, 0, 0]])
+    expected_level_1_votes = tf.tensor_scatter_nd_add(
+        tf.zeros([3, (num_extensions - 1) * num_extensions], tf.int32),
+        # Path 'b' (1) to the terminator (3), and path 'c' (2) to 'a' (0).
+        [[1, 1 * num_extensions + 3], [0, 2 * num_extensions + 0]],
+        [1, 1])
+    self.assertAllEqual(level_1_votes, expected_level_1_votes)
+    self.assertAllEqual(client_output.client_weight, [2, 2])
+
+  def test_multi_level_trie_client_update_works_on_empty_trie_level(self):
+    possible_prefix_extensions = ['a', 'b', 'c', triehh_tf.DEFAULT_TERMINATOR]
+    node_keys, _ = self._create_trie()
+    client_output = triehh_tf.multi_level_trie_client_update(
+        tf.data.Dataset.from_tensor_slices(['ab', 'ba']), node_keys,
+        tf.constant(5),
+        tf.constant(triehh_tf.get_char_to_index(possible_prefix_extensions)),
+        tf.constant(1), tf.constant(1), tf.constant(3), tf.constant(10),
+        len(possible_prefix_extensions), 2)
+    self.assertAllEqual(client_output.client_votes[0],
+                        tf.zeros([3, 4], tf.int32))
+    self.assertAllEqual(client_output.client_votes[1],
+                        tf.zeros([3, 12], tf.int32))
+    self.assertAllEqual(client_output.client_weight, [0, 0])
+
+  def test_accumulate_server_votes_and_expand_trie_works_as_expected(self):
+    max_num_prefixes = tf.constant(3)
+    threshold = tf.constant(1)
+    possible_prefix_extensions = tf.constant(
+        ['a', 'b', 'c', triehh_tf.DEFAULT_TERMINATOR], dtype=tf.string)
+    node_keys, frontier_start = self._create_trie()
+    server_state = triehh_tf.TrieServerState(
+        discovered_heavy_hitters=tf.constant([], dtype=tf.string),
+        heavy_hitters_frequencies=tf.constant([], dtype=tf.float64),
+        discovered_prefixes=tf.constant(['ab', 'ba'], dtype=tf.string),
+        node_keys=node_keys,
+        frontier_start=frontier_start,
+        round_num=tf.constant(1, dtype=tf.int32),
+        accumulated_votes=tf.zeros(dtype=tf.int32, shape=[3, 4]),
+        accumulated_weights=tf.constant(0, dtype=tf.int32))
+    sub_round_votes = tf.constant([[0, 0, 2, 1], [3, 0, 0, 0], [0, 0, 0, 0]],
+                                  dtype=tf.int32)
+
+    server_state = triehh_tf.accumulate_server_votes_and_expand_trie(
+        server_state, possible_prefix_extensions, sub_round_votes,
+        tf.constant(4), max_num_prefixes, threshold)
+
+    self.assertAllEqual(server_state.discovered_heavy_hitters, [b'ab'])
+    self.assertAllClose(server_state.heavy_hitters_frequencies, [0.25])
+    self.assertAllEqual(server_state.discovered_prefixes, [b'abc', b'baa'])
+    # 'abc' is the child of node 3 by 'c', and 'baa' of node 4 by 'a'.
+    self.assertAllEqual(server_state.node_keys,
+                        [0, 1, 5, 8, 3 * 4 + 2, 4 * 4 + 0])
+    self.assertEqual(server_state.frontier_start, 5)
+    self.assertEqual(server_state.round_num, 2)
+    self.assertAllEqual(server_state.accumulated_votes,
+                        tf.zeros(dtype=tf.int32, shape=[3, 4]))
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -32,7 +32,12 @@ import tensorflow_federated as tff
 from tensorflow_federated.python.research.triehh import triehh_tf
 from tensorflow_federated.python.research.triehh.triehh_tf import client_update
 from tensorflow_federated.python.research.triehh.triehh_tf import server_update
+from tensorflow_federated.python.research.triehh.triehh_tf import multi_level_trie_client_update
+from tensorflow_federated.python.research.triehh.triehh_tf import multi_level_trie_server_update
 from tensorflow_federated.python.research.triehh.triehh_tf import ServerState
+from tensorflow_federated.python.research.triehh.triehh_tf import trie_client_update
+from tensorflow_federated.python.research.triehh.triehh_tf import trie_server_update
+from tensorflow_federated.python.research.triehh.triehh_tf import TrieServerState
 
 
 def build_triehh_process(
@@ -41,7 +46,9 @@ def build_triehh_process(
     max_num_prefixes: int,
     threshold: int,
     max_user_contribution: int,
-    default_terminator: str = triehh_tf.DEFAULT_TERMINATOR):
+    default_terminator: str = triehh_tf.DEFAULT_TERMINATOR,
+    use_trie: bool = False,
+    levels_per_round: int = 1):
   """Builds the TFF computations for heavy hitters discovery with TrieHH.
 
   TrieHH works by interactively keeping track of popular prefixes. In each
@@ -57,6 +64,23 @@ def build_triehh_process(
   already discovered prefix is extended by `default_terminator` it is added to
   the list of discovered heavy hitters.
 
+  If `use_trie` is True, the server state is a `TrieServerState`: the
+  discovered prefixes are kept as the nodes of a trie, and the server
+  broadcasts the trie as int tensors instead of the prefixes themselves.
+  Clients then vote by walking the trie, without building lookup tables, and
+  the server only builds the strings of the prefixes it keeps. Both
+  representations discover the same heavy hitters.
+
+  With a trie, clients can also vote on `levels_per_round` levels of the trie
+  at once, see `triehh_tf.multi_level_trie_client_update`. The server then
+  adds `levels_per_round` levels to the trie every `num_sub_rounds` rounds,
+  which divides the number of rounds needed to discover long heavy hitters
+  accordingly. Each level is voted on by a disjoint sample of the words of a
+  client, and the votes on the last level have a size of
+  `max_num_prefixes * (len(possible_prefix_extensions) + 1) *
+  len(possible_prefix_extensions)**(levels_per_round - 1)`, so this is meant
+  for a small number of levels.
+
   Args:
     possible_prefix_extensions: A list containing all the possible extensions to
       learned prefixes. Each extensions must be a single character strings. This
@@ -70,21 +94,35 @@ def build_triehh_process(
     max_user_contribution: The maximum number of examples a user can contribute.
       Must be positive.
     default_terminator: The end of sequence symbol.
+    use_trie: Whether to keep the discovered prefixes in a `TrieServerState`.
+    levels_per_round: The number of levels of the trie voted on in a round.
+      Must be positive, and 1 unless `use_trie` is True.
 
   Returns:
     A `tff.templates.IterativeProcess`.
 
   Raises:
-    ValueError: If possible_prefix_extensions contains default_terminator.
+    ValueError: If possible_prefix_extensions contains default_terminator, or
+      if `levels_per_round` is not supported.
   """
   if default_terminator in possible_prefix_extensions:
     raise ValueError(
         'default_terminator should not appear in possible_prefix_extensions')
+  if levels_per_round < 1:
+    raise ValueError('levels_per_round must be positive, found {}.'.format(
+        levels_per_round))
+  if levels_per_round > 1 and not use_trie:
+    raise ValueError('Voting on several levels per round requires use_trie.')
 
   # Append `default_terminator` to `possible_prefix_extensions` to make sure it
   # is the last item in the list.
   possible_prefix_extensions.append(default_terminator)
 
+  if use_trie:
+    return _build_trie_process(possible_prefix_extensions, num_sub_rounds,
+                               max_num_prefixes, threshold,
+                               max_user_contribution, levels_per_round)
+
   @tff.tf_computation
   def server_init_tf():
     return ServerState(
@@ -184,3 +222,150 @@ def build_triehh_process(
       initialize_fn=tff.federated_computation(
           lambda: tff.federated_eval(server_init_tf, tff.SERVER)),
       next_fn=run_one_round)
+
+
+def _build_trie_process(possible_prefix_extensions: List[str],
+                        num_sub_rounds: int, max_num_prefixes: int,
+                        threshold: int, max_user_contribution: int,
+                        levels_per_round: int):
+  """Builds the TrieHH process with a `TrieServerState`.
+
+  Args:
+    possible_prefix_extensions: A list containing all the possible extensions to
+      learned prefixes, with the terminator as the last item.
+    num_sub_rounds: The total number of sub rounds to be executed before
+      decoding aggregated votes.
+    max_num_prefixes: The maximum number of prefixes we can keep in the trie.
+    threshold: The threshold for heavy hitters and discovered prefixes.
+    max_user_contribution: The maximum number of examples a user can contribute.
+    levels_per_round: The number of levels of the trie voted on in a round.
+
+  Returns:
+    A `tff.templates.IterativeProcess`.
+  """
+  num_extensions = len(possible_prefix_extensions)
+  char_to_index = triehh_tf.get_char_to_index(possible_prefix_extensions)
+
+  # With a single level per round, the votes and weights keep the shapes of
+  # `ServerState`. Otherwise, they hold a tensor and a count per level.
+  if levels_per_round == 1:
+    client_update = trie_client_update
+    server_update = trie_server_update
+    votes_shapes = [max_num_prefixes, num_extensions]
+    weight_shape = []
+    level_kwargs = {}
+
+    def zero_votes():
+      return tf.zeros(dtype=tf.int32, shape=votes_shapes)
+
+    votes_type = tff.TensorType(dtype=tf.int32, shape=votes_shapes)
+  else:
+    client_update = multi_level_trie_client_update
+    server_update = multi_level_trie_server_update
+    votes_shapes = triehh_tf.get_level_votes_shapes(levels_per_round,
+                                                    max_num_prefixes,
+                                                    num_extensions)
+    weight_shape = [levels_per_round]
+    level_kwargs = {'levels_per_round': levels_per_round}
+
+    def zero_votes():
+      return [tf.zeros(dtype=tf.int32, shape=shape) for shape in votes_shapes]
+
+    votes_type = [
+        tff.TensorType(dtype=tf.int32, shape=shape) for shape in votes_shapes
+    ]
+  weight_type = tff.TensorType(dtype=tf.int32, shape=weight_shape)
+
+  @tff.tf_computation
+  def server_init_tf():
+    return TrieServerState(
+        discovered_heavy_hitters=tf.constant([], dtype=tf.string),
+        heavy_hitters_frequencies=tf.constant([], dtype=tf.float64),
+        discovered_prefixes=tf.constant([''], dtype=tf.string),
+        node_keys=tf.constant([], dtype=tf.int32),
+        frontier_start=tf.constant(0, dtype=tf.int32),
+        round_num=tf.constant(0, dtype=tf.int32),
+        accumulated_votes=zero_votes(),
+        accumulated_weights=tf.zeros(dtype=tf.int32, shape=weight_shape))
+
+  # The discovered_* fields and the trie grow over time, so they need [None]
+  # shapes.
+  server_state_type = (
+      tff.to_type(
+          TrieServerState(
+              discovered_heavy_hitters=tff.TensorType(
+                  dtype=tf.string, shape=[None]),
+              heavy_hitters_frequencies=tff.TensorType(
+                  dtype=tf.float64, shape=[None]),
+              discovered_prefixes=tff.TensorType(dtype=tf.string, shape=[None]),
+              node_keys=tff.TensorType(dtype=tf.int32, shape=[None]),
+              frontier_start=tff.TensorType(dtype=tf.int32, shape=[]),
+              round_num=tff.TensorType(dtype=tf.int32, shape=[]),
+              accumulated_votes=votes_type,
+              accumulated_weights=weight_type,
+          )))
+
+  @tff.tf_computation(server_state_type, votes_type, weight_type)
+  def server_update_fn(server_state, sub_round_votes, sub_round_weight):
+    return server_update(
+        server_state,
+        tf.constant(possible_prefix_extensions),
+        sub_round_votes,
+        sub_round_weight,
+        num_sub_rounds=tf.constant(num_sub_rounds),
+        max_num_prefixes=tf.constant(max_num_prefixes),
+        threshold=tf.constant(threshold))
+
+  tf_dataset_type = tff.SequenceType(tf.string)
+  node_keys_type = tff.TensorType(dtype=tf.int32, shape=[None])
+  scalar_type = tff.TensorType(dtype=tf.int32, shape=[])
+
+  @tff.tf_computation(tf_dataset_type, node_keys_type, scalar_type,
+                      scalar_type)
+  def client_update_fn(tf_dataset, node_keys, frontier_start, round_num):
+    return client_update(tf_dataset, node_keys, frontier_start,
+                         tf.constant(char_to_index, dtype=tf.int32), round_num,
+                         num_sub_rounds, max_num_prefixes,
+                         max_user_contribution, num_extensions,
+                         **level_kwargs)
+
+  federated_server_state_type = tff.FederatedType(server_state_type, tff.SERVER)
+  federated_dataset_type = tff.FederatedType(
+      tf_dataset_type, tff.CLIENTS, all_equal=False)
+
+  @tff.federated_computation(federated_server_state_type,
+                             federated_dataset_type)
+  def run_one_round(server_state, federated_dataset):
+    """Orchestration logic for one round of TrieHH computation on a trie.
+
+    Args:
+      server_state: A `TrieServerState`.
+      federated_dataset: A federated `tf.Dataset` with placement `tff.CLIENTS`.
+
+    Returns:
+      An updated `TrieServerState`
+    """
+    node_keys = tff.federated_broadcast(server_state.node_keys)
+    frontier_start = tff.federated_broadcast(server_state.frontier_start)
+    round_num = tff.federated_broadcast(server_state.round_num)
+
+    client_outputs = tff.federated_map(
+        client_update_fn,
+        (federated_dataset, node_keys, frontier_start, round_num))
+
+    accumulated_votes = tff.federated_sum(client_outputs.client_votes)
+
+    accumulated_weights = tff.federated_sum(client_outputs.client_weight)
+
+    server_state = tff.federated_map(
+        server_update_fn,
+        (server_state, accumulated_votes, accumulated_weights))
+
+    server_output = tff.federated_value([], tff.SERVER)
+
+    return server_state, server_output
+
+  return tff.templates.IterativeProcess(
+      initialize_fn=tff.federated_computation(
+          lambda: tff.federated_eval(server_init_tf, tff.SERVER)),
+      next_fn=run_one_round)
@@ -92,6 +92,36 @@ class TriehhTffTest(hh_test.HeavyHittersTest):
     self.assertSetAllEqual(server_state.discovered_heavy_hitters,
                            expected_discovered_heavy_hitters)
 
+  def test_build_triehh_process_with_trie_finds_same_heavy_hitters(self):
+    possible_prefix_extensions = list(string.ascii_lowercase)
+    datasets = [
+        tf.data.Dataset.from_tensor_slices(['hello', 'hey', 'hi']),
+        tf.data.Dataset.from_tensor_slices(['hello', 'help', 'a']),
+    ]
+
+    results = []
+    for use_trie in [False, True]:
+      tff.backends.native.set_local_execution_context()
+      iterative_process = triehh_tff.build_triehh_process(
+          list(possible_prefix_extensions),
+          num_sub_rounds=1,
+          max_num_prefixes=4,
+          threshold=1,
+          max_user_contribution=10,
+          use_trie=use_trie)
+      server_state = iterative_process.initialize()
+      for _ in range(7):
+        server_state, _ = iterative_process.next(server_state, datasets)
+      self.assertEmpty(server_state.discovered_prefixes)
+      results.append(server_state)
+
+    self.assertAllEqual(results[0].discovered_heavy_hitters,
+                        results[1].discovered_heavy_hitters)
+    self.assertAllClose(results[0].heavy_hitters_frequencies,
+                        results[1].heavy_hitters_frequencies)
+    self.assertSetAllEqual(results[1].discovered_heavy_hitters,
+                           ['hello', 'hey', 'hi', 'help', 'a'])
+
 
 if __name__ == '__main__':
   tf.test.main()
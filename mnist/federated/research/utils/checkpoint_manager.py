@@ -14,11 +14,13 @@
 """Utilities for saving and loading experiments."""
 
 import abc
+import concurrent.futures
 import os.path
 import re
 from typing import Any, List, Tuple
 
 from absl import logging
+import numpy as np
 import tensorflow as tf
 
 
@@ -223,3 +225,140 @@ class FileCheckpointManager(CheckpointManager):
     """Returns all the checkpoint paths managed by the instance."""
     pattern = os.path.join(self._root_dir, '{}*'.format(self._prefix))
     return tf.io.gfile.glob(pattern)
+
+
+class TensorFileCheckpointManager(FileCheckpointManager):
+  """A `FileCheckpointManager` writing raw tensors in the background.
+
+  Each checkpoint is a directory holding the flattened state as serialized
+  tensors, in a TFRecord file, rather than a SavedModel. Saving copies the
+  state to host memory, and returns while the checkpoint is written and old
+  checkpoints are removed by a background thread. Loading first waits for any
+  pending write.
+
+  Checkpoints written by `FileCheckpointManager` under the same `root_dir` and
+  `prefix` can still be loaded.
+  """
+
+  _TENSORS_FILENAME = 'tensors.tfrecord'
+
+  def __init__(self,
+               root_dir: str,
+               prefix: str = 'ckpt_',
+               keep_total: int = 5,
+               keep_first: bool = True,
+               write_in_background: bool = True):
+    """Returns an initialized `TensorFileCheckpointManager`.
+
+    Args:
+      root_dir: A path on the filesystem to store checkpoints.
+      prefix: A string to use as the prefix for checkpoint names.
+      keep_total: An integer representing the total number of checkpoints to
+        keep.
+      keep_first: A boolean indicating if the first checkpoint should be kept.
+      write_in_background: A boolean indicating if checkpoints are written by a
+        background thread. If False, `save_checkpoint` returns once the
+        checkpoint is written.
+    """
+    super().__init__(root_dir, prefix, keep_total, keep_first)
+    if write_in_background:
+      self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    else:
+      self._executor = None
+    self._pending_write = None
+
+  def wait_for_pending_write(self) -> None:
+    """Blocks until the last checkpoint is written, raising its errors."""
+    if self._pending_write is not None:
+      pending_write, self._pending_write = self._pending_write, None
+      pending_write.result()
+
+  def load_latest_checkpoint(self, structure: Any) -> Tuple[Any, int]:
+    self.wait_for_pending_write()
+    return super().load_latest_checkpoint(structure)
+
+  def load_checkpoint(self, structure: Any, round_num: int) -> Any:
+    self.wait_for_pending_write()
+    return super().load_checkpoint(structure, round_num)
+
+  def _load_checkpoint_from_path(self, structure: Any,
+                                 checkpoint_path: str) -> Tuple[Any, int]:
+    """Returns the state and round number for the given `checkpoint_path`.
+
+    Args:
+      structure: A nested structure which `tf.convert_to_tensor` supports to use
+        as a template when reconstructing the loaded template.
+      checkpoint_path: A path on the filesystem to load.
+
+    Raises:
+      FileNotFoundError: If a checkpoint for given `checkpoint_path` doesn't
+        exist.
+    """
+    tensors_path = os.path.join(checkpoint_path, self._TENSORS_FILENAME)
+    if not tf.io.gfile.exists(tensors_path):
+      # A SavedModel written by `FileCheckpointManager`.
+      return super()._load_checkpoint_from_path(structure, checkpoint_path)
+    flat_structure = tf.nest.flatten(structure)
+    serialized_tensors = list(
+        tf.data.TFRecordDataset(tensors_path).as_numpy_iterator())
+    if len(serialized_tensors) != len(flat_structure):
+      raise ValueError(
+          'The checkpoint {} holds {} tensors, but the structure has {}.'
+          .format(checkpoint_path, len(serialized_tensors),
+                  len(flat_structure)))
+    flat_obj = [
+        tf.io.parse_tensor(serialized_tensor,
+                           tf.convert_to_tensor(template).dtype)
+        for serialized_tensor, template in zip(serialized_tensors,
+                                               flat_structure)
+    ]
+    state = tf.nest.pack_sequence_as(structure, flat_obj)
+    round_num = self._round_num(checkpoint_path)
+    logging.info('Checkpoint loaded: %s', checkpoint_path)
+    return state, round_num
+
+  def save_checkpoint(self, state: Any, round_num: int) -> None:
+    """Saves a new checkpointed `state` for the given `round_num`.
+
+    Args:
+      state: A nested structure which `tf.convert_to_tensor` supports.
+      round_num: An integer representing the current training round.
+    """
+    # The previous write must be done before the next one clears old
+    # checkpoints, and its errors are raised here rather than lost.
+    self.wait_for_pending_write()
+    # The state is copied now, since it may be mutated while being written.
+    flat_obj = [
+        np.array(tf.convert_to_tensor(value))
+        for value in tf.nest.flatten(state)
+    ]
+    if self._executor is None:
+      self._write_checkpoint(flat_obj, round_num)
+    else:
+      self._pending_write = self._executor.submit(self._write_checkpoint,
+                                                  flat_obj, round_num)
+
+  def _write_checkpoint(self, flat_obj: List[np.ndarray],
+                        round_num: int) -> None:
+    """Writes the flattened state of a checkpoint, and clears old ones."""
+    basename = '{}{}'.format(self._prefix, round_num)
+    checkpoint_path = os.path.join(self._root_dir, basename)
+
+    # First write to a temporary directory.
+    temp_basename = '.temp_{}'.format(basename)
+    temp_path = os.path.join(self._root_dir, temp_basename)
+    try:
+      tf.io.gfile.rmtree(temp_path)
+    except tf.errors.NotFoundError:
+      pass
+    tf.io.gfile.makedirs(temp_path)
+    with tf.io.TFRecordWriter(os.path.join(temp_path,
+                                           self._TENSORS_FILENAME)) as writer:
+      for value in flat_obj:
+        writer.write(tf.io.serialize_tensor(value).numpy())
+
+    # Rename the temp directory to the final location atomically.
+    tf.io.gfile.rename(temp_path, checkpoint_path)
+    logging.info('Checkpoint saved: %s', checkpoint_path)
+
+    self._clear_old_checkpoints()
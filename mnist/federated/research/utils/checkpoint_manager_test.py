@@ -250,5 +250,79 @@ class FileCheckpointManagerSaveCheckpointTest(tf.test.TestCase):
       checkpoint_mngr.save_checkpoint(dummy_state_1, 1)
 
 
+class TensorFileCheckpointManagerTest(tf.test.TestCase):
+
+  def test_loads_latest_checkpoint(self):
+    temp_dir = self.get_temp_dir()
+    checkpoint_mngr = checkpoint_manager.TensorFileCheckpointManager(temp_dir)
+    dummy_state_1 = _create_dummy_state(1)
+    checkpoint_mngr.save_checkpoint(dummy_state_1, 1)
+    dummy_state_2 = _create_dummy_state(2)
+    checkpoint_mngr.save_checkpoint(dummy_state_2, 2)
+    structure = _create_dummy_state()
+
+    state, round_num = checkpoint_mngr.load_latest_checkpoint(structure)
+
+    self.assertEqual(state, dummy_state_2)
+    self.assertEqual(round_num, 2)
+    self.assertEqual(
+        checkpoint_mngr.load_checkpoint(structure, 1), dummy_state_1)
+
+  def test_removes_oldest_with_keep_first_true(self):
+    temp_dir = self.get_temp_dir()
+    checkpoint_mngr = checkpoint_manager.TensorFileCheckpointManager(
+        temp_dir, keep_total=3)
+
+    for round_num in range(1, 5):
+      checkpoint_mngr.save_checkpoint(_create_dummy_state(round_num), round_num)
+    checkpoint_mngr.wait_for_pending_write()
+
+    self.assertCountEqual(os.listdir(temp_dir), ['ckpt_1', 'ckpt_3', 'ckpt_4'])
+
+  def test_saves_in_foreground(self):
+    temp_dir = self.get_temp_dir()
+    checkpoint_mngr = checkpoint_manager.TensorFileCheckpointManager(
+        temp_dir, write_in_background=False)
+
+    checkpoint_mngr.save_checkpoint(_create_dummy_state(1), 1)
+
+    self.assertCountEqual(os.listdir(temp_dir), ['ckpt_1'])
+
+  def test_loads_file_checkpoint_manager_checkpoint(self):
+    temp_dir = self.get_temp_dir()
+    dummy_state_1 = _create_dummy_state(1)
+    checkpoint_manager.FileCheckpointManager(temp_dir).save_checkpoint(
+        dummy_state_1, 1)
+    checkpoint_mngr = checkpoint_manager.TensorFileCheckpointManager(temp_dir)
+
+    state, round_num = checkpoint_mngr.load_latest_checkpoint(
+        _create_dummy_state())
+
+    self.assertEqual(state, dummy_state_1)
+    self.assertEqual(round_num, 1)
+
+  def test_raises_already_exists_error_with_existing_round_number(self):
+    temp_dir = self.get_temp_dir()
+    checkpoint_mngr = checkpoint_manager.TensorFileCheckpointManager(temp_dir)
+
+    dummy_state_1 = _create_dummy_state(1)
+    checkpoint_mngr.save_checkpoint(dummy_state_1, 1)
+    checkpoint_mngr.save_checkpoint(dummy_state_1, 1)
+
+    # The error of the background write is raised once it is waited for.
+    with self.assertRaises(tf.errors.AlreadyExistsError):
+      checkpoint_mngr.wait_for_pending_write()
+
+  def test_raises_value_error_with_bad_structure(self):
+    temp_dir = self.get_temp_dir()
+    checkpoint_mngr = checkpoint_manager.TensorFileCheckpointManager(temp_dir)
+    dummy_state_1 = _create_dummy_state(1)
+    checkpoint_mngr.save_checkpoint(dummy_state_1, 1)
+    structure = None
+
+    with self.assertRaises(ValueError):
+      checkpoint_mngr.load_checkpoint(structure, 1)
+
+
 if __name__ == '__main__':
   tf.test.main()
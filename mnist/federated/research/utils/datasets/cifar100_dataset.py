@@ -17,7 +17,8 @@ import collections
 import functools
 
 import tensorflow as tf
-import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.utils.datasets import dataset_cache
 
 CIFAR_SHAPE = (32, 32, 3)
 TOTAL_FEATURE_SIZE = 32 * 32 * 3
@@ -80,7 +81,7 @@ def get_federated_cifar100(client_epochs_per_round,
                      ' intended, then max_batches_per_client must be set to '
                      'some positive integer.')
 
-  cifar_train, cifar_test = tff.simulation.datasets.cifar100.load_data()
+  cifar_train, cifar_test = dataset_cache.load_cifar100()
   train_crop_shape = (train_batch_size,) + crop_shape
   test_crop_shape = (TEST_BATCH_SIZE,) + crop_shape
   train_image_map = functools.partial(
@@ -131,7 +132,7 @@ def get_centralized_cifar100(train_batch_size, crop_shape=CIFAR_SHAPE):
   if len(crop_shape) != 3:
     raise ValueError('The crop_shape must have length 3, corresponding to a '
                      'tensor of shape [height, width, channels].')
-  cifar_train, cifar_test = tff.simulation.datasets.cifar100.load_data()
+  cifar_train, cifar_test = dataset_cache.load_cifar100()
   train_crop_shape = (train_batch_size,) + crop_shape
   test_crop_shape = (TEST_BATCH_SIZE,) + crop_shape
   train_image_map = functools.partial(
@@ -0,0 +1,195 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Loaders of the `tff.simulation.datasets` used by the research datasets.
+
+By default, each call loads the data again, as the underlying
+`tff.simulation.datasets` functions do. Within `cache_loaded_datasets`, e.g.
+while running several experiments in a single process, each dataset is loaded
+once and shared by all the calls.
+
+Artifacts derived from the datasets, such as vocabularies, can also be cached
+on local disk across processes, see `set_artifact_cache_dir` and
+`cache_artifact`.
+"""
+
+import collections
+import contextlib
+import functools
+import json
+import os.path
+import time
+
+from absl import logging
+import tensorflow as tf
+import tensorflow_federated as tff
+
+# The loaded datasets, keyed by loader and arguments, while caching is enabled.
+_loaded_datasets = None
+
+# The directory caching derived artifacts, see `set_artifact_cache_dir`.
+_artifact_cache_dir = None
+
+# The time spent in each loader since the last call to `pop_load_secs`.
+_load_secs = collections.OrderedDict()
+
+# The time spent in loads nested in each of the running loaders, innermost
+# last, see `_timed`.
+_nested_load_secs = []
+
+
+def pop_load_secs():
+  """Returns the seconds spent in each loader since the last call, if any.
+
+  The time of a load nested in another, e.g. a cached artifact created from a
+  loaded dataset, is only counted for the innermost loader, so the values sum
+  up to the total time spent loading.
+  """
+  load_secs = collections.OrderedDict(_load_secs)
+  _load_secs.clear()
+  return load_secs
+
+
+def _timed(name, load_fn):
+  """Returns `load_fn`, recording its time, excluding nested loads, as `name`."""
+
+  @functools.wraps(load_fn)
+  def timed_load_fn(*args, **kwargs):
+    start_time = time.time()
+    _nested_load_secs.append(0.0)
+    try:
+      return load_fn(*args, **kwargs)
+    finally:
+      total_secs = time.time() - start_time
+      load_secs = total_secs - _nested_load_secs.pop()
+      if _nested_load_secs:
+        _nested_load_secs[-1] += total_secs
+      _load_secs[name] = _load_secs.get(name, 0.0) + load_secs
+      logging.info('%s took %.2f s', name, load_secs)
+
+  return timed_load_fn
+
+
+@contextlib.contextmanager
+def cache_loaded_datasets():
+  """A context manager within which each dataset is loaded at most once."""
+  global _loaded_datasets
+  if _loaded_datasets is not None:
+    # Nested scopes share the cache of the outermost one.
+    yield
+    return
+  _loaded_datasets = {}
+  try:
+    yield
+  finally:
+    _loaded_datasets = None
+
+
+def _cached(load_fn):
+  """Returns `load_fn`, memoized within `cache_loaded_datasets`."""
+
+  @functools.wraps(load_fn)
+  def cached_load_fn(*args, **kwargs):
+    if _loaded_datasets is None:
+      return load_fn(*args, **kwargs)
+    key = (load_fn.__name__, args, tuple(sorted(kwargs.items())))
+    if key not in _loaded_datasets:
+      _loaded_datasets[key] = load_fn(*args, **kwargs)
+    else:
+      logging.info('Reusing the data of %s', load_fn.__name__)
+    return _loaded_datasets[key]
+
+  return _timed(load_fn.__name__, cached_load_fn)
+
+
+def set_artifact_cache_dir(cache_dir):
+  """Sets the local directory caching derived artifacts, or None to disable."""
+  global _artifact_cache_dir
+  _artifact_cache_dir = cache_dir
+
+
+def _get_dataset_version():
+  # The datasets are pinned by the version of TFF which downloads them.
+  return 'tff_{}'.format(tff.__version__)
+
+
+def cache_artifact(create_fn):
+  """Decorates `create_fn` to cache its results on disk.
+
+  The results of `create_fn` must be JSON-serializable, e.g. lists of strings,
+  and only depend on its arguments and on the version of the datasets. They
+  are cached in the directory set by `set_artifact_cache_dir`, under a file
+  keyed by the dataset version, the name of `create_fn` and its arguments. If
+  no directory is set, `create_fn` is called every time.
+
+  Args:
+    create_fn: The function to decorate.
+
+  Returns:
+    The decorated function.
+  """
+  name = '{}.{}'.format(create_fn.__module__.rsplit('.', 1)[-1],
+                        create_fn.__name__)
+
+  @functools.wraps(create_fn)
+  def cached_create_fn(*args, **kwargs):
+    if _artifact_cache_dir is None:
+      return create_fn(*args, **kwargs)
+    key = '_'.join([name] + [str(arg) for arg in args] +
+                   ['{}={}'.format(k, v) for k, v in sorted(kwargs.items())])
+    path = os.path.join(_artifact_cache_dir, _get_dataset_version(),
+                        key + '.json')
+    if tf.io.gfile.exists(path):
+      with tf.io.gfile.GFile(path, 'r') as f:
+        return json.load(f)
+
+    artifact = create_fn(*args, **kwargs)
+    tf.io.gfile.makedirs(os.path.dirname(path))
+    # Written to a temporary file first, so a partial cache is never read.
+    with tf.io.gfile.GFile(path + '.tmp', 'w') as f:
+      json.dump(artifact, f)
+    tf.io.gfile.rename(path + '.tmp', path, overwrite=True)
+    logging.info('Cached %s to %s', name, path)
+    return artifact
+
+  return _timed(name, cached_create_fn)
+
+
+@_cached
+def load_cifar100():
+  return tff.simulation.datasets.cifar100.load_data()
+
+
+@_cached
+def load_emnist(only_digits=True):
+  return tff.simulation.datasets.emnist.load_data(only_digits=only_digits)
+
+
+@_cached
+def load_shakespeare():
+  return tff.simulation.datasets.shakespeare.load_data()
+
+
+@_cached
+def load_stackoverflow():
+  return tff.simulation.datasets.stackoverflow.load_data()
+
+
+@_cached
+def load_stackoverflow_word_counts():
+  return tff.simulation.datasets.stackoverflow.load_word_counts()
+
+
+@_cached
+def load_stackoverflow_tag_counts():
+  return tff.simulation.datasets.stackoverflow.load_tag_counts()
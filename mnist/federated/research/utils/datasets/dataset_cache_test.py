@@ -0,0 +1,99 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+import tensorflow as tf
+
+from tensorflow_federated.python.research.utils.datasets import dataset_cache
+
+EMNIST_MODULE = 'tensorflow_federated.simulation.datasets.emnist'
+
+
+class DatasetCacheTest(tf.test.TestCase):
+
+  @mock.patch(EMNIST_MODULE + '.load_data')
+  def test_loads_data_on_every_call_by_default(self, mock_load_data):
+    dataset_cache.load_emnist(only_digits=True)
+    dataset_cache.load_emnist(only_digits=True)
+    self.assertEqual(mock_load_data.call_count, 2)
+
+  @mock.patch(EMNIST_MODULE + '.load_data')
+  def test_loads_data_once_per_arguments_within_cache(self, mock_load_data):
+    mock_load_data.side_effect = lambda only_digits: (only_digits, 'test')
+    with dataset_cache.cache_loaded_datasets():
+      self.assertEqual(
+          dataset_cache.load_emnist(only_digits=True), (True, 'test'))
+      with dataset_cache.cache_loaded_datasets():
+        self.assertEqual(
+            dataset_cache.load_emnist(only_digits=True), (True, 'test'))
+      self.assertEqual(
+          dataset_cache.load_emnist(only_digits=False), (False, 'test'))
+    self.assertEqual(mock_load_data.call_count, 2)
+
+    dataset_cache.load_emnist(only_digits=True)
+    self.assertEqual(mock_load_data.call_count, 3)
+
+  def test_cache_artifact_caches_on_disk(self):
+    dataset_cache.pop_load_secs()
+    calls = []
+
+    @dataset_cache.cache_artifact
+    def create_vocab(vocab_size):
+      calls.append(vocab_size)
+      return ['word{}'.format(i) for i in range(vocab_size)]
+
+    self.assertEqual(create_vocab(2), ['word0', 'word1'])
+    self.assertEqual(calls, [2])
+
+    dataset_cache.set_artifact_cache_dir(self.get_temp_dir())
+    try:
+      self.assertEqual(create_vocab(2), ['word0', 'word1'])
+      self.assertEqual(create_vocab(2), ['word0', 'word1'])
+      self.assertEqual(create_vocab(3), ['word0', 'word1', 'word2'])
+    finally:
+      dataset_cache.set_artifact_cache_dir(None)
+    self.assertEqual(calls, [2, 2, 3])
+    load_secs = dataset_cache.pop_load_secs()
+    self.assertLen(load_secs, 1)
+    self.assertEndsWith(list(load_secs)[0], '.create_vocab')
+    self.assertEmpty(dataset_cache.pop_load_secs())
+
+  @mock.patch(EMNIST_MODULE + '.load_data')
+  def test_nested_load_secs_are_counted_once(self, mock_load_data):
+    dataset_cache.pop_load_secs()
+    clock = [0.0]
+
+    def advance_clock(secs):
+      clock[0] += secs
+
+    mock_load_data.side_effect = lambda only_digits: advance_clock(2.0)
+
+    @dataset_cache.cache_artifact
+    def create_vocab():
+      advance_clock(1.0)
+      dataset_cache.load_emnist(only_digits=True)
+      return []
+
+    with mock.patch.object(dataset_cache.time, 'time', lambda: clock[0]):
+      create_vocab()
+    load_secs = dataset_cache.pop_load_secs()
+    self.assertLen(load_secs, 2)
+    self.assertEqual(load_secs.pop('load_emnist'), 2.0)
+    self.assertEndsWith(list(load_secs)[0], '.create_vocab')
+    self.assertEqual(list(load_secs.values()), [1.0])
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -14,7 +14,8 @@
 """Library for loading and preprocessing EMNIST autoencoder data."""
 
 import tensorflow as tf
-import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.utils.datasets import dataset_cache
 
 EMNIST_TRAIN_DIGITS_ONLY_SIZE = 341873
 EMNIST_TRAIN_FULL_SIZE = 671585
@@ -61,7 +62,7 @@ def get_emnist_datasets(client_batch_size,
                      ' intended, then max_batches_per_client must be set to '
                      'some positive integer.')
 
-  emnist_train, emnist_test = tff.simulation.datasets.emnist.load_data(
+  emnist_train, emnist_test = dataset_cache.load_emnist(
       only_digits=only_digits)
 
   def preprocess_train_dataset(dataset):
@@ -94,7 +95,7 @@ def get_emnist_datasets(client_batch_size,
 
 def get_centralized_emnist_datasets(batch_size, only_digits=False):
   """Loads and preprocesses centralized EMNIST training and testing sets."""
-  emnist_train, emnist_test = tff.simulation.datasets.emnist.load_data(
+  emnist_train, emnist_test = dataset_cache.load_emnist(
       only_digits=only_digits)
 
   def preprocess(dataset, batch_size, buffer_size=10000, shuffle_data=True):
@@ -16,7 +16,8 @@
 from typing import Optional
 
 import tensorflow as tf
-import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.utils.datasets import dataset_cache
 
 EMNIST_TRAIN_DIGITS_ONLY_SIZE = 341873
 EMNIST_TRAIN_FULL_SIZE = 671585
@@ -62,7 +63,7 @@ def get_emnist_datasets(client_batch_size: int,
                      ' intended, then max_batches_per_client must be set to '
                      'some positive integer.')
 
-  emnist_train, emnist_test = tff.simulation.datasets.emnist.load_data(
+  emnist_train, emnist_test = dataset_cache.load_emnist(
       only_digits=only_digits)
 
   def preprocess_train_dataset(dataset):
@@ -113,7 +114,7 @@ def get_centralized_emnist_datasets(batch_size: int,
       dataset.
     test_dataset: A `tf.data.Dataset` instance representing the test dataset.
   """
-  emnist_train, emnist_test = tff.simulation.datasets.emnist.load_data(
+  emnist_train, emnist_test = dataset_cache.load_emnist(
       only_digits=only_digits)
 
   def preprocess(dataset, batch_size, buffer_size=10000, shuffle_data=True):
@@ -17,7 +17,8 @@ import functools
 from typing import Tuple
 
 import tensorflow as tf
-import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.utils.datasets import dataset_cache
 
 SEQUENCE_LENGTH = 80  # from McMahan et al AISTATS 2017
 # Vocabulary re-used from the Federated Learning for Text Generation tutorial.
@@ -141,7 +142,7 @@ def construct_character_level_datasets(client_batch_size: int,
                      ' intended, then max_batches_per_client must be set to '
                      'some positive integer.')
 
-  train_client_data, _ = (tff.simulation.datasets.shakespeare.load_data())
+  train_client_data, _ = dataset_cache.load_shakespeare()
 
   preprocessed_train_client_data = train_client_data.preprocess(
       functools.partial(
@@ -159,8 +160,7 @@ def construct_centralized_datasets(batch_size: int = EVAL_BATCH_SIZE,
                                    sequence_length: int = SEQUENCE_LENGTH,
                                    shuffle_buffer_size: int = 0):
   """Loads and preprocesses centralized training and test Shakespeare datasets."""
-  train_client_data, test_client_data = (
-      tff.simulation.datasets.shakespeare.load_data())
+  train_client_data, test_client_data = dataset_cache.load_shakespeare()
 
   eval_train_dataset = convert_snippets_to_character_sequence_examples(
       train_client_data.create_tf_dataset_from_all_clients(),
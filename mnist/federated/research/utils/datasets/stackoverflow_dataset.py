@@ -22,6 +22,8 @@ import numpy as np
 import tensorflow as tf
 import tensorflow_federated as tff
 
+from tensorflow_federated.python.research.utils.datasets import dataset_cache
+
 EVAL_BATCH_SIZE = 100
 
 
@@ -41,9 +43,10 @@ class SpecialTokens(object):
   eos = attr.ib()
 
 
+@dataset_cache.cache_artifact
 def create_vocab(vocab_size):
   """Creates vocab from `vocab_size` most common words in Stackoverflow."""
-  vocab_dict = tff.simulation.datasets.stackoverflow.load_word_counts()
+  vocab_dict = dataset_cache.load_stackoverflow_word_counts()
   return list(vocab_dict.keys())[:vocab_size]
 
 
@@ -269,7 +272,7 @@ def construct_word_level_datasets(vocab_size: int,
                      'passed {}'.format(vocab_size))
 
   (stackoverflow_train, _,
-   stackoverflow_test) = tff.simulation.datasets.stackoverflow.load_data()
+   stackoverflow_test) = dataset_cache.load_stackoverflow()
 
   vocab = create_vocab(vocab_size)
 
@@ -306,7 +309,7 @@ def get_centralized_train_dataset(vocab_size: int,
   vocab = create_vocab(vocab_size)
   to_ids = build_to_ids_fn(
       vocab=vocab, max_seq_len=max_seq_len, num_oov_buckets=num_oov_buckets)
-  train, _, _ = tff.simulation.datasets.stackoverflow.load_data()
+  train, _, _ = dataset_cache.load_stackoverflow()
 
   train = train.create_tf_dataset_from_all_clients()
   train = train.shuffle(buffer_size=shuffle_buffer_size)
@@ -14,20 +14,23 @@
 """Data loader for Stackoverflow."""
 
 import tensorflow as tf
-import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.utils.datasets import dataset_cache
 
 TEST_BATCH_SIZE = 500
 
 
+@dataset_cache.cache_artifact
 def create_token_vocab(vocab_size):
   """Creates vocab from `vocab_size` most common words in Stackoverflow."""
-  vocab_dict = tff.simulation.datasets.stackoverflow.load_word_counts()
+  vocab_dict = dataset_cache.load_stackoverflow_word_counts()
   return list(vocab_dict.keys())[:vocab_size]
 
 
+@dataset_cache.cache_artifact
 def create_tag_vocab(vocab_size):
   """Creates vocab from `vocab_size` most common tags in Stackoverflow."""
-  tag_dict = tff.simulation.datasets.stackoverflow.load_tag_counts()
+  tag_dict = dataset_cache.load_stackoverflow_tag_counts()
   return list(tag_dict.keys())[:vocab_size]
 
 
@@ -119,8 +122,8 @@ def get_stackoverflow_datasets(
 
   # Ignoring held-out Stackoverflow users for consistency with other
   # StackOverflow experiments.
-  stackoverflow_train, _, stackoverflow_test = tff.simulation.datasets.stackoverflow.load_data(
-  )
+  stackoverflow_train, _, stackoverflow_test = (
+      dataset_cache.load_stackoverflow())
 
   vocab_tokens = create_token_vocab(vocab_tokens_size)
   vocab_tags = create_tag_vocab(vocab_tags_size)
@@ -169,8 +172,8 @@ def get_centralized_stackoverflow_datasets(batch_size,
 
   # Ignoring held-out Stackoverflow users for consistency with other datasets in
   # optimization paper.
-  stackoverflow_train, _, stackoverflow_test = tff.simulation.datasets.stackoverflow.load_data(
-  )
+  stackoverflow_train, _, stackoverflow_test = (
+      dataset_cache.load_stackoverflow())
 
   vocab_tokens = create_token_vocab(vocab_tokens_size)
   vocab_tags = create_tag_vocab(vocab_tags_size)
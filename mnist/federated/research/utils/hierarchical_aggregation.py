@@ -0,0 +1,366 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Two-tier (clients -> edges -> server) aggregation of client updates.
+
+The aggregators in `aggregate_fns.py` assume a flat topology, where every
+client value is aggregated by a single `tff.federated_mean` at the server. This
+library instead groups clients into `num_edges` edge aggregators using a
+partition function. Each edge is a separate invocation of a TFF computation
+whose `tff.CLIENTS` are the clients of that edge, and which produces a partial
+weighted sum. The partial sums are then combined by a second computation whose
+`tff.CLIENTS` are the edges.
+
+`HierarchicalAggregator.aggregate_edges` requests the client values of one edge
+at a time from a provider function, so when the provider computes them lazily
+(e.g. by training the clients of that edge, as in
+`optimization/shared/hierarchical_fed_avg.py`), only one edge of client values
+is held in memory and the peak memory of the aggregation is bounded by the size
+of the largest edge rather than the size of the round cohort. Calling the
+aggregator on a sequence of client values instead aggregates values that are
+already materialized, and gives no such bound.
+"""
+
+import collections
+import time
+import zlib
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+import attr
+import numpy as np
+import tensorflow as tf
+import tensorflow_federated as tff
+
+# Convenience type aliases.
+PartitionFn = Callable[[Hashable, int], int]
+EdgeValuesFn = Callable[[List[int]], Tuple[Sequence[Any], Sequence[float]]]
+
+
+@attr.s(auto_attribs=True, eq=False, frozen=True)
+class EdgeAggregate(object):
+  """Structure for the output of an edge aggregator.
+
+  Fields:
+  -   `weighted_sum`: The sum of the client values at the edge, each multiplied
+        by its client weight.
+  -   `total_weight`: A float. The sum of the client weights at the edge.
+  -   `num_clipped`: An integer. The number of client values that were clipped
+        at the edge.
+  """
+  weighted_sum: Any
+  total_weight: float
+  num_clipped: int
+
+
+def default_partition_fn(client_key: Hashable, num_edges: int) -> int:
+  """Assigns a client to an edge by hashing its key.
+
+  Integer keys (e.g. the position of the client in the round) are assigned in a
+  round-robin fashion, all other keys are hashed. The hash is stable across
+  processes, so a client id is always assigned to the same edge.
+
+  Args:
+    client_key: A hashable key identifying the client, e.g. its client id.
+    num_edges: The number of edge aggregators.
+
+  Returns:
+    An integer in `[0, num_edges)`.
+  """
+  if isinstance(client_key, (int, np.integer)):
+    return int(client_key) % num_edges
+  return zlib.crc32(str(client_key).encode('utf-8')) % num_edges
+
+
+def _nbytes(value) -> int:
+  """Returns the number of bytes in the tensors of a nested structure."""
+  return sum(np.asarray(x).nbytes for x in tf.nest.flatten(value))
+
+
+def build_edge_aggregate_fn(
+    value_type: Union[tff.StructType, tff.TensorType],
+    clip_norm: Optional[float] = None,
+    edge_aggregate_fn: Optional[tff.utils.StatefulAggregateFn] = None
+) -> tff.Computation:
+  """Builds the computation run by each edge aggregator.
+
+  The returned computation has the TFF type signature:
+
+  ```
+  (<{value_type}@CLIENTS, {float32}@CLIENTS> -> EdgeAggregate@SERVER)
+  ```
+
+  Args:
+    value_type: A `tff.Type` describing the shape and type of the client values.
+    clip_norm: An optional float. If set, each client value is clipped to this
+      global l2 norm before being aggregated at the edge.
+    edge_aggregate_fn: An optional `tff.utils.StatefulAggregateFn` computing a
+      weighted mean of the (possibly clipped) client values, for example a
+      robust aggregator. It is initialized on every call, so any state it
+      carries is not preserved across calls. If `None`, the edge computes the
+      exact weighted sum of its client values.
+
+  Returns:
+    A `tff.Computation` computing an `EdgeAggregate` of the client values.
+  """
+
+  @tff.tf_computation(value_type)
+  def clip_by_global_norm(value):
+    if clip_norm is None:
+      return value, tf.constant(0)
+    clipped, global_norm = tf.clip_by_global_norm(
+        tf.nest.flatten(value), tf.constant(clip_norm))
+    was_clipped = tf.cast(
+        tf.greater(global_norm, tf.constant(clip_norm)), tf.int32)
+    return tf.nest.pack_sequence_as(value, clipped), was_clipped
+
+  @tff.tf_computation(value_type, tf.float32)
+  def scale(value, weight):
+    return tf.nest.map_structure(lambda x: x * weight, value)
+
+  @tff.federated_computation(
+      tff.FederatedType(value_type, tff.CLIENTS),
+      tff.FederatedType(tf.float32, tff.CLIENTS))
+  def edge_aggregate(values, weights):
+    values, was_clipped = tff.federated_map(clip_by_global_norm, values)
+    total_weight = tff.federated_sum(weights)
+    if edge_aggregate_fn is None:
+      weighted_sum = tff.federated_sum(
+          tff.federated_map(scale, (values, weights)))
+    else:
+      state = tff.federated_value(edge_aggregate_fn.initialize(), tff.SERVER)
+      _, mean = edge_aggregate_fn(state, values, weights)
+      weighted_sum = tff.federated_map(scale, (mean, total_weight))
+    return tff.federated_zip(
+        EdgeAggregate(
+            weighted_sum=weighted_sum,
+            total_weight=total_weight,
+            num_clipped=tff.federated_sum(was_clipped)))
+
+  return edge_aggregate
+
+
+def build_server_aggregate_fn(
+    value_type: Union[tff.StructType, tff.TensorType],
+    server_aggregate_fn: Optional[tff.utils.StatefulAggregateFn] = None
+) -> tff.Computation:
+  """Builds the computation combining the edge aggregates at the server.
+
+  The returned computation has the TFF type signature:
+
+  ```
+  (<{value_type}@CLIENTS, {float32}@CLIENTS> -> value_type@SERVER)
+  ```
+
+  where the `tff.CLIENTS` are the edges, the first argument are the edge
+  weighted sums and the second argument are the edge total weights.
+
+  Args:
+    value_type: A `tff.Type` describing the shape and type of the values.
+    server_aggregate_fn: An optional `tff.utils.StatefulAggregateFn` computing
+      a weighted mean of the edge means, for example a robust aggregator. It is
+      initialized on every call. If `None`, the server computes the exact
+      weighted mean of all client values, i.e. the sum of the edge weighted sums
+      divided by the sum of the edge weights.
+
+  Returns:
+    A `tff.Computation` computing the aggregate of all client values.
+  """
+
+  @tff.tf_computation(value_type, tf.float32)
+  def divide(value, weight):
+    return tf.nest.map_structure(lambda x: tf.math.divide_no_nan(x, weight),
+                                 value)
+
+  @tff.federated_computation(
+      tff.FederatedType(value_type, tff.CLIENTS),
+      tff.FederatedType(tf.float32, tff.CLIENTS))
+  def server_aggregate(weighted_sums, total_weights):
+    if server_aggregate_fn is None:
+      return tff.federated_map(divide, (tff.federated_sum(weighted_sums),
+                                        tff.federated_sum(total_weights)))
+    edge_means = tff.federated_map(divide, (weighted_sums, total_weights))
+    state = tff.federated_value(server_aggregate_fn.initialize(), tff.SERVER)
+    _, mean = server_aggregate_fn(state, edge_means, total_weights)
+    return mean
+
+  return server_aggregate
+
+
+class HierarchicalAggregator(object):
+  """Aggregates client values through a tier of edge aggregators.
+
+  Example usage:
+
+  ```python
+  aggregator = HierarchicalAggregator(value_type, num_edges=10, clip_norm=1.0)
+  mean, measurements = aggregator(client_values, client_weights, client_ids)
+  ```
+
+  To avoid materializing the client values of the whole cohort, pass a function
+  producing the values of one edge to `aggregate_edges` instead:
+
+  ```python
+  def edge_values_fn(positions):
+    outputs = [train_client(client_ids[i]) for i in positions]
+    return [o.weights_delta for o in outputs], [o.weight for o in outputs]
+
+  mean, measurements = aggregator.aggregate_edges(edge_values_fn, client_ids)
+  ```
+
+  The returned `measurements` report the wall-clock time and the number of
+  bytes uploaded in each tier.
+  """
+
+  def __init__(
+      self,
+      value_type: Union[tff.StructType, tff.TensorType],
+      num_edges: int,
+      partition_fn: PartitionFn = default_partition_fn,
+      clip_norm: Optional[float] = None,
+      edge_aggregate_fn: Optional[tff.utils.StatefulAggregateFn] = None,
+      server_aggregate_fn: Optional[tff.utils.StatefulAggregateFn] = None):
+    """Returns an initialized `HierarchicalAggregator`.
+
+    Args:
+      value_type: A `tff.Type` describing the shape and type of the client
+        values.
+      num_edges: A positive integer, the number of edge aggregators.
+      partition_fn: A function accepting a client key and `num_edges`, and
+        returning the index of the edge the client is assigned to.
+      clip_norm: An optional float. If set, each client value is clipped to
+        this global l2 norm at its edge.
+      edge_aggregate_fn: An optional `tff.utils.StatefulAggregateFn` used to
+        aggregate client values at each edge. See `build_edge_aggregate_fn`.
+      server_aggregate_fn: An optional `tff.utils.StatefulAggregateFn` used to
+        aggregate edge values at the server. See `build_server_aggregate_fn`.
+
+    Raises:
+      ValueError: If `num_edges` is not positive.
+    """
+    if num_edges < 1:
+      raise ValueError('num_edges must be positive, found {}.'.format(
+          num_edges))
+    self._num_edges = num_edges
+    self._partition_fn = partition_fn
+    self._edge_aggregate = build_edge_aggregate_fn(value_type, clip_norm,
+                                                   edge_aggregate_fn)
+    self._server_aggregate = build_server_aggregate_fn(value_type,
+                                                       server_aggregate_fn)
+
+  def partition(self, client_keys: Sequence[Hashable]) -> Dict[int, List[int]]:
+    """Returns a mapping from edge index to the positions of its clients."""
+    edges = collections.OrderedDict()
+    for position, key in enumerate(client_keys):
+      edge = self._partition_fn(key, self._num_edges)
+      if not 0 <= edge < self._num_edges:
+        raise ValueError(
+            'partition_fn assigned client {!r} to edge {}, expected a value '
+            'in [0, {}).'.format(key, edge, self._num_edges))
+      edges.setdefault(edge, []).append(position)
+    return edges
+
+  def __call__(
+      self,
+      client_values: Sequence[Any],
+      client_weights: Sequence[float],
+      client_keys: Optional[Sequence[Hashable]] = None
+  ) -> Tuple[Any, Dict[str, Any]]:
+    """Returns the aggregate of `client_values` and per-tier measurements.
+
+    Args:
+      client_values: A sequence of client values matching `value_type`.
+      client_weights: A sequence of float client weights.
+      client_keys: An optional sequence of hashable keys passed to
+        `partition_fn`. If `None`, the position of each client is used.
+
+    Returns:
+      A tuple `(result, measurements)`, as returned by `aggregate_edges`.
+
+    Raises:
+      ValueError: If the arguments do not have matching lengths.
+    """
+    if len(client_values) != len(client_weights):
+      raise ValueError('Found {} client values but {} client weights.'.format(
+          len(client_values), len(client_weights)))
+    if client_keys is None:
+      client_keys = range(len(client_values))
+    elif len(client_keys) != len(client_values):
+      raise ValueError('Found {} client values but {} client keys.'.format(
+          len(client_values), len(client_keys)))
+
+    def edge_values_fn(positions):
+      return ([client_values[i] for i in positions],
+              [client_weights[i] for i in positions])
+
+    return self.aggregate_edges(edge_values_fn, client_keys)
+
+  def aggregate_edges(
+      self, edge_values_fn: EdgeValuesFn,
+      client_keys: Sequence[Hashable]) -> Tuple[Any, Dict[str, Any]]:
+    """Returns the aggregate of the clients of all edges, one edge at a time.
+
+    Args:
+      edge_values_fn: A function accepting the positions in `client_keys` of
+        the clients of one edge, and returning a tuple `(values, weights)` of
+        their client values and float client weights. It is called once per
+        non-empty edge, and the values it returns are released before the next
+        edge is requested.
+      client_keys: A sequence of hashable keys passed to `partition_fn`, one
+        per client of the round.
+
+    Returns:
+      A tuple `(result, measurements)`, where `result` is the aggregate of all
+      client values and `measurements` is a nested dictionary of per-tier
+      metrics.
+
+    Raises:
+      ValueError: If `edge_values_fn` returns a number of values or weights
+        different from the number of clients of the edge.
+    """
+    edge_start_time = time.time()
+    edge_sums = []
+    edge_weights = []
+    client_bytes = 0
+    num_clipped = 0
+    max_clients_per_edge = 0
+    for positions in self.partition(client_keys).values():
+      values, weights = edge_values_fn(positions)
+      if len(values) != len(positions) or len(weights) != len(positions):
+        raise ValueError(
+            'edge_values_fn returned {} values and {} weights for an edge of '
+            '{} clients.'.format(len(values), len(weights), len(positions)))
+      client_bytes += sum(_nbytes(v) for v in values)
+      edge_aggregate = self._edge_aggregate(values, weights)
+      del values, weights
+      edge_sums.append(edge_aggregate.weighted_sum)
+      edge_weights.append(edge_aggregate.total_weight)
+      num_clipped += int(edge_aggregate.num_clipped)
+      max_clients_per_edge = max(max_clients_per_edge, len(positions))
+    edge_secs = time.time() - edge_start_time
+
+    server_start_time = time.time()
+    result = self._server_aggregate(edge_sums, edge_weights)
+    server_secs = time.time() - server_start_time
+
+    measurements = collections.OrderedDict(
+        edge=collections.OrderedDict(
+            aggregate_secs=edge_secs,
+            uploaded_bytes=client_bytes,
+            num_edges=len(edge_sums),
+            max_clients_per_edge=max_clients_per_edge,
+            num_clipped=num_clipped),
+        server=collections.OrderedDict(
+            aggregate_secs=server_secs,
+            uploaded_bytes=sum(_nbytes(s) for s in edge_sums) +
+            _nbytes(edge_weights)))
+    return result, measurements
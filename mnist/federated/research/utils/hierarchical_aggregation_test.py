@@ -0,0 +1,170 @@
+# Copyright 2020, The TensorFlow Federated Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from tensorflow_federated.python.research.utils import hierarchical_aggregation
+
+
+def create_weights_delta(input_size=2, hidden_size=5, constant=0):
+  """Returns deterministic weights delta for a linear model."""
+  kernel = constant + tf.reshape(
+      tf.range(input_size * hidden_size, dtype=tf.float32),
+      [input_size, hidden_size])
+  bias = constant + tf.range(hidden_size, dtype=tf.float32)
+  return collections.OrderedDict([('dense/kernel', kernel),
+                                  ('dense/bias', bias)])
+
+
+def weighted_mean(values, weights):
+  total_weight = sum(weights)
+  return tf.nest.map_structure(
+      lambda *xs: sum(w * x for w, x in zip(weights, xs)) / total_weight,
+      *values)
+
+
+class DefaultPartitionFnTest(tf.test.TestCase):
+
+  def test_integer_keys_are_round_robin(self):
+    edges = [
+        hierarchical_aggregation.default_partition_fn(i, 3) for i in range(6)
+    ]
+    self.assertEqual(edges, [0, 1, 2, 0, 1, 2])
+
+  def test_string_keys_are_deterministic(self):
+    for key in ['a', 'client_1', 'f0123_45']:
+      edge = hierarchical_aggregation.default_partition_fn(key, 4)
+      self.assertBetween(edge, 0, 3)
+      self.assertEqual(edge,
+                       hierarchical_aggregation.default_partition_fn(key, 4))
+
+
+class EdgeAggregateFnTest(tf.test.TestCase):
+
+  def test_weighted_sum(self):
+    deltas = [create_weights_delta(), create_weights_delta(constant=10)]
+    value_type = tff.framework.type_from_tensors(deltas[0])
+    edge_aggregate = hierarchical_aggregation.build_edge_aggregate_fn(
+        value_type)
+
+    output = edge_aggregate(deltas, [1.0, 3.0])
+
+    expected_sum = tf.nest.map_structure(lambda a, b: a + 3.0 * b, *deltas)
+    self.assertAllClose(expected_sum, output.weighted_sum)
+    self.assertAllClose(output.total_weight, 4.0)
+    self.assertEqual(output.num_clipped, 0)
+
+  def test_clip_by_global_norm(self):
+    clip_norm = 20.0
+    # Global l2 norms [17.74824, 53.99074].
+    deltas = [create_weights_delta(), create_weights_delta(constant=10)]
+    value_type = tff.framework.type_from_tensors(deltas[0])
+    edge_aggregate = hierarchical_aggregation.build_edge_aggregate_fn(
+        value_type, clip_norm=clip_norm)
+
+    output = edge_aggregate(deltas, [1.0, 1.0])
+
+    expected_clipped = []
+    for delta in deltas:
+      clipped, _ = tf.clip_by_global_norm(tf.nest.flatten(delta), clip_norm)
+      expected_clipped.append(tf.nest.pack_sequence_as(delta, clipped))
+    expected_sum = tf.nest.map_structure(lambda a, b: a + b, *expected_clipped)
+    self.assertAllClose(expected_sum, output.weighted_sum)
+    self.assertEqual(output.num_clipped, 1)
+
+
+class HierarchicalAggregatorTest(tf.test.TestCase):
+
+  def test_matches_flat_weighted_mean(self):
+    deltas = [create_weights_delta(constant=c) for c in range(5)]
+    weights = [1.0, 2.0, 3.0, 4.0, 5.0]
+    value_type = tff.framework.type_from_tensors(deltas[0])
+    aggregator = hierarchical_aggregation.HierarchicalAggregator(
+        value_type, num_edges=2)
+
+    result, measurements = aggregator(deltas, weights)
+
+    self.assertAllClose(weighted_mean(deltas, weights), result)
+    self.assertEqual(measurements['edge']['num_edges'], 2)
+    self.assertEqual(measurements['edge']['max_clients_per_edge'], 3)
+    # Five clients each upload 15 float32 values, two edges each upload 15
+    # float32 values and a float32 weight.
+    self.assertEqual(measurements['edge']['uploaded_bytes'], 5 * 15 * 4)
+    self.assertEqual(measurements['server']['uploaded_bytes'], 2 * 16 * 4)
+
+  def test_partition_fn_with_client_keys(self):
+    deltas = [create_weights_delta(constant=c) for c in range(4)]
+    weights = [1.0, 1.0, 2.0, 2.0]
+    value_type = tff.framework.type_from_tensors(deltas[0])
+    aggregator = hierarchical_aggregation.HierarchicalAggregator(
+        value_type,
+        num_edges=3,
+        partition_fn=lambda key, num_edges: 0 if key.startswith('a') else 2)
+
+    result, measurements = aggregator(
+        deltas, weights, client_keys=['a1', 'b1', 'a2', 'b2'])
+
+    self.assertAllClose(weighted_mean(deltas, weights), result)
+    self.assertEqual(measurements['edge']['num_edges'], 2)
+    self.assertEqual(
+        aggregator.partition(['a1', 'b1', 'a2', 'b2']), {
+            0: [0, 2],
+            2: [1, 3]
+        })
+
+  def test_aggregate_edges_requests_one_edge_at_a_time(self):
+    deltas = [create_weights_delta(constant=c) for c in range(5)]
+    weights = [1.0, 2.0, 3.0, 4.0, 5.0]
+    value_type = tff.framework.type_from_tensors(deltas[0])
+    aggregator = hierarchical_aggregation.HierarchicalAggregator(
+        value_type, num_edges=2)
+    requested_edges = []
+
+    def edge_values_fn(positions):
+      requested_edges.append(positions)
+      return [deltas[i] for i in positions], [weights[i] for i in positions]
+
+    result, _ = aggregator.aggregate_edges(edge_values_fn, range(5))
+
+    self.assertAllClose(weighted_mean(deltas, weights), result)
+    self.assertEqual(requested_edges, [[0, 2, 4], [1, 3]])
+
+  def test_aggregate_edges_with_missing_values_raises(self):
+    value_type = tff.framework.type_from_tensors(create_weights_delta())
+    aggregator = hierarchical_aggregation.HierarchicalAggregator(
+        value_type, num_edges=1)
+    with self.assertRaises(ValueError):
+      aggregator.aggregate_edges(
+          lambda positions: ([create_weights_delta()], [1.0]), [0, 1])
+
+  def test_partition_fn_out_of_range_raises(self):
+    value_type = tff.framework.type_from_tensors(create_weights_delta())
+    aggregator = hierarchical_aggregation.HierarchicalAggregator(
+        value_type, num_edges=2, partition_fn=lambda key, num_edges: num_edges)
+    with self.assertRaises(ValueError):
+      aggregator.partition([0])
+
+  def test_mismatched_lengths_raises(self):
+    value_type = tff.framework.type_from_tensors(create_weights_delta())
+    aggregator = hierarchical_aggregation.HierarchicalAggregator(
+        value_type, num_edges=2)
+    with self.assertRaises(ValueError):
+      aggregator([create_weights_delta()], [1.0, 2.0])
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -76,7 +76,8 @@ def create_conv_dropout_model(only_digits=True):
       tf.keras.layers.Dense(128, activation='relu'),
       tf.keras.layers.Dropout(0.5),
       tf.keras.layers.Dense(
-          10 if only_digits else 62, activation=tf.nn.softmax),
+          10 if only_digits else 62, activation=tf.nn.softmax,
+          dtype='float32'),
   ])
 
   return model
@@ -146,7 +147,8 @@ def create_original_fedavg_cnn_model(only_digits=True):
       tf.keras.layers.Flatten(),
       tf.keras.layers.Dense(512, activation=tf.nn.relu),
       tf.keras.layers.Dense(
-          10 if only_digits else 62, activation=tf.nn.softmax),
+          10 if only_digits else 62, activation=tf.nn.softmax,
+          dtype='float32'),
   ])
 
   return model
@@ -191,7 +193,8 @@ def create_two_hidden_layer_model(only_digits=True, hidden_units=200):
       tf.keras.layers.Dense(hidden_units, activation=tf.nn.relu),
       tf.keras.layers.Dense(hidden_units, activation=tf.nn.relu),
       tf.keras.layers.Dense(
-          10 if only_digits else 62, activation=tf.nn.softmax),
+          10 if only_digits else 62, activation=tf.nn.softmax,
+          dtype='float32'),
   ])
 
   return model
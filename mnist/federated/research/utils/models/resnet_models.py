@@ -282,6 +282,8 @@ def create_resnet(input_shape,
   x = tf.keras.layers.Dense(
       num_classes,
       activation='softmax',
+      # Keep the outputs in float32 under mixed precision policies.
+      dtype='float32',
       kernel_initializer=tf.keras.initializers.RandomNormal(stddev=0.01),
       kernel_regularizer=tf.keras.regularizers.l2(L2_WEIGHT_DECAY),
       bias_regularizer=tf.keras.regularizers.l2(L2_WEIGHT_DECAY))(x)
@@ -54,5 +54,7 @@ def create_recurrent_model(vocab_size: int,
       stateful=False)
   model.add(lstm_layer_builder())
   model.add(lstm_layer_builder())
-  model.add(tf.keras.layers.Dense(vocab_size))  # Note: logits, no softmax.
+  # Note: logits, no softmax. Keep the logits in float32 under mixed precision
+  # policies.
+  model.add(tf.keras.layers.Dense(vocab_size, dtype='float32'))
   return model
@@ -20,7 +20,10 @@ class TransposableEmbedding(tf.keras.layers.Embedding):
   """A Keras Embedding layer implements a transposed projection for output."""
 
   def reverse_project(self, inputs):
-    return tf.matmul(inputs, self.embeddings, transpose_b=True)
+    # Under a mixed precision policy the embeddings are stored in float32 but
+    # the inputs are in the compute dtype of the model.
+    embeddings = tf.cast(self.embeddings, inputs.dtype)
+    return tf.matmul(inputs, embeddings, transpose_b=True)
 
 
 def create_recurrent_model(vocab_size=10000,
@@ -60,9 +63,11 @@ def create_recurrent_model(vocab_size=10000,
 
   if shared_embedding:
     logits = input_embedding.reverse_project(projected)
+    logits = tf.cast(logits, tf.float32)
   else:
+    # Keep the logits in float32 under mixed precision policies.
     logits = tf.keras.layers.Dense(
-        extended_vocab_size, activation=None)(
+        extended_vocab_size, activation=None, dtype='float32')(
             projected)
 
   return tf.keras.Model(inputs=inputs, outputs=logits, name=name)
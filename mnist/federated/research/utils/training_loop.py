@@ -230,6 +230,9 @@ def run(iterative_process: adapters.IterativeProcessPythonAdapter,
     round_metrics = iteration_result.metrics
 
     train_metrics['training_secs'] = time.time() - training_start_time
+    if 'num_examples' in round_metrics:
+      train_metrics['examples_per_sec'] = (
+          round_metrics['num_examples'] / train_metrics['training_secs'])
     train_metrics['model_delta_l2_norm'] = _compute_numpy_l2_difference(
         state.model, prev_model)
     train_metrics.update(round_metrics)
@@ -14,16 +14,18 @@
 """Utilities supporting experiments."""
 
 import collections
+from concurrent import futures
 import contextlib
 import functools
 import inspect
 import itertools
 import multiprocessing
-import os.path
+import os
+import queue
 import shutil
 import subprocess
 import tempfile
-from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Union
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
 
 from absl import flags
 from absl import logging
@@ -522,6 +524,27 @@ def hparams_to_str(wid: int,
   return hparams_str
 
 
+def _create_command(executable: str,
+                    idx: int,
+                    param_dict: Mapping[str, Union[int, float, str]],
+                    root_output_dir: str,
+                    short_names: Optional[Mapping[str, str]] = None,
+                    exp_name_flag: str = 'exp_name') -> Tuple[str, str]:
+  """Returns the experiment name and the command of a trial of a grid search."""
+  param_list = [
+      '--{}={}'.format(key, str(value))
+      for key, value in sorted(param_dict.items())
+  ]
+
+  short_names = short_names or {}
+  param_str = hparams_to_str(idx, param_dict, short_names)
+
+  param_list.append('--root_output_dir={}'.format(root_output_dir))
+  param_list.append('--{}={}'.format(exp_name_flag, param_str))
+  command = '{} {}'.format(executable, ' '.join(param_list))
+  return param_str, command
+
+
 def launch_experiment(executable: str,
                       grid_iter: Iterable[Mapping[str, Union[int, float, str]]],
                       root_output_dir: str = '/tmp/exp',
@@ -535,6 +558,9 @@ def launch_experiment(executable: str,
   launch_experiment('run_exp.py', grid_iter)
   ```
 
+  See `run_grid_search` to pin the experiments to CPUs, retry failed
+  experiments and collect their metrics.
+
   Args:
     executable: An executable which takes flags --root_output_dir
       and --exp_name, e.g., `bazel run //research/emnist:run_experiment --`.
@@ -545,20 +571,11 @@ def launch_experiment(executable: str,
       string length is too long.
     max_workers: The max number of commands to run in parallel.
   """
-  command_list = []
-  for idx, param_dict in enumerate(grid_iter):
-    param_list = [
-        '--{}={}'.format(key, str(value))
-        for key, value in sorted(param_dict.items())
-    ]
-
-    short_names = short_names or {}
-    param_str = hparams_to_str(idx, param_dict, short_names)
-
-    param_list.append('--root_output_dir={}'.format(root_output_dir))
-    param_list.append('--exp_name={}'.format(param_str))
-    command = '{} {}'.format(executable, ' '.join(param_list))
-    command_list.append(command)
+  command_list = [
+      _create_command(executable, idx, param_dict, root_output_dir,
+                      short_names)[1]
+      for idx, param_dict in enumerate(grid_iter)
+  ]
 
   pool = multiprocessing.Pool(processes=max_workers)
   executor = functools.partial(subprocess.call, shell=True)
@@ -566,3 +583,218 @@ def launch_experiment(executable: str,
     pool.apply_async(executor, (command,))
   pool.close()
   pool.join()
+
+
+# The environment variables bounding the number of threads of a trial, see
+# `run_grid_search`.
+_THREAD_COUNT_ENV_VARS = ('OMP_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS',
+                          'TF_NUM_INTEROP_THREADS')
+
+
+def _get_available_cpus() -> List[int]:
+  """Returns the CPUs this process may run on."""
+  if hasattr(os, 'sched_getaffinity'):
+    return sorted(os.sched_getaffinity(0))
+  return list(range(os.cpu_count() or 1))
+
+
+def _get_available_memory_bytes() -> Optional[int]:
+  """Returns the available physical memory, or None if it is unknown."""
+  try:
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+  except (AttributeError, ValueError, OSError):
+    return None
+
+
+def _run_trial(command: str, cpu_set: Sequence[int],
+               max_retries: int) -> Tuple[int, int]:
+  """Runs `command` on `cpu_set` until it succeeds or runs out of retries.
+
+  Args:
+    command: The shell command of the trial.
+    cpu_set: The CPUs the trial runs on, and its number of threads.
+    max_retries: The number of times a failed trial is run again.
+
+  Returns:
+    A tuple `(return_code, attempts)` of the last run of `command`.
+  """
+  env = dict(os.environ)
+  for name in _THREAD_COUNT_ENV_VARS:
+    env[name] = str(len(cpu_set))
+
+  for attempt in range(1, max_retries + 2):
+    # The trial is pinned from the parent right after it is started, rather
+    # than with a `preexec_fn`, which is unsafe in the threads of the pool.
+    process = subprocess.Popen(command, shell=True, env=env)
+    if hasattr(os, 'sched_setaffinity'):
+      try:
+        os.sched_setaffinity(process.pid, cpu_set)
+      except ProcessLookupError:
+        pass
+    return_code = process.wait()
+    if return_code == 0:
+      break
+    logging.warning('Command [%s] exited with code %d (attempt %d of %d).',
+                    command, return_code, attempt, max_retries + 1)
+  return return_code, attempt
+
+
+def read_grid_search_metrics(root_output_dir: str,
+                             trials: pd.DataFrame) -> pd.DataFrame:
+  """Merges the metrics of the trials of a grid search into a single table.
+
+  The metrics of a trial are read from the CSV files written by the
+  `metrics_manager.ScalarMetricsManager` of the experiment, under
+  `{root_output_dir}/results/{exp_name}/`.
+
+  Args:
+    root_output_dir: The `root_output_dir` of the trials.
+    trials: A `pandas.DataFrame` indexed by the experiment names of the trials,
+      whose columns include the hyperparameters of the trials, as returned by
+      `run_grid_search`.
+
+  Returns:
+    A `pandas.DataFrame` of the metrics of all trials, with a column for each
+    hyperparameter, indexed by experiment name and round number.
+  """
+  hparam_names = [
+      name for name in trials.columns
+      if name not in ('command', 'return_code', 'attempts')
+  ]
+  trial_metrics = []
+  for exp_name, trial in trials.iterrows():
+    pattern = os.path.join(root_output_dir, 'results', exp_name,
+                           '*.metrics.csv*')
+    for metrics_file in tf.io.gfile.glob(pattern):
+      metrics = atomic_read_from_csv(metrics_file)
+      for name in hparam_names:
+        metrics[name] = trial[name]
+      metrics['exp_name'] = exp_name
+      trial_metrics.append(metrics)
+  if not trial_metrics:
+    return pd.DataFrame()
+  metrics = pd.concat(trial_metrics, ignore_index=True, sort=False)
+  index = ['exp_name', 'round_num'] if 'round_num' in metrics else ['exp_name']
+  return metrics.set_index(index)
+
+
+def run_grid_search(
+    executable: str,
+    grid_iter: Iterable[Mapping[str, Union[int, float, str]]],
+    root_output_dir: str = '/tmp/exp',
+    short_names: Optional[Mapping[str, str]] = None,
+    max_workers: Optional[int] = None,
+    cpus_per_trial: Optional[int] = None,
+    memory_per_trial_gb: Optional[float] = None,
+    max_retries: int = 0,
+    exp_name_flag: str = 'exp_name') -> Tuple[pd.DataFrame, pd.DataFrame]:
+  """Runs the experiments of a grid search, and collects their metrics.
+
+  Unlike `launch_experiment`, the concurrent trials are pinned to disjoint sets
+  of CPUs, and their number of TensorFlow and OpenMP threads is set to the
+  size of their CPU set, so that they do not oversubscribe the machine.
+
+  A trial exiting with a non-zero code (e.g. after being preempted) is run
+  again with the same `root_output_dir` and experiment name, up to
+  `max_retries` times. The training loops then resume from the latest
+  checkpoint of their `checkpoint_manager.FileCheckpointManager`.
+
+  The trials and their merged metrics are written to
+  `{root_output_dir}/grid_search_trials.csv` and
+  `{root_output_dir}/grid_search_metrics.csv`.
+
+  Example usage:
+  ```python
+  grid_iter = iter_grid({'a': [1, 2], 'b': [4.0, 5.0]})
+  trials, metrics = run_grid_search('run_exp.py', grid_iter, cpus_per_trial=4)
+  ```
+
+  Args:
+    executable: An executable which takes flags --root_output_dir and
+      --`exp_name_flag`, e.g., `bazel run //research/emnist:run_experiment --`.
+    grid_iter: A sequence of dictionaries with keys from grid, and values
+      corresponding to all combinations of items in the corresponding iterables.
+    root_output_dir: The directory where all outputs are stored.
+    short_names: Short name mapping for the parameter name used if parameter
+      string length is too long.
+    max_workers: The max number of trials to run in parallel. Defaults to the
+      number of available CPUs divided by `cpus_per_trial`, or 1 if
+      `cpus_per_trial` is not set.
+    cpus_per_trial: The number of CPUs of each trial. Defaults to an even
+      split of the available CPUs between the `max_workers` trials.
+    memory_per_trial_gb: If set, the number of parallel trials is further
+      bounded so that each trial has this much available memory.
+    max_retries: The number of times a failed trial is run again.
+    exp_name_flag: The name of the flag of `executable` setting the name of
+      the experiment.
+
+  Returns:
+    A tuple `(trials, metrics)` of `pandas.DataFrame`s. `trials` is indexed by
+    the experiment names of the trials, and holds their hyperparameters,
+    command, return code and number of attempts. `metrics` is returned by
+    `read_grid_search_metrics`.
+
+  Raises:
+    ValueError: If `cpus_per_trial` is larger than the number of available
+      CPUs, or `max_workers` or `max_retries` are invalid.
+  """
+  if max_workers is not None and max_workers < 1:
+    raise ValueError('max_workers must be at least 1, found {}.'.format(
+        max_workers))
+  if max_retries < 0:
+    raise ValueError('max_retries must be non-negative, found {}.'.format(
+        max_retries))
+  cpus = _get_available_cpus()
+  if cpus_per_trial is not None and not 1 <= cpus_per_trial <= len(cpus):
+    raise ValueError('cpus_per_trial must be between 1 and the {} available '
+                     'CPUs, found {}.'.format(len(cpus), cpus_per_trial))
+
+  hparams = collections.OrderedDict()
+  commands = collections.OrderedDict()
+  for idx, param_dict in enumerate(grid_iter):
+    exp_name, command = _create_command(executable, idx, param_dict,
+                                        root_output_dir, short_names,
+                                        exp_name_flag)
+    hparams[exp_name] = param_dict
+    commands[exp_name] = command
+  if not commands:
+    return pd.DataFrame(), pd.DataFrame()
+
+  if max_workers is None:
+    max_workers = len(cpus) // cpus_per_trial if cpus_per_trial else 1
+  if memory_per_trial_gb is not None:
+    available_memory = _get_available_memory_bytes()
+    if available_memory is not None:
+      max_workers = min(max_workers,
+                        int(available_memory / (memory_per_trial_gb * 2**30)))
+  max_workers = max(1, min(max_workers, len(cpus), len(commands)))
+  cpu_sets = queue.Queue()
+  for cpu_set in np.array_split(cpus, max_workers):
+    cpu_sets.put([int(cpu) for cpu in cpu_set[:cpus_per_trial]])
+  logging.info('Running %d trials, %d at a time.', len(commands), max_workers)
+
+  def run_trial_on_free_cpus(command):
+    cpu_set = cpu_sets.get()
+    try:
+      return _run_trial(command, cpu_set, max_retries)
+    finally:
+      cpu_sets.put(cpu_set)
+
+  with futures.ThreadPoolExecutor(max_workers) as executor:
+    results = executor.map(run_trial_on_free_cpus, commands.values())
+    trials = pd.DataFrame.from_dict(hparams, orient='index')
+    trials['command'] = list(commands.values())
+    trials['return_code'], trials['attempts'] = zip(*results)
+  trials.index.name = 'exp_name'
+  failed = trials.index[trials['return_code'] != 0]
+  if failed.size:
+    logging.error('%d of %d trials failed: %s', failed.size, len(trials),
+                  list(failed))
+
+  metrics = read_grid_search_metrics(root_output_dir, trials)
+  tf.io.gfile.makedirs(root_output_dir)
+  atomic_write_to_csv(trials,
+                      os.path.join(root_output_dir, 'grid_search_trials.csv'))
+  atomic_write_to_csv(metrics,
+                      os.path.join(root_output_dir, 'grid_search_metrics.csv'))
+  return trials, metrics
@@ -224,6 +224,62 @@ class UtilsTest(tf.test.TestCase, parameterized.TestCase):
     result = [args[0][1][0] for args in result]
     self.assertCountEqual(result, expected)
 
+  def test_run_grid_search_retries_failed_trials(self):
+    root_output_dir = self.create_tempdir().full_path
+    grid = list(utils_impl.iter_grid({'a': [1, 2]}))
+
+    trials, metrics = utils_impl.run_grid_search(
+        'true', grid, root_output_dir, max_workers=2, max_retries=1)
+    self.assertCountEqual(trials.index, ['0-a=1', '1-a=2'])
+    self.assertListEqual(list(trials['return_code']), [0, 0])
+    self.assertListEqual(list(trials['attempts']), [1, 1])
+    self.assertTrue(metrics.empty)
+
+    trials, _ = utils_impl.run_grid_search(
+        'false', grid, root_output_dir, max_retries=2)
+    self.assertListEqual(list(trials['return_code']), [1, 1])
+    self.assertListEqual(list(trials['attempts']), [3, 3])
+    self.assertTrue(
+        tf.io.gfile.exists(
+            os.path.join(root_output_dir, 'grid_search_trials.csv')))
+
+  def test_run_grid_search_sets_thread_counts(self):
+    root_output_dir = self.create_tempdir().full_path
+    output_file = os.path.join(root_output_dir, 'num_threads')
+    grid_iter = utils_impl.iter_grid({'a': [1]})
+
+    trials, _ = utils_impl.run_grid_search(
+        'echo $OMP_NUM_THREADS > {} #'.format(output_file),
+        grid_iter,
+        root_output_dir,
+        cpus_per_trial=1)
+    self.assertListEqual(list(trials['return_code']), [0])
+    with open(output_file) as f:
+      self.assertEqual(f.read().strip(), '1')
+
+  def test_run_grid_search_with_too_many_cpus_per_trial_raises(self):
+    with self.assertRaisesRegex(ValueError, 'cpus_per_trial'):
+      utils_impl.run_grid_search(
+          'true', utils_impl.iter_grid({'a': [1]}), cpus_per_trial=100000)
+
+  def test_read_grid_search_metrics(self):
+    root_output_dir = self.create_tempdir().full_path
+    trials = pd.DataFrame({'a': [1, 2]}, index=['0-a=1', '1-a=2'])
+    for exp_name, loss in [('0-a=1', 0.5), ('1-a=2', 0.25)]:
+      results_dir = os.path.join(root_output_dir, 'results', exp_name)
+      tf.io.gfile.makedirs(results_dir)
+      utils_impl.atomic_write_to_csv(
+          pd.DataFrame({
+              'round_num': [0, 1],
+              'loss': [loss, loss / 2]
+          }), os.path.join(results_dir, 'experiment.metrics.csv'))
+
+    metrics = utils_impl.read_grid_search_metrics(root_output_dir, trials)
+    self.assertListEqual(metrics.index.names, ['exp_name', 'round_num'])
+    self.assertEqual(metrics.loc[('1-a=2', 1), 'loss'], 0.125)
+    self.assertEqual(metrics.loc[('1-a=2', 1), 'a'], 2)
+    self.assertEqual(metrics.loc[('0-a=1', 0), 'a'], 1)
+
   def test_remove_unused_flags_without_optimizer_flag(self):
     hparam_dict = collections.OrderedDict([('client_opt_fn', 'sgd'),
                                            ('client_sgd_momentum', 0.3)])